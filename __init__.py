@@ -107,9 +107,10 @@ Eg
 __version__ = '1.3b'
 
 import os
-from distutils.version import LooseVersion
+import re
 import numpy
-if LooseVersion(numpy.__version__) <= LooseVersion('1.8.0'):
+# distutils is not used here because importing it is slow
+if tuple(int(x) for x in re.findall(r'\d+', numpy.__version__)[:3]) <= (1, 8, 0):
     raise SystemError("You're using an old version of Numpy (%s). "
                       "It is recommended to upgrad numpy to 1.8.0 or newer. \n"
                       "You still can use all features of PySCF with the old numpy by removing this warning msg. "
@@ -117,8 +118,8 @@ if LooseVersion(numpy.__version__) <= LooseVersion('1.8.0'):
                       numpy.__version__)
 from pyscf import gto
 from pyscf import lib
-from pyscf import scf
-from pyscf import ao2mo
+scf = lib.lazy_import('pyscf.scf')
+ao2mo = lib.lazy_import('pyscf.ao2mo')
 
 __path__.append(os.path.join(os.path.dirname(__file__), 'future'))
 __path__.append(os.path.join(os.path.dirname(__file__), 'tools'))
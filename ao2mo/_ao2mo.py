@@ -13,7 +13,7 @@ def _fpointer(name):
 
 class AO2MOpt(object):
     def __init__(self, mol, intor,
-                 prescreen='CVHFnoscreen', qcondname=None):
+                 prescreen='CVHFnoscreen', qcondname=None, shell_pairs=None):
         self._this = ctypes.POINTER(_vhf._CVHFOpt)()
         #print self._this.contents, expect ValueError: NULL pointer access
         self._intor = _fpointer(intor)
@@ -33,11 +33,14 @@ class AO2MOpt(object):
 
         if prescreen != 'CVHFnoscreen':
             # for cint2e_sph, qcondname is 'CVHFsetnr_direct_scf'
-            fsetqcond = getattr(libao2mo, qcondname)
-            fsetqcond(self._this,
-                      c_atm.ctypes.data_as(ctypes.c_void_p), natm,
-                      c_bas.ctypes.data_as(ctypes.c_void_p), nbas,
-                      c_env.ctypes.data_as(ctypes.c_void_p))
+            if shell_pairs is not None and qcondname == 'CVHFsetnr_direct_scf':
+                _vhf.set_q_cond(libao2mo, self._this, shell_pairs)
+            else:
+                fsetqcond = getattr(libao2mo, qcondname)
+                fsetqcond(self._this,
+                          c_atm.ctypes.data_as(ctypes.c_void_p), natm,
+                          c_bas.ctypes.data_as(ctypes.c_void_p), nbas,
+                          c_env.ctypes.data_as(ctypes.c_void_p))
 
 
 # if out is not None, transform AO to MO in-place
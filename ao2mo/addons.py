@@ -14,6 +14,9 @@ libao2mo = pyscf.lib.load_library('libao2mo')
 class load(object):
     '''load 2e integrals from hdf5 file
 
+    The integrals written with compression (see :func:`outcore.general`) are
+    decompressed on the fly when the dataset is read.
+
     Usage:
         with load(erifile) as eri:
             print eri.shape
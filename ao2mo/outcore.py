@@ -8,6 +8,7 @@ import numpy
 import h5py
 from pyscf import lib
 from pyscf.lib import logger
+from pyscf.lib import memplan
 from pyscf.ao2mo import _ao2mo
 from pyscf.ao2mo import incore
 
@@ -19,7 +20,8 @@ IOBUF_ROW_MIN = 160
 
 def full(mol, mo_coeff, erifile, dataname='eri_mo', tmpdir=None,
          intor='cint2e_sph', aosym='s4', comp=1,
-         max_memory=2000, ioblk_size=IOBLK_SIZE, verbose=logger.WARN, compact=True):
+         max_memory=2000, ioblk_size=IOBLK_SIZE, verbose=logger.WARN, compact=True,
+         compression=None, threshold=0):
     r'''Transfer arbitrary spherical AO integrals to MO integrals for given orbitals
 
     Args:
@@ -71,6 +73,16 @@ def full(mol, mo_coeff, erifile, dataname='eri_mo', tmpdir=None,
             returned MO integrals has (up to 4-fold) permutation symmetry.
             If it's False, the function will abandon any permutation symmetry,
             and return the "plain" MO integrals
+        compression : str
+            HDF5 compression filter for the MO integrals, 'lzf' (fast) or
+            'gzip'.  The integrals are compressed losslessly by blocks of
+            rows, and decompressed transparently when the dataset is read,
+            e.g. through :class:`ao2mo.load`.  Default is None (no compression).
+        threshold : float
+            MO integrals smaller than threshold in magnitude are stored as 0,
+            which improves the compression ratio.  The largest dropped value,
+            i.e. the error bound of the stored integrals, is saved in the
+            attribute 'max_error' of the dataset.
 
     Returns:
         None
@@ -100,12 +112,14 @@ def full(mol, mo_coeff, erifile, dataname='eri_mo', tmpdir=None,
     dataset ['eri_mo', 'new'], shape (3, 100, 55)
     '''
     general(mol, (mo_coeff,)*4, erifile, dataname, tmpdir,
-            intor, aosym, comp, max_memory, ioblk_size, verbose, compact)
+            intor, aosym, comp, max_memory, ioblk_size, verbose, compact,
+            compression, threshold)
     return erifile
 
 def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
             intor='cint2e_sph', aosym='s4', comp=1,
-            max_memory=2000, ioblk_size=IOBLK_SIZE, verbose=logger.WARN, compact=True):
+            max_memory=2000, ioblk_size=IOBLK_SIZE, verbose=logger.WARN, compact=True,
+            compression=None, threshold=0):
     r'''For the given four sets of orbitals, transfer arbitrary spherical AO
     integrals to MO integrals on the fly.
 
@@ -159,6 +173,16 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
             returned MO integrals has (up to 4-fold) permutation symmetry.
             If it's False, the function will abandon any permutation symmetry,
             and return the "plain" MO integrals
+        compression : str
+            HDF5 compression filter for the MO integrals, 'lzf' (fast) or
+            'gzip'.  The integrals are compressed losslessly by blocks of
+            rows, and decompressed transparently when the dataset is read,
+            e.g. through :class:`ao2mo.load`.  Default is None (no compression).
+        threshold : float
+            MO integrals smaller than threshold in magnitude are stored as 0,
+            which improves the compression ratio.  The largest dropped value,
+            i.e. the error bound of the stored integrals, is saved in the
+            attribute 'max_error' of the dataset.
 
     Returns:
         None
@@ -239,14 +263,21 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
     else:
         assert(isinstance(erifile, h5py.Group))
         feri = erifile
-    if comp == 1:
+    if compression and nij_pair > 0 and nkl_pair > 0:
+# Chunks of ~1 MB complete rows.  The shuffle filter groups the bytes of the
+# floating point numbers, which improves the compression ratio.
+        chunks = (min(nij_pair, max(1, 131072//nkl_pair)), nkl_pair)
+        h5opts = {'compression': compression, 'shuffle': True}
+    else:
         chunks = (nmoj,nmol)
+        h5opts = {}
+    if comp == 1:
         h5d_eri = feri.create_dataset(dataname, (nij_pair,nkl_pair),
-                                      'f8', chunks=chunks)
+                                      'f8', chunks=chunks, **h5opts)
     else:
-        chunks = (1,nmoj,nmol)
+        chunks = (1,) + chunks
         h5d_eri = feri.create_dataset(dataname, (comp,nij_pair,nkl_pair),
-                                      'f8', chunks=chunks)
+                                      'f8', chunks=chunks, **h5opts)
 
     if nij_pair == 0 or nkl_pair == 0:
         if isinstance(erifile, str):
@@ -257,20 +288,38 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
               float(nij_pair)*nkl_pair*comp, nij_pair*nkl_pair*comp*8/1e6)
 
 # transform e1
-    if tmpdir is None:
-        tmpdir = lib.param.TMPDIR
-    swapfile = tempfile.NamedTemporaryFile(dir=tmpdir)
-    fswap = h5py.File(swapfile.name, 'w')
-    half_e1(mol, mo_coeffs, fswap, intor, aosym, comp, max_memory, ioblk_size,
-            log, compact)
+# If the half-transformed integrals (ij|kl), ij in MO and kl in AO, fit in
+# memory (e.g. one of the MO spaces is small, like the occupied space of MP2),
+# the AO integrals are transformed directly without the swap file.
+# The integrals are held in memory until the end of step 2, together with the
+# step-2 output buffers (bufs1 and buf_write).
+    e2blk_size = max(max_memory*.1, ioblk_size)
+    iobuflen = guess_e2bufsize(e2blk_size, nij_pair, max(nao_pair,nkl_pair))[0]
+    half_mem = comp * nij_pair * nao_pair * 8/1e6
+    e2buf_mem = iobuflen * nkl_pair * 8*2/1e6
+    mem_now = lib.current_memory()[0]
+    if memplan.choose_path(half_mem+e2buf_mem, mem_now, max_memory) == 'incore':
+        log.debug('step1: integral-direct, half-transformed integrals '
+                  '%.8g MB in memory', half_mem)
+        fswap = None
+        half = half_e1_incore(mol, mo_coeffs, intor, aosym, comp,
+                              max_memory-half_mem-mem_now, log, compact)
+    else:
+        if tmpdir is None:
+            tmpdir = lib.param.TMPDIR
+        swapfile = tempfile.NamedTemporaryFile(dir=tmpdir)
+        fswap = h5py.File(swapfile.name, 'w')
+        half_e1(mol, mo_coeffs, fswap, intor, aosym, comp, max_memory, ioblk_size,
+                log, compact)
 
     time_1pass = log.timer('AO->MO transformation for %s 1 pass'%intor,
                            *time_0pass)
 
-    ioblk_size = max(max_memory*.1, ioblk_size)
-    iobuflen = guess_e2bufsize(ioblk_size, nij_pair, max(nao_pair,nkl_pair))[0]
-    reading_frame = [numpy.empty((iobuflen,nao_pair)),
-                     numpy.empty((iobuflen,nao_pair))]
+    if fswap is None:
+        reading_frame = []
+    else:
+        reading_frame = [numpy.empty((iobuflen,nao_pair)),
+                         numpy.empty((iobuflen,nao_pair))]
     def prefetch(icomp, row0, row1, buf):
         if icomp+1 < comp:
             icomp += 1
@@ -280,6 +329,8 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
         if row0 < row1:
             _load_from_h5g(fswap['%d'%icomp], row0, row1, buf)
     def async_read(icomp, row0, row1, thread_read):
+        if fswap is None:
+            return half[icomp,row0:row1], None
         buf_current, buf_prefetch = reading_frame
         reading_frame[:] = [buf_prefetch, buf_current]
         if thread_read is None:
@@ -289,7 +340,15 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
         thread_read = lib.background_thread(prefetch, icomp, row0, row1, buf_prefetch)
         return buf_current[:row1-row0], thread_read
 
+    dropped = [0, 0.]  # number of dropped integrals, largest dropped value
     def save(icomp, row0, row1, buf):
+        if threshold > 0:
+            buf = buf[:row1-row0]
+            mask = abs(buf) < threshold
+            if mask.any():
+                dropped[0] += numpy.count_nonzero(buf[mask])
+                dropped[1] = max(dropped[1], abs(buf[mask]).max())
+                buf[mask] = 0
         if comp == 1:
             h5d_eri[row0:row1] = buf[:row1-row0]
         else:
@@ -304,7 +363,6 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
               nao_pair, nkl_pair, iobuflen*nao_pair*8/1e6,
               iobuflen*nkl_pair*8/1e6)
 
-    klaoblks = len(fswap['0'])
     ijmoblks = int(numpy.ceil(float(nij_pair)/iobuflen)) * comp
     ao_loc = mol.ao_loc_nr('cart' in intor)
     ti0 = time_1pass
@@ -332,7 +390,18 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
                        istep, ijmoblks, ti1[0]-ti0[0], ti1[1]-ti0[1])
             ti0 = ti1
     write_handler.join()
-    fswap.close()
+    if fswap is None:
+        half = None
+    else:
+        fswap.close()
+    if threshold > 0:
+        h5d_eri.attrs['threshold'] = threshold
+        h5d_eri.attrs['max_error'] = dropped[1]
+        log.info('%d MO integrals smaller than %g are dropped, max error %.3g',
+                 dropped[0], threshold, dropped[1])
+    if compression:
+        log.debug('MO integrals compressed by %s, %.8g MB on disk',
+                  compression, h5d_eri.id.get_storage_size()/1e6)
     if isinstance(erifile, str):
         feri.close()
 
@@ -424,7 +493,8 @@ def half_e1(mol, mo_coeffs, swapfile,
     if ao2mopt is None:
         if intor == 'cint2e_sph':
             ao2mopt = _ao2mo.AO2MOpt(mol, intor, 'CVHFnr_schwarz_cond',
-                                     'CVHFsetnr_direct_scf')
+                                     'CVHFsetnr_direct_scf',
+                                     mol.shell_pair_list())
         else:
             ao2mopt = _ao2mo.AO2MOpt(mol, intor)
 
@@ -484,6 +554,71 @@ def half_e1(mol, mo_coeffs, swapfile,
         fswap.close()
     return swapfile
 
+def half_e1_incore(mol, mo_coeffs, intor='cint2e_sph', aosym='s4', comp=1,
+                   max_memory=2000, verbose=logger.WARN, compact=True,
+                   ao2mopt=None):
+    r'''Half transform the AO integrals (ij|kl) to (ij|kl) with i,j in MO
+    representation.  The AO integrals are generated by batches of shells and
+    transformed on the fly.  The half-transformed integrals are held in memory.
+
+    Args, Kwargs: see :func:`half_e1`.  The max_memory is the memory for the
+        AO integrals buffer.
+
+    Returns:
+        3D array (comp,nij_pair,nkl_pair).  The AO pairs kl are ordered by
+        shell pairs, see :func:`_ao2mo.nr_e2` with ao_loc.
+    '''
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(mol.stdout, verbose)
+
+    nao = mo_coeffs[0].shape[0]
+    aosym = _stand_sym_code(aosym)
+    if aosym in ('s4', 's2ij'):
+        nao_pair = nao * (nao+1) // 2
+    else:
+        nao_pair = nao * nao
+    if aosym in ('s4', 's2kl'):
+        nkl_pair = nao * (nao+1) // 2
+    else:
+        nkl_pair = nao * nao
+
+    ijmosym, nij_pair, moij, ijshape = \
+            incore._conc_mos(mo_coeffs[0], mo_coeffs[1],
+                             compact and aosym in ('s4', 's2ij'))
+
+    aobuflen = int(max_memory*1e6/8 / (comp*(nao_pair+nij_pair)))
+    aobuflen = max(aobuflen, IOBUF_ROW_MIN)
+    shranges = guess_shell_ranges(mol, (aosym in ('s4', 's2kl')), aobuflen)
+    if ao2mopt is None:
+        if intor == 'cint2e_sph':
+            ao2mopt = _ao2mo.AO2MOpt(mol, intor, 'CVHFnr_schwarz_cond',
+                                     'CVHFsetnr_direct_scf',
+                                     mol.shell_pair_list())
+        else:
+            ao2mopt = _ao2mo.AO2MOpt(mol, intor)
+
+    half = numpy.empty((comp,nij_pair,nkl_pair))
+    aobuflen = max([x[2] for x in shranges])
+    bufs1 = numpy.empty((comp*aobuflen,nao_pair))
+    bufs2 = numpy.empty((comp*aobuflen,nij_pair))
+    nstep = len(shranges)
+    ti0 = (time.clock(), time.time())
+    p0 = 0
+    for istep, sh_range in enumerate(shranges):
+        log.debug1('step 1 [%d/%d], AO [%d:%d], len(buf) = %d', \
+                   istep+1, nstep, *sh_range)
+        nrow = sh_range[2]
+        buf = numpy.ndarray((comp*nrow,nao_pair), buffer=bufs1)
+        _ao2mo.nr_e1fill(intor, sh_range, mol._atm, mol._bas, mol._env,
+                         aosym, comp, ao2mopt, out=buf)
+        buf = _ao2mo.nr_e1(buf, moij, ijshape, aosym, ijmosym, out=bufs2)
+        half[:,:,p0:p0+nrow] = buf.reshape(comp,nrow,nij_pair).transpose(0,2,1)
+        p0 += nrow
+        ti0 = log.timer_debug1('gen AO/transform MO [%d/%d]'%(istep+1,nstep), *ti0)
+    return half
+
 def _load_from_h5g(h5group, row0, row1, out):
     nrow = row1 - row0
     col0 = 0
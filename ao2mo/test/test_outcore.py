@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 
+import io
+import sys
 import ctypes
 import unittest
 from functools import reduce
@@ -68,6 +70,50 @@ class KnowValues(unittest.TestCase):
         feri.close()
         self.assertTrue(numpy.allclose(eri1, eriref))
 
+    def test_compression(self):
+        ftmp = tempfile.NamedTemporaryFile(dir=lib.param.TMPDIR)
+        erifile = ftmp.name
+        eri_ao = scf._vhf.int2e_sph(mol._atm, mol._bas, mol._env)
+        eriref = ao2mo.incore.full(eri_ao, mo)
+        ao2mo.outcore.full(mol, mo, erifile, max_memory=10, ioblk_size=5,
+                           compression='lzf')
+        with ao2mo.load(erifile) as eri1:
+            self.assertEqual(eri1.compression, 'lzf')
+            self.assertTrue(numpy.allclose(eri1[:], eriref))
+
+        ao2mo.outcore.full(mol, mo, erifile, max_memory=10, ioblk_size=5,
+                           compression='gzip', threshold=1e-3)
+        with ao2mo.load(erifile) as eri1:
+            err = eri1.attrs['max_error']
+            self.assertTrue(err < 1e-3)
+            self.assertTrue(abs(eri1[:] - eriref).max() <= err)
+
+    def test_direct(self):
+        ftmp = tempfile.NamedTemporaryFile(dir=lib.param.TMPDIR)
+        erifile = ftmp.name
+        nocc = 5
+        mos = (mo[:,:nocc], mo[:,nocc:], mo[:,:nocc], mo[:,nocc:])
+        def transform(dataname, max_memory):
+            if sys.version_info >= (3,):
+                buf = io.StringIO()
+            else:
+                buf = io.BytesIO()
+            ao2mo.outcore.general(mol, mos, erifile, dataname=dataname,
+                                  max_memory=max_memory, ioblk_size=5,
+                                  verbose=lib.logger.Logger(buf, lib.logger.DEBUG))
+            return buf.getvalue()
+        # max_memory is below the memory in use.  The swap file is used.
+        self.assertTrue('integral-direct' not in transform('ref', 10))
+        # The half-transformed integrals fit in memory
+        mem_now = lib.current_memory()[0]
+        self.assertTrue('integral-direct' in transform('direct', mem_now+100))
+        with h5py.File(erifile, 'r') as feri:
+            self.assertEqual(feri['direct'].shape, (nocc*(nao-nocc),)*2)
+            self.assertTrue(numpy.allclose(feri['direct'][:], feri['ref'][:]))
+
+        half = ao2mo.outcore.half_e1_incore(mol, (mo,mo), aosym='s1', max_memory=1)
+        self.assertEqual(half.shape, (1,nao**2,nao**2))
+
     def test_nroutcore_eri(self):
         ftmp = tempfile.NamedTemporaryFile(dir=lib.param.TMPDIR)
         erifile = ftmp.name
@@ -120,6 +166,43 @@ class KnowValues(unittest.TestCase):
         eri1 = eri1.reshape(nao,nao,nao,nao)
         self.assertTrue(numpy.allclose(eri1, eriref))
 
+    def test_schwarz_cond(self):
+        mol1 = gto.M(atom=[['H', (0, 0, i*4.)] for i in range(10)],
+                     basis='6-31g', verbose=0)
+        nbas = mol1.nbas
+        spl = mol1.shell_pair_list()
+        self.assertTrue(spl.npairs < nbas*(nbas+1)//2)
+        fscreen = ao2mo._ao2mo.libao2mo.CVHFnr_schwarz_cond
+        c_atm = mol1._atm.ctypes.data_as(ctypes.c_void_p)
+        c_bas = mol1._bas.ctypes.data_as(ctypes.c_void_p)
+        c_env = mol1._env.ctypes.data_as(ctypes.c_void_p)
+        def count_quartets(ao2mopt):
+            shls = numpy.zeros(4, dtype=numpy.int32)
+            mask = numpy.zeros((nbas,)*4, dtype=bool)
+            for ijkl in numpy.ndindex(mask.shape):
+                shls[:] = ijkl
+                mask[ijkl] = fscreen(shls.ctypes.data_as(ctypes.c_void_p),
+                                     ao2mopt._this, c_atm, c_bas, c_env)
+            return mask
+        ao2mopt = ao2mo._ao2mo.AO2MOpt(mol1, 'cint2e_sph', 'CVHFnr_schwarz_cond',
+                                       'CVHFsetnr_direct_scf')
+        mask0 = count_quartets(ao2mopt)
+        self.assertTrue(0 < mask0.sum() < nbas**4)
+        ao2mopt = ao2mo._ao2mo.AO2MOpt(mol1, 'cint2e_sph', 'CVHFnr_schwarz_cond',
+                                       'CVHFsetnr_direct_scf', spl)
+        mask1 = count_quartets(ao2mopt)
+        pair_mask = spl.mask()
+        self.assertTrue(0 < mask1.sum() <= pair_mask.sum()**2)
+        self.assertFalse(numpy.any(mask1 & ~pair_mask[:,:,None,None]))
+        self.assertFalse(numpy.any(mask1 & ~pair_mask[None,None,:,:]))
+
+        nmo = mol1.nao_nr()
+        mo1 = numpy.random.random((nmo,nmo))
+        eriref = ao2mo.incore.full(scf._vhf.int2e_sph(mol1._atm, mol1._bas,
+                                                      mol1._env), mo1)
+        eri1 = ao2mo.outcore.full_iofree(mol1, mo1, max_memory=10)
+        self.assertTrue(numpy.allclose(eri1, eriref))
+
     def test_group_segs(self):
         numpy.random.seed(1)
         segs = numpy.asarray(numpy.random.random(40)*50, dtype=int)
@@ -60,3 +60,7 @@ def RCCSD(mf, frozen=[], mo_coeff=None, mo_occ=None):
 def UCCSD(mf, frozen=[[],[]], mo_coeff=None, mo_occ=None):
     from pyscf.cc import uccsd
     return uccsd.UCCSD(mf, frozen, mo_coeff, mo_occ)
+
+def LPNOCCSD(mf, frozen=[], mo_coeff=None, mo_occ=None):
+    from pyscf.cc import lpno_ccsd
+    return lpno_ccsd.LPNOCCSD(mf, frozen, mo_coeff, mo_occ)
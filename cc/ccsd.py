@@ -12,6 +12,7 @@ import h5py
 from pyscf import gto
 from pyscf import lib
 from pyscf.lib import logger
+from pyscf.lib import memplan
 from pyscf import ao2mo
 from pyscf.ao2mo import _ao2mo
 from pyscf.cc import _ccsd
@@ -108,11 +109,8 @@ def update_amps(mycc, t1, t2, eris):
     eris_ooov = None
     time1 = log.timer_debug1('woooo', *time1)
 
-    unit = _memory_usage_inloop(nocc, nvir)
     max_memory = max(2000, mycc.max_memory - lib.current_memory()[0])
-    blksize = min(nocc, max(BLKMIN, int(max_memory/unit)))
-    blknvir = int((max_memory*.9e6/8-blksize*nocc*nvir**2*6)/(blksize*nvir**2*2))
-    blknvir = min(nvir, max(BLKMIN, blknvir))
+    blksize, blknvir = _blksize_inloop(nocc, nvir, max_memory)
     log.debug1('max_memory %d MB,  nocc,nvir = %d,%d  blksize = %d,%d',
                max_memory, nocc, nvir, blksize, blknvir)
     nvir_pair = nvir * (nvir+1) // 2
@@ -390,6 +388,123 @@ def energy(mycc, t1, t2, eris):
     return e
 
 
+def _ao_schwarz_cond(mol, sh_ranges):
+    '''Schwarz bound sqrt(max|(ij|ij)|) for every pair of shell blocks'''
+    qshl = mol.shell_pair_list().q_cond
+    sh_offs = [x[0] for x in sh_ranges]
+    qshl = numpy.maximum.reduceat(qshl, sh_offs, axis=0)
+    return numpy.maximum.reduceat(qshl, sh_offs, axis=1)
+
+def _ao_tau_cond(tau, ao_loc, sh_ranges):
+    '''max|tau[x,i,k]| for every pair of shell blocks'''
+    ao_offs = [ao_loc[x[0]] for x in sh_ranges]
+    tau_cond = abs(tau).max(axis=0)
+    tau_cond = numpy.maximum.reduceat(tau_cond, ao_offs, axis=0)
+    return numpy.maximum.reduceat(tau_cond, ao_offs, axis=1)
+
+def _vvvv_ao_tasks(q_cond, tau_cond, tol):
+    '''Shell block quartets (I,J|K,L), I>=J, K>=L, which survive the
+    screening  Q(IJ) * Q(KL) * max(|tau(IK)|,|tau(IL)|,|tau(JK)|,|tau(JL)|) > tol
+    '''
+    nblk = q_cond.shape[0]
+    kidx, lidx = numpy.tril_indices(nblk)
+    q_kl = q_cond[kidx,lidx]
+    tasks = []
+    for i in range(nblk):
+        for j in range(i+1):
+            t_max = numpy.max((tau_cond[i,kidx], tau_cond[i,lidx],
+                               tau_cond[j,kidx], tau_cond[j,lidx]), axis=0)
+            mask = q_cond[i,j] * q_kl * t_max > tol
+            tasks.extend([(i,j,k,l) for k, l in zip(kidx[mask], lidx[mask])])
+    return tasks
+
+def _contract_vvvv_ao(mol, tau, tasks, sh_ranges, out=None):
+    '''out[x,j,l] += sum_{ik} tau[x,i,k] (ij|kl) for the given shell block
+    quartets (I,J|K,L).  The 4-fold permutation symmetry of the integrals is
+    used, i.e. only the quartets with I>=J and K>=L need to be given.
+
+    The integrals of the next quartet are evaluated in a background thread
+    while the current quartet is contracted.
+    '''
+    nao = tau.shape[-1]
+    if out is None:
+        out = numpy.zeros_like(tau)
+    if not tasks:
+        return out
+    ao_loc = mol.ao_loc_nr()
+    cintopt = gto.moleintor.make_cintopt(mol._atm, mol._bas, mol._env, 'cint2e_sph')
+    dmax = max(x[2] for x in sh_ranges)
+    eribufs = (numpy.empty(dmax**4), numpy.empty(dmax**4))
+    def get_eri(task, buf):
+        shls_slice = sum([tuple(sh_ranges[p][:2]) for p in task], ())
+        return gto.moleintor.getints2e('cint2e_sph', mol._atm, mol._bas, mol._env,
+                                       shls_slice, aosym='s1', ao_loc=ao_loc,
+                                       cintopt=cintopt, out=buf)
+
+    handler = lib.background_thread(get_eri, tasks[0], eribufs[0])
+    for n, (ip, jp, kp, lp) in enumerate(tasks):
+        eri = handler.join()
+        if n+1 < len(tasks):
+            handler = lib.background_thread(get_eri, tasks[n+1], eribufs[(n+1)%2])
+        i0, i1 = ao_loc[sh_ranges[ip][0]], ao_loc[sh_ranges[ip][1]]
+        j0, j1 = ao_loc[sh_ranges[jp][0]], ao_loc[sh_ranges[jp][1]]
+        k0, k1 = ao_loc[sh_ranges[kp][0]], ao_loc[sh_ranges[kp][1]]
+        l0, l1 = ao_loc[sh_ranges[lp][0]], ao_loc[sh_ranges[lp][1]]
+        eri = eri.reshape(i1-i0,j1-j0,k1-k0,l1-l0)
+        out[:,j0:j1,l0:l1] += lib.einsum('xik,ijkl->xjl', tau[:,i0:i1,k0:k1], eri)
+        if kp != lp:
+            out[:,j0:j1,k0:k1] += lib.einsum('xil,ijkl->xjk', tau[:,i0:i1,l0:l1], eri)
+        if ip != jp:
+            out[:,i0:i1,l0:l1] += lib.einsum('xjk,ijkl->xil', tau[:,j0:j1,k0:k1], eri)
+            if kp != lp:
+                out[:,i0:i1,k0:k1] += lib.einsum('xjl,ijkl->xik', tau[:,j0:j1,l0:l1], eri)
+    return out
+
+def _distribute_vvvv_tasks(tasks, sh_ranges, nproc):
+    '''Greedy (largest first) assignment of shell block quartets to processes'''
+    cost = [sh_ranges[i][2]*sh_ranges[j][2]*sh_ranges[k][2]*sh_ranges[l][2]
+            for i, j, k, l in tasks]
+    load = numpy.zeros(nproc)
+    groups = [[] for p in range(nproc)]
+    for n in numpy.argsort(cost)[::-1]:
+        p = numpy.argmin(load)
+        groups[p].append(tasks[n])
+        load[p] += cost[n]
+    return groups
+
+def _contract_vvvv_ao_task(args):
+    '''Worker of :func:`_contract_vvvv_ao_nproc`.  AO-tau is read from and the
+    partial result is accumulated in memory-mapped .npy files.'''
+    mol, taufile, outfile, tasks, sh_ranges = args
+    tau = numpy.load(taufile, mmap_mode='r')
+    out = numpy.load(outfile, mmap_mode='r+')
+    _contract_vvvv_ao(mol, tau, tasks, sh_ranges, out)
+    out.flush()
+
+def _contract_vvvv_ao_nproc(mol, tau, tasks, sh_ranges, nproc, out):
+    ''':func:`_contract_vvvv_ao` with the shell block quartets distributed
+    over a pool of nproc (spawned) processes.  AO-tau and the partial results
+    of the processes are exchanged through scratch files, not pickled.
+    '''
+    groups = _distribute_vvvv_tasks(tasks, sh_ranges, nproc)
+    ftau = tempfile.NamedTemporaryFile(dir=lib.param.TMPDIR, suffix='.npy')
+    numpy.save(ftau, tau)
+    ftau.flush()
+    fouts = []
+    for group in groups:
+        fouts.append(tempfile.NamedTemporaryFile(dir=lib.param.TMPDIR, suffix='.npy'))
+        numpy.lib.format.open_memmap(fouts[-1].name, mode='w+', dtype=out.dtype,
+                                     shape=out.shape).flush()
+    lib.map_with_processes(_contract_vvvv_ao_task,
+                           [(mol, ftau.name, f.name, group, sh_ranges)
+                            for f, group in zip(fouts, groups)], nproc)
+    for f in fouts:
+        out += numpy.load(f.name, mmap_mode='r')
+        f.close()
+    ftau.close()
+    return out
+
+
 class CCSD(lib.StreamObject):
     '''restricted CCSD
 
@@ -410,6 +525,14 @@ class CCSD(lib.StreamObject):
             The step to start DIIS.  Default is 0.
         direct : bool
             AO-direct CCSD. Default is False.
+        direct_screen_tol : float
+            In AO-direct CCSD, the shell block quartets of the vvvv
+            contraction are skipped if the product of the Schwarz bound and
+            the AO-tau bound is smaller than this value.  Default is 1e-13.
+        direct_nproc : int
+            Number of processes to compute the AO-direct vvvv contraction.
+            The processes are spawned (see :func:`lib.map_with_processes`)
+            and share OMP_NUM_THREADS.  Default is 1.
         frozen : int or list
             If integer is given, the inner-most orbitals are frozen from CC
             amplitudes.  Given the orbital indices (0-based) in a list, both
@@ -460,6 +583,8 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
 # FIXME: Should we avoid DIIS starting early?
         self.diis_start_energy_diff = 1e9
         self.direct = False
+        self.direct_screen_tol = 1e-13
+        self.direct_nproc = 1
 
         self.frozen = frozen
 
@@ -527,6 +652,9 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
             log.info('frozen orbitals %s', str(self.frozen))
         log.info('max_cycle = %d', self.max_cycle)
         log.info('direct = %d', self.direct)
+        if self.direct:
+            log.info('direct_screen_tol = %g', self.direct_screen_tol)
+            log.info('direct_nproc = %d', self.direct_nproc)
         log.info('conv_tol = %g', self.conv_tol)
         log.info('conv_tol_normt = %s', self.conv_tol_normt)
         log.info('diis_space = %d', self.diis_space)
@@ -645,20 +773,6 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
 
         #: tau = t2 + numpy.einsum('ia,jb->ijab', t1, t1)
         #: t2new += numpy.einsum('ijcd,acdb->ijab', tau, vvvv)
-        def contract_rec_(t2new_tril, tau, eri, i0, i1, j0, j1):
-            nao = tau.shape[-1]
-            ic = i1 - i0
-            jc = j1 - j0
-            #: t2tril[:,j0:j1] += numpy.einsum('xcd,cdab->xab', tau[:,i0:i1], eri)
-            _dgemm('N', 'N', nocc*(nocc+1)//2, jc*nao, ic*nao,
-                   tau.reshape(-1,nao*nao), eri.reshape(-1,jc*nao),
-                   t2new_tril.reshape(-1,nao*nao), 1, 1, i0*nao, 0, j0*nao)
-
-            #: t2tril[:,i0:i1] += numpy.einsum('xcd,abcd->xab', tau[:,j0:j1], eri)
-            _dgemm('N', 'T', nocc*(nocc+1)//2, ic*nao, jc*nao,
-                   tau.reshape(-1,nao*nao), eri.reshape(-1,jc*nao),
-                   t2new_tril.reshape(-1,nao*nao), 1, 1, j0*nao, 0, i0*nao)
-
         def contract_tril_(t2new_tril, tau, eri, a0, a):
             nvir = tau.shape[-1]
             #: t2new[i,:i+1, a] += numpy.einsum('xcd,cdb->xb', tau[:,a0:a+1], eri)
@@ -688,44 +802,25 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
             tau = tau.reshape(-1,nao,nao)
             time0 = logger.timer_debug1(self, 'vvvv-tau', *time0)
 
-            ao2mopt = _ao2mo.AO2MOpt(mol, 'cint2e_sph', 'CVHFnr_schwarz_cond',
-                                     'CVHFsetnr_direct_scf')
             outbuf[:] = 0
             ao_loc = mol.ao_loc_nr()
             max_memory = max(0, self.max_memory - lib.current_memory()[0])
-            dmax = max(4, int(numpy.sqrt(max_memory*.95e6/8/nao**2/2)))
+            dmax = max(4, int((max_memory*.25e6/8)**.25))
             sh_ranges = ao2mo.outcore.balance_partition(ao_loc, dmax)
-            dmax = max(x[2] for x in sh_ranges)
-            eribuf = numpy.empty((dmax,dmax,nao,nao))
-            loadbuf = numpy.empty((dmax,dmax,nao,nao))
-            fint = gto.moleintor.getints2e
-
-            for ip, (ish0, ish1, ni) in enumerate(sh_ranges):
-                for jsh0, jsh1, nj in sh_ranges[:ip]:
-                    eri = fint('cint2e_sph', mol._atm, mol._bas, mol._env,
-                               shls_slice=(ish0,ish1,jsh0,jsh1), aosym='s2kl',
-                               ao_loc=ao_loc, cintopt=ao2mopt._cintopt, out=eribuf)
-                    i0, i1 = ao_loc[ish0], ao_loc[ish1]
-                    j0, j1 = ao_loc[jsh0], ao_loc[jsh1]
-                    tmp = numpy.ndarray((i1-i0,nao,j1-j0,nao), buffer=loadbuf)
-                    _ccsd.libcc.CCload_eri(tmp.ctypes.data_as(ctypes.c_void_p),
-                                           eri.ctypes.data_as(ctypes.c_void_p),
-                                           (ctypes.c_int*4)(i0, i1, j0, j1),
-                                           ctypes.c_int(nao))
-                    contract_rec_(outbuf, tau, tmp, i0, i1, j0, j1)
-                    time0 = logger.timer_debug1(self, 'AO-vvvv [%d:%d,%d:%d]' %
-                                                (ish0,ish1,jsh0,jsh1), *time0)
-                eri = fint('cint2e_sph', mol._atm, mol._bas, mol._env,
-                           shls_slice=(ish0,ish1,ish0,ish1), aosym='s4',
-                           ao_loc=ao_loc, cintopt=ao2mopt._cintopt, out=eribuf)
-                i0, i1 = ao_loc[ish0], ao_loc[ish1]
-                for i in range(i1-i0):
-                    p0, p1 = i*(i+1)//2, (i+1)*(i+2)//2
-                    tmp = lib.unpack_tril(eri[p0:p1], out=loadbuf)
-                    contract_tril_(outbuf, tau, tmp, i0, i0+i)
-                time0 = logger.timer_debug1(self, 'AO-vvvv [%d:%d,%d:%d]' %
-                                            (ish0,ish1,ish0,ish1), *time0)
-            eribuf = loadbuf = eri = tmp = None
+            q_cond = _ao_schwarz_cond(mol, sh_ranges)
+            tau_cond = _ao_tau_cond(tau, ao_loc, sh_ranges)
+            tasks = _vvvv_ao_tasks(q_cond, tau_cond, self.direct_screen_tol)
+            nblk = len(sh_ranges)
+            logger.debug1(self, 'AO-vvvv %d of %d shell block quartets survive screening',
+                          len(tasks), (nblk*(nblk+1)//2)**2)
+            time0 = logger.timer_debug1(self, 'AO-vvvv screening', *time0)
+
+            nproc = max(1, min(self.direct_nproc, len(tasks)))
+            if nproc > 1:
+                _contract_vvvv_ao_nproc(mol, tau, tasks, sh_ranges, nproc, outbuf)
+            else:
+                _contract_vvvv_ao(mol, tau, tasks, sh_ranges, outbuf)
+            time0 = logger.timer_debug1(self, 'AO-vvvv', *time0)
 
             mo = numpy.asarray(self.mo_coeff, order='F')
             tmp = _ao2mo.nr_e2(outbuf, mo, (nocc,nmo,nocc,nmo), 's1', 's1', out=tau)
@@ -837,9 +932,8 @@ class _ERIS:
             mo = numpy.asarray(mo_coeff, order='F')
             nmo = mo.shape[1]
             ijslice = (0, nmo, 0, nmo)
-            Lpq = None
-            for eri1 in cc._scf.with_df.loop():
-                Lpq = _ao2mo.nr_e2(eri1, mo, ijslice, aosym='s2', out=Lpq).reshape(-1,nmo,nmo)
+            for Lpq in cc._scf.with_df.loop_mo(mo, ijslice):
+                Lpq = Lpq.reshape(-1,nmo,nmo)
                 Loo = Lpq[:,:nocc,:nocc].reshape(-1,nocc**2)
                 Lov = Lpq[:,:nocc,nocc:].reshape(-1,nocc*nvir)
                 Lvv = Lpq[:,nocc:,nocc:].reshape(-1,nvir**2)
@@ -868,8 +962,9 @@ class _ERIS:
             self.ovvv = self.feri1['ovvv']
             self.vvvv = self.feri1['vvvv']
 
-        elif (method == 'incore' and cc._scf._eri is not None and
-            (mem_incore+mem_now < cc.max_memory) or cc.mol.incore_anyway):
+        elif memplan.choose_path(mem_incore, mem_now, cc.max_memory,
+                                 method == 'incore' and cc._scf._eri is not None,
+                                 cc.mol.incore_anyway) == 'incore':
             eri1 = ao2mo.incore.full(cc._scf._eri, mo_coeff)
             #:eri1 = ao2mo.restore(1, eri1, nmo)
             #:self.oooo = eri1[:nocc,:nocc,:nocc,:nocc].copy()
@@ -981,6 +1076,13 @@ class _ERIS:
 def _memory_usage_inloop(nocc, nvir):
     v = max(nvir**3*.3+nocc*nvir**2*6, nocc*nvir**2*7)
     return v*8/1e6
+def _blksize_inloop(nocc, nvir, max_memory):
+    '''Block sizes of occupied and virtual indices in update_amps'''
+    unit = _memory_usage_inloop(nocc, nvir)
+    blksize = min(nocc, max(BLKMIN, int(max_memory/unit)))
+    blknvir = int((max_memory*.9e6/8-blksize*nocc*nvir**2*6)/(blksize*nvir**2*2))
+    blknvir = min(nvir, max(BLKMIN, blknvir))
+    return blksize, blknvir
 # assume nvir > nocc, minimal requirements on memory
 def _mem_usage(nocc, nvir):
     basic = _memory_usage_inloop(nocc, nvir)*1e6/8 + nocc**4
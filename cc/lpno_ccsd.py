@@ -0,0 +1,635 @@
+#!/usr/bin/env python
+#
+# Local pair natural orbital (LPNO) CCSD
+#
+# Ref:
+# F. Neese, F. Wennmohs, A. Hansen, J. Chem. Phys. 130, 114108 (2009)
+# F. Neese, A. Hansen, D. G. Liakos, J. Chem. Phys. 131, 064103 (2009)
+#
+
+'''
+LPNO-CCSD
+
+The occupied orbitals are localized (Boys or Pipek-Mezey) and the virtual
+orbitals are kept canonical.  For each localized pair ij, the semi-canonical
+pair-MP2 amplitudes
+
+    T^{ij}_{ab} = (ia|jb) / (f_ii + f_jj - e_a - e_b)
+
+are used to estimate the pair correlation energy.  Pairs with
+|e_ij| < pair_thresh are treated at MP2 level only.  For the remaining
+(strong) pairs, the pair density
+
+    D^{ij} = (Tt^{ij}+ T^{ij} + Tt^{ij} T^{ij}+) / (1+delta_ij),
+    Tt^{ij} = 4 T^{ij} - 2 T^{ij}+
+
+is diagonalized and the natural orbitals with occupation larger than
+pno_thresh form the pair domain.  The CCSD doubles amplitudes of each
+strong pair are solved in its semi-canonicalized PNO domain.  The MP2
+energy of the weak pairs and the MP2 estimate of the PNO truncation error
+are added to the correlation energy.
+
+The singles and the O(N^5) intermediates are built in the canonical
+virtual space.  The O(N^6) terms of the doubles residual, the ring terms
+and the particle-particle ladder, are evaluated for each strong pair in its
+PNO domain.  The (vv|vv) integrals are not transformed.  The ladder is
+built from the Cholesky vectors of the AO integrals.
+
+The lambda equations and the CCSD density matrices are not available.
+'''
+
+import time
+from functools import reduce
+import numpy
+from pyscf import gto
+from pyscf import lib
+from pyscf.lib import logger
+from pyscf.ao2mo import _ao2mo
+from pyscf.cc import ccsd
+
+# Threshold of the pivoted Cholesky decomposition of the AO integrals
+CHOLESKY_TOL = 1e-12
+# Pivots of one shell pair with diagonals above CHOLESKY_SPAN*max(diag) are
+# taken from the same integral column block
+CHOLESKY_SPAN = 1e-2
+
+
+def localize_occ(mycc, mo_coeff=None, method=None, verbose=None):
+    '''Localize the correlated occupied orbitals.  Frozen orbitals and
+    virtual orbitals are not changed.
+
+    Returns:
+        mo_coeff with the active occupied orbitals replaced by the localized
+        orbitals.
+    '''
+    from pyscf import lo
+    if mo_coeff is None: mo_coeff = mycc.mo_coeff
+    if method is None: method = mycc.localization
+    if verbose is None: verbose = mycc.verbose
+    mol = mycc.mol
+
+    occidx = numpy.where(_active_mask(mycc) & (mycc.mo_occ > 0))[0]
+    mo_coeff = numpy.array(mo_coeff, copy=True)
+    orbo = mo_coeff[:,occidx]
+    if method.lower() in ('boys', 'bf', 'fb'):
+        loc = lo.Boys(mol, orbo)
+    elif method.lower() in ('pipek', 'pipekmezey', 'pm'):
+        loc = lo.PipekMezey(mol, orbo)
+    else:
+        raise ValueError('Unknown localization method %s' % method)
+    loc.verbose = verbose
+    mo_coeff[:,occidx] = loc.kernel()
+    return mo_coeff
+
+def _active_mask(mycc):
+    moidx = numpy.ones(mycc.mo_occ.size, dtype=numpy.bool)
+    if isinstance(mycc.frozen, (int, numpy.integer)):
+        moidx[:mycc.frozen] = False
+    elif len(mycc.frozen) > 0:
+        moidx[numpy.asarray(mycc.frozen)] = False
+    return moidx
+
+
+def make_pnos(mycc, eris, pair_thresh=None, pno_thresh=None, verbose=None):
+    '''Semi-canonical pair MP2, weak pair screening and PNO construction.
+
+    Returns:
+        pnos : dict
+            For each strong pair (i,j) with i >= j, a tuple (Q, ev) of the
+            semi-canonicalized PNO coefficients (in the virtual MO basis) and
+            their orbital energies.
+        e_pair : 2D array
+            Semi-canonical MP2 pair energies.  e_pair.sum() is the total
+            MP2 correlation energy in the local occupied basis.
+        de_weak : float
+            MP2 energy of the weak pairs.
+        de_pno : float
+            MP2 estimate of the PNO truncation error of the strong pairs.
+    '''
+    if pair_thresh is None: pair_thresh = mycc.pair_thresh
+    if pno_thresh is None: pno_thresh = mycc.pno_thresh
+    if verbose is None: verbose = mycc.verbose
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(mycc.stdout, verbose)
+    cput0 = (time.clock(), time.time())
+
+    nocc = mycc.nocc
+    fock = eris.fock
+    nvir = fock.shape[0] - nocc
+    foo = fock.diagonal()[:nocc]
+    fvv = fock[nocc:,nocc:]
+    mo_ev = fvv.diagonal()
+    evv = lib.direct_sum('a+b->ab', mo_ev, mo_ev)
+
+    e_pair = numpy.zeros((nocc,nocc))
+    pnos = {}
+    de_weak = 0
+    de_pno = 0
+    npno_tot = 0
+    for i in range(nocc):
+        gi = numpy.asarray(eris.ovov[i])
+        for j in range(i+1):
+            kij = gi[:,j]
+            tij = kij / (foo[i] + foo[j] - evv)
+            eij = numpy.einsum('ab,ab', tij*2-tij.T, kij)
+            if i != j:
+                eij *= 2
+            e_pair[i,j] = e_pair[j,i] = eij * (.5 if i != j else 1)
+            if abs(eij) < pair_thresh:
+                de_weak += eij
+                continue
+
+            ttij = tij*4 - tij.T*2
+            dm = lib.dot(ttij.T, tij) + lib.dot(ttij, tij.T)
+            if i == j:
+                dm *= .5
+            occ, natorb = numpy.linalg.eigh(dm)
+            natorb = natorb[:,occ > pno_thresh]
+            npno = natorb.shape[1]
+            npno_tot += npno
+            if npno == 0:
+                de_weak += eij
+                continue
+
+            ev, u = numpy.linalg.eigh(reduce(numpy.dot, (natorb.T, fvv, natorb)))
+            q = numpy.dot(natorb, u)
+            kpno = reduce(numpy.dot, (q.T, kij, q))
+            tpno = kpno / (foo[i] + foo[j] - lib.direct_sum('a+b->ab', ev, ev))
+            epno = numpy.einsum('ab,ab', tpno*2-tpno.T, kpno)
+            if i != j:
+                epno *= 2
+            de_pno += eij - epno
+            pnos[(i,j)] = (q, ev)
+
+    npair = nocc*(nocc+1)//2
+    log.info('LPNO pairs: %d strong, %d weak out of %d', len(pnos),
+             npair-len(pnos), npair)
+    if pnos:
+        log.info('Average number of PNOs per strong pair %.1f (nvir = %d)',
+                 float(npno_tot)/len(pnos), nvir)
+    log.info('Semi-canonical MP2 energy = %.15g', e_pair.sum())
+    log.info('MP2 correction of weak pairs = %.15g  PNO truncation = %.15g',
+             de_weak, de_pno)
+    log.timer('LPNO pair domains', *cput0)
+    return pnos, e_pair, de_weak, de_pno
+
+
+def project_amps(mycc, t2, pnos):
+    '''Project the doubles amplitudes onto the pair domains.  The amplitudes
+    of weak pairs are zeroed.'''
+    t2new = numpy.zeros_like(t2)
+    for (i,j), (q, ev) in pnos.items():
+        tij = reduce(numpy.dot, (q, q.T, t2[i,j], q, q.T))
+        t2new[i,j] = tij
+        t2new[j,i] = tij.T
+    return t2new
+
+def _shell_pair_rows(ao_loc, ish, jsh):
+    '''Lower-triangular AO-pair indices of the shell pair (ish,jsh), ish >= jsh,
+    and the mask of the rows p >= q in the (di*dj) block'''
+    p = numpy.arange(ao_loc[ish], ao_loc[ish+1])[:,None]
+    q = numpy.arange(ao_loc[jsh], ao_loc[jsh+1])
+    mask = (p >= q).ravel()
+    return (p*(p+1)//2 + q).ravel()[mask], mask
+
+def cholesky_vvvv(mycc, eris, tol=CHOLESKY_TOL):
+    r'''Pivoted Cholesky decomposition of the AO integrals, transformed to the
+    (vv|vv) and (ov|vv) blocks
+
+        (ac|bd) = \sum_P L^P_{ac} L^P_{bd},   (kc|bd) = \sum_P M^P_{kc} L^P_{bd}
+
+    The integral columns of the pivots are evaluated shell pair by shell
+    pair, so neither eris.vvvv nor the full AO integrals are needed.
+
+    Returns:
+        L in the packed (lower triangular) form, (naux,nvir*(nvir+1)/2)
+        and M, (naux,nocc,nvir)
+    '''
+    log = logger.Logger(mycc.stdout, mycc.verbose)
+    cput0 = (time.clock(), time.time())
+    mol = mycc.mol
+    nocc = mycc.nocc
+    mo = numpy.asarray(eris.mo_coeff, order='F')
+    nmo = mo.shape[1]
+    nvir = nmo - nocc
+    nao = mo.shape[0]
+    nao_pair = nao * (nao+1) // 2
+    ao_loc = mol.ao_loc_nr()
+    nbas = mol.nbas
+    cintopt = gto.moleintor.make_cintopt(mol._atm, mol._bas, mol._env, 'cint2e_sph')
+    def get_eri(shls_slice, aosym):
+        return gto.moleintor.getints2e('cint2e_sph', mol._atm, mol._bas, mol._env,
+                                       shls_slice, aosym=aosym, ao_loc=ao_loc,
+                                       cintopt=cintopt)
+
+    diag = numpy.empty(nao_pair)
+    pair_shl = numpy.empty((nao_pair,2), dtype=int)
+    for ish in range(nbas):
+        for jsh in range(ish+1):
+            idx, mask = _shell_pair_rows(ao_loc, ish, jsh)
+            eri = get_eri((ish,ish+1,jsh,jsh+1,ish,ish+1,jsh,jsh+1), 's1')
+            diag[idx] = eri.diagonal()[mask]
+            pair_shl[idx] = (ish, jsh)
+
+    chol = numpy.empty((min(nao_pair, max(64, nao*4)), nao_pair))
+    naux = 0
+    while True:
+        dmax = diag.max()
+        if dmax < tol:
+            break
+        ish, jsh = pair_shl[numpy.argmax(diag)]
+        rows, mask = _shell_pair_rows(ao_loc, ish, jsh)
+        eri = get_eri((ish,ish+1,jsh,jsh+1,0,nbas,0,nbas), 's2kl')
+        eri = eri.reshape(-1,nao_pair)[mask]
+        if naux > 0:
+            eri -= lib.dot(chol[:naux,rows].T, chol[:naux])
+        dmin = max(tol, dmax*CHOLESKY_SPAN)
+        while True:
+            k = numpy.argmax(diag[rows])
+            p = rows[k]
+            if diag[p] < dmin:
+                break
+            if naux == chol.shape[0]:
+                buf = numpy.empty((min(nao_pair, naux*2), nao_pair))
+                buf[:naux] = chol[:naux]
+                chol = buf
+            v = chol[naux]
+            v[:] = eri[k] * (1/numpy.sqrt(diag[p]))
+            diag -= v**2
+            diag[p] = 0
+            eri -= numpy.outer(v[rows], v)
+            naux += 1
+        eri = None
+    chol = chol[:naux]
+
+    nvir_pair = nvir * (nvir+1) // 2
+    vvL = numpy.empty((naux,nvir_pair))
+    ovL = numpy.empty((naux,nocc,nvir))
+    blksize = max(1, int(mycc.max_memory*.2e6/8/nmo**2))
+    for p0, p1 in lib.prange(0, naux, blksize):
+        vvL[p0:p1] = _ao2mo.nr_e2(chol[p0:p1], mo, (nocc,nmo,nocc,nmo), 's2', 's2')
+        ovL[p0:p1] = _ao2mo.nr_e2(chol[p0:p1], mo, (0,nocc,nocc,nmo),
+                                  's2').reshape(-1,nocc,nvir)
+    log.debug('Cholesky vectors of the AO integrals %d (nao_pair = %d)',
+              naux, nao_pair)
+    log.timer('LPNO AO Cholesky', *cput0)
+    return vvL, ovL
+
+
+def _pair_amps(pnos, tpno, i, j):
+    '''PNOs and the PNO amplitudes of pair ij, None for weak pairs'''
+    if (i,j) in pnos:
+        return pnos[(i,j)][0], tpno[(i,j)]
+    elif (j,i) in pnos:
+        return pnos[(j,i)][0], tpno[(j,i)].T
+    else:
+        return None, None
+
+def update_amps(mycc, t1, t2, eris):
+    '''One Jacobi step of the LPNO-CCSD equations.
+
+    The singles and the intermediates of order N^5 (and the o^4v^2 Woooo
+    terms) are built canonically.  The terms which scale as N^6 in the
+    canonical CCSD, the particle-particle ladder and the ring contractions,
+    are evaluated for each strong pair in its PNO domain.  The ladder uses
+    the AO Cholesky vectors in the vv and ov blocks (see
+    :func:`cholesky_vvvv`).  The
+    doubles amplitudes of the strong pairs are updated in the semi-canonical
+    PNO basis, the weak pairs are not correlated.
+    '''
+    # Ref: Hirata et al., J. Chem. Phys. 120, 2581 (2004) Eqs.(35)-(36)
+    time0 = time.clock(), time.time()
+    log = logger.Logger(mycc.stdout, mycc.verbose)
+    nocc, nvir = t1.shape
+    fock = eris.fock
+    fov = fock[:nocc,nocc:]
+    foo = fock[:nocc,:nocc]
+    fvv = fock[nocc:,nocc:]
+    mo_e = fock.diagonal()
+    eia = mo_e[:nocc,None] - mo_e[None,nocc:]
+    pnos = mycc.pnos
+    if getattr(eris, 'vvL', None) is None:
+        eris.vvL, eris.ovL = cholesky_vvvv(mycc, eris)
+
+    tpno = {}
+    for (i,j), (q, ev) in pnos.items():
+        tpno[(i,j)] = reduce(numpy.dot, (q.T, t2[i,j], q))
+    tau = t2 + numpy.einsum('ia,jb->ijab', t1, t1)
+
+    eris_ovov = numpy.asarray(eris.ovov)
+    eris_ooov = numpy.asarray(eris.ooov)
+    eris_oovv = numpy.asarray(eris.oovv)
+    theta = eris_ovov*2 - eris_ovov.transpose(0,3,2,1)
+    Foo = foo + lib.einsum('kcld,ilcd->ki', theta, tau)
+    Fvv = fvv - lib.einsum('kcld,klad->ac', theta, tau)
+    Fov = fov + lib.einsum('kcld,ld->kc', theta, t1)
+    Loo = Foo + lib.einsum('kc,ic->ki', fov, t1)
+    Loo += lib.einsum('kilc,lc->ki', eris_ooov*2-eris_ooov.transpose(2,1,0,3), t1)
+    Lvv = Fvv - lib.einsum('kc,ka->ac', fov, t1)
+    Woooo = numpy.asarray(eris.oooo).transpose(0,2,1,3).copy()
+    Woooo += lib.einsum('kilc,jc->klij', eris_ooov, t1)
+    Woooo += lib.einsum('ljkc,ic->klij', eris_ooov, t1)
+    Woooo += lib.einsum('kcld,ijcd->klij', eris_ovov, tau)
+    # Wvoov and Wvovo, stored as wvoov[i,k,a,c] = W_{akic}, wvovo[i,k,a,c] = W_{akci}
+    wvoov = eris_ovov.transpose(0,2,1,3) - lib.einsum('likc,la->ikac', eris_ooov, t1)
+    wvoov -= lib.einsum('ldkc,id,la->ikac', eris_ovov, t1, t1)
+    wvovo = eris_oovv.transpose(1,0,2,3) - lib.einsum('kilc,la->ikac', eris_ooov, t1)
+    wvovo -= lib.einsum('lckd,id,la->ikac', eris_ovov, t1, t1)
+
+    t1new = numpy.array(fov)
+    t1new += -2*lib.einsum('kc,ka,ic->ia', fov, t1, t1)
+    t1new += 2*lib.einsum('iakc,kc->ia', eris_ovov, t1)
+    t1new -= lib.einsum('kiac,kc->ia', eris_oovv, t1)
+    t1new -= lib.einsum('kilc,klac->ia', eris_ooov*2-eris_ooov.transpose(2,1,0,3), tau)
+
+    # tmp collects the terms of the doubles which are symmetrized as
+    # tmp_{ijab} + tmp_{jiba}
+    tmp = numpy.zeros((nocc,nocc,nvir,nvir))
+    blksize = max(1, int(mycc.max_memory*.3e6/8/nvir**3))
+    for p0, p1 in lib.prange(0, nocc, blksize):
+        ovvv = lib.unpack_tril(numpy.asarray(eris.ovvv[p0:p1]).reshape((p1-p0)*nvir,-1))
+        ovvv = ovvv.reshape(p1-p0,nvir,nvir,nvir)
+        t1new += lib.einsum('kdac,ikcd->ia', ovvv*2-ovvv.transpose(0,3,2,1), tau[:,p0:p1])
+        Lvv += lib.einsum('kdac,kd->ac', ovvv*2-ovvv.transpose(0,3,2,1), t1[p0:p1])
+        wvoov[:,p0:p1] += lib.einsum('kcad,id->ikac', ovvv, t1)
+        wvovo[:,p0:p1] += lib.einsum('kdac,id->ikac', ovvv, t1)
+        tmp[p0:p1] += lib.einsum('iacb,jc->ijab', ovvv, t1)
+        ovvv = None
+
+    Foo -= numpy.diag(numpy.diag(foo))
+    Fvv -= numpy.diag(numpy.diag(fvv))
+    Loo -= numpy.diag(numpy.diag(foo))
+    Lvv -= numpy.diag(numpy.diag(fvv))
+
+    t1new += lib.einsum('ac,ic->ia', Fvv, t1)
+    t1new -= lib.einsum('ki,ka->ia', Foo, t1)
+    t1new += lib.einsum('kc,kica->ia', Fov, t2*2-t2.transpose(0,1,3,2))
+    t1new += lib.einsum('kc,ic,ka->ia', Fov, t1, t1)
+    t1new /= eia
+
+    # The t2 contributions to Wvoov and Wvovo, from the PNO amplitudes
+    for (p,r) in pnos.keys():
+        for i, l in set([(p,r), (r,p)]):
+            q, x = _pair_amps(pnos, tpno, i, l)
+            qk1 = lib.dot(q.T, eris_ovov[l].reshape(nvir,-1))
+            qk2 = lib.dot(q.T, eris_ovov[:,:,l].transpose(1,0,2).reshape(nvir,-1))
+            w = lib.dot(x-x.T*.5, qk1) - lib.dot(x, qk2) * .5
+            wvoov[i] += lib.dot(q, w).reshape(nvir,nocc,nvir).transpose(1,0,2)
+            w = lib.dot(q, lib.dot(x.T, qk2)) * -.5
+            wvovo[i] += w.reshape(nvir,nocc,nvir).transpose(1,0,2)
+
+    t2new = lib.einsum('klij,klab->ijab', Woooo, tau)
+    t2new += eris_ovov.transpose(0,2,1,3)
+    tmp += lib.einsum('ac,ijcb->ijab', Lvv, t2)
+    tmp -= lib.einsum('ki,kjab->ijab', Loo, t2)
+    tmp -= lib.einsum('kibc,ka,jc->ijab', eris_oovv, t1, t1)
+    tmp -= lib.einsum('jkia,kb->ijab', eris_ooov, t1)
+    tmp -= lib.einsum('iakc,jc,kb->ijab', eris_ovov, t1, t1)
+    t2new += tmp + tmp.transpose(1,0,3,2)
+    tmp = None
+
+    # Residuals of the strong pairs in the PNO basis
+    r2 = {}
+    for (i,j), (q, ev) in pnos.items():
+        r2[(i,j)] = reduce(numpy.dot, (q.T, t2new[i,j], q))
+
+    # Ring terms
+    #   tmp_{ij} = \sum_k (2W_{ik} - V_{ik}) t_{kj} - W_{ik} t_{kj}^T - t_{kj} V_{ik}^T
+    #   with W_{ik} = Wvoov[:,k,i,:], V_{ik} = Wvovo[:,k,:,i]
+    def ring(q, i, j):
+        rij = 0
+        for k in range(nocc):
+            qk, xk = _pair_amps(pnos, tpno, k, j)
+            if qk is None:
+                continue
+            s = lib.dot(q.T, qk)
+            a = reduce(numpy.dot, (q.T, wvoov[i,k], qk))
+            b = reduce(numpy.dot, (q.T, wvovo[i,k], qk))
+            rij += reduce(numpy.dot, (a*2-b, xk, s.T))
+            rij -= reduce(numpy.dot, (a, xk.T, s.T))
+            rij -= reduce(numpy.dot, (s, xk, b.T))
+        return rij
+    for (i,j), (q, ev) in pnos.items():
+        r2[(i,j)] += ring(q, i, j) + ring(q, j, i).T
+    time1 = log.timer_debug1('LPNO ring terms', *time0)
+
+    # Particle-particle ladder with the t1-dressed Cholesky vectors
+    #   \sum_{cd} W_{abcd} tau_{ij}^{cd} = \sum_P [(L^P - D^P) tau L^P - L^P tau D^P+]_{ab}
+    #   D^P_{ac} = \sum_k t_k^a M^P_{kc}
+    naux = eris.vvL.shape[0]
+    blksize = max(1, int(mycc.max_memory*.3e6/8/nvir**2/2))
+    for p0, p1 in lib.prange(0, naux, blksize):
+        vvL = lib.unpack_tril(eris.vvL[p0:p1]).reshape(-1,nvir)
+        ovL = eris.ovL[p0:p1]
+        for (i,j), (q, ev) in pnos.items():
+            x = tpno[(i,j)]
+            npno = q.shape[1]
+            # G^P = Q^T L^P  and  H^P = Q^T D^P, stored as (G^P)^T and (H^P)^T
+            gt = lib.dot(vvL, q).reshape(p1-p0,nvir,npno)
+            ht = lib.einsum('pkc,km->pcm', ovL, lib.dot(t1, q))
+            g = lib.einsum('am,pan->pmn', q, gt)
+            h = lib.einsum('pcm,cn->pmn', ht, q)
+            ui = lib.einsum('pcm,c->pm', gt, t1[i])
+            uj = lib.einsum('pcm,c->pm', gt, t1[j])
+            wi = lib.einsum('pcm,c->pm', ht, t1[i])
+            wj = lib.einsum('pcm,c->pm', ht, t1[j])
+            r2[(i,j)] += lib.einsum('pml,pkl->mk', lib.einsum('pmn,nl->pml', g-h, x), g)
+            r2[(i,j)] -= lib.einsum('pml,pkl->mk', lib.einsum('pmn,nl->pml', g, x), h)
+            r2[(i,j)] += lib.dot((ui-wi).T, uj) - lib.dot(ui.T, wj)
+        vvL = ovL = None
+    log.timer_debug1('LPNO ladder', *time1)
+
+    mo_ev = fvv.diagonal()
+    t2new = numpy.zeros_like(t2)
+    for (i,j), (q, ev) in pnos.items():
+        x = tpno[(i,j)]
+        fq = lib.dot(q.T*mo_ev, q)
+        rij = r2[(i,j)] + lib.dot(fq, x) + lib.dot(x, fq) - (mo_e[i]+mo_e[j]) * x
+        x = x + rij / (mo_e[i] + mo_e[j] - lib.direct_sum('a+b->ab', ev, ev))
+        t2new[i,j] = reduce(numpy.dot, (q, x, q.T))
+        t2new[j,i] = t2new[i,j].T
+    log.timer_debug1('update t1 t2', *time0)
+    return t1new, t2new
+
+
+class LPNOCCSD(ccsd.CCSD):
+    '''Local pair natural orbital CCSD
+
+    Attributes:
+        localization : str
+            Method to localize occupied orbitals, 'boys' or 'pm'.  Default
+            is 'boys'.
+        pair_thresh : float
+            Pairs with semi-canonical MP2 pair energy below this threshold
+            are treated by MP2.  Default is 1e-4.
+        pno_thresh : float
+            Occupation number threshold to truncate the pair natural
+            orbitals.  Default is 1e-7.
+
+    Saved results
+
+        e_corr : float
+            LPNO-CCSD correlation energy, including the MP2 corrections of
+            the weak pairs and the PNO truncation.
+        e_weak_pairs : float
+            MP2 energy of the weak pairs.
+        e_pno_trunc : float
+            MP2 estimate of the PNO truncation error.
+        pnos : dict
+            Semi-canonical PNOs (in the canonical virtual basis) and their
+            orbital energies for each strong pair (i,j), i >= j.
+    '''
+    def __init__(self, mf, frozen=[], mo_coeff=None, mo_occ=None):
+        ccsd.CCSD.__init__(self, mf, frozen, mo_coeff, mo_occ)
+        self.localization = 'boys'
+        self.pair_thresh = 1e-4
+        self.pno_thresh = 1e-7
+        # The ladder does not need the (vv|vv) integrals
+        self.direct = True
+
+        self.lmo_coeff = None
+        self.pnos = None
+        self.e_weak_pairs = 0
+        self.e_pno_trunc = 0
+        self._keys = self._keys.union(['localization', 'pair_thresh',
+                                       'pno_thresh', 'lmo_coeff', 'pnos',
+                                       'e_weak_pairs', 'e_pno_trunc'])
+
+    def dump_flags(self):
+        ccsd.CCSD.dump_flags(self)
+        log = logger.Logger(self.stdout, self.verbose)
+        log.info('localization = %s', self.localization)
+        log.info('pair_thresh = %g', self.pair_thresh)
+        log.info('pno_thresh = %g', self.pno_thresh)
+        return self
+
+    def ao2mo(self, mo_coeff=None):
+        if mo_coeff is None:
+            if self.lmo_coeff is None:
+                self.lmo_coeff = localize_occ(self, self.mo_coeff)
+            mo_coeff = self.lmo_coeff
+        eris = ccsd._ERIS(self, mo_coeff)
+        eris.vvvv = None
+        return eris
+
+    def init_amps(self, eris):
+        time0 = time.clock(), time.time()
+        self.pnos, e_pair, self.e_weak_pairs, self.e_pno_trunc = \
+                make_pnos(self, eris)
+        mo_e = eris.fock.diagonal()
+        nocc = self.nocc
+        nvir = mo_e.size - nocc
+        eia = mo_e[:nocc,None] - mo_e[None,nocc:]
+        t1 = eris.fock[:nocc,nocc:] / eia
+        t2 = numpy.zeros((nocc,nocc,nvir,nvir))
+        for (i,j), (q, ev) in self.pnos.items():
+            kij = reduce(numpy.dot, (q.T, numpy.asarray(eris.ovov[i,:,j]), q))
+            tij = kij / (mo_e[i] + mo_e[j] - lib.direct_sum('a+b->ab', ev, ev))
+            tij = reduce(numpy.dot, (q, tij, q.T))
+            t2[i,j] = tij
+            t2[j,i] = tij.T
+        self.emp2 = e_pair.sum()
+        logger.info(self, 'Init t2, MP2 energy = %.15g', self.emp2)
+        logger.timer(self, 'init mp2', *time0)
+        return self.emp2, t1, t2
+
+    def kernel(self, t1=None, t2=None, eris=None):
+        return self.ccsd(t1, t2, eris)
+    def ccsd(self, t1=None, t2=None, eris=None):
+        if self.verbose >= logger.WARN:
+            self.check_sanity()
+        self.dump_flags()
+
+        if eris is None:
+            eris = self.ao2mo()
+        if t1 is None and t2 is None:
+            t1, t2 = self.init_amps(eris)[1:]
+        else:
+            self.pnos, e_pair, self.e_weak_pairs, self.e_pno_trunc = \
+                    make_pnos(self, eris)
+            if t2 is not None:
+                t2 = project_amps(self, t2, self.pnos)
+        self.converged, e_cc, self.t1, self.t2 = \
+                ccsd.kernel(self, eris, t1, t2, max_cycle=self.max_cycle,
+                            tol=self.conv_tol, tolnormt=self.conv_tol_normt,
+                            verbose=self.verbose)
+        self.e_corr = e_cc + self.e_weak_pairs + self.e_pno_trunc
+        if self.converged:
+            logger.info(self, 'LPNO-CCSD converged')
+        else:
+            logger.info(self, 'LPNO-CCSD not converged')
+        logger.info(self, 'E(CCSD, strong pairs) = %.16g  E(MP2, weak pairs) = %.16g  '
+                    'dE(PNO truncation) = %.16g', e_cc, self.e_weak_pairs,
+                    self.e_pno_trunc)
+        if self._scf.e_tot == 0:
+            logger.note(self, 'E_corr = %.16g', self.e_corr)
+        else:
+            logger.note(self, 'E(LPNO-CCSD) = %.16g  E_corr = %.16g',
+                        self.e_tot, self.e_corr)
+        return self.e_corr, self.t1, self.t2
+
+    update_amps = update_amps
+
+    def solve_lambda(self, *args, **kwargs):
+        raise NotImplementedError('Lambda equations are not available for LPNO-CCSD')
+    def make_rdm1(self, *args, **kwargs):
+        raise NotImplementedError('Density matrices are not available for LPNO-CCSD')
+    def make_rdm2(self, *args, **kwargs):
+        raise NotImplementedError('Density matrices are not available for LPNO-CCSD')
+
+LPNO = LPNOCCSD
+
+
+def compare_canonical(mf, frozen=[], **kwargs):
+    '''Run LPNO-CCSD and canonical CCSD for the same SCF object and report the
+    energy error and the wall time of both.
+
+    Kwargs are assigned to the LPNOCCSD object.
+
+    Returns:
+        LPNO-CCSD correlation energy, canonical CCSD correlation energy,
+        LPNO-CCSD wall time, canonical CCSD wall time
+    '''
+    log = logger.Logger(mf.stdout, mf.verbose)
+    mycc = LPNOCCSD(mf, frozen).set(**kwargs)
+    t0 = time.time()
+    mycc.kernel()
+    t_pno = time.time() - t0
+
+    refcc = ccsd.CCSD(mf, frozen)
+    refcc.conv_tol = mycc.conv_tol
+    refcc.conv_tol_normt = mycc.conv_tol_normt
+    t0 = time.time()
+    refcc.kernel()
+    t_can = time.time() - t0
+
+    log.note('E_corr(LPNO-CCSD) = %.12g  E_corr(CCSD) = %.12g  error = %.6g '
+             '(%.3f%% of E_corr)', mycc.e_corr, refcc.e_corr,
+             mycc.e_corr-refcc.e_corr,
+             (mycc.e_corr-refcc.e_corr)/refcc.e_corr*100)
+    log.note('Wall time LPNO-CCSD %.2f s  CCSD %.2f s', t_pno, t_can)
+    return mycc.e_corr, refcc.e_corr, t_pno, t_can
+
+
+if __name__ == '__main__':
+    from pyscf import gto
+    from pyscf import scf
+
+    mol = gto.Mole()
+    mol.atom = [
+        [8 , (0. , 0.     , 0.)],
+        [1 , (0. , -0.757 , 0.587)],
+        [1 , (0. , 0.757  , 0.587)]]
+    mol.basis = 'cc-pvdz'
+    mol.build()
+    mf = scf.RHF(mol).run()
+
+    mycc = LPNOCCSD(mf)
+    mycc.pair_thresh = 0
+    mycc.pno_thresh = 0
+    mycc.kernel()
+    print(mycc.e_corr - -0.213343234198275)
+
+    print(compare_canonical(mf, frozen=1))
@@ -166,7 +166,11 @@ class RCCSD(ccsd.CCSD):
     def __init__(self, mf, frozen=[], mo_coeff=None, mo_occ=None):
         ccsd.CCSD.__init__(self, mf, frozen, mo_coeff, mo_occ)
         self.max_space = 20
-        self._keys = self._keys.union(['max_space'])
+        self.imds_outcore = False
+        self.ip_partition = None
+        self.ea_partition = None
+        self._keys = self._keys.union(['max_space', 'imds_outcore', 'imds',
+                                       'ip_partition', 'ea_partition'])
 
     def dump_flags(self):
         ccsd.CCSD.dump_flags(self)
@@ -225,6 +229,35 @@ class RCCSD(ccsd.CCSD):
 #    def update_amps(self, t1, t2, eris):
 #        return update_amps(self, t1, t2, eris)
 
+    def get_imds(self):
+        '''EOM-CCSD intermediates.  The intermediates are cached in self.imds
+        and shared by IP, EA and EE-EOM-CCSD.  They are rebuilt only if t1, t2
+        or eris are changed.  If self.imds_outcore is set, the intermediates
+        which have two or more virtual indices are saved on disk.'''
+        if getattr(self, 'imds', None) is None or not self.imds.is_valid_for(self):
+            self.imds = _IMDS(self, self.imds_outcore)
+        return self.imds
+
+    def make_ip_imds(self):
+        imds = self.get_imds()
+        if (not imds.made_ip_imds or
+            (imds.ip_partition == 'mp' and self.ip_partition != 'mp')):
+            imds.make_ip(self.ip_partition)
+        return imds
+
+    def make_ea_imds(self):
+        imds = self.get_imds()
+        if (not imds.made_ea_imds or
+            (imds.ea_partition == 'mp' and self.ea_partition != 'mp')):
+            imds.make_ea(self.ea_partition)
+        return imds
+
+    def make_ee_imds(self):
+        imds = self.get_imds()
+        if not imds.made_ee_imds:
+            imds.make_ee()
+        return imds
+
     def nip(self):
         nocc = self.nocc
         nvir = self.nmo - nocc
@@ -294,7 +327,8 @@ class RCCSD(ccsd.CCSD):
         def precond(r, e0, x0):
             return r/(e0-adiag+1e-12)
 
-        eig = linalg_helper.eig
+        # ipccsd_matvec takes all trial vectors of a Davidson iteration at once
+        eig = eig_block
         if user_guess or koopmans:
             def pickeig(w, v, nr, envs):
                 x0 = linalg_helper._gen_x0(envs['v'], envs['xs'])
@@ -324,58 +358,62 @@ class RCCSD(ccsd.CCSD):
             return eip, evecs
 
     def ipccsd_matvec(self, vector):
+        '''IP-EOM-CCSD matrix-vector multiplication.  If a list (or a 2D array)
+        of vectors is given, all vectors are contracted in one pass and a 2D
+        array of the products is returned.'''
         # Ref: Nooijen and Snijders, J. Chem. Phys. 102, 1681 (1995) Eqs.(8)-(9)
-        if not hasattr(self,'imds'):
-            self.imds = _IMDS(self)
-        if not self.imds.made_ip_imds:
-            self.imds.make_ip(self.ip_partition)
-        imds = self.imds
+        vector = np.asarray(vector)
+        if vector.ndim == 1:
+            return self.ipccsd_matvec(vector.reshape(1,-1))[0]
 
+        imds = self.make_ip_imds()
         r1,r2 = self.vector_to_amplitudes_ip(vector)
 
         # 1h-1h block
-        Hr1 = -einsum('ki,k->i',imds.Loo,r1)
+        Hr1 = -einsum('ki,xk->xi',imds.Loo,r1)
         #1h-2h1p block
-        Hr1 += 2*einsum('ld,ild->i',imds.Fov,r2)
-        Hr1 +=  -einsum('kd,kid->i',imds.Fov,r2)
-        Hr1 += -2*einsum('klid,kld->i',imds.Wooov,r2)
-        Hr1 +=    einsum('lkid,kld->i',imds.Wooov,r2)
+        Hr1 += 2*einsum('ld,xild->xi',imds.Fov,r2)
+        Hr1 +=  -einsum('kd,xkid->xi',imds.Fov,r2)
+        Wooov = np.asarray(imds.Wooov)
+        Hr1 += -2*einsum('klid,xkld->xi',Wooov,r2)
+        Hr1 +=    einsum('lkid,xkld->xi',Wooov,r2)
+        Wooov = None
 
         # 2h1p-1h block
-        Hr2 = -einsum('kbij,k->ijb',imds.Wovoo,r1)
+        Hr2 = -einsum('kbij,xk->xijb',np.asarray(imds.Wovoo),r1)
         # 2h1p-2h1p block
         if self.ip_partition == 'mp':
             nocc, nvir = self.t1.shape
             fock = self.eris.fock
             foo = fock[:nocc,:nocc]
             fvv = fock[nocc:,nocc:]
-            Hr2 += einsum('bd,ijd->ijb',fvv,r2)
-            Hr2 += -einsum('ki,kjb->ijb',foo,r2)
-            Hr2 += -einsum('lj,ilb->ijb',foo,r2)
+            Hr2 += einsum('bd,xijd->xijb',fvv,r2)
+            Hr2 += -einsum('ki,xkjb->xijb',foo,r2)
+            Hr2 += -einsum('lj,xilb->xijb',foo,r2)
         elif self.ip_partition == 'full':
             Hr2 += self._ipccsd_diag_matrix2*r2
         else:
-            Hr2 += einsum('bd,ijd->ijb',imds.Lvv,r2)
-            Hr2 += -einsum('ki,kjb->ijb',imds.Loo,r2)
-            Hr2 += -einsum('lj,ilb->ijb',imds.Loo,r2)
-            Hr2 +=  einsum('klij,klb->ijb',imds.Woooo,r2)
-            Hr2 += 2*einsum('lbdj,ild->ijb',imds.Wovvo,r2)
-            Hr2 +=  -einsum('kbdj,kid->ijb',imds.Wovvo,r2)
-            Hr2 +=  -einsum('lbjd,ild->ijb',imds.Wovov,r2) #typo in Ref 
-            Hr2 +=  -einsum('kbid,kjd->ijb',imds.Wovov,r2)
-            tmp = 2*einsum('lkdc,kld->c',imds.Woovv,r2)
-            tmp += -einsum('kldc,kld->c',imds.Woovv,r2)
-            Hr2 += -einsum('c,ijcb->ijb',tmp,self.t2)
+            Hr2 += einsum('bd,xijd->xijb',imds.Lvv,r2)
+            Hr2 += -einsum('ki,xkjb->xijb',imds.Loo,r2)
+            Hr2 += -einsum('lj,xilb->xijb',imds.Loo,r2)
+            Hr2 +=  einsum('klij,xklb->xijb',np.asarray(imds.Woooo),r2)
+            Wovvo = np.asarray(imds.Wovvo)
+            Hr2 += 2*einsum('lbdj,xild->xijb',Wovvo,r2)
+            Hr2 +=  -einsum('kbdj,xkid->xijb',Wovvo,r2)
+            Wovov = np.asarray(imds.Wovov)
+            Hr2 +=  -einsum('lbjd,xild->xijb',Wovov,r2) #typo in Ref 
+            Hr2 +=  -einsum('kbid,xkjd->xijb',Wovov,r2)
+            Woovv = np.asarray(imds.Woovv)
+            tmp = 2*einsum('lkdc,xkld->xc',Woovv,r2)
+            tmp += -einsum('kldc,xkld->xc',Woovv,r2)
+            Hr2 += -einsum('xc,ijcb->xijb',tmp,self.t2)
+            Wovvo = Wovov = Woovv = None
 
         vector = self.amplitudes_to_vector_ip(Hr1,Hr2)
         return vector
 
     def ipccsd_diag(self):
-        if not hasattr(self,'imds'):
-            self.imds = _IMDS(self)
-        if not self.imds.made_ip_imds:
-            self.imds.make_ip(self.ip_partition)
-        imds = self.imds
+        imds = self.make_ip_imds()
 
         t1, t2 = self.t1, self.t2
         nocc, nvir = t1.shape
@@ -384,43 +422,43 @@ class RCCSD(ccsd.CCSD):
         fvv = fock[nocc:,nocc:]
 
         Hr1 = -np.diag(imds.Loo)
-        Hr2 = np.zeros((nocc,nocc,nvir), t1.dtype)
-        for i in range(nocc):
-            for j in range(nocc):
-                for b in range(nvir):
-                    if self.ip_partition == 'mp':
-                        Hr2[i,j,b] += fvv[b,b]
-                        Hr2[i,j,b] += -foo[i,i]
-                        Hr2[i,j,b] += -foo[j,j]
-                    else:
-                        Hr2[i,j,b] += imds.Lvv[b,b]
-                        Hr2[i,j,b] += -imds.Loo[i,i]
-                        Hr2[i,j,b] += -imds.Loo[j,j]
-                        Hr2[i,j,b] += imds.Woooo[i,j,i,j]
-                        Hr2[i,j,b] += 2*imds.Wovvo[j,b,b,j]
-                        Hr2[i,j,b] += -imds.Wovvo[i,b,b,i]*(i==j)
-                        Hr2[i,j,b] += -imds.Wovov[j,b,j,b]
-                        Hr2[i,j,b] += -imds.Wovov[i,b,i,b]
-                        Hr2[i,j,b] += -2*np.dot(imds.Woovv[j,i,b,:],t2[i,j,:,b])
-                        Hr2[i,j,b] += np.dot(imds.Woovv[i,j,b,:],t2[i,j,:,b])
+        if self.ip_partition == 'mp':
+            Hr2 = lib.direct_sum('b-i-j->ijb', fvv.diagonal(),
+                                 foo.diagonal(), foo.diagonal())
+        else:
+            Loo = imds.Loo.diagonal()
+            Hr2 = lib.direct_sum('b-i-j->ijb', imds.Lvv.diagonal(), Loo, Loo)
+            Hr2 += np.einsum('ijij->ij', np.asarray(imds.Woooo))[:,:,None]
+            wbbj = np.einsum('jbbj->jb', np.asarray(imds.Wovvo))
+            Hr2 += 2*wbbj[None,:,:]
+            Hr2[np.arange(nocc),np.arange(nocc)] -= wbbj
+            wbjb = np.einsum('jbjb->jb', np.asarray(imds.Wovov))
+            Hr2 -= wbjb[None,:,:]
+            Hr2 -= wbjb[:,None,:]
+            Woovv = np.asarray(imds.Woovv)
+            Hr2 -= 2*np.einsum('jibc,ijcb->ijb', Woovv, t2)
+            Hr2 += np.einsum('ijbc,ijcb->ijb', Woovv, t2)
+        Hr2 = Hr2.astype(t1.dtype)
 
         vector = self.amplitudes_to_vector_ip(Hr1,Hr2)
         return vector
 
     def vector_to_amplitudes_ip(self,vector):
+        '''For a 2D array of vectors, r1 and r2 carry an extra leading index
+        for the vectors.'''
         nocc = self.nocc
         nvir = self.nmo - nocc
-        r1 = vector[:nocc].copy()
-        r2 = vector[nocc:].copy().reshape(nocc,nocc,nvir)
+        r1 = vector[...,:nocc].copy()
+        r2 = vector[...,nocc:].copy().reshape(vector.shape[:-1]+(nocc,nocc,nvir))
         return [r1,r2]
 
     def amplitudes_to_vector_ip(self,r1,r2):
         nocc = self.nocc
         nvir = self.nmo - nocc
         size = self.nip()
-        vector = np.zeros(size, r1.dtype)
-        vector[:nocc] = r1.copy()
-        vector[nocc:] = r2.copy().reshape(nocc*nocc*nvir)
+        vector = np.zeros(r1.shape[:-1]+(size,), r1.dtype)
+        vector[...,:nocc] = r1
+        vector[...,nocc:] = r2.reshape(r1.shape[:-1]+(nocc*nocc*nvir,))
         return vector
 
     def eaccsd(self, nroots=1, koopmans=False, guess=None, partition=None):
@@ -464,7 +502,8 @@ class RCCSD(ccsd.CCSD):
         def precond(r, e0, x0):
             return r/(e0-adiag+1e-12)
 
-        eig = linalg_helper.eig
+        # eaccsd_matvec takes all trial vectors of a Davidson iteration at once
+        eig = eig_block
         if user_guess or koopmans:
             def pickeig(w, v, nr, envs):
                 x0 = linalg_helper._gen_x0(envs['v'], envs['xs'])
@@ -495,61 +534,73 @@ class RCCSD(ccsd.CCSD):
             return eea, evecs
 
     def eaccsd_matvec(self,vector):
+        '''EA-EOM-CCSD matrix-vector multiplication.  If a list (or a 2D array)
+        of vectors is given, all vectors are contracted in one pass and a 2D
+        array of the products is returned.'''
         # Ref: Nooijen and Bartlett, J. Chem. Phys. 102, 3629 (1994) Eqs.(30)-(31)
-        if not hasattr(self,'imds'):
-            self.imds = _IMDS(self)
-        if not self.imds.made_ea_imds:
-            self.imds.make_ea(self.ea_partition)
-        imds = self.imds
+        vector = np.asarray(vector)
+        if vector.ndim == 1:
+            return self.eaccsd_matvec(vector.reshape(1,-1))[0]
 
+        imds = self.make_ea_imds()
+        nvec = vector.shape[0]
         r1,r2 = self.vector_to_amplitudes_ea(vector)
 
         # Eq. (30)
         # 1p-1p block
-        Hr1 =  einsum('ac,c->a',imds.Lvv,r1)
+        Hr1 =  einsum('ac,xc->xa',imds.Lvv,r1)
         # 1p-2p1h block
-        Hr1 += einsum('ld,lad->a',2.*imds.Fov,r2)
-        Hr1 += einsum('ld,lda->a',  -imds.Fov,r2)
-        Hr1 += 2*einsum('alcd,lcd->a',imds.Wvovv,r2)
-        Hr1 +=  -einsum('aldc,lcd->a',imds.Wvovv,r2)
+        Hr1 += einsum('ld,xlad->xa',2.*imds.Fov,r2)
+        Hr1 += einsum('ld,xlda->xa',  -imds.Fov,r2)
+        Wvovv = np.asarray(imds.Wvovv)
+        Hr1 += 2*einsum('alcd,xlcd->xa',Wvovv,r2)
+        Hr1 +=  -einsum('aldc,xlcd->xa',Wvovv,r2)
+        Wvovv = None
         # Eq. (31)
         # 2p1h-1p block
-        Hr2 = einsum('abcj,c->jab',imds.Wvvvo,r1)
+        Hr2 = einsum('abcj,xc->xjab',np.asarray(imds.Wvvvo),r1)
         # 2p1h-2p1h block
         if self.ea_partition == 'mp':
             nocc, nvir = self.t1.shape
             fock = self.eris.fock
             foo = fock[:nocc,:nocc]
             fvv = fock[nocc:,nocc:]
-            Hr2 +=  einsum('ac,jcb->jab',fvv,r2)
-            Hr2 +=  einsum('bd,jad->jab',fvv,r2)
-            Hr2 += -einsum('lj,lab->jab',foo,r2)
+            Hr2 +=  einsum('ac,xjcb->xjab',fvv,r2)
+            Hr2 +=  einsum('bd,xjad->xjab',fvv,r2)
+            Hr2 += -einsum('lj,xlab->xjab',foo,r2)
         elif self.ea_partition == 'full':
             Hr2 += self._eaccsd_diag_matrix2*r2
         else:
-            Hr2 +=  einsum('ac,jcb->jab',imds.Lvv,r2)
-            Hr2 +=  einsum('bd,jad->jab',imds.Lvv,r2)
-            Hr2 += -einsum('lj,lab->jab',imds.Loo,r2)
-            Hr2 += 2*einsum('lbdj,lad->jab',imds.Wovvo,r2)
-            Hr2 +=  -einsum('lbjd,lad->jab',imds.Wovov,r2)
-            Hr2 +=  -einsum('lajc,lcb->jab',imds.Wovov,r2)
-            Hr2 +=  -einsum('lbcj,lca->jab',imds.Wovvo,r2)
-            nvir = self.nmo-self.nocc
-            for a in range(nvir):
-                Hr2[:,a,:] += einsum('bcd,jcd->jb',imds.Wvvvv[a],r2)
-            tmp = (2*einsum('klcd,lcd->k',imds.Woovv,r2)
-                    -einsum('kldc,lcd->k',imds.Woovv,r2))
-            Hr2 += -einsum('k,kjab->jab',tmp,self.t2)
+            nocc = self.nocc
+            nvir = self.nmo-nocc
+            Hr2 +=  einsum('ac,xjcb->xjab',imds.Lvv,r2)
+            Hr2 +=  einsum('bd,xjad->xjab',imds.Lvv,r2)
+            Hr2 += -einsum('lj,xlab->xjab',imds.Loo,r2)
+            Wovvo = np.asarray(imds.Wovvo)
+            Wovov = np.asarray(imds.Wovov)
+            Hr2 += 2*einsum('lbdj,xlad->xjab',Wovvo,r2)
+            Hr2 +=  -einsum('lbjd,xlad->xjab',Wovov,r2)
+            Hr2 +=  -einsum('lajc,xlcb->xjab',Wovov,r2)
+            Hr2 +=  -einsum('lbcj,xlca->xjab',Wovvo,r2)
+            Wovvo = Wovov = None
+            # Wvvvv is read once for all vectors
+            mem_now = lib.current_memory()[0]
+            max_memory = max(2000, self.max_memory - mem_now)
+            blksize = max(1, int(max_memory*.3e6/8/(nvir**3+nvec*nocc*nvir**2)))
+            for a0, a1 in lib.prange(0, nvir, blksize):
+                Hr2[:,:,a0:a1] += einsum('abcd,xjcd->xjab',
+                                         np.asarray(imds.Wvvvv[a0:a1]), r2)
+            Woovv = np.asarray(imds.Woovv)
+            tmp = (2*einsum('klcd,xlcd->xk',Woovv,r2)
+                    -einsum('kldc,xlcd->xk',Woovv,r2))
+            Hr2 += -einsum('xk,kjab->xjab',tmp,self.t2)
+            Woovv = None
 
         vector = self.amplitudes_to_vector_ea(Hr1,Hr2)
         return vector
 
     def eaccsd_diag(self):
-        if not hasattr(self,'imds'):
-            self.imds = _IMDS(self)
-        if not self.imds.made_ea_imds:
-            self.imds.make_ea(self.ea_partition)
-        imds = self.imds
+        imds = self.make_ea_imds()
 
         t1, t2 = self.t1, self.t2
         nocc, nvir = t1.shape
@@ -559,45 +610,44 @@ class RCCSD(ccsd.CCSD):
         fvv = fock[nocc:,nocc:]
 
         Hr1 = np.diag(imds.Lvv)
-        Hr2 = np.zeros((nocc,nvir,nvir), t1.dtype)
-        for a in range(nvir):
-            if self.ea_partition != 'mp':
-                _Wvvvva = np.array(imds.Wvvvv[a])
-            for b in range(nvir):
-                for j in range(nocc):
-                    if self.ea_partition == 'mp':
-                        Hr2[j,a,b] += fvv[a,a]
-                        Hr2[j,a,b] += fvv[b,b]
-                        Hr2[j,a,b] += -foo[j,j]
-                    else:
-                        Hr2[j,a,b] += imds.Lvv[a,a]
-                        Hr2[j,a,b] += imds.Lvv[b,b]
-                        Hr2[j,a,b] += -imds.Loo[j,j]
-                        Hr2[j,a,b] += 2*imds.Wovvo[j,b,b,j]
-                        Hr2[j,a,b] += -imds.Wovov[j,b,j,b]
-                        Hr2[j,a,b] += -imds.Wovov[j,a,j,a]
-                        Hr2[j,a,b] += -imds.Wovvo[j,b,b,j]*(a==b)
-                        Hr2[j,a,b] += _Wvvvva[b,a,b]
-                        Hr2[j,a,b] += -2*np.dot(imds.Woovv[:,j,a,b],t2[:,j,a,b])
-                        Hr2[j,a,b] += np.dot(imds.Woovv[:,j,b,a],t2[:,j,a,b])
+        if self.ea_partition == 'mp':
+            Hr2 = lib.direct_sum('-j+a+b->jab', foo.diagonal(),
+                                 fvv.diagonal(), fvv.diagonal())
+        else:
+            Lvv = imds.Lvv.diagonal()
+            Hr2 = lib.direct_sum('-j+a+b->jab', imds.Loo.diagonal(), Lvv, Lvv)
+            wbbj = np.einsum('jbbj->jb', np.asarray(imds.Wovvo))
+            Hr2 += 2*wbbj[:,None,:]
+            Hr2[:,np.arange(nvir),np.arange(nvir)] -= wbbj
+            wbjb = np.einsum('jbjb->jb', np.asarray(imds.Wovov))
+            Hr2 -= wbjb[:,None,:]
+            Hr2 -= wbjb[:,:,None]
+            for a in range(nvir):
+                Hr2[:,a] += np.asarray(imds.Wvvvv[a,:,a]).diagonal()
+            Woovv = np.asarray(imds.Woovv)
+            Hr2 -= 2*np.einsum('kjab,kjab->jab', Woovv, t2)
+            Hr2 += np.einsum('kjba,kjab->jab', Woovv, t2)
+        Hr2 = Hr2.astype(t1.dtype)
 
         vector = self.amplitudes_to_vector_ea(Hr1,Hr2)
         return vector
 
     def vector_to_amplitudes_ea(self,vector):
+        '''For a 2D array of vectors, r1 and r2 carry an extra leading index
+        for the vectors.'''
         nocc = self.nocc
         nvir = self.nmo - nocc
-        r1 = vector[:nvir].copy()
-        r2 = vector[nvir:].copy().reshape(nocc,nvir,nvir)
+        r1 = vector[...,:nvir].copy()
+        r2 = vector[...,nvir:].copy().reshape(vector.shape[:-1]+(nocc,nvir,nvir))
         return [r1,r2]
 
     def amplitudes_to_vector_ea(self,r1,r2):
         nocc = self.nocc
         nvir = self.nmo - nocc
         size = self.nea()
-        vector = np.zeros(size, r1.dtype)
-        vector[:nvir] = r1.copy()
-        vector[nvir:] = r2.copy().reshape(nocc*nvir*nvir)
+        vector = np.zeros(r1.shape[:-1]+(size,), r1.dtype)
+        vector[...,:nvir] = r1
+        vector[...,nvir:] = r2.reshape(r1.shape[:-1]+(nocc*nvir*nvir,))
         return vector
 
     #TODO: double spin-flip EOM-EE
@@ -876,11 +926,7 @@ class RCCSD(ccsd.CCSD):
             return eee, evecs
 
     def eomee_ccsd_matvec_singlet(self, vector):
-        if not hasattr(self,'imds'):
-            self.imds = _IMDS(self)
-        if not self.imds.made_ee_imds:
-            self.imds.make_ee()
-        imds = self.imds
+        imds = self.make_ee_imds()
 
         r1, r2 = self.vector_to_amplitudes(vector)
         t1, t2, eris = self.t1, self.t2, self.eris
@@ -966,11 +1012,7 @@ class RCCSD(ccsd.CCSD):
         return vector
 
     def eomee_ccsd_matvec_triplet(self, vector):
-        if not hasattr(self,'imds'):
-            self.imds = _IMDS(self)
-        if not self.imds.made_ee_imds:
-            self.imds.make_ee()
-        imds = self.imds
+        imds = self.make_ee_imds()
 
         r1, r2 = self.vector_to_amplitudes_triplet(vector)
         r2aa, r2ab = r2
@@ -1074,11 +1116,7 @@ class RCCSD(ccsd.CCSD):
 
     def eomsf_ccsd_matvec(self, vector):
         '''Spin flip EOM-CCSD'''
-        if not hasattr(self,'imds'):
-            self.imds = _IMDS(self)
-        if not self.imds.made_ee_imds:
-            self.imds.make_ee()
-        imds = self.imds
+        imds = self.make_ee_imds()
 
         t1, t2, eris = self.t1, self.t2, self.eris
         r1, r2 = self.vector_to_amplitudes_eomsf(vector)
@@ -1208,11 +1246,7 @@ class RCCSD(ccsd.CCSD):
         return vector
 
     def eeccsd_diag(self):
-        if not hasattr(self,'imds'):
-            self.imds = _IMDS(self)
-        if not self.imds.made_ee_imds:
-            self.imds.make_ee()
-        imds = self.imds
+        imds = self.make_ee_imds()
 
         eris = self.eris
         t1, t2 = self.t1, self.t2
@@ -1545,7 +1579,7 @@ class _ERIS:
         log.timer('CCSD integral transformation', *cput0)
 
 class _IMDS:
-    def __init__(self, cc):
+    def __init__(self, cc, outcore=False):
         self.verbose = cc.verbose
         self.stdout = cc.stdout
         self.t1 = cc.t1
@@ -1554,7 +1588,29 @@ class _IMDS:
         self.made_ip_imds = False
         self.made_ea_imds = False
         self.made_ee_imds = False
+        self.ip_partition = None
+        self.ea_partition = None
+        self._made_shared_1e = False
         self._made_shared_2e = False
+        if outcore:
+            self._fimd = lib.H5TmpFile()
+        else:
+            self._fimd = None
+
+    def is_valid_for(self, cc):
+        '''Whether the intermediates were built from the current t1, t2 and
+        eris of cc'''
+        return (self.t1 is cc.t1 and self.t2 is cc.t2 and
+                self.eris is getattr(cc, 'eris', None))
+
+    def _save(self, key, w):
+        if self._fimd is None:
+            return w
+        else:
+            if key in self._fimd:
+                del(self._fimd[key])
+            self._fimd[key] = np.asarray(w)
+            return self._fimd[key]
 
     def _make_shared_1e(self):
         cput0 = (time.clock(), time.time())
@@ -1573,14 +1629,16 @@ class _IMDS:
 
         t1,t2,eris = self.t1, self.t2, self.eris
         # 2 virtuals
-        self.Wovov = imd.Wovov(t1,t2,eris)
-        self.Wovvo = imd.Wovvo(t1,t2,eris)
-        self.Woovv = np.asarray(eris.ovov).transpose(0,2,1,3)
+        self.Wovov = self._save('Wovov', imd.Wovov(t1,t2,eris))
+        self.Wovvo = self._save('Wovvo', imd.Wovvo(t1,t2,eris))
+        self.Woovv = self._save('Woovv', np.asarray(eris.ovov).transpose(0,2,1,3))
 
         log.timer('EOM-CCSD shared two-electron intermediates', *cput0)
 
     def make_ip(self, ip_partition=None):
-        self._make_shared_1e()
+        if not self._made_shared_1e:
+            self._make_shared_1e()
+            self._made_shared_1e = True
         if self._made_shared_2e is False and ip_partition != 'mp':
             self._make_shared_2e()
             self._made_shared_2e = True
@@ -1596,10 +1654,13 @@ class _IMDS:
         self.Wooov = imd.Wooov(t1,t2,eris)
         self.Wovoo = imd.Wovoo(t1,t2,eris)
         self.made_ip_imds = True
+        self.ip_partition = ip_partition
         log.timer('EOM-CCSD IP intermediates', *cput0)
 
     def make_ea(self, ea_partition=None):
-        self._make_shared_1e()
+        if not self._made_shared_1e:
+            self._make_shared_1e()
+            self._made_shared_1e = True
         if self._made_shared_2e is False and ea_partition != 'mp':
             self._make_shared_2e()
             self._made_shared_2e = True
@@ -1610,13 +1671,15 @@ class _IMDS:
         t1,t2,eris = self.t1, self.t2, self.eris
 
         # 3 or 4 virtuals
-        self.Wvovv = imd.Wvovv(t1,t2,eris)
+        self.Wvovv = self._save('Wvovv', imd.Wvovv(t1,t2,eris))
         if ea_partition == 'mp' and not np.any(t1):
-            self.Wvvvo = imd.Wvvvo(t1,t2,eris)
+            self.Wvvvo = self._save('Wvvvo', imd.Wvvvo(t1,t2,eris))
         else:
+            # imd.Wvvvv is stored on disk
             self.Wvvvv = imd.Wvvvv(t1,t2,eris)
-            self.Wvvvo = imd.Wvvvo(t1,t2,eris,self.Wvvvv)
+            self.Wvvvo = self._save('Wvvvo', imd.Wvvvo(t1,t2,eris,self.Wvvvv))
         self.made_ea_imds = True
+        self.ea_partition = ea_partition
         log.timer('EOM-CCSD EA intermediates', *cput0)
 
 
@@ -1780,6 +1843,17 @@ class _IMDS:
         self.made_ee_imds = True
         log.timer('EOM-CCSD EE intermediates', *cput0)
 
+def eig_block(aop, x0, precond, nroots=1, **kwargs):
+    '''Same to :func:`linalg_helper.eig`, except that aop takes a list of
+    trial vectors and returns the list of their matrix-vector products.
+    '''
+    conv, e, x = linalg_helper.davidson_nosym1(aop, x0, precond, nroots=nroots,
+                                               **kwargs)
+    if nroots == 1:
+        return e[0], x[0]
+    else:
+        return e, x
+
 def make_tau(t2, t1, r1, fac=1, out=None):
     tau = np.einsum('ia,jb->ijab', t1, r1)
     tau = tau + tau.transpose(1,0,3,2)
@@ -122,6 +122,42 @@ class KnowValues(unittest.TestCase):
         self.assertAlmostEqual(finger(r2[0]), 84325.863680611626 , 8)
         self.assertAlmostEqual(finger(r2[1]), 6715.9574457836134 , 8)
 
+    def test_ipccsd_matvec_block(self):
+        size = mycc1.nip()
+        hdiag = mycc1.ipccsd_diag()
+        h = mycc1.ipccsd_matvec(numpy.eye(size))
+        self.assertAlmostEqual(abs(h.diagonal()-hdiag).max(), 0, 9)
+        numpy.random.seed(10)
+        vec = numpy.random.random(size) - .9
+        self.assertAlmostEqual(abs(mycc1.ipccsd_matvec(vec)-h.T.dot(vec)).max(), 0, 9)
+
+    def test_eaccsd_matvec_block(self):
+        size = mycc1.nea()
+        hdiag = mycc1.eaccsd_diag()
+        h = mycc1.eaccsd_matvec(numpy.eye(size))
+        self.assertAlmostEqual(abs(h.diagonal()-hdiag).max(), 0, 9)
+        numpy.random.seed(10)
+        vec = numpy.random.random((2,size)) - .9
+        self.assertAlmostEqual(abs(mycc1.eaccsd_matvec(vec)-vec.dot(h)).max(), 0, 9)
+
+    def test_imds_cache(self):
+        mycc = copy.copy(mycc1)
+        mycc.imds = None
+        imds = mycc.make_ip_imds()
+        self.assertTrue(mycc.make_ea_imds() is imds)
+        Loo = imds.Loo
+        mycc.make_ea_imds()
+        self.assertTrue(imds.Loo is Loo)
+        mycc.t1 = mycc1.t1 * 2
+        self.assertTrue(mycc.make_ip_imds() is not imds)
+
+        mycc.imds = None
+        mycc.imds_outcore = True
+        mycc.t1 = mycc1.t1
+        vec = numpy.random.random(mycc.nea()) - .9
+        self.assertAlmostEqual(abs(mycc.eaccsd_matvec(vec) -
+                                   mycc1.eaccsd_matvec(vec)).max(), 0, 9)
+
     def test_eomee_diag(self):
         vec1S, vec1T, vec2 = mycc1.eeccsd_diag()
         self.assertAlmostEqual(finger(vec1S), 62.028729797614801, 9)
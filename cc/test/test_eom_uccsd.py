@@ -114,6 +114,37 @@ class KnowValues(unittest.TestCase):
         self.assertAlmostEqual(finger(numpy.asarray(eris.OVvo)), 144.41387241954908 , 9)
         self.assertAlmostEqual(finger(numpy.asarray(eris.OVvv)), 21.940358346011749 , 9)
 
+    def test_ucc_eris_outcore(self):
+        eris1 = uccsd._ERIS(ucc1, method='outcore')
+        for key in ('oooo', 'ooov', 'ovov', 'oovv', 'ovvo', 'ovvv', 'vvvv',
+                    'OOOO', 'OVOV', 'OOVV', 'OVVO', 'OVVV', 'VVVV',
+                    'ooOO', 'ovOV', 'ooVV', 'ovVO', 'ovVV', 'vvVV',
+                    'OOov', 'OOvo', 'OOvv', 'OVvo', 'OVvv'):
+            self.assertAlmostEqual(abs(numpy.asarray(getattr(eris1, key)) -
+                                       numpy.asarray(getattr(eris, key))).max(), 0, 9)
+
+        ucc2 = cc.UCCSD(mf1)
+        ucc2.max_memory = 1
+        t1, t2 = ucc1.update_amps(r1, r2, eris)
+        t1ref, t2ref = ucc2.update_amps(r1, r2, eris1)
+        self.assertAlmostEqual(abs(t1[0]-t1ref[0]).max(), 0, 9)
+        self.assertAlmostEqual(abs(t2[1]-t2ref[1]).max(), 0, 9)
+        self.assertAlmostEqual(abs(t2[2]-t2ref[2]).max(), 0, 9)
+
+    def test_ucc_kernel_outcore_amps(self):
+        mol = gto.M(atom='H 0 0 0; F 0 0 1.1', basis='6-31g', spin=0, verbose=0)
+        mf = scf.UHF(mol).run()
+        mycc = cc.UCCSD(mf)
+        ecc = mycc.kernel()[0]
+        mycc1 = cc.UCCSD(mf)
+        mycc1.max_memory = 1
+        eris1 = uccsd._ERIS(mycc1, method='outcore')
+        self.assertTrue(eris1.outcore_amps)
+        ecc1, t1, t2 = mycc1.kernel(eris=eris1)
+        self.assertTrue(isinstance(t2[0], numpy.ndarray))
+        self.assertAlmostEqual(ecc1, ecc, 8)
+        self.assertAlmostEqual(abs(t2[1]-mycc.t2[1]).max(), 0, 6)
+
     def test_ucc_update_amps(self):
         t1, t2 = ucc1.update_amps(r1, r2, eris)
         t1 = ucc1.spatial2spin(t1, eris.orbspin)
@@ -57,6 +57,13 @@ class KnowValues(unittest.TestCase):
         mcc.direct = True
         t2b = mcc.add_wvvVV(t1, t2, eris)
         self.assertTrue(numpy.allclose(t2a,t2b))
+        mcc.direct_nproc = 2
+        t2b = mcc.add_wvvVV(t1, t2, eris)
+        self.assertTrue(numpy.allclose(t2a,t2b))
+        mcc.direct_nproc = 1
+        mcc.direct_screen_tol = 1e-10
+        t2b = mcc.add_wvvVV(t1, t2, eris)
+        self.assertAlmostEqual(abs(t2a-t2b).max(), 0, 7)
 
     def test_ccsd_frozen(self):
         mcc = cc.ccsd.CC(mf, frozen=range(1))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+import unittest
+import numpy
+
+from pyscf import gto
+from pyscf import scf
+from pyscf import cc
+from pyscf.cc import lpno_ccsd
+
+mol = gto.Mole()
+mol.verbose = 0
+mol.output = None
+mol.atom = [
+    [8 , (0. , 0.     , 0.)],
+    [1 , (0. , -0.757 , 0.587)],
+    [1 , (0. , 0.757  , 0.587)]]
+mol.basis = 'cc-pvdz'
+mol.build()
+mf = scf.RHF(mol)
+mf.conv_tol_grad = 1e-8
+ehf = mf.kernel()
+
+mycc = cc.CCSD(mf)
+mycc.conv_tol = 1e-10
+mycc.kernel()
+
+
+class KnowValues(unittest.TestCase):
+    def test_full_domain(self):
+        mcc = cc.LPNOCCSD(mf)
+        mcc.conv_tol = 1e-10
+        mcc.pair_thresh = -1
+        mcc.pno_thresh = -1
+        mcc.kernel()
+        self.assertAlmostEqual(mcc.e_weak_pairs, 0, 12)
+        self.assertAlmostEqual(mcc.e_pno_trunc, 0, 9)
+        self.assertAlmostEqual(mcc.e_corr, mycc.e_corr, 7)
+        self.assertRaises(NotImplementedError, mcc.solve_lambda)
+        self.assertRaises(NotImplementedError, mcc.make_rdm1)
+
+    def test_cholesky_vvvv(self):
+        eris = mycc.ao2mo()
+        vvL, ovL = lpno_ccsd.cholesky_vvvv(mycc, eris)
+        self.assertTrue(numpy.allclose(numpy.dot(vvL.T, vvL), eris.vvvv))
+        nocc, nvir = ovL.shape[1:]
+        ovvv = numpy.asarray(eris.ovvv).reshape(nocc*nvir,-1)
+        self.assertTrue(numpy.allclose(numpy.dot(ovL.reshape(-1,nocc*nvir).T, vvL), ovvv))
+
+    def test_truncated(self):
+        mcc = cc.LPNOCCSD(mf)
+        mcc.conv_tol = 1e-10
+        mcc.localization = 'pm'
+        mcc.pno_thresh = 1e-6
+        mcc.kernel()
+        self.assertTrue(mcc.converged)
+        self.assertAlmostEqual(mcc.e_corr, mycc.e_corr, 3)
+        nvir = mol.nao_nr() - mol.nelectron//2
+        self.assertTrue(all(q.shape[1] < nvir for q, ev in mcc.pnos.values()))
+
+        t2 = lpno_ccsd.project_amps(mcc, mcc.t2, mcc.pnos)
+        self.assertTrue(numpy.allclose(t2, mcc.t2))
+
+    def test_frozen(self):
+        ref = cc.CCSD(mf, frozen=1)
+        ref.conv_tol = 1e-10
+        ref.kernel()
+        mcc = cc.LPNOCCSD(mf, frozen=1)
+        mcc.conv_tol = 1e-10
+        mcc.pair_thresh = -1
+        mcc.pno_thresh = -1
+        mcc.kernel()
+        self.assertAlmostEqual(mcc.e_corr, ref.e_corr, 7)
+
+
+if __name__ == "__main__":
+    print("Full Tests for LPNO-CCSD")
+    unittest.main()
@@ -40,25 +40,35 @@ def kernel(cc, eris, t1=None, t2=None, max_cycle=50, tol=1e-8, tolnormt=1e-6,
     cput1 = cput0 = (time.clock(), time.time())
     eold = 0
     eccsd = 0
+    outcore = getattr(eris, 'outcore_amps', False)
     if cc.diis:
         adiis = lib.diis.DIIS(cc, cc.diis_file)
         adiis.space = cc.diis_space
+        if outcore:
+            # DIIS trial, error and previous vectors in adiis._diisfile
+            adiis.incore_size = 0
+            log.debug('DIIS vectors are stored on disk')
 
     conv = False
     for istep in range(max_cycle):
-        t1new, t2new = cc.update_amps(t1, t2, eris)
-        vec = cc.amplitudes_to_vector(t1new, t2new)
-        normt = np.linalg.norm(vec - cc.amplitudes_to_vector(t1, t2))
+        t1new, t2new = cc.update_amps(t1, _amps_from_disk(t2), eris)
+        normt = _norm_amps_diff(t1new, t2new, t1, t2)
         t1, t2 = t1new, t2new
         t1new = t2new = None
+        if outcore:
+            t1, t2 = _amps_to_disk(t1, t2, eris)
         if cc.diis:
             if (istep > cc.diis_start_cycle and
                 abs(eccsd-eold) < cc.diis_start_energy_diff):
+                vec = cc.amplitudes_to_vector(t1, _amps_from_disk(t2))
+                t1 = t2 = None
                 vec = adiis.update(vec)
                 t1, t2 = cc.vector_to_amplitudes(vec)
+                vec = None
+                if outcore:
+                    t1, t2 = _amps_to_disk(t1, t2, eris)
                 log.debug1('DIIS for step %d', istep)
-        vec = None
-        eold, eccsd = eccsd, energy(cc, t1, t2, eris)
+        eold, eccsd = eccsd, energy(cc, t1, _amps_from_disk(t2), eris)
         log.info('istep = %d  E(CCSD) = %.15g  dE = %.9g  norm(t1,t2) = %.6g',
                  istep, eccsd, eccsd - eold, normt)
         cput1 = log.timer('CCSD iter', *cput1)
@@ -66,7 +76,37 @@ def kernel(cc, eris, t1=None, t2=None, max_cycle=50, tol=1e-8, tolnormt=1e-6,
             conv = True
             break
     log.timer('CCSD', *cput0)
-    return conv, eccsd, t1, t2
+    return conv, eccsd, t1, _amps_from_disk(t2)
+
+def _norm_amps_diff(t1new, t2new, t1, t2):
+    '''norm(amplitudes_to_vector(t1new,t2new) - amplitudes_to_vector(t1,t2))
+    computed block by block.  The aa and bb blocks of t2 are antisymmetric,
+    each unique element appears 4 times in the full arrays.'''
+    t2new = _amps_from_disk(t2new)
+    t2 = _amps_from_disk(t2)
+    norm2 = 0
+    for x, y in zip(t1new, t1):
+        norm2 += np.linalg.norm(x - y)**2
+    norm2 += np.linalg.norm(t2new[0] - t2[0])**2 * .25
+    norm2 += np.linalg.norm(t2new[1] - t2[1])**2
+    norm2 += np.linalg.norm(t2new[2] - t2[2])**2 * .25
+    return np.sqrt(norm2)
+
+def _amps_to_disk(t1, t2, eris):
+    '''Save the t2 blocks in eris.famps and release the in-memory copies.'''
+    if not hasattr(eris, 'famps'):
+        eris.famps = lib.H5TmpFile()
+    t2aa, t2ab, t2bb = t2
+    t2 = None
+    for key, t2x in (('t2aa', t2aa), ('t2ab', t2ab), ('t2bb', t2bb)):
+        if key not in eris.famps:
+            eris.famps.create_dataset(key, t2x.shape, t2x.dtype.char)
+        eris.famps[key][:] = t2x
+    t2aa = t2ab = t2bb = None
+    return t1, (eris.famps['t2aa'], eris.famps['t2ab'], eris.famps['t2bb'])
+
+def _amps_from_disk(t2):
+    return tuple(np.asarray(x) for x in t2)
 
 def update_amps(cc, t1, t2, eris):
     time0 = time.clock(), time.time()
@@ -106,8 +146,9 @@ def update_amps(cc, t1, t2, eris):
     wOvvO = np.zeros((noccb,nvira,nvira,noccb))
 
     mem_now = lib.current_memory()[0]
-    max_memory = lib.param.MAX_MEMORY - mem_now
-    blksize = max(int(max_memory*1e6/8/(nvira**3*3)), 2)
+    max_memory = cc.max_memory - mem_now
+    blksize = max(int(max_memory*1e6/8/(nvira**3*3+nocca**2*nvira*2)), 2)
+    log.debug1('ovvv blksize %d', blksize)
     for p0,p1 in lib.prange(0, nocca, blksize):
         ovvv = np.asarray(eris.ovvv[p0:p1]).reshape((p1-p0)*nvira,-1)
         ovvv = lib.unpack_tril(ovvv).reshape(-1,nvira,nvira,nvira)
@@ -120,7 +161,8 @@ def update_amps(cc, t1, t2, eris):
         u2aa -= lib.einsum('ijmb,ma->ijab', tmp1aa, t1a[p0:p1]*.5)
         ovvv = tmp1aa = None
 
-    blksize = max(int(max_memory*1e6/8/(nvirb**3*3)), 2)
+    blksize = max(int(max_memory*1e6/8/(nvirb**3*3+noccb**2*nvirb*2)), 2)
+    log.debug1('OVVV blksize %d', blksize)
     for p0,p1 in lib.prange(0, noccb, blksize):
         OVVV = np.asarray(eris.OVVV[p0:p1]).reshape((p1-p0)*nvirb,-1)
         OVVV = lib.unpack_tril(OVVV).reshape(-1,nvirb,nvirb,nvirb)
@@ -133,7 +175,8 @@ def update_amps(cc, t1, t2, eris):
         u2bb -= lib.einsum('ijmb,ma->ijab', tmp1bb, t1b[p0:p1]*.5)
         OVVV = tmp1bb = None
 
-    blksize = max(int(max_memory*1e6/8/(nvira*nvirb**2*3)), 2)
+    blksize = max(int(max_memory*1e6/8/(nvira*nvirb**2*3+nocca*noccb*nvirb*2)), 2)
+    log.debug1('ovVV blksize %d', blksize)
     for p0,p1 in lib.prange(0, nocca, blksize):
         ovVV = np.asarray(eris.ovVV[p0:p1]).reshape((p1-p0)*nvira,-1)
         ovVV = lib.unpack_tril(ovVV).reshape(-1,nvira,nvirb,nvirb)
@@ -146,7 +189,8 @@ def update_amps(cc, t1, t2, eris):
         u2ab -= lib.einsum('iJmB,ma->iJaB', tmp1ab, t1a[p0:p1])
         ovVV = tmp1ab = None
 
-    blksize = max(int(max_memory*1e6/8/(nvirb*nocca**2*3)), 2)
+    blksize = max(int(max_memory*1e6/8/(nvirb*nvira**2*3+nocca*noccb*nvira*2)), 2)
+    log.debug1('OVvv blksize %d', blksize)
     for p0,p1 in lib.prange(0, noccb, blksize):
         OVvv = np.asarray(eris.OVvv[p0:p1]).reshape((p1-p0)*nvirb,-1)
         OVvv = lib.unpack_tril(OVvv).reshape(-1,nvirb,nvira,nvira)
@@ -550,6 +594,10 @@ class UCCSD(rccsd.RCCSD):
 
     def ipccsd_matvec(self, vector):
         # Ref: Tu, Wang, and Li, J. Chem. Phys. 136, 174102 (2012) Eqs.(8)-(9)
+        vector = np.asarray(vector)
+        if vector.ndim == 2:
+            # RCCSD.ipccsd passes all trial vectors of a Davidson iteration
+            return np.asarray([self.ipccsd_matvec(x) for x in vector])
         if not hasattr(self,'imds'):
             self.imds = _IMDS(self)
         if not self.imds.made_ip_imds:
@@ -641,6 +689,10 @@ class UCCSD(rccsd.RCCSD):
 
     def eaccsd_matvec(self,vector):
         # Ref: Nooijen and Bartlett, J. Chem. Phys. 102, 3629 (1994) Eqs.(30)-(31)
+        vector = np.asarray(vector)
+        if vector.ndim == 2:
+            # RCCSD.eaccsd passes all trial vectors of a Davidson iteration
+            return np.asarray([self.eaccsd_matvec(x) for x in vector])
         if not hasattr(self,'imds'):
             self.imds = _IMDS(self)
         if not self.imds.made_ea_imds:
@@ -2023,6 +2075,24 @@ class _ERISspin:
 
         log.timer('CCSD integral transformation', *cput0)
 
+def _mem_usage(nocca, noccb, nvira, nvirb):
+    '''Estimated memory (in MB) for the spin-blocked UCCSD.
+
+    Returns:
+        incore : the aa, bb, ab and ba MO integrals held in memory during the
+            in-core integral transformation.
+        outcore : the amplitudes, the o^2v^2 integral blocks and the
+            intermediates held in memory by update_amps when the ovvv and
+            vvvv integrals are read from disk.
+    '''
+    nmoa = nocca + nvira
+    nmob = noccb + nvirb
+    incore = nmoa**4 + nmob**4 + nmoa**2*nmob**2*2
+    nov2 = (nocca*nvira + noccb*nvirb)**2
+    # t2, t2new, tau, 6 W(ovvo) intermediates and the o^2v^2 integrals
+    outcore = nov2 * 12
+    return incore*8/1e6, outcore*8/1e6
+
 class _ERIS:
     def __init__(self, cc, mo_coeff=None, method='incore',
                  ao2mofn=ao2mo.outcore.general_iofree):
@@ -2039,8 +2109,13 @@ class _ERIS:
         nocc = cc.nocc
         nmo = cc.nmo
         nvir = nmo - nocc
-        mem_incore, mem_outcore, mem_basic = rccsd._mem_usage(nocc, nvir)
+        nocca = int(cc.mo_occ[0][moidx[0]].sum())
+        noccb = int(cc.mo_occ[1][moidx[1]].sum())
+        nvira = mo_coeff[0].shape[1] - nocca
+        nvirb = mo_coeff[1].shape[1] - noccb
+        mem_incore, mem_outcore = _mem_usage(nocca, noccb, nvira, nvirb)
         mem_now = lib.current_memory()[0]
+        max_memory = max(100, cc.max_memory - mem_now)
 
         fock, so_coeff, self.orbspin = uspatial2spin(cc, moidx, mo_coeff)
         idxa = self.orbspin == 0
@@ -2057,6 +2132,7 @@ class _ERIS:
             pass
         elif (method == 'incore' and cc._scf._eri is not None and
             (mem_incore+mem_now < cc.max_memory) or cc.mol.incore_anyway):
+            log.debug('UCCSD MO integrals in core')
             moa = so_coeff[:,idxa]
             mob = so_coeff[:,idxb]
             nmoa = moa.shape[1]
@@ -2126,14 +2202,19 @@ class _ERIS:
             OVvv = None
             #self.VVvv = eri_ba[noccb:,noccb:,nocca:,nocca:].copy()
         else:
+            log.debug('UCCSD MO integrals on disk, max_memory %d MB '
+                      '(estimated %d MB for incore integrals, %d MB for '
+                      'CCSD iterations)', max_memory, mem_incore, mem_outcore)
+            if mem_outcore+mem_now > cc.max_memory:
+                log.warn('Not enough memory for out-of-core UCCSD. '
+                         'Estimated %d MB, max_memory %d MB. '
+                         'T2 amplitudes and DIIS vectors are kept on disk',
+                         mem_outcore+mem_now, cc.max_memory)
+                self.outcore_amps = True
             moa = so_coeff[:,idxa]
             mob = so_coeff[:,idxb]
             nmoa = moa.shape[1]
             nmob = mob.shape[1]
-            nocca = int(cc.mo_occ[0][moidx[0]].sum())
-            noccb = int(cc.mo_occ[1][moidx[1]].sum())
-            nvira = nmoa - nocca
-            nvirb = nmob - noccb
 
             orboa = moa[:,:nocca]
             orbob = mob[:,:noccb]
@@ -2178,73 +2259,88 @@ class _ERIS:
             cput1 = time.clock(), time.time()
             # <ij||pq> = <ij|pq> - <ij|qp> = (ip|jq) - (iq|jp)
             tmpfile2 = tempfile.NamedTemporaryFile(dir=lib.param.TMPDIR)
-            ao2mo.general(cc.mol, (orboa,moa,moa,moa), tmpfile2.name, 'aa')
+            ao2mo.general(cc.mol, (orboa,moa,moa,moa), tmpfile2.name, 'aa',
+                          max_memory=max_memory, verbose=log)
             with h5py.File(tmpfile2.name) as f:
-                buf = numpy.empty((nmoa,nmoa,nmoa))
-                for i in range(nocca):
-                    lib.unpack_tril(f['aa'][i*nmoa:(i+1)*nmoa], out=buf)
-                    self.oooo[i] = buf[:nocca,:nocca,:nocca]
-                    self.ooov[i] = buf[:nocca,:nocca,nocca:]
-                    self.ovoo[i] = buf[nocca:,:nocca,:nocca]
-                    self.ovov[i] = buf[nocca:,:nocca,nocca:]
-                    self.oovo[i] = buf[:nocca,nocca:,:nocca]
-                    self.oovv[i] = buf[:nocca,nocca:,nocca:]
-                    self.ovvo[i] = buf[nocca:,nocca:,:nocca]
-                    self.ovvv[i] = lib.pack_tril(buf[nocca:,nocca:,nocca:])
+                blksize = max(1, int(max_memory*.4e6/8/nmoa**3))
+                for p0, p1 in lib.prange(0, nocca, blksize):
+                    buf = lib.unpack_tril(f['aa'][p0*nmoa:p1*nmoa])
+                    buf = buf.reshape(p1-p0,nmoa,nmoa,nmoa)
+                    self.oooo[p0:p1] = buf[:,:nocca,:nocca,:nocca]
+                    self.ooov[p0:p1] = buf[:,:nocca,:nocca,nocca:]
+                    self.ovoo[p0:p1] = buf[:,nocca:,:nocca,:nocca]
+                    self.ovov[p0:p1] = buf[:,nocca:,:nocca,nocca:]
+                    self.oovo[p0:p1] = buf[:,:nocca,nocca:,:nocca]
+                    self.oovv[p0:p1] = buf[:,:nocca,nocca:,nocca:]
+                    self.ovvo[p0:p1] = buf[:,nocca:,nocca:,:nocca]
+                    ovvv = buf[:,nocca:,nocca:,nocca:].reshape(-1,nvira,nvira)
+                    self.ovvv[p0:p1] = lib.pack_tril(ovvv).reshape(p1-p0,nvira,-1)
+                    buf = ovvv = None
                 del(f['aa'])
-                buf = None
 
-            ao2mo.general(cc.mol, (orbob,mob,mob,mob), tmpfile2.name, 'bb')
+            ao2mo.general(cc.mol, (orbob,mob,mob,mob), tmpfile2.name, 'bb',
+                          max_memory=max_memory, verbose=log)
             with h5py.File(tmpfile2.name) as f:
-                buf = numpy.empty((nmob,nmob,nmob))
-                for i in range(noccb):
-                    lib.unpack_tril(f['bb'][i*nmob:(i+1)*nmob], out=buf)
-                    self.OOOO[i] = buf[:noccb,:noccb,:noccb]
-                    self.OOOV[i] = buf[:noccb,:noccb,noccb:]
-                    self.OVOO[i] = buf[noccb:,:noccb,:noccb]
-                    self.OVOV[i] = buf[noccb:,:noccb,noccb:]
-                    self.OOVO[i] = buf[:noccb,noccb:,:noccb]
-                    self.OOVV[i] = buf[:noccb,noccb:,noccb:]
-                    self.OVVO[i] = buf[noccb:,noccb:,:noccb]
-                    self.OVVV[i] = lib.pack_tril(buf[noccb:,noccb:,noccb:])
+                blksize = max(1, int(max_memory*.4e6/8/nmob**3))
+                for p0, p1 in lib.prange(0, noccb, blksize):
+                    buf = lib.unpack_tril(f['bb'][p0*nmob:p1*nmob])
+                    buf = buf.reshape(p1-p0,nmob,nmob,nmob)
+                    self.OOOO[p0:p1] = buf[:,:noccb,:noccb,:noccb]
+                    self.OOOV[p0:p1] = buf[:,:noccb,:noccb,noccb:]
+                    self.OVOO[p0:p1] = buf[:,noccb:,:noccb,:noccb]
+                    self.OVOV[p0:p1] = buf[:,noccb:,:noccb,noccb:]
+                    self.OOVO[p0:p1] = buf[:,:noccb,noccb:,:noccb]
+                    self.OOVV[p0:p1] = buf[:,:noccb,noccb:,noccb:]
+                    self.OVVO[p0:p1] = buf[:,noccb:,noccb:,:noccb]
+                    OVVV = buf[:,noccb:,noccb:,noccb:].reshape(-1,nvirb,nvirb)
+                    self.OVVV[p0:p1] = lib.pack_tril(OVVV).reshape(p1-p0,nvirb,-1)
+                    buf = OVVV = None
                 del(f['bb'])
-                buf = None
 
-            ao2mo.general(cc.mol, (orboa,moa,mob,mob), tmpfile2.name, 'ab')
+            ao2mo.general(cc.mol, (orboa,moa,mob,mob), tmpfile2.name, 'ab',
+                          max_memory=max_memory, verbose=log)
             with h5py.File(tmpfile2.name) as f:
-                buf = numpy.empty((nmoa,nmob,nmob))
-                for i in range(nocca):
-                    lib.unpack_tril(f['ab'][i*nmoa:(i+1)*nmoa], out=buf)
-                    self.ooOO[i] = buf[:nocca,:noccb,:noccb]
-                    self.ooOV[i] = buf[:nocca,:noccb,noccb:]
-                    self.ovOO[i] = buf[nocca:,:noccb,:noccb]
-                    self.ovOV[i] = buf[nocca:,:noccb,noccb:]
-                    self.ooVO[i] = buf[:nocca,noccb:,:noccb]
-                    self.ooVV[i] = buf[:nocca,noccb:,noccb:]
-                    self.ovVO[i] = buf[nocca:,noccb:,:noccb]
-                    self.ovVV[i] = lib.pack_tril(buf[nocca:,noccb:,noccb:])
+                blksize = max(1, int(max_memory*.4e6/8/(nmoa*nmob**2)))
+                for p0, p1 in lib.prange(0, nocca, blksize):
+                    buf = lib.unpack_tril(f['ab'][p0*nmoa:p1*nmoa])
+                    buf = buf.reshape(p1-p0,nmoa,nmob,nmob)
+                    self.ooOO[p0:p1] = buf[:,:nocca,:noccb,:noccb]
+                    self.ooOV[p0:p1] = buf[:,:nocca,:noccb,noccb:]
+                    self.ovOO[p0:p1] = buf[:,nocca:,:noccb,:noccb]
+                    self.ovOV[p0:p1] = buf[:,nocca:,:noccb,noccb:]
+                    self.ooVO[p0:p1] = buf[:,:nocca,noccb:,:noccb]
+                    self.ooVV[p0:p1] = buf[:,:nocca,noccb:,noccb:]
+                    self.ovVO[p0:p1] = buf[:,nocca:,noccb:,:noccb]
+                    ovVV = buf[:,nocca:,noccb:,noccb:].reshape(-1,nvirb,nvirb)
+                    self.ovVV[p0:p1] = lib.pack_tril(ovVV).reshape(p1-p0,nvira,-1)
+                    buf = ovVV = None
                 del(f['ab'])
-                buf = None
 
-            ao2mo.general(cc.mol, (orbob,mob,moa,moa), tmpfile2.name, 'ba')
+            ao2mo.general(cc.mol, (orbob,mob,moa,moa), tmpfile2.name, 'ba',
+                          max_memory=max_memory, verbose=log)
             with h5py.File(tmpfile2.name) as f:
-                buf = numpy.empty((nmob,nmoa,nmoa))
-                for i in range(noccb):
-                    lib.unpack_tril(f['ba'][i*nmob:(i+1)*nmob], out=buf)
-                    self.OOov[i] = buf[:noccb,:nocca,nocca:]
-                    self.OVoo[i] = buf[noccb:,:nocca,:nocca]
-                    self.OOvo[i] = buf[:noccb,nocca:,:nocca]
-                    self.OOvv[i] = buf[:noccb,nocca:,nocca:]
-                    self.OVvo[i] = buf[noccb:,nocca:,:nocca]
-                    self.OVvv[i] = lib.pack_tril(buf[noccb:,nocca:,nocca:])
+                blksize = max(1, int(max_memory*.4e6/8/(nmob*nmoa**2)))
+                for p0, p1 in lib.prange(0, noccb, blksize):
+                    buf = lib.unpack_tril(f['ba'][p0*nmob:p1*nmob])
+                    buf = buf.reshape(p1-p0,nmob,nmoa,nmoa)
+                    self.OOov[p0:p1] = buf[:,:noccb,:nocca,nocca:]
+                    self.OVoo[p0:p1] = buf[:,noccb:,:nocca,:nocca]
+                    self.OOvo[p0:p1] = buf[:,:noccb,nocca:,:nocca]
+                    self.OOvv[p0:p1] = buf[:,:noccb,nocca:,nocca:]
+                    self.OVvo[p0:p1] = buf[:,noccb:,nocca:,:nocca]
+                    OVvv = buf[:,noccb:,nocca:,nocca:].reshape(-1,nvira,nvira)
+                    self.OVvv[p0:p1] = lib.pack_tril(OVvv).reshape(p1-p0,nvirb,-1)
+                    buf = OVvv = None
                 del(f['ba'])
-                buf = None
 
             cput1 = log.timer_debug1('transforming oopq, ovpq', *cput1)
 
-            ao2mo.full(cc.mol, orbva, self.feri, dataname='vvvv')
-            ao2mo.full(cc.mol, orbvb, self.feri, dataname='VVVV')
-            ao2mo.general(cc.mol, (orbva,orbva,orbvb,orbvb), self.feri, dataname='vvVV')
+            ao2mo.full(cc.mol, orbva, self.feri, dataname='vvvv',
+                       max_memory=max_memory, verbose=log)
+            ao2mo.full(cc.mol, orbvb, self.feri, dataname='VVVV',
+                       max_memory=max_memory, verbose=log)
+            ao2mo.general(cc.mol, (orbva,orbva,orbvb,orbvb), self.feri, dataname='vvVV',
+                          max_memory=max_memory, verbose=log)
             self.vvvv = self.feri['vvvv']
             self.VVVV = self.feri['VVVV']
             self.vvVV = self.feri['vvVV']
@@ -526,7 +526,8 @@ class CISD(lib.StreamObject):
             time0 = logger.timer_debug1(self, 'vvvv-tau', *time0)
 
             ao2mopt = _ao2mo.AO2MOpt(mol, 'cint2e_sph', 'CVHFnr_schwarz_cond',
-                                     'CVHFsetnr_direct_scf')
+                                     'CVHFsetnr_direct_scf',
+                                     mol.shell_pair_list())
             outbuf[:] = 0
             ao_loc = mol.ao_loc_nr()
             max_memory = max(0, self.max_memory - lib.current_memory()[0])
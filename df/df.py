@@ -36,6 +36,15 @@ class DF(lib.StreamObject):
         self._cderi = None
         self._call_count = 0
         self.blockdim = 240
+# Store only the significant AO pairs of the Cholesky decomposed integrals.
+# The integrals are in the block-sparse format, see incore.cholesky_eri_sparse
+        self.sparse = False
+        self.sparse_cutoff = 1e-14
+        self._cderi_pair_idx = None
+# Pair-atomic local fitting for K, see df_jk.get_k_local.  J is computed with
+# the full auxiliary basis.
+        self.local_k = False
+        self._local_fit = None
         self._keys = set(self.__dict__.keys())
 
     def dump_flags(self):
@@ -44,6 +53,10 @@ class DF(lib.StreamObject):
         logger.info(self, '******** %s flags ********', self.__class__)
         logger.info(self, 'auxbasis = %s', self.auxbasis)
         logger.info(self, 'max_memory = %s', self.max_memory)
+        if self.sparse:
+            logger.info(self, 'sparse cderi, cutoff = %g', self.sparse_cutoff)
+        if self.local_k:
+            logger.info(self, 'local density fitting for K')
         if isinstance(self._cderi, str):
             logger.info(self, '_cderi = %s', self._cderi)
         else:
@@ -59,6 +72,10 @@ class DF(lib.StreamObject):
         nao_pair = nao*(nao+1)//2
 
         max_memory = (self.max_memory - lib.current_memory()[0]) * .8
+        self._cderi_pair_idx = None
+        self._local_fit = None
+        if self.sparse:
+            return self._build_sparse(max_memory, log)
         if nao_pair*naux*3*8/1e6 < max_memory:
             self._cderi = incore.cholesky_eri(mol, auxmol=auxmol, verbose=log)
         else:
@@ -77,15 +94,74 @@ class DF(lib.StreamObject):
 
         return self
 
-    def loop(self):
+    def _build_sparse(self, max_memory, log):
+        t0 = (time.clock(), time.time())
+        mol = self.mol
+        auxmol = self.auxmol
+        naux = auxmol.nao_nr()
+        spl = incore.sparse_shell_pairs(mol, auxmol, self.sparse_cutoff)[0]
+        ncol = incore.sparse_pair_loc(mol, spl.pairs)[0][-1]
+        if naux*ncol*2*8/1e6 < max_memory:
+            self._cderi, self._cderi_pair_idx = \
+                    incore.cholesky_eri_sparse(mol, auxmol=auxmol, verbose=log,
+                                               cutoff=self.sparse_cutoff,
+                                               max_memory=max_memory)
+        else:
+            if not isinstance(self._cderi, str):
+                if isinstance(self._cderi_file, str):
+                    self._cderi = self._cderi_file
+                else:
+                    self._cderi = self._cderi_file.name
+            outcore.cholesky_eri_sparse(mol, self._cderi, dataname='j3c',
+                                        auxmol=auxmol, cutoff=self.sparse_cutoff,
+                                        max_memory=max_memory, verbose=log)
+            with h5py.File(self._cderi, 'r') as f:
+                self._cderi_pair_idx = numpy.asarray(f['j3c_pair_idx'])
+        log.timer_debug1('Generate sparse density fitting integrals', *t0)
+        return self
+
+    def loop(self, compressed=False):
+        '''Loop over the blocks of the Cholesky decomposed integrals
+        (naux_blk,nao_pair).  If compressed is set and the integrals are
+        stored in the block-sparse format (see :attr:`sparse`), the blocks
+        are (naux_blk,ncol) and the columns are given by
+        :attr:`_cderi_pair_idx`.
+        '''
         if self._cderi is None:
             self.build()
+        pair_idx = self._cderi_pair_idx
+        if pair_idx is not None and not compressed:
+            nao = self.mol.nao_nr()
+            nao_pair = nao * (nao+1) // 2
         with addons.load(self._cderi, 'j3c') as feri:
             naoaux = feri.shape[0]
             for b0, b1 in self.prange(0, naoaux, self.blockdim):
                 eri1 = numpy.asarray(feri[b0:b1], order='C')
+                if pair_idx is not None and not compressed:
+                    eri1 = incore.unpack_sparse(eri1, pair_idx, nao_pair)
                 yield eri1
 
+    def loop_mo(self, mo_coeff, ijslice):
+        '''Loop over the blocks of the MO integrals (naux_blk,nij),
+        _ao2mo.nr_e2(eri1, mo_coeff, ijslice, aosym='s2') of the blocks of
+        :meth:`loop`.  The block-sparse integrals are transformed in the
+        compressed format (see :func:`incore.sparse_e2`).
+        '''
+        if self._cderi is None:
+            self.build()
+        mo = numpy.asarray(mo_coeff, order='F')
+        pair_idx = self._cderi_pair_idx
+        Lij = None
+        if pair_idx is None:
+            for eri1 in self.loop():
+                Lij = _ao2mo.nr_e2(eri1, mo, ijslice, aosym='s2', out=Lij)
+                yield Lij
+        else:
+            pattern = incore.sparse_tril_pattern(pair_idx, mo.shape[0])
+            for eri1 in self.loop(compressed=True):
+                Lij = incore.sparse_e2(eri1, pattern, mo, ijslice, out=Lij)
+                yield Lij
+
     def prange(self, start, end, step):
         self._call_count += 1
         if self._call_count % 2 == 1:
@@ -104,6 +180,12 @@ class DF(lib.StreamObject):
             return feri.shape[0]
 
     def get_jk(self, dm, hermi=1, vhfopt=None, with_j=True, with_k=True):
+        if self.local_k and with_k:
+            vj = None
+            if with_j:
+                vj = df_jk.get_jk(self, dm, hermi, vhfopt, with_j, False)[0]
+            vk = df_jk.get_k_local(self, dm, hermi)
+            return vj, vk
         return df_jk.get_jk(self, dm, hermi, vhfopt, with_j, with_k)
 
     def get_eri(self):
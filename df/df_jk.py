@@ -10,12 +10,16 @@ from functools import reduce
 import numpy
 import scipy.linalg
 from pyscf import lib
+from pyscf import gto
 from pyscf.lib import logger
 from pyscf.ao2mo import _ao2mo
 from pyscf.df import _ri
+from pyscf.df import incore
 
 
 OCCDROP = 1e-12
+# Eigenvalues of the local fitting metric below this value are dropped
+LINDEP_THRESHOLD = 1e-9
 
 def density_fit(mf, auxbasis='weigend+etb', with_df=None):
     '''For the given SCF object, update the J, K matrix constructor with
@@ -153,6 +157,8 @@ def get_jk(dfobj, dms, hermi=1, vhfopt=None, with_j=True, with_k=True):
     if hermi == 1: # and numpy.einsum('ij,ij->', dm, ovlp) > 0.1
 # I cannot assume dm is positive definite because it might be the density
 # matrix difference when the mf.direct_scf flag is set.
+        pair_idx = getattr(dfobj, '_cderi_pair_idx', None)
+        nao_pair = nao * (nao+1) // 2
         dmtril = []
         cpos = []
         cneg = []
@@ -161,6 +167,8 @@ def get_jk(dfobj, dms, hermi=1, vhfopt=None, with_j=True, with_k=True):
                 dmtril.append(lib.pack_tril(dm+dm.T))
                 i = numpy.arange(nao)
                 dmtril[k][i*(i+1)//2+i] *= .5
+                if pair_idx is not None:
+                    dmtril[k] = dmtril[k][pair_idx]
 
             if with_k:
                 e, c = scipy.linalg.eigh(dm)
@@ -174,13 +182,23 @@ def get_jk(dfobj, dms, hermi=1, vhfopt=None, with_j=True, with_k=True):
                 tmp = numpy.einsum('ij,j->ij', c[:,neg], numpy.sqrt(-e[neg]))
                 cneg.append(numpy.asarray(tmp, order='F'))
         buf = numpy.empty((dfobj.blockdim*nao,nao))
-        for eri1 in dfobj.loop():
-            naux, nao_pair = eri1.shape
-            assert(nao_pair == nao*(nao+1)//2)
+# For the block-sparse cderi, J is computed with the compressed AO pairs
+        if pair_idx is None:
+            vjtril = numpy.zeros((nset,nao_pair))
+            loop = dfobj.loop()
+        else:
+            vjtril = numpy.zeros((nset,len(pair_idx)))
+            loop = dfobj.loop(compressed=True)
+        for eri1 in loop:
+            erij = eri1
+            if pair_idx is None:
+                assert(eri1.shape[1] == nao_pair)
+            elif with_k:
+                eri1 = incore.unpack_sparse(eri1, pair_idx, nao_pair)
+            naux = eri1.shape[0]
             for k in range(nset):
                 if with_j:
-                    buf1 = reduce(numpy.dot, (eri1, dmtril[k], eri1))
-                    vj[k] += lib.unpack_tril(buf1, hermi)
+                    vjtril[k] += reduce(numpy.dot, (erij, dmtril[k], erij))
                 if with_k and cpos[k].shape[1] > 0:
                     buf1 = buf[:naux*cpos[k].shape[1]]
                     fdrv(ftrans, fmmm,
@@ -202,6 +220,12 @@ def get_jk(dfobj, dms, hermi=1, vhfopt=None, with_j=True, with_k=True):
                          null, ctypes.c_int(0))
                     vk[k] -= lib.dot(buf1.T, buf1)
             t1 = log.timer_debug1('jk', *t1)
+        if with_j:
+            if pair_idx is not None:
+                vjtril, vjc = numpy.zeros((nset,nao_pair)), vjtril
+                vjtril[:,pair_idx] = vjc
+            for k in range(nset):
+                vj[k] = lib.unpack_tril(vjtril[k], hermi)
     else:
         #:vk = numpy.einsum('pij,jk->pki', cderi, dm)
         #:vk = numpy.einsum('pki,pkj->ij', cderi, vk)
@@ -234,6 +258,195 @@ def get_jk(dfobj, dms, hermi=1, vhfopt=None, with_j=True, with_k=True):
     return vj, vk
 
 
+def get_k_local(dfobj, dms, hermi=1):
+    '''Exchange matrix with pair-atomic local density fitting.
+
+    The AO pairs of atoms (A,B) are fitted with the auxiliary functions of A
+    and B only, using the Coulomb metric of this local domain
+
+        C^{AB}_{mu nu,P} = \sum_{Q in AB} (mu nu|Q) [J_{AB}^{-1}]_{QP}
+
+    and the exchange integrals are approximated by the symmetrized expression
+
+        (mu la|nu si) ~ 1/2 [\sum_P C_{mu la,P} (P|nu si)
+                           + \sum_Q (mu la|Q) C_{nu si,Q}]
+
+    Each row mu of K then only involves the auxiliary functions of the atoms
+    near mu (the domain of the atom of mu).  The fitting coefficients are
+    computed in the first call and saved in dfobj._local_fit.  The
+    intermediates are held per atom in the local auxiliary index of the
+    domain, and the 3-center integrals (P|nu si) are evaluated for one atom
+    of P at a time.  The memory is thus O(N^2) for the extended systems.
+    '''
+    t0 = t1 = (time.clock(), time.time())
+    log = logger.Logger(dfobj.stdout, dfobj.verbose)
+    mol = dfobj.mol
+    if dfobj.auxmol is None:
+        dfobj.auxmol = incore.format_aux_basis(mol, dfobj.auxbasis)
+    auxmol = dfobj.auxmol
+
+    if isinstance(dms, numpy.ndarray) and dms.ndim == 2:
+        dms = [dms]
+        is_single_dm = True
+    else:
+        is_single_dm = False
+    nset = len(dms)
+    nao = dms[0].shape[0]
+    if hermi != 1:
+# The second half of the symmetrized integrals gives K'[dm^T]^T
+        dms = list(dms) + [dm.T for dm in dms]
+
+# dm = L R^T
+    dm_l = []
+    dm_r = []
+    for dm in dms:
+        if hermi == 1:
+            e, c = scipy.linalg.eigh(dm)
+            idx = abs(e) > OCCDROP
+            dm_l.append(c[:,idx] * e[idx])
+            dm_r.append(c[:,idx])
+        else:
+            u, s, vh = scipy.linalg.svd(dm)
+            idx = s > OCCDROP
+            dm_l.append(u[:,idx] * s[idx])
+            dm_r.append(vh[idx].T)
+
+    atm, bas, env, ao_loc = incore._env_and_aoloc('cint3c2e_sph', mol, auxmol)
+    cintopt = gto.moleintor.make_cintopt(atm, bas, env, 'cint3c2e_sph')
+    aoslices = _aoslice_by_atom(mol)
+    auxslices = _aoslice_by_atom(auxmol)
+    atom_pairs = _significant_atom_pairs(mol)
+    if dfobj._local_fit is None:
+        dfobj._local_fit = _local_fit_coeffs(mol, auxmol, atom_pairs, log)
+        t1 = log.timer_debug1('local fitting of %d atom pairs' % len(atom_pairs), *t1)
+
+# The domain of atom A are the atoms paired with A.  The auxiliary functions
+# of the domain are indexed locally, in the order of the domain atoms.
+    domains = [set([ia]) for ia in range(mol.natm)]
+    for ia, ja in atom_pairs:
+        domains[ia].add(ja)
+        domains[ja].add(ia)
+    domains = [sorted(x) for x in domains]
+    dom_loc = []
+    for ia in range(mol.natm):
+        naux_atm = [auxslices[ja][3]-auxslices[ja][2] for ja in domains[ia]]
+        offsets = numpy.append(0, numpy.cumsum(naux_atm))
+        dom_loc.append(dict(zip(domains[ia], zip(offsets[:-1], offsets[1:]))))
+    def dom_idx(ia, ja):
+        return numpy.arange(*dom_loc[ia][ja])
+
+    # bvec[k][A][mu,P,i] = \sum_la C_{mu la,P} L_{la,i}, P in the domain of A
+    bvec = [[numpy.zeros((aoslices[ia][3]-aoslices[ia][2],
+                          dom_loc[ia][domains[ia][-1]][1], x.shape[1]))
+             for ia in range(mol.natm)] for x in dm_l]
+    for n, (ia, ja) in enumerate(atom_pairs):
+        i0, i1 = aoslices[ia][2:]
+        j0, j1 = aoslices[ja][2:]
+        cfit = dfobj._local_fit[n]
+        if ia == ja:
+            pidx = dom_idx(ia, ia)
+            for k in range(len(dms)):
+                bvec[k][ia][:,pidx] += numpy.einsum('pmn,ni->mpi', cfit, dm_l[k][j0:j1])
+        else:
+            pidx = numpy.append(dom_idx(ia, ia), dom_idx(ia, ja))
+            qidx = numpy.append(dom_idx(ja, ia), dom_idx(ja, ja))
+            for k in range(len(dms)):
+                bvec[k][ia][:,pidx] += numpy.einsum('pmn,ni->mpi', cfit, dm_l[k][j0:j1])
+                bvec[k][ja][:,qidx] += numpy.einsum('pmn,mi->npi', cfit, dm_l[k][i0:i1])
+    t1 = log.timer_debug1('local bvec', *t1)
+
+    vk = numpy.zeros((len(dms),nao,nao))
+    for ka in range(auxmol.natm):
+        ksh0, ksh1, k0, k1 = auxslices[ka]
+        if k0 == k1:
+            continue
+        shls_slice = (0, mol.nbas, 0, mol.nbas,
+                      mol.nbas+ksh0, mol.nbas+ksh1)
+        j3c = gto.moleintor.getints3c('cint3c2e_sph', atm, bas, env,
+                                      shls_slice, 1, 's1', ao_loc, cintopt)
+        j3c = j3c.reshape(nao,nao,k1-k0)
+        for k in range(len(dms)):
+            # evec[P,i,nu] = \sum_si (P|nu si) R_{si,i}, P on atom ka
+            evec = numpy.einsum('nsp,si->pin', j3c, dm_r[k]).reshape(-1,nao)
+            for ia in domains[ka]:
+                i0, i1 = aoslices[ia][2:]
+                if i0 == i1:
+                    continue
+                pidx = dom_idx(ia, ka)
+                vk[k,i0:i1] += lib.dot(bvec[k][ia][:,pidx].reshape(i1-i0,-1), evec)
+    j3c = evec = bvec = None
+    if hermi == 1:
+        vk = (vk + vk.transpose(0,2,1)) * .5
+    else:
+        vk = (vk[:nset] + vk[nset:].transpose(0,2,1)) * .5
+
+    if is_single_dm:
+        vk = vk[0]
+    logger.timer(dfobj, 'local vk', *t0)
+    return vk
+
+def _local_fit_coeffs(mol, auxmol, atom_pairs, log):
+    '''The fitting coefficients C^{AB}_{P,mu nu} of each atom pair (A,B),
+    P over the auxiliary functions of A then those of B.'''
+    atm, bas, env, ao_loc = incore._env_and_aoloc('cint3c2e_sph', mol, auxmol)
+    cintopt = gto.moleintor.make_cintopt(atm, bas, env, 'cint3c2e_sph')
+    aoslices = _aoslice_by_atom(mol)
+    auxslices = _aoslice_by_atom(auxmol)
+    j2c = incore.fill_2c2e(mol, auxmol)
+    local_fit = []
+    for ia, ja in atom_pairs:
+        ish0, ish1, i0, i1 = aoslices[ia]
+        jsh0, jsh1, j0, j1 = aoslices[ja]
+        if ia == ja:
+            fit_atoms = (ia,)
+        else:
+            fit_atoms = (ia, ja)
+        j3c = []
+        pidx = []
+        for ka in fit_atoms:
+            ksh0, ksh1, k0, k1 = auxslices[ka]
+            shls_slice = (ish0, ish1, jsh0, jsh1,
+                          mol.nbas+ksh0, mol.nbas+ksh1)
+            j3c.append(gto.moleintor.getints3c('cint3c2e_sph', atm, bas, env,
+                                               shls_slice, 1, 's1', ao_loc,
+                                               cintopt).reshape(-1,k1-k0))
+            pidx.append(numpy.arange(k0, k1))
+        j3c = numpy.hstack(j3c)
+        pidx = numpy.hstack(pidx)
+        cfit = _local_solve(j2c[pidx[:,None],pidx], j3c.T, log)
+        local_fit.append(cfit.reshape(-1,i1-i0,j1-j0))
+    return local_fit
+
+def _local_solve(j2c, rhs, log):
+    '''Solve j2c x = rhs.  The eigenvectors of j2c with small eigenvalues are
+    projected out if the local metric is ill-conditioned.'''
+    try:
+        return scipy.linalg.cho_solve(scipy.linalg.cho_factor(j2c), rhs)
+    except scipy.linalg.LinAlgError:
+        w, v = scipy.linalg.eigh(j2c)
+        idx = w > LINDEP_THRESHOLD
+        log.debug('ill-conditioned local metric, %d linearly dependent '
+                  'auxiliary functions are removed', w.size-numpy.count_nonzero(idx))
+        v = v[:,idx]
+        return numpy.dot(v/w[idx], numpy.dot(v.T, rhs))
+
+def _aoslice_by_atom(mol):
+    '''(shell-start, shell-stop, AO-start, AO-stop) of each atom.  The
+    ranges are empty for the atoms without basis functions.'''
+    ao_loc = mol.ao_loc_nr()
+    bas_atom = mol._bas[:,gto.ATOM_OF]
+    sh0 = numpy.searchsorted(bas_atom, numpy.arange(mol.natm), 'left')
+    sh1 = numpy.searchsorted(bas_atom, numpy.arange(mol.natm), 'right')
+    return numpy.vstack((sh0, sh1, ao_loc[sh0], ao_loc[sh1])).T
+
+def _significant_atom_pairs(mol):
+    '''Atom pairs (A,B), A >= B, which have significant shell pairs'''
+    bas_atom = mol._bas[:,gto.ATOM_OF]
+    pairs = bas_atom[mol.shell_pair_list().pairs]
+    pairs = numpy.unique(pairs[:,0] * mol.natm + pairs[:,1])
+    return numpy.vstack((pairs // mol.natm, pairs % mol.natm)).T
+
+
 def r_get_jk(dfobj, dms, hermi=1):
     '''Relativistic density fitting JK'''
     t0 = t1 = (time.clock(), time.time())
@@ -39,13 +39,19 @@ def format_aux_basis(mol, auxbasis='weigend+etb'):
 
 
 # (ij|L)
-def aux_e2(mol, auxmol, intor='cint3c2e_sph', aosym='s1', comp=1, out=None):
+def aux_e2(mol, auxmol, intor='cint3c2e_sph', aosym='s1', comp=1, out=None,
+           shell_pairs=None):
     '''3-center AO integrals (ij|L), where L is the auxiliary basis.
+
+    Kwargs:
+        shell_pairs : :class:`pyscf.gto.shellpair.ShellPairList`
+            If given, only the significant AO shell pairs are evaluated.  The
+            integrals of the other pairs are 0.
     '''
     atm, bas, env, ao_loc = _env_and_aoloc(intor, mol, auxmol)
     shls_slice = (0, mol.nbas, 0, mol.nbas, mol.nbas, mol.nbas+auxmol.nbas)
     return _ri.nr_auxe2(intor, atm, bas, env, shls_slice, ao_loc,
-                        aosym, comp, out=out)
+                        aosym, comp, out=out, shell_pairs=shell_pairs)
 
 # (L|ij)
 def aux_e1(mol, auxmol, intor='cint3c2e_sph', aosym='s1', comp=1, out=None):
@@ -66,7 +72,8 @@ def fill_2c2e(mol, auxmol, intor='cint2c2e_sph', comp=1, hermi=1, out=None):
 
 # Note the temporary memory usage is about twice as large as the return cderi
 # array
-def cholesky_eri(mol, auxbasis='weigend+etb', auxmol=None, verbose=0):
+def cholesky_eri(mol, auxbasis='weigend+etb', auxmol=None, verbose=0,
+                 shell_pairs=None):
     '''
     Returns:
         2D array of (naux,nao*(nao+1)/2) in C-contiguous
@@ -90,7 +97,8 @@ def cholesky_eri(mol, auxbasis='weigend+etb', auxmol=None, verbose=0):
     j2c = None
     t1 = log.timer('Cholesky 2c2e', *t1)
 
-    j3c = aux_e2(mol, auxmol, intor='cint3c2e_sph', aosym='s2ij')
+    j3c = aux_e2(mol, auxmol, intor='cint3c2e_sph', aosym='s2ij',
+                 shell_pairs=shell_pairs)
     j3cT = j3c.T
     t1 = log.timer('3c2e', *t1)
     cderi = scipy.linalg.solve_triangular(low, j3c.T, lower=True,
@@ -102,6 +110,232 @@ def cholesky_eri(mol, auxbasis='weigend+etb', auxmol=None, verbose=0):
     return cderi
 
 
+def sparse_pair_loc(mol, pairs):
+    '''Layout of the AO pairs in the block-sparse 3-center integrals.
+
+    Args:
+        pairs : (npairs,2) int array
+            Shell pairs (i,j), i >= j
+
+    Returns:
+        pair_loc, pair_idx.  The AO pairs of the shell pair p are stored in
+        columns pair_loc[p]:pair_loc[p+1].  pair_idx gives the index of each
+        column in the lower triangular AO pair index (as of lib.pack_tril).
+    '''
+    ao_loc = mol.ao_loc_nr()
+    pairs = numpy.asarray(pairs).reshape(-1,2)
+    i, j = pairs.T
+    di = ao_loc[i+1] - ao_loc[i]
+    dj = ao_loc[j+1] - ao_loc[j]
+    sizes = numpy.where(i == j, di*(di+1)//2, di*dj)
+    pair_loc = numpy.zeros(len(pairs)+1, dtype=numpy.int32)
+    numpy.cumsum(sizes, out=pair_loc[1:])
+
+    pair_idx = []
+    for ish, jsh in pairs:
+        ii = numpy.arange(ao_loc[ish], ao_loc[ish+1])
+        jj = numpy.arange(ao_loc[jsh], ao_loc[jsh+1])
+        idx = (ii*(ii+1)//2)[:,None] + jj
+        if ish == jsh:
+            idx = idx[numpy.tril_indices(len(ii))]
+        pair_idx.append(idx.ravel())
+    if pair_idx:
+        pair_idx = numpy.hstack(pair_idx)
+    else:
+        pair_idx = numpy.zeros(0, dtype=int)
+    return pair_loc, pair_idx
+
+def aux_e2_sparse(mol, auxmol, pairs, pair_loc, q_pair, q_aux,
+                  cutoff=1e-14, intor='cint3c2e_sph', cintopt=None, out=None):
+    '''Block-sparse 3-center integrals (ij|L) of the given shell pairs.
+
+    Args:
+        pairs : (npairs,2) int array
+            Shell pairs (i,j), i >= j
+        pair_loc : 1D int array
+            Columns of the shell pairs, see :func:`sparse_pair_loc`
+        q_pair, q_aux : 1D arrays
+            Schwarz bounds of the shell pairs and the auxiliary shells.  The
+            blocks with q_pair * q_aux < cutoff are not evaluated.
+
+    Returns:
+        2D array (naoaux,ncol), ncol = pair_loc[-1]
+    '''
+    atm, bas, env, ao_loc = _env_and_aoloc(intor, mol, auxmol)
+    shls_slice = (0, mol.nbas, 0, mol.nbas, mol.nbas, mol.nbas+auxmol.nbas)
+    naoaux = ao_loc[-1] - ao_loc[mol.nbas]
+    pairs = numpy.asarray(pairs, dtype=numpy.int32, order='C')
+    pair_loc = numpy.asarray(pair_loc, dtype=numpy.int32, order='C')
+    q_pair = numpy.asarray(q_pair, dtype=numpy.double, order='C')
+    q_aux = numpy.asarray(q_aux, dtype=numpy.double, order='C')
+    out = numpy.ndarray((naoaux,pair_loc[-1]), buffer=out)
+    out[:] = 0
+    if cintopt is None:
+        cintopt = gto.moleintor.make_cintopt(atm, bas, env, intor)
+    libcgto = gto.moleintor.libcgto
+    libcgto.GTOnr3c_sparse_drv(getattr(libcgto, intor),
+                               out.ctypes.data_as(ctypes.c_void_p),
+                               pairs.ctypes.data_as(ctypes.c_void_p),
+                               ctypes.c_int(len(pairs)),
+                               pair_loc.ctypes.data_as(ctypes.c_void_p),
+                               q_pair.ctypes.data_as(ctypes.c_void_p),
+                               q_aux.ctypes.data_as(ctypes.c_void_p),
+                               ctypes.c_double(cutoff),
+                               (ctypes.c_int*6)(*shls_slice),
+                               ao_loc.ctypes.data_as(ctypes.c_void_p), cintopt,
+                               atm.ctypes.data_as(ctypes.c_void_p),
+                               ctypes.c_int(len(atm)),
+                               bas.ctypes.data_as(ctypes.c_void_p),
+                               ctypes.c_int(len(bas)),
+                               env.ctypes.data_as(ctypes.c_void_p))
+    return out
+
+def cholesky_eri_sparse(mol, auxbasis='weigend+etb', auxmol=None, verbose=0,
+                        cutoff=1e-14, max_memory=2000):
+    '''Cholesky decomposed 3-center integrals in the block-sparse format.
+    The AO shell pairs and the (ij|L) blocks are screened by the Schwarz
+    inequality |(ij|L)| <= sqrt((ij|ij)) sqrt((L|L)), see
+    :func:`sparse_shell_pairs`.
+
+    Returns:
+        cderi, pair_idx.  cderi is a 2D array (naux,ncol).  Column c
+        corresponds to the AO pair pair_idx[c] of the lower triangular AO
+        pair index.  The AO pairs not in pair_idx are 0.
+    '''
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(mol.stdout, verbose)
+    if auxmol is None:
+        auxmol = format_aux_basis(mol, auxbasis)
+    naoaux = auxmol.nao_nr()
+    pair_idx = None
+    cderi = None
+    for col0, col1, pair_idx, cderi_blk in \
+            _sparse_cderi_loop(mol, auxmol, cutoff, max_memory, log):
+        if cderi is None:
+            cderi = numpy.empty((naoaux,len(pair_idx)))
+        cderi[:,col0:col1] = cderi_blk
+    return cderi, pair_idx
+
+def sparse_shell_pairs(mol, auxmol, cutoff=1e-14, j2c=None):
+    '''The AO shell pairs (ij| of the block-sparse 3-center integrals.  The
+    pairs with sqrt((ij|ij)) * max_L sqrt((L|L)) < cutoff are dropped.
+
+    Returns:
+        A :class:`gto.ShellPairList` and the Schwarz bounds sqrt((L|L)) of
+        the auxiliary shells
+    '''
+    from pyscf.gto.shellpair import ShellPairList
+    if j2c is None:
+        j2c = fill_2c2e(mol, auxmol, intor='cint2c2e_sph')
+    aux_loc = auxmol.ao_loc_nr()
+    q_aux = numpy.sqrt(numpy.maximum.reduceat(j2c.diagonal(), aux_loc[:-1]))
+    spl = ShellPairList(mol, cutoff, ket_max=q_aux.max()).build()
+    return spl, q_aux
+
+def _sparse_cderi_loop(mol, auxmol, cutoff, max_memory, log):
+    '''Generate the block-sparse cderi in blocks of AO pair columns'''
+    t0 = t1 = (time.clock(), time.time())
+    j2c = fill_2c2e(mol, auxmol, intor='cint2c2e_sph')
+    naoaux = j2c.shape[0]
+    spl, q_aux = sparse_shell_pairs(mol, auxmol, cutoff, j2c)
+    try:
+        low = scipy.linalg.cholesky(j2c, lower=True)
+    except scipy.linalg.LinAlgError:
+        j2c[numpy.diag_indices(j2c.shape[1])] += 1e-14
+        low = scipy.linalg.cholesky(j2c, lower=True)
+    j2c = None
+    t1 = log.timer_debug1('Cholesky 2c2e', *t1)
+
+    pair_loc, pair_idx = sparse_pair_loc(mol, spl.pairs)
+    ncol = pair_loc[-1]
+    nao = mol.nao_nr()
+    log.debug('sparse cderi: %d of %d AO pairs, %d of %d shell pairs',
+              ncol, nao*(nao+1)//2, spl.npairs, mol.nbas*(mol.nbas+1)//2)
+
+    atm, bas, env, ao_loc = _env_and_aoloc('cint3c2e_sph', mol, auxmol)
+    cintopt = gto.moleintor.make_cintopt(atm, bas, env, 'cint3c2e_sph')
+    blksize = max(int(max_memory*.3e6/8/naoaux), 1)
+    p0 = 0
+    while p0 < spl.npairs:
+        p1 = p0 + 1
+        while p1 < spl.npairs and pair_loc[p1+1] - pair_loc[p0] <= blksize:
+            p1 += 1
+        col0, col1 = pair_loc[p0], pair_loc[p1]
+        j3c = aux_e2_sparse(mol, auxmol, spl.pairs[p0:p1],
+                            pair_loc[p0:p1+1]-col0, spl.q[p0:p1], q_aux,
+                            cutoff, cintopt=cintopt)
+        cderi = scipy.linalg.solve_triangular(low, j3c, lower=True,
+                                              overwrite_b=True)
+        yield col0, col1, pair_idx, cderi
+        t1 = log.timer_debug1('sparse cderi cols [%d:%d]' % (col0, col1), *t1)
+        p0 = p1
+    log.timer('sparse cderi', *t0)
+
+def unpack_sparse(cderi, pair_idx, nao_pair, out=None):
+    '''Expand the columns of the block-sparse cderi to the AO pairs of the
+    lower triangular AO pair index'''
+    out = numpy.ndarray((cderi.shape[0],nao_pair), buffer=out)
+    out[:] = 0
+    out[:,pair_idx] = cderi
+    return out
+
+def sparse_tril_pattern(pair_idx, nao):
+    '''CSR layout of the symmetric AO matrices of the block-sparse cderi.
+
+    Returns:
+        indices, indptr, src.  The nonzero elements of row mu are in the AO
+        columns indices[indptr[mu]:indptr[mu+1]] and they are the columns src
+        of the block-sparse cderi.
+    '''
+    pair_idx = numpy.asarray(pair_idx)
+    tril_loc = numpy.arange(nao+1) * numpy.arange(1, nao+2) // 2
+    i = numpy.searchsorted(tril_loc, pair_idx, side='right') - 1
+    j = pair_idx - tril_loc[i]
+    offdiag = i != j
+    col = numpy.arange(len(pair_idx))
+    rows = numpy.append(i, j[offdiag])
+    cols = numpy.append(j, i[offdiag])
+    src = numpy.append(col, col[offdiag])
+    order = numpy.lexsort((cols, rows))
+    indptr = numpy.searchsorted(rows[order], numpy.arange(nao+1))
+    return cols[order], indptr, src[order]
+
+def sparse_e2(cderi, pattern, mo_coeff, ijslice, out=None):
+    '''MO transformation of a block (naux_blk,ncol) of the block-sparse
+    cderi.  It is _ao2mo.nr_e2(unpack_sparse(cderi, ...), mo_coeff, ijslice,
+    aosym='s2'), computed without expanding the AO pairs.  The AO matrices
+    of the block are multiplied by mo_coeff[:,j0:j1] as sparse matrices.
+
+    Args:
+        pattern : tuple
+            The output of :func:`sparse_tril_pattern`
+
+    Returns:
+        2D array (naux_blk,(i1-i0)*(j1-j0))
+    '''
+    import scipy.sparse
+    indices, indptr, src = pattern
+    naux = cderi.shape[0]
+    nao = len(indptr) - 1
+    nnz = len(indices)
+    i0, i1, j0, j1 = ijslice
+    out = numpy.ndarray((naux,i1-i0,j1-j0), buffer=out)
+    if out.size == 0:
+        return out.reshape(naux,-1)
+    blk_ptr = (indptr[:-1] + numpy.arange(naux)[:,None] * nnz).ravel()
+    lmat = scipy.sparse.csr_matrix((cderi[:,src].ravel(),
+                                    numpy.tile(indices, naux),
+                                    numpy.append(blk_ptr, naux*nnz)),
+                                   shape=(naux*nao,nao))
+    half = lmat.dot(mo_coeff[:,j0:j1]).reshape(naux,nao,j1-j0)
+    moi = numpy.asarray(mo_coeff[:,i0:i1].T, order='C')
+    for p in range(naux):
+        pyscf.lib.dot(moi, half[p], c=out[p])
+    return out.reshape(naux,-1)
+
+
 def _env_and_aoloc(intor, mol, auxmol):
     atm, bas, env = gto.mole.conc_env(mol._atm, mol._bas, mol._env,
                                       auxmol._atm, auxmol._bas, auxmol._env)
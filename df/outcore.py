@@ -100,6 +100,40 @@ def cholesky_eri(mol, erifile, auxbasis='weigend+etb', dataname='eri_mo', tmpdir
     log.timer('cholesky_eri', *time0)
     return erifile
 
+def cholesky_eri_sparse(mol, erifile, auxbasis='weigend+etb', dataname='j3c',
+                        auxmol=None, cutoff=1e-14, max_memory=2000, verbose=0):
+    '''Block-sparse cderi (see :func:`incore.cholesky_eri_sparse`) saved in
+    erifile.  The (naux,ncol) integrals are stored in dataset dataname and the
+    AO pair index of the columns in dataset dataname+'_pair_idx'.
+    '''
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(mol.stdout, verbose)
+    if auxmol is None:
+        auxmol = incore.format_aux_basis(mol, auxbasis)
+    naoaux = auxmol.nao_nr()
+
+    if h5py.is_hdf5(erifile):
+        feri = h5py.File(erifile)
+        for key in (dataname, dataname+'_pair_idx'):
+            if key in feri:
+                del(feri[key])
+    else:
+        feri = h5py.File(erifile, 'w')
+    h5d_eri = None
+    for col0, col1, pair_idx, cderi in \
+            incore._sparse_cderi_loop(mol, auxmol, cutoff, max_memory, log):
+        if h5d_eri is None:
+            ncol = len(pair_idx)
+            chunks = (min(64,naoaux), max(min(2048,ncol),1)) # 1M
+            h5d_eri = feri.create_dataset(dataname, (naoaux,ncol), 'f8',
+                                          chunks=chunks)
+            feri[dataname+'_pair_idx'] = pair_idx
+        h5d_eri[:,col0:col1] = cderi
+    feri.close()
+    return erifile
+
 # store cderi in blocks
 def cholesky_eri_b(mol, erifile, auxbasis='weigend+etb', dataname='eri_mo',
                    int3c='cint3c2e_sph', aosym='s2ij', int2c='cint2c2e_sph',
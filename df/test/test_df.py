@@ -160,6 +160,63 @@ class KnowValues(unittest.TestCase):
         with h5py.File(ftmp.name) as feri:
             self.assertTrue(numpy.allclose(feri['eri_mo'], cderi0))
 
+    def test_sparse(self):
+        mol1 = gto.M(atom=[['H', (0, 0, i*2.5)] for i in range(10)],
+                     basis='ccpvdz', verbose=0)
+        nao = mol1.nao_nr()
+        cderi0 = df.incore.cholesky_eri(mol1)
+        cderi, pair_idx = df.incore.cholesky_eri_sparse(mol1, cutoff=1e-12,
+                                                        max_memory=.01)
+        self.assertTrue(len(pair_idx) < nao*(nao+1)//2)
+        cderi1 = df.incore.unpack_sparse(cderi, pair_idx, nao*(nao+1)//2)
+        self.assertTrue(abs(cderi1 - cderi0).max() < 1e-8)
+
+        ftmp = tempfile.NamedTemporaryFile(dir=lib.param.TMPDIR)
+        df.outcore.cholesky_eri_sparse(mol1, ftmp.name, cutoff=1e-12,
+                                       max_memory=.01)
+        with h5py.File(ftmp.name) as feri:
+            self.assertTrue(numpy.allclose(feri['j3c'], cderi))
+            self.assertTrue(numpy.all(numpy.asarray(feri['j3c_pair_idx']) == pair_idx))
+
+        dfobj = df.DF(mol1)
+        dfobj.sparse = True
+        dfobj.sparse_cutoff = 1e-12
+        numpy.random.seed(1)
+        dm = numpy.random.random((nao,nao))
+        dm = dm + dm.T
+        vj0, vk0 = df.DF(mol1).get_jk(dm)
+        vj1, vk1 = dfobj.get_jk(dm)
+        self.assertTrue(abs(vj1 - vj0).max() < 1e-7)
+        self.assertTrue(abs(vk1 - vk0).max() < 1e-7)
+        eri1 = numpy.vstack(list(dfobj.loop()))
+        self.assertTrue(abs(eri1 - cderi0).max() < 1e-8)
+
+        mo = numpy.random.random((nao,8))
+        ref = numpy.vstack([x.copy() for x in df.DF(mol1).loop_mo(mo, (0,3,3,8))])
+        Lov = numpy.vstack([x.copy() for x in dfobj.loop_mo(mo, (0,3,3,8))])
+        self.assertTrue(abs(Lov - ref).max() < 1e-7)
+
+    def test_sparse_shell_pairs(self):
+        mol1 = gto.M(atom=[['H', (0, 0, i*2.5)] for i in range(10)],
+                     basis='ccpvdz', verbose=0)
+        auxmol1 = df.incore.format_aux_basis(mol1)
+        spl, q_aux = df.incore.sparse_shell_pairs(mol1, auxmol1, 1e-12)
+        # pairs screened by the 3-center bound sqrt((ij|ij)) * max sqrt((L|L))
+        spl0 = gto.ShellPairList(mol1, 1e-12, ket_max=1e300).build()
+        self.assertEqual(spl.npairs, numpy.count_nonzero(spl0.q * q_aux.max() >= 1e-12))
+
+    def test_sparse_e2(self):
+        numpy.random.seed(2)
+        nao = 9
+        pair_idx = numpy.sort(numpy.random.choice(nao*(nao+1)//2, 25, replace=False))
+        cderi = numpy.random.random((7,len(pair_idx)))
+        mo = numpy.random.random((nao,6))
+        pattern = df.incore.sparse_tril_pattern(pair_idx, nao)
+        eri1 = lib.unpack_tril(df.incore.unpack_sparse(cderi, pair_idx, nao*(nao+1)//2))
+        ref = numpy.einsum('pmn,mi,nj->pij', eri1, mo[:,1:3], mo[:,0:4]).reshape(7,-1)
+        Lij = df.incore.sparse_e2(cderi, pattern, mo, (1,3,0,4))
+        self.assertAlmostEqual(abs(Lij - ref).max(), 0, 12)
+
     def test_r_incore(self):
         j3c = df.r_incore.aux_e2(mol, auxmol, intor='cint3c2e_spinor', aosym='s1')
         nao = mol.nao_2c()
@@ -112,6 +112,66 @@ class KnowValues(unittest.TestCase):
         mf._cderi = (u[:,idx] * numpy.sqrt(w[idx])).T.copy()
         self.assertAlmostEqual(mf.kernel(), -76.026765673110447, 9)
 
+    def test_local_k(self):
+        mf = scf.density_fit(scf.RHF(mol))
+        e0 = mf.kernel()
+        dm = mf.make_rdm1()
+        vk0 = mf.get_k(mol, dm)
+
+        mf.with_df.local_k = True
+        vk1 = mf.get_k(mol, dm)
+        self.assertTrue(abs(vk1 - vk0).max() < 1e-4)
+        self.assertTrue(abs(vk1 - vk1.T).max() < 1e-12)
+        vk2 = mf.with_df.get_jk(dm, hermi=0, with_j=False)[1]
+        self.assertAlmostEqual(abs(vk1 - vk2).max(), 0, 10)
+        self.assertAlmostEqual(mf.kernel(), e0, 5)
+
+    def test_local_k_hermi0(self):
+        mf = scf.density_fit(scf.RHF(mol))
+        mf.kernel()
+        nocc = mol.nelectron // 2
+        mo = mf.mo_coeff
+        # non-symmetric (transition) density matrix
+        dm = numpy.dot(mo[:,:nocc], mo[:,1:nocc+1].T)
+        vk0 = mf.with_df.get_jk(dm, hermi=0, with_j=False)[1]
+
+        mf.with_df.local_k = True
+        vk1 = mf.with_df.get_jk(dm, hermi=0, with_j=False)[1]
+        self.assertTrue(abs(vk1 - vk0).max() < 1e-3)
+        # K[D^T] = K[D]^T holds for the symmetrized local fitting as well
+        vk2 = mf.with_df.get_jk(dm.T, hermi=0, with_j=False)[1]
+        self.assertAlmostEqual(abs(vk2.T - vk1).max(), 0, 10)
+        vks = mf.with_df.get_jk(numpy.array((dm, dm.T)), hermi=0, with_j=False)[1]
+        self.assertAlmostEqual(abs(vks[0] - vk1).max(), 0, 12)
+        self.assertAlmostEqual(abs(vks[1] - vk2).max(), 0, 12)
+
+    def test_local_k_extended(self):
+        hchain = gto.M(atom=[['H', (0, 0, i*3.)] for i in range(8)],
+                       basis='6-31g', spin=0, verbose=0)
+        pairs = df_jk._significant_atom_pairs(hchain)
+        self.assertTrue(len(pairs) < hchain.natm*(hchain.natm+1)//2)
+        mf = scf.density_fit(scf.RHF(hchain))
+        mf.kernel()
+        dm = mf.make_rdm1()
+        vk0 = mf.get_k(hchain, dm)
+        mf.with_df.local_k = True
+        vk1 = mf.get_k(hchain, dm)
+        self.assertEqual(len(mf.with_df._local_fit), len(pairs))
+        self.assertTrue(abs(vk1 - vk0).max() < 1e-3)
+        self.assertTrue(abs(vk1 - vk1.T).max() < 1e-12)
+        vk2 = mf.get_k(hchain, dm)
+        self.assertAlmostEqual(abs(vk1 - vk2).max(), 0, 12)
+
+    def test_local_solve_lindep(self):
+        numpy.random.seed(2)
+        v = numpy.linalg.qr(numpy.random.random((6,6)))[0]
+        w = numpy.array([-1e-15, 0, .1, .5, 1, 2])
+        j2c = numpy.dot(v*w, v.T)
+        rhs = numpy.dot(j2c, numpy.random.random((6,3)))
+        log = lib.logger.Logger(mol.stdout, 0)
+        x = df_jk._local_solve(j2c, rhs, log)
+        self.assertAlmostEqual(abs(numpy.dot(j2c, x) - rhs).max(), 0, 12)
+
 
 if __name__ == "__main__":
     print("Full Tests for df")
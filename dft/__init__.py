@@ -10,8 +10,9 @@ except (ImportError, OSError):
 from pyscf.dft import rks
 from pyscf.dft import roks
 from pyscf.dft import uks
-from pyscf.dft import rks_symm
-from pyscf.dft import uks_symm
+from pyscf import lib
+rks_symm = lib.lazy_import('pyscf.dft.rks_symm')
+uks_symm = lib.lazy_import('pyscf.dft.uks_symm')
 from pyscf.dft import gen_grid as grid
 from pyscf.dft import radi
 from pyscf.df import density_fit
@@ -15,7 +15,8 @@ import math
 import numpy
 import pyscf.lib
 
-_itrf = pyscf.lib.load_library('libxc_itrf')
+# Not lazy: pyscf.dft detects the available XC library by importing it
+_itrf = pyscf.lib.load_library('libxc_itrf', lazy=False)
 
 # xc_code from libxc
 XC = XC_CODES = {
@@ -14,7 +14,8 @@ import math
 import numpy
 import pyscf.lib
 
-_itrf = pyscf.lib.load_library('libxcfun_itrf')
+# Not lazy: pyscf.dft detects the available XC library by importing it
+_itrf = pyscf.lib.load_library('libxcfun_itrf', lazy=False)
 
 XC = XC_CODES = {
 'SLATERX'       :  0,  # Slater LDA exchange
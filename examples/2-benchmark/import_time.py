@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+'''
+Wall time to start a fresh interpreter and import pyscf modules.  Each
+statement is executed in a new python process, as in the job wrappers which
+start one interpreter per molecule.  The startup time of a bare interpreter
+is printed as the reference.
+'''
+
+import sys
+import time
+import subprocess
+
+STATEMENTS = (
+    'pass',
+    'import numpy, scipy.linalg, h5py',
+    'import pyscf',
+    'from pyscf import gto, scf',
+    'from pyscf import gto, scf; scf.RHF(gto.M(atom="H 0 0 0; H 0 0 .74"))',
+    'from pyscf import gto, scf, mcscf',
+    'from pyscf import gto, scf, dft',
+)
+
+def import_time(stmt, repeat=5):
+    t = []
+    for i in range(repeat):
+        t0 = time.time()
+        subprocess.check_call([sys.executable, '-c', stmt])
+        t.append(time.time() - t0)
+    return min(t)
+
+if __name__ == '__main__':
+    for stmt in STATEMENTS:
+        print('%8.3f s  %s' % (import_time(stmt), stmt))
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+'''
+Local pair natural orbital CCSD.
+
+Occupied orbitals are localized (Boys by default), weak pairs are treated by
+MP2 and the doubles amplitudes of strong pairs are solved in their pair
+natural orbital domains.  compare_canonical reports the energy error and the
+wall time against canonical CCSD.
+'''
+
+from pyscf import gto, scf, cc
+from pyscf.cc import lpno_ccsd
+
+mol = gto.M(
+    atom = '''
+C   0.000000   0.000000   0.765000
+H   0.000000   1.020000   1.160000
+H   0.883000  -0.510000   1.160000
+H  -0.883000  -0.510000   1.160000
+C   0.000000   0.000000  -0.765000
+H   0.000000  -1.020000  -1.160000
+H  -0.883000   0.510000  -1.160000
+H   0.883000   0.510000  -1.160000''',
+    basis = 'cc-pvdz')
+mf = scf.RHF(mol).run()
+
+mycc = cc.LPNOCCSD(mf, frozen=2)
+mycc.localization = 'pm'
+mycc.pair_thresh = 1e-4
+mycc.pno_thresh = 1e-7
+mycc.kernel()
+print('LPNO-CCSD correlation energy', mycc.e_corr)
+
+#
+# Energy error and timing against canonical CCSD
+#
+lpno_ccsd.compare_canonical(mf, frozen=2, pno_thresh=1e-6)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+'''
+Forecast the memory and disk usage of CCSD, MP2 and CASSCF without running
+them (dry-run).  The SCF calculation is not needed for the forecast.
+'''
+
+from pyscf import gto, scf, cc, mp, mcscf
+from pyscf.lib import memplan
+
+mol = gto.M(
+    atom = 'O 0 0 0; H 0 -.757 .587; H 0 .757 .587',
+    basis = 'cc-pvqz')
+mf = scf.RHF(mol)
+
+#
+# The plan tells which path (incore/outcore/direct) the integral
+# transformation will take, the peak memory and disk, and the block sizes.
+#
+mycc = cc.CCSD(mf)
+mycc.max_memory = 4000
+memplan.dryrun(mycc)
+
+mycc.direct = True
+plan = memplan.dryrun(mycc)
+print('CCSD path %s  peak memory %d MB  disk %d MB' %
+      (plan.path, plan.mem_peak, plan.disk))
+
+#
+# Scan max_memory to size the job request
+#
+for max_memory in (1000, 4000, 16000, 64000):
+    plan = memplan.plan(cc.CCSD(mf), max_memory=max_memory)
+    print('max_memory %6d MB  path %-8s  peak memory %6d MB  disk %6d MB'
+          % (max_memory, plan.path, plan.mem_peak, plan.disk))
+
+#
+# MP2 and CASSCF need the SCF orbitals to be initialized
+#
+mf.run()
+memplan.dryrun(mp.MP2(mf))
+memplan.dryrun(mcscf.CASSCF(mf, 8, 8))
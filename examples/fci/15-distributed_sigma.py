@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+'''
+Distribute the FCI vectors and the sigma contraction over worker processes.
+
+direct_spin1_dist.FCISolver has the same interface as direct_spin1.FCISolver
+and can be assigned to CASCI/CASSCF objects.  Each worker owns a segment of
+the alpha strings.  The benchmark below measures the strong scaling of one
+sigma contraction over the number of workers.  Run it with OMP_NUM_THREADS=1
+to count one core per worker, eg
+
+    OMP_NUM_THREADS=1 python 15-distributed_sigma.py
+
+Note each worker reads the rows of the CI vector linked to its segment by one
+alpha excitation from the other workers, which are most of the vector.  The
+last column of the table is the number of copies of the CI vector read by
+all workers in one sigma.
+'''
+
+import time
+import numpy
+from pyscf import gto, scf, mcscf, fci, ao2mo
+from pyscf.fci import direct_spin1_dist
+
+mol = gto.M(atom='N 0 0 0; N 0 0 1.1', basis='ccpvdz', verbose=0)
+mf = scf.RHF(mol).run()
+
+#
+# Drop-in replacement of the FCI solver in CASSCF
+#
+mc = mcscf.CASSCF(mf, 8, 8)
+mc.fcisolver = direct_spin1_dist.FCISolver(mol, nproc=2)
+mc.kernel()
+mc.fcisolver.close()
+print('CASSCF(8,8) with distributed FCI solver, E = %.12f' % mc.e_tot)
+
+#
+# Strong scaling of the sigma contraction for a (12e,12o) space
+#
+norb = 12
+nelec = (6,6)
+mo = mf.mo_coeff[:,1:norb+1]
+h1e = mo.T.dot(mf.get_hcore()).dot(mo)
+eri = ao2mo.kernel(mol, mo)
+h2e = fci.direct_spin1.absorb_h1e(h1e, eri, norb, nelec, .5)
+na = fci.cistring.num_strings(norb, nelec[0])
+ci0 = numpy.random.random((na,na))
+link_index = fci.direct_spin1._unpack(norb, nelec, None)
+
+t0 = time.time()
+for i in range(5):
+    ref = fci.direct_spin1.contract_2e(h2e, ci0, norb, nelec, link_index)
+t_ref = (time.time() - t0) / 5
+print('nproc  time/sigma(s)  speedup  max|err|  copies')
+print('  %3s  %12.3f  %7.2f' % ('omp', t_ref, 1))
+for nproc in (1, 2, 4, 8):
+    cis = direct_spin1_dist.FCISolver(nproc=nproc)
+    cis.contract_2e(h2e, ci0, norb, nelec, link_index)  # start workers
+    t0 = time.time()
+    for i in range(5):
+        ci1 = cis.contract_2e(h2e, ci0, norb, nelec, link_index)
+    t1 = (time.time() - t0) / 5
+    if cis._workers is None:  # nproc=1 runs direct_spin1 in this process
+        copies = 0
+    else:
+        copies = cis._workers.nrow_read / float(na)
+    cis.close()
+    print('  %3d  %12.3f  %7.2f  %.2g  %6.2f' %
+          (nproc, t1, t_ref/t1, abs(ci1-ref).max(), copies))
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+import time
+import numpy
+from pyscf import gto, scf
+
+'''
+Update the geometry of a molecule without rebuilding it
+
+Mole.set_geom_ writes the new coordinates into mol._env and keeps the basis
+and ECP data of the last build.  It is much cheaper than Mole.build for
+trajectories, scans and geometry optimizations where only the coordinates
+change.  SCF objects cache the geometry dependent integrals, so a new SCF
+object should be created (or mf._eri reset) after the update.
+'''
+
+mol = gto.M(atom='O 0 0 0; H 0 .757 .587; H 0 -.757 .587', basis='ccpvtz',
+            verbose=0)
+coords = mol.atom_coords()  # in Bohr
+nstep = 1000
+
+t0 = time.time()
+for i in range(nstep):
+    mol1 = gto.M(atom=[[mol.atom_symbol(k), c] for k, c in enumerate(coords)],
+                 unit='Bohr', basis='ccpvtz', verbose=0)
+t1 = time.time()
+for i in range(nstep):
+    mol.set_geom_(coords, unit='Bohr')
+t2 = time.time()
+print('%d steps: Mole.build %.3f s, Mole.set_geom_ %.3f s' % (nstep, t1-t0, t2-t1))
+
+#
+# A bond length scan
+#
+for r in numpy.arange(.9, 1.3, .1):
+    mol.set_geom_('O 0 0 0; H 0 0 %f; H 0 %f 0' % (r, r), unit='Ang')
+    print('R = %.1f  E(HF) = %.12g' % (r, scf.RHF(mol).kernel()))
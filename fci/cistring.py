@@ -6,11 +6,20 @@
 import sys
 import ctypes
 import math
+import tempfile
+import collections
 import numpy
 from pyscf import lib
 
 libfci = lib.load_library('libfci')
 
+# Link tables generated by gen_linkstr_index are kept in a process-wide LRU
+# cache.  They are shared by all FCI solvers and by the rdm functions.
+# LINKSTR_CACHE_SIZE is the max number of tables in the cache.  Tables larger
+# than LINKSTR_MMAP_SIZE (in MB) are held in memory-mapped scratch files.
+LINKSTR_CACHE_SIZE = 16
+LINKSTR_MMAP_SIZE = 2000
+
 def gen_strings4orblist(orb_list, nelec):
     '''Generate string from the given orbital list.
 
@@ -92,9 +101,21 @@ def gen_linkstr_index(orb_list, nocc, strs=None, tril=False):
     excitations, which do not change the string. The next nocc*nvir rows
     [a(:vir),i(:occ),str1,sign] are occupied-virtual exciations, starting from
     str0, annihilating i, creating a, to get str1.
+
+    If strs is not given, the table is taken from the link table cache.  The
+    cache returns a copy of the table which can be modified by the caller.
     '''
     if strs is None:
-        strs = gen_strings4orblist(orb_list, nocc)
+        key = (tuple([int(i) for i in orb_list]), int(nocc), bool(tril))
+        link_index = _linkstr_cache.get(key)
+        if link_index is None:
+            strs = gen_strings4orblist(orb_list, nocc)
+            link_index = _gen_linkstr_index(orb_list, nocc, strs, tril)
+            _linkstr_cache.put(key, link_index)
+        return link_index
+    return _gen_linkstr_index(orb_list, nocc, strs, tril)
+
+def _gen_linkstr_index(orb_list, nocc, strs, tril):
     strs = numpy.array(strs, dtype=numpy.uint64)
     assert(all(strs[:-1] < strs[1:]))
     norb = len(orb_list)
@@ -108,6 +129,56 @@ def gen_linkstr_index(orb_list, nocc, strs=None, tril=False):
                             ctypes.c_int(tril))
     return link_index
 
+class _LinkstrCache(object):
+    '''LRU cache of the link tables, keyed by (orb_list, nocc, tril).  The
+    cache holds private tables and hands out copies of them.
+    '''
+    def __init__(self):
+        self._tables = collections.OrderedDict()
+
+    def get(self, key):
+        link_index = self._tables.pop(key, None)
+        if link_index is None:
+            return None
+        self._tables[key] = link_index
+        if isinstance(link_index, numpy.memmap):
+# Copy-on-write map of the scratch file.  The changes made by the caller are
+# not written back to the file.
+            tmpfile = link_index._tmpfile
+            link_index = numpy.memmap(tmpfile.name, dtype=link_index.dtype,
+                                      mode='c', shape=link_index.shape)
+            link_index._tmpfile = tmpfile
+            return link_index
+        else:
+            return link_index.copy()
+
+    def put(self, key, link_index):
+        if LINKSTR_CACHE_SIZE <= 0:
+            return
+        if link_index.nbytes > LINKSTR_MMAP_SIZE*1e6:
+            tmpfile = tempfile.NamedTemporaryFile(dir=lib.param.TMPDIR)
+            mmap = numpy.memmap(tmpfile, dtype=link_index.dtype, mode='w+',
+                                shape=link_index.shape)
+            mmap[:] = link_index
+            mmap.flush()
+            mmap._tmpfile = tmpfile  # remove the file with the array
+            link_index = mmap
+        else:
+            link_index = link_index.copy()
+        link_index.flags.writeable = False
+        self._tables[key] = link_index
+        while len(self._tables) > LINKSTR_CACHE_SIZE:
+            self._tables.popitem(last=False)
+
+    def clear(self):
+        self._tables.clear()
+
+_linkstr_cache = _LinkstrCache()
+
+def clear_linkstr_cache():
+    '''Release the link tables held in the cache'''
+    _linkstr_cache.clear()
+
 def reform_linkstr_index(link_index):
     '''Compress the (a, i) pair index in linkstr_index to a lower triangular
     index, to match the 4-fold symmetry of integrals.
@@ -326,6 +397,100 @@ def tn_strs(norb, nelec, n):
     tns = (hf_str | virs_allow.reshape(-1,1)) ^ occs_allow
     return tns.ravel()
 
+
+#
+# Multi-word strings for more than 64 orbitals.  A string is stored as an
+# array of nwords = (norb+63)//64 numpy.uint64.  Word w holds the occupancy
+# of orbitals 64*w ... 64*w+63.  A set of strings is a 2D array
+# [nstrs,nwords].
+#
+def num_words(norb):
+    '''Number of uint64 words to store the string of norb orbitals'''
+    return (norb + 63) // 64
+
+def orb_masks(norb):
+    '''Multi-word strings which have only one orbital occupied'''
+    masks = numpy.zeros((norb,num_words(norb)), dtype=numpy.uint64)
+    orbs = numpy.arange(norb)
+    masks[orbs,orbs//64] = numpy.left_shift(numpy.uint64(1),
+                                            (orbs%64).astype(numpy.uint64))
+    return masks
+
+def int2strs(strs, norb):
+    '''Convert python integers to multi-word strings'''
+    nw = num_words(norb)
+    words = numpy.empty((len(strs),nw), dtype=numpy.uint64)
+    for k, s in enumerate(strs):
+        s = int(s)
+        for w in range(nw):
+            words[k,w] = (s >> (w*64)) & 0xffffffffffffffff
+    return words
+
+def strs2int(strs):
+    '''Convert one multi-word string to python integer'''
+    return sum(int(x) << (w*64) for w, x in enumerate(strs))
+
+def strs2occ(strs, norb):
+    '''Occupation pattern (boolean array [nstrs,norb]) of multi-word strings'''
+    strs = numpy.asarray(strs, dtype=numpy.uint64)
+    nstrs = strs.shape[0]
+    bits = numpy.right_shift(strs[:,:,None], numpy.arange(64, dtype=numpy.uint64))
+    bits = (bits & numpy.uint64(1)).astype(bool)
+    return bits.reshape(nstrs,-1)[:,:norb]
+
+def argsort_strs(strs):
+    '''Indices to sort strings in ascending order.  Both the single-word
+    (1D array) and the multi-word (2D array) strings are supported.
+    '''
+    strs = numpy.asarray(strs)
+    if strs.ndim == 1:
+        return numpy.argsort(strs)
+    else:
+        return numpy.lexsort(strs.T)
+
+def _as_void(strs):
+    strs = numpy.ascontiguousarray(strs, dtype=numpy.uint64)
+    return strs.view('V%d' % (strs.shape[1]*8)).ravel()
+
+def uniq_strs(strs):
+    '''Unique multi-word strings, in ascending order'''
+    strs = numpy.ascontiguousarray(strs, dtype=numpy.uint64)
+    nw = strs.shape[1]
+    strs = numpy.unique(_as_void(strs)).view(numpy.uint64).reshape(-1,nw)
+    return strs[numpy.lexsort(strs.T)]
+
+def make_strs_index(strsbook):
+    '''Search index of the multi-word strings for the function lookup_strs'''
+    book = _as_void(strsbook)
+    idx = numpy.argsort(book, kind='mergesort')
+    return book[idx], idx
+
+def add_strs_index(strs_index, strs, offset):
+    '''Insert multi-word strs into the search index.  The addresses of strs
+    are offset, offset+1, ...
+    '''
+    book, idx = strs_index
+    keys = _as_void(strs)
+    order = numpy.argsort(keys, kind='mergesort')
+    keys = keys[order]
+    pos = numpy.searchsorted(book, keys)
+    return numpy.insert(book, pos, keys), numpy.insert(idx, pos, order+offset)
+
+def lookup_strs(strs_index, strs):
+    '''Addresses of multi-word strs in the strings book of strs_index.
+    -1 is assigned to the strings which are not found in the book.
+    '''
+    book, idx = strs_index
+    addr = -numpy.ones(len(strs), dtype=numpy.int64)
+    if book.size == 0 or len(strs) == 0:
+        return addr
+    keys = _as_void(strs)
+    pos = numpy.searchsorted(book, keys)
+    pos[pos == book.size] = 0
+    found = book[pos] == keys
+    addr[found] = idx[pos[found]]
+    return addr
+
 if __name__ == '__main__':
     #print([bin(i) for i in gen_strings4orblist(range(2,5), 2)])
     #print(gen_strings4orblist(range(4), 2))
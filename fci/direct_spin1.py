@@ -92,13 +92,19 @@ def contract_2e(eri, fcivec, norb, nelec, link_index=None):
         eri_{pq,rs} = (pq|rs) - (.5/Nelec) [\sum_q (pq|qs) + \sum_p (pq|rp)]
 
     See also :func:`direct_spin1.absorb_h1e`
+
+    fcivec can also be a stack of FCI vectors, (nvec,na,nb) or a list of
+    vectors.  The stack is contracted in one call which shares the link
+    tables and the work buffers among the vectors.
     '''
     fcivec = numpy.asarray(fcivec, order='C')
     eri = ao2mo.restore(4, eri, norb)
     link_indexa, link_indexb = _unpack(norb, nelec, link_index)
     na, nlinka = link_indexa.shape[:2]
     nb, nlinkb = link_indexb.shape[:2]
-    assert(fcivec.size == na*nb)
+    if fcivec.size != na*nb:
+        return _contract_2e_multi(eri, fcivec, norb, na, nb, nlinka, nlinkb,
+                                  link_indexa, link_indexb)
     ci1 = numpy.empty_like(fcivec)
 
     libfci.FCIcontract_2e_spin1(eri.ctypes.data_as(ctypes.c_void_p),
@@ -111,6 +117,114 @@ def contract_2e(eri, fcivec, norb, nelec, link_index=None):
                                 link_indexb.ctypes.data_as(ctypes.c_void_p))
     return ci1
 
+def _contract_2e_multi(eri, fcivecs, norb, na, nb, nlinka, nlinkb,
+                       link_indexa, link_indexb):
+    nvec = fcivecs.size // (na*nb)
+    assert(fcivecs.size == nvec*na*nb)
+    ci1 = numpy.empty_like(fcivecs)
+    libfci.FCIcontract_2e_spin1_multi(eri.ctypes.data_as(ctypes.c_void_p),
+                                      fcivecs.ctypes.data_as(ctypes.c_void_p),
+                                      ci1.ctypes.data_as(ctypes.c_void_p),
+                                      ctypes.c_int(norb),
+                                      ctypes.c_int(na), ctypes.c_int(nb),
+                                      ctypes.c_int(nlinka), ctypes.c_int(nlinkb),
+                                      link_indexa.ctypes.data_as(ctypes.c_void_p),
+                                      link_indexb.ctypes.data_as(ctypes.c_void_p),
+                                      ctypes.c_int(nvec))
+    return ci1
+
+def split_strings(link_indexa, nproc):
+    '''Split the alpha strings into nproc segments.
+
+    Returns:
+        A list of (rows, link_index) for each segment.  rows are the alpha
+        strings of the segment followed by the boundary rows, ie the alpha
+        strings they link to, in ascending order.  link_index is the alpha
+        link table of the segment, addressed in rows.  Note rows typically
+        cover most of the alpha strings, see direct_spin1_dist.
+    '''
+    na = link_indexa.shape[0]
+    segs = []
+    for seg in numpy.array_split(numpy.arange(na), nproc):
+        if seg.size == 0:
+            continue
+        a0, a1 = seg[0], seg[-1] + 1
+        link_seg = numpy.array(link_indexa[a0:a1], copy=True)
+        nbrs = numpy.setdiff1d(link_seg[:,:,2], seg)
+        rows = numpy.append(seg, nbrs)
+        addr = numpy.empty(na, dtype=link_seg.dtype)
+        addr[rows] = numpy.arange(rows.size)
+        link_seg[:,:,2] = addr[link_seg[:,:,2]]
+        segs.append((rows, link_seg))
+    return segs
+
+def contract_2e_seg(eri, ci_rows, nseg, norb, link_seg, link_indexb):
+    '''Contribution of the first nseg alpha strings of ci_rows to sigma.
+    ci_rows and the returned sigma have the row layout of split_strings.
+    '''
+    ci_rows = numpy.asarray(ci_rows, order='C')
+    nrow = ci_rows.shape[0]
+    nlinka = link_seg.shape[1]
+    nb, nlinkb = link_indexb.shape[:2]
+    ci1 = numpy.empty_like(ci_rows)
+    libfci.FCIcontract_2e_spin1_seg(eri.ctypes.data_as(ctypes.c_void_p),
+                                    ci_rows.ctypes.data_as(ctypes.c_void_p),
+                                    ci1.ctypes.data_as(ctypes.c_void_p),
+                                    ctypes.c_int(norb), ctypes.c_int(nrow),
+                                    ctypes.c_int(nb), ctypes.c_int(nseg),
+                                    ctypes.c_int(nlinka), ctypes.c_int(nlinkb),
+                                    link_seg.ctypes.data_as(ctypes.c_void_p),
+                                    link_indexb.ctypes.data_as(ctypes.c_void_p))
+    return ci1
+
+def contract_2e_outcore(eri, fcivec, norb, nelec, link_index=None, out=None,
+                        max_memory=lib.param.MAX_MEMORY, segs=None):
+    '''contract_2e for the CI vector on disk (numpy.memmap or h5py dataset).
+    The alpha strings are processed in segments (see split_strings).  For
+    each segment, the rows linked to the segment are read from fcivec and the
+    partial sigma of the rows is added to out.  Only the rows of one segment
+    are held in memory.
+
+    Kwargs:
+        out : array-like with shape (na,nb)
+            To hold sigma, eg a numpy.memmap.  It is overwritten.
+        segs : list
+            The output of split_strings, to avoid generating the segments in
+            each call.
+    '''
+    eri = ao2mo.restore(4, eri, norb)
+    link_indexa, link_indexb = _unpack(norb, nelec, link_index)
+    na = link_indexa.shape[0]
+    nb = link_indexb.shape[0]
+    fcivec = fcivec.reshape(na,nb)
+    if out is None:
+        out = numpy.zeros((na,nb))
+    else:
+        out = out.reshape(na,nb)
+        for p0, p1 in lib.prange(0, na, max(1, int(max_memory*1e6/8/nb))):
+            out[p0:p1] = 0
+    if segs is None:
+        segs = split_strings_by_memory(link_indexa, nb, max_memory)
+    for rows, link_seg in segs:
+        nseg = link_seg.shape[0]
+        ci1 = contract_2e_seg(eri, numpy.asarray(fcivec[rows]), nseg, norb,
+                              link_seg, link_indexb)
+        out[rows] += ci1
+    return out
+
+def split_strings_by_memory(link_indexa, nb, max_memory=lib.param.MAX_MEMORY):
+    '''split_strings with the smallest number of segments that the rows of c
+    and sigma of each segment fit in max_memory (MB).
+    '''
+    na = link_indexa.shape[0]
+    nseg = 1
+    while True:
+        segs = split_strings(link_indexa, nseg)
+        nrow = max([rows.size for rows, link_seg in segs])
+        if nrow*nb*16/1e6 < max_memory or nseg >= na:
+            return segs
+        nseg = min(nseg*2, na)
+
 def make_hdiag(h1e, eri, norb, nelec):
     '''Diagonal Hamiltonian for Davidson preconditioner
     '''
@@ -396,9 +510,38 @@ def kernel_ms1(fci, h1e, eri, norb, nelec, ci0=None, link_index=None,
     precond = fci.make_precond(hdiag, pw, pv, addr)
 
     h2e = fci.absorb_h1e(h1e, eri, norb, nelec, .5)
-    def hop(c):
-        hc = fci.contract_2e(h2e, c, norb, nelec, (link_indexa,link_indexb))
-        return hc.ravel()
+    if max_memory is None: max_memory = fci.max_memory
+# The Davidson subspace is held on memory-mapped scratch files if the memory
+# left after the CI intermediates (hdiag, h2e, link tables) is insufficient
+    max_memory = max(0, max_memory - lib.current_memory()[0])
+# The stack of trial vectors and sigma vectors for block contraction
+    block_op = (nroots > 1 and _multi_contract_ok(fci) and
+                na*nb*nroots*2*8/1e6 < max_memory*.5)
+# In the out-of-core Davidson, the trial vectors are numpy.memmap.  They are
+# contracted over alpha-string segments and sigma is written to scratch files.
+    stream = _multi_contract_ok(fci)
+    segs = []
+    def hop_outcore(c):
+        if not segs:
+            segs.extend(split_strings_by_memory(link_indexa, nb, max_memory*.5))
+        hc = lib.linalg_helper._scratch_vector(c.shape, c.dtype)
+        contract_2e_outcore(h2e, c, norb, nelec, (link_indexa,link_indexb),
+                            out=hc, segs=segs)
+        return hc
+    if block_op:
+# All trial vectors of a Davidson iteration are contracted in one pass
+        def hop(cs):
+            if stream and isinstance(cs[0], numpy.memmap):
+                return [hop_outcore(c) for c in cs]
+            hcs = fci.contract_2e(h2e, numpy.asarray(cs), norb, nelec,
+                                  (link_indexa,link_indexb))
+            return [hc.ravel() for hc in hcs.reshape(len(cs),-1)]
+    else:
+        def hop(c):
+            if stream and isinstance(c, numpy.memmap):
+                return hop_outcore(c)
+            hc = fci.contract_2e(h2e, c, norb, nelec, (link_indexa,link_indexb))
+            return hc.ravel()
 
     if ci0 is None:
         if hasattr(fci, 'get_init_guess'):
@@ -419,18 +562,25 @@ def kernel_ms1(fci, h1e, eri, norb, nelec, ci0=None, link_index=None,
     if lindep is None: lindep = fci.lindep
     if max_cycle is None: max_cycle = fci.max_cycle
     if max_space is None: max_space = fci.max_space
-    if max_memory is None: max_memory = fci.max_memory
     if verbose is None: verbose = logger.Logger(fci.stdout, fci.verbose)
     #e, c = lib.davidson(hop, ci0, precond, tol=fci.conv_tol, lindep=fci.lindep)
     e, c = fci.eig(hop, ci0, precond, tol=tol, lindep=lindep,
                    max_cycle=max_cycle, max_space=max_space, nroots=nroots,
                    max_memory=max_memory, verbose=verbose, follow_state=True,
-                   **kwargs)
+                   block_op=block_op, **kwargs)
     if nroots > 1:
         return e+ecore, [ci.reshape(na,nb) for ci in c]
     else:
         return e+ecore, c.reshape(na,nb)
 
+def _multi_contract_ok(fci):
+    '''Whether fci.contract_2e is the direct_spin1 contraction which accepts a
+    stack of CI vectors.  Solvers which overload contract_2e (symmetry
+    adapted, spin0, fix_spin etc.) are contracted one vector at a time.
+    '''
+    fn = getattr(fci.contract_2e, '__func__', None)
+    return fn is getattr(FCISolver.contract_2e, '__func__', FCISolver.contract_2e)
+
 def make_pspace_precond(hdiag, pspaceig, pspaceci, addr, level_shift=0):
     # precondition with pspace Hamiltonian, CPL, 169, 463
     def precond(r, e0, x0, *args):
@@ -530,10 +680,19 @@ class FCISolver(lib.StreamObject):
         return contract_2e(eri, fcivec, norb, nelec, link_index, **kwargs)
 
     def eig(self, op, x0, precond, **kwargs):
+        '''Davidson diagonalization.  If block_op is set, op takes a list of
+        vectors and returns the list of the contracted vectors.
+        '''
         if kwargs['nroots'] == 1 and x0[0].size > 6.5e7: # 500MB
             lessio = True
         else:
             lessio = False
+        if kwargs.pop('block_op', False):
+            conv, e, x = lib.davidson1(op, x0, precond, lessio=lessio, **kwargs)
+            if kwargs['nroots'] == 1:
+                return e[0], x[0]
+            else:
+                return e, x
         return lib.davidson(op, x0, precond, lessio=lessio, **kwargs)
 
     def make_precond(self, hdiag, pspaceig, pspaceci, addr):
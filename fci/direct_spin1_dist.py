@@ -0,0 +1,598 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+'''
+direct_spin1 FCI solver with the CI vectors distributed over worker processes.
+
+The alpha strings are split into nproc segments and worker k owns the rows of
+the CI vectors in segment k.  In FCISolver.kernel, the trial vectors, the
+sigma vectors and the Hamiltonian diagonal of the Davidson diagonalization are
+stored only by the owners of the rows.  The master process keeps the subspace
+matrices.  It sends commands to the workers (sigma, dot products, linear
+combinations, preconditioner) and receives the dot products.  The CI vectors
+are gathered to the master only when the diagonalization is finished.
+
+The contribution of a segment to sigma involves the rows of c which are
+linked to the segment by one alpha excitation (the boundary rows of the
+segment).  It produces partial sigma on the same rows.  Each worker publishes
+its rows of c and the boundary rows of its partial sigma in memory-mapped
+scratch files in lib.param.TMPDIR.  A worker reads its boundary rows of c from
+the files of their owners, and the owner of a row sums up the partial sigma of
+this row from the files of the other workers.  Two barriers in each sigma
+separate the writes and the reads.
+
+A single alpha excitation connects a segment to a large part of the string
+space.  For the active spaces of practical interest, the boundary rows are 60%
+- 100% of the CI vector even for small segments.  The data read by each
+worker in a sigma is thus comparable to one CI vector, which bounds the
+speedup over the threaded direct_spin1 kernel.
+
+FCISolver.contract_2e keeps the direct_spin1 interface for the callers which
+hold the full CI vector, eg the CASSCF orbital Hessian.  The rows of c are
+sent to their owners and the rows of sigma are gathered.
+
+The workers are started by the "spawn" method (Python 3.4 or newer).  Each
+worker runs the OpenMP kernel of direct_spin1 with lib.num_threads()/nproc
+threads.
+'''
+
+import os
+import sys
+import shutil
+import tempfile
+import traceback
+import ctypes
+import numpy
+import scipy.linalg
+from pyscf import lib
+from pyscf import ao2mo
+from pyscf.lib import logger
+from pyscf.fci import cistring
+from pyscf.fci import direct_spin1
+
+libfci = direct_spin1.libfci
+
+split_strings = direct_spin1.split_strings
+contract_2e_seg = direct_spin1.contract_2e_seg
+
+def make_hdiag_seg(h1e, eri, norb, nelec, a0, a1):
+    '''The rows a0:a1 (alpha strings) of direct_spin1.make_hdiag'''
+    neleca, nelecb = direct_spin1._unpack_nelec(nelec)
+    h1e = numpy.asarray(h1e, order='C')
+    eri = ao2mo.restore(1, eri, norb)
+    strsa = cistring.gen_strings4orblist(range(norb), neleca)
+    strsa = numpy.asarray(strsa[a0:a1], order='C')
+    strsb = numpy.asarray(cistring.gen_strings4orblist(range(norb), nelecb))
+    na = len(strsa)
+    nb = len(strsb)
+
+    hdiag = numpy.empty(na*nb)
+    jdiag = numpy.asarray(numpy.einsum('iijj->ij',eri), order='C')
+    kdiag = numpy.asarray(numpy.einsum('ijji->ij',eri), order='C')
+    c_h1e = h1e.ctypes.data_as(ctypes.c_void_p)
+    c_jdiag = jdiag.ctypes.data_as(ctypes.c_void_p)
+    c_kdiag = kdiag.ctypes.data_as(ctypes.c_void_p)
+    libfci.FCImake_hdiag_uhf(hdiag.ctypes.data_as(ctypes.c_void_p),
+                             c_h1e, c_h1e, c_jdiag, c_jdiag, c_jdiag, c_kdiag, c_kdiag,
+                             ctypes.c_int(norb),
+                             ctypes.c_int(na), ctypes.c_int(nb),
+                             ctypes.c_int(neleca), ctypes.c_int(nelecb),
+                             strsa.ctypes.data_as(ctypes.c_void_p),
+                             strsb.ctypes.data_as(ctypes.c_void_p))
+    return hdiag.reshape(na,nb)
+
+def _buffer(tmpdir, name, nrow, nb, mode):
+    # memmap does not accept empty files
+    return numpy.memmap(os.path.join(tmpdir, name), dtype=numpy.double,
+                        mode=mode, shape=(max(nrow,1),nb))
+
+class _WorkerError(object):
+    def __init__(self, message):
+        self.message = message
+
+class _Segment(object):
+    '''The rows a0:a1 of the CI vectors held by a worker process.
+
+    The methods are the commands which the master sends to the worker.
+    '''
+    def __init__(self, iseg, segs, bnds, link_seg, link_indexb, norb, nelec,
+                 tmpdir, barrier):
+        self.iseg = iseg
+        self.a0, self.a1 = segs[iseg]
+        self.norb = norb
+        self.nelec = nelec
+        self.link_seg = link_seg
+        self.link_indexb = link_indexb
+        self.bnd = bnds[iseg]
+        self.barrier = barrier
+        self.eri = None
+        self.hdiag = None
+        self.vecs = {}
+
+        nb = link_indexb.shape[0]
+        self.cbufs = []
+        self.sbufs = []
+        for k, (b0, b1) in enumerate(segs):
+            mode = 'r+' if k == iseg else 'r'
+            self.cbufs.append(_buffer(tmpdir, 'c%d'%k, b1-b0, nb, mode))
+            self.sbufs.append(_buffer(tmpdir, 's%d'%k, len(bnds[k]), nb, mode))
+
+# The boundary rows of this segment owned by segment k, and the boundary rows
+# of segment k owned by this segment.  Both are contiguous in the sorted
+# boundary rows.
+        self.gather_idx = []
+        self.reduce_idx = []
+        for k, (b0, b1) in enumerate(segs):
+            if k == iseg:
+                continue
+            lo, hi = numpy.searchsorted(self.bnd, (b0, b1))
+            if hi > lo:
+                self.gather_idx.append((k, lo, hi, self.bnd[lo:hi]-b0))
+            lo, hi = numpy.searchsorted(bnds[k], (self.a0, self.a1))
+            if hi > lo:
+                self.reduce_idx.append((k, lo, hi, bnds[k][lo:hi]-self.a0))
+
+    def set_eri(self, eri):
+        self.eri = eri
+
+    def set_hamiltonian(self, h1e, eri):
+        self.hdiag = make_hdiag_seg(h1e, eri, self.norb, self.nelec,
+                                    self.a0, self.a1)
+        h2e = direct_spin1.absorb_h1e(h1e, eri, self.norb, self.nelec, .5)
+        self.eri = ao2mo.restore(4, h2e, self.norb)
+
+    def put(self, key, x):
+        self.vecs[key] = numpy.asarray(x, dtype=numpy.double, order='C')
+
+    def get(self, key):
+        return self.vecs[key]
+
+    def delete(self, keys):
+        for key in keys:
+            self.vecs.pop(key, None)
+
+    def sigma(self, xkey, axkey):
+        x = self.vecs[xkey]
+        nseg = x.shape[0]
+        nbnd = self.bnd.size
+        self.cbufs[self.iseg][:nseg] = x
+        self.barrier.wait()
+
+        ci_rows = numpy.empty((nseg+nbnd,x.shape[1]))
+        ci_rows[:nseg] = x
+        for k, lo, hi, idx in self.gather_idx:
+            ci_rows[nseg+lo:nseg+hi] = self.cbufs[k][idx]
+        ci1 = contract_2e_seg(self.eri, ci_rows, nseg, self.norb,
+                              self.link_seg, self.link_indexb)
+        ci_rows = None
+        self.sbufs[self.iseg][:nbnd] = ci1[nseg:]
+        ax = ci1[:nseg].copy()
+        ci1 = None
+        self.barrier.wait()
+
+        for k, lo, hi, idx in self.reduce_idx:
+            ax[idx] += self.sbufs[k][lo:hi]
+        self.vecs[axkey] = ax
+
+    def dot(self, keys1, keys2):
+        vs2 = [self.vecs[k].ravel() for k in keys2]
+        return numpy.array([[numpy.dot(self.vecs[k1].ravel(), v2) for v2 in vs2]
+                            for k1 in keys1])
+
+    def lincomb(self, out, keys, coeffs):
+        x = self.vecs[keys[0]] * coeffs[0]
+        for key, c in zip(keys[1:], coeffs[1:]):
+            x += self.vecs[key] * c
+        self.vecs[out] = x
+
+    def precond(self, out, key, e, level_shift):
+        hdiagd = self.hdiag - (e-level_shift)
+        hdiagd[abs(hdiagd)<1e-8] = 1e-8
+        self.vecs[out] = self.vecs[key] / hdiagd
+
+    def hdiag_min(self, n):
+        '''n lowest diagonal elements and their addresses in the CI vector'''
+        hdiag = self.hdiag.ravel()
+        idx = numpy.argsort(hdiag)[:n]
+        return hdiag[idx], idx + self.a0 * self.hdiag.shape[1]
+
+    def guess(self, key, addrs, values):
+        '''A vector with the given values at the addresses of the CI vector'''
+        nb = self.link_indexb.shape[0]
+        x = numpy.zeros(((self.a1-self.a0),nb))
+        for addr, v in zip(addrs, values):
+            if self.a0*nb <= addr < self.a1*nb:
+                x.ravel()[addr-self.a0*nb] += v
+        self.vecs[key] = x
+
+def _worker(conn, *args):
+    seg = _Segment(*args)
+    while True:
+        key, args = conn.recv()
+        if key == 'exit':
+            break
+        try:
+            conn.send(getattr(seg, key)(*args))
+        except Exception:
+# Release the other workers waiting at the barrier of sigma
+            seg.barrier.abort()
+            conn.send(_WorkerError(traceback.format_exc()))
+    conn.close()
+
+class _Workers(object):
+    '''Worker processes which own the alpha-string segments.'''
+    def __init__(self, norb, nelec, link_index, nproc):
+        import multiprocessing
+        if not hasattr(multiprocessing, 'get_context'):
+            raise NotImplementedError('spawn start method requires Python 3.4')
+        link_indexa, link_indexb = link_index
+        self.norb = norb
+        self.nelec = nelec
+        na = link_indexa.shape[0]
+        nb = link_indexb.shape[0]
+        self.shape = (na, nb)
+        self.nlink = (link_indexa.shape[1], link_indexb.shape[1])
+
+        split = split_strings(link_indexa, nproc)
+        self.segs = [(int(rows[0]), int(rows[0])+link_seg.shape[0])
+                     for rows, link_seg in split]
+        bnds = [rows[link_seg.shape[0]:] for rows, link_seg in split]
+        # Number of rows of c each sigma reads from the other workers
+        self.nrow_read = sum(bnd.size for bnd in bnds)
+
+        self.tmpdir = tempfile.mkdtemp(dir=lib.param.TMPDIR)
+        for k, (a0, a1) in enumerate(self.segs):
+            _buffer(self.tmpdir, 'c%d'%k, a1-a0, nb, 'w+')
+            _buffer(self.tmpdir, 's%d'%k, bnds[k].size, nb, 'w+')
+
+        ctx = multiprocessing.get_context('spawn')
+# The semaphores of the barrier are released when the master drops it
+        self._barrier = barrier = ctx.Barrier(len(split))
+        omp_threads = max(1, lib.num_threads() // len(split))
+        self.conns = []
+        self.procs = []
+        self._eri = None
+        for k, (rows, link_seg) in enumerate(split):
+            conn, child_conn = ctx.Pipe()
+            p = lib.spawn_process(_worker, (child_conn, k, self.segs, bnds,
+                                            link_seg, link_indexb, norb,
+                                            nelec, self.tmpdir, barrier),
+                                  omp_threads)
+            self.conns.append(conn)
+            self.procs.append(p)
+
+    def match(self, norb, nelec, link_index):
+        return (len(self.conns) > 0 and
+                norb == self.norb and nelec == self.nelec and
+                self.shape == (link_index[0].shape[0], link_index[1].shape[0]) and
+                self.nlink == (link_index[0].shape[1], link_index[1].shape[1]))
+
+    def _collect(self):
+        res = [conn.recv() for conn in self.conns]
+        for r in res:
+            if isinstance(r, _WorkerError):
+                self.close()
+                raise RuntimeError('FCI worker process failed\n' + r.message)
+        return res
+
+    def call(self, key, *args):
+        '''Run the command key(*args) in all workers'''
+        for conn in self.conns:
+            conn.send((key, args))
+        return self._collect()
+
+    def call_each(self, key, args_lst):
+        '''Run the command key with different arguments in each worker'''
+        for conn, args in zip(self.conns, args_lst):
+            conn.send((key, args))
+        return self._collect()
+
+    def set_eri(self, eri):
+# The same eri is used by all contractions of a Davidson diagonalization.  It
+# is sent to the workers only when a different array is given.
+        if eri is not self._eri:
+            self.call('set_eri', ao2mo.restore(4, eri, self.norb))
+            self._eri = eri
+
+    def set_hamiltonian(self, h1e, eri):
+        self.call('set_hamiltonian', h1e, eri)
+        self._eri = None
+
+    def scatter(self, key, fcivec):
+        fcivec = fcivec.reshape(self.shape)
+        self.call_each('put', [(key, fcivec[a0:a1]) for a0, a1 in self.segs])
+
+    def gather(self, key):
+        return numpy.vstack(self.call('get', key))
+
+    def delete(self, keys):
+        self.call('delete', keys)
+
+    def sigma(self, xkey, axkey):
+        self.call('sigma', xkey, axkey)
+
+    def dot(self, keys1, keys2):
+        return sum(self.call('dot', keys1, keys2))
+
+    def lincomb(self, out, keys, coeffs):
+        self.call('lincomb', out, keys, coeffs)
+
+    def precond(self, out, key, e, level_shift):
+        self.call('precond', out, key, e, level_shift)
+
+    def contract(self, fcivec):
+        self.scatter('c', fcivec)
+        self.sigma('c', 'hc')
+        ci1 = self.gather('hc')
+        self.delete(('c', 'hc'))
+        return ci1
+
+    def get_init_guess(self, nroots):
+        '''The lowest determinants of the Hamiltonian diagonal, with the noise
+        of direct_spin1.get_init_guess'''
+        hdiag, addrs = [numpy.hstack(x) for x in zip(*self.call('hdiag_min', nroots))]
+        addrs = addrs[numpy.argsort(hdiag)[:nroots]]
+        na, nb = self.shape
+        keys = []
+        for i, addr in enumerate(addrs):
+            key = 'x0_%d' % i
+            if i == 0:
+                self.call('guess', key, (addr, 0, na*nb-1), (1, 1e-5, -1e-5))
+            else:
+                self.call('guess', key, (addr,), (1,))
+            keys.append(key)
+        return keys
+
+    def close(self):
+        for conn, p in zip(self.conns, self.procs):
+            if p.is_alive():
+                conn.send(('exit', None))
+                p.join()
+            conn.close()
+        self.conns = []
+        self.procs = []
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+def davidson(workers, x0, nroots=1, tol=1e-10, lindep=1e-14, max_cycle=50,
+             max_space=12, level_shift=1e-3, verbose=logger.WARN):
+    '''Davidson diagonalization of the CI Hamiltonian held by the workers.
+
+    Args:
+        workers : _Workers
+        x0 : list of str
+            The names of the initial guess vectors in the workers.
+
+    Returns:
+        conv, e, and the names of the eigenvectors in the workers.
+    '''
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(sys.stdout, verbose)
+    toloose = numpy.sqrt(tol)
+    max_space = max_space + (nroots-1) * 3
+    count = [0]
+    def new_key(prefix):
+        count[0] += 1
+        return '%s%d' % (prefix, count[0])
+
+    xs = []
+    axs = []
+    xt = list(x0)
+    e = numpy.zeros(nroots)
+    v = None
+    conv = False
+    for icyc in range(max_cycle):
+# Gram-Schmidt (twice for the numerical stability) of the new trial vectors
+        xnew = []
+        for key in xt:
+            for i in range(2):
+                if xs or xnew:
+                    ovlp = workers.dot(xs+xnew, [key])[:,0]
+                    workers.lincomb(key, [key]+xs+xnew, numpy.append(1, -ovlp))
+            norm2 = workers.dot([key], [key])[0,0]
+            if norm2 > lindep:
+                workers.lincomb(key, [key], [1/numpy.sqrt(norm2)])
+                xnew.append(key)
+            else:
+                workers.delete([key])
+        if not xnew:
+            log.debug('Linear dependency in trial subspace')
+            break
+        for key in xnew:
+            workers.sigma(key, 'a'+key)
+            xs.append(key)
+            axs.append('a'+key)
+
+        heff = workers.dot(xs, axs)
+        w, v = scipy.linalg.eigh((heff+heff.T)*.5)
+        e_old, e = e, w[:nroots]
+        v = v[:,:nroots]
+
+        rkeys = []
+        rnorm = numpy.empty(nroots)
+        for k in range(nroots):
+            rkey = new_key('r')
+            workers.lincomb(rkey, axs+xs, numpy.append(v[:,k], -e[k]*v[:,k]))
+            rnorm[k] = numpy.sqrt(workers.dot([rkey], [rkey])[0,0])
+            rkeys.append(rkey)
+        de = e - e_old
+        conv_k = (abs(de) < tol) & (rnorm < toloose)
+        log.debug('davidson %d %d  |r|= %4.3g  e= %s  max|de|= %4.3g',
+                  icyc, len(xs), rnorm.max(), e, abs(de).max())
+        if all(conv_k):
+            conv = True
+            workers.delete(rkeys)
+            break
+
+        if len(xs) + nroots > max_space:
+# Restart with the current eigenvectors
+            cs = [new_key('x') for k in range(nroots)]
+            for k, key in enumerate(cs):
+                workers.lincomb(key, xs, v[:,k])
+                workers.lincomb('a'+key, axs, v[:,k])
+            workers.delete(xs+axs)
+            xs = cs
+            axs = ['a'+key for key in cs]
+            v = numpy.eye(nroots)
+
+        xt = []
+        for k in range(nroots):
+            if conv_k[k]:
+                workers.delete([rkeys[k]])
+            else:
+                workers.precond(rkeys[k], rkeys[k], e[k], level_shift)
+                xt.append(rkeys[k])
+    else:
+        workers.delete(xt)
+
+    ci = []
+    for k in range(nroots):
+        key = new_key('ci')
+        workers.lincomb(key, xs, v[:,k])
+        ci.append(key)
+    workers.delete(xs+axs)
+    return conv, e, ci
+
+
+class FCISolver(direct_spin1.FCISolver):
+    '''direct_spin1 FCI solver with distributed CI vectors.
+
+    kernel runs the Davidson diagonalization with the CI vectors distributed
+    over the workers and the Hamiltonian diagonal as preconditioner.  The
+    pspace preconditioner and the wrappers of contract_2e (eg
+    addons.fix_spin_) are not applied in kernel.
+
+    Attributes:
+        nproc : int
+            Number of worker processes.  Each worker owns one segment of the
+            alpha strings.  Default is 2.
+
+    Examples:
+
+    >>> cis = FCISolver(mol, nproc=4)
+    >>> mc = mcscf.CASSCF(mf, 8, 8)
+    >>> mc.fcisolver = cis
+    >>> mc.kernel()
+    >>> cis.close()
+    '''
+    def __init__(self, mol=None, nproc=2):
+        direct_spin1.FCISolver.__init__(self, mol)
+        self.nproc = nproc
+        self._workers = None
+        self._keys = self._keys.union(['nproc'])
+
+    def dump_flags(self, verbose=None):
+        direct_spin1.FCISolver.dump_flags(self, verbose)
+        logger.info(self, 'nproc = %d', self.nproc)
+        return self
+
+    def _get_workers(self, norb, nelec, link_index):
+        if (self._workers is None or
+            not self._workers.match(norb, nelec, link_index)):
+            self.close()
+            logger.debug(self, 'Start %d workers for FCI', self.nproc)
+            self._workers = _Workers(norb, nelec, link_index, self.nproc)
+            logger.debug(self, 'Each sigma reads %.2f copies of the CI vector '
+                         'from the other workers', self._workers.nrow_read /
+                         float(self._workers.shape[0]))
+        return self._workers
+
+    def kernel(self, h1e, eri, norb, nelec, ci0=None,
+               tol=None, lindep=None, max_cycle=None, max_space=None,
+               nroots=None, davidson_only=None, pspace_size=None,
+               orbsym=None, wfnsym=None, ecore=0, **kwargs):
+        if self.nproc <= 1:
+            return direct_spin1.FCISolver.kernel(self, h1e, eri, norb, nelec,
+                                                 ci0, tol, lindep, max_cycle,
+                                                 max_space, nroots,
+                                                 davidson_only, pspace_size,
+                                                 ecore=ecore, **kwargs)
+        if self.verbose >= logger.WARN:
+            self.check_sanity()
+        if tol is None: tol = self.conv_tol
+        if lindep is None: lindep = self.lindep
+        if max_cycle is None: max_cycle = self.max_cycle
+        if max_space is None: max_space = self.max_space
+        if nroots is None: nroots = self.nroots
+        log = logger.Logger(self.stdout, self.verbose)
+
+        nelec = tuple(direct_spin1._unpack_nelec(nelec, self.spin))
+        link_index = direct_spin1._unpack(norb, nelec, None)
+        workers = self._get_workers(norb, nelec, link_index)
+        workers.set_hamiltonian(h1e, eri)
+        na, nb = workers.shape
+
+        if ci0 is None:
+            x0 = workers.get_init_guess(nroots)
+        else:
+            if isinstance(ci0, numpy.ndarray) and ci0.size == na*nb:
+                ci0 = [ci0]
+            x0 = []
+            for i, c in enumerate(ci0):
+                x0.append('x0_%d' % i)
+                workers.scatter(x0[-1], numpy.asarray(c))
+
+        conv, e, ci = davidson(workers, x0, nroots, tol, lindep, max_cycle,
+                               max_space, self.level_shift, log)
+        if not conv:
+            log.warn('Distributed FCI Davidson not converged')
+        civec = [workers.gather(key) for key in ci]
+        workers.delete(ci)
+        if nroots > 1:
+            return e+ecore, civec
+        else:
+            return e[0]+ecore, civec[0]
+
+    def contract_2e(self, eri, fcivec, norb, nelec, link_index=None, **kwargs):
+        if self.nproc <= 1:
+            return direct_spin1.contract_2e(eri, fcivec, norb, nelec, link_index)
+        nelec = tuple(direct_spin1._unpack_nelec(nelec, self.spin))
+        link_index = direct_spin1._unpack(norb, nelec, link_index)
+        workers = self._get_workers(norb, nelec, link_index)
+        workers.set_eri(eri)
+        fcivec = numpy.asarray(fcivec)
+        return workers.contract(fcivec).reshape(fcivec.shape)
+
+    def close(self):
+        '''Terminate the worker processes'''
+        if self._workers is not None:
+            self._workers.close()
+            self._workers = None
+        return self
+
+    def __getstate__(self):
+        state = direct_spin1.FCISolver.__getstate__(self)
+        state['_workers'] = None
+        return state
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+FCI = FCISolver
+
+
+if __name__ == '__main__':
+    from functools import reduce
+    from pyscf import gto
+    from pyscf import scf
+
+    mol = gto.Mole()
+    mol.verbose = 0
+    mol.atom = [['H', (0,0,i)] for i in range(8)]
+    mol.basis = {'H': '6-31g'}
+    mol.build()
+    m = scf.RHF(mol).run()
+    norb = m.mo_coeff.shape[1]
+    h1e = reduce(numpy.dot, (m.mo_coeff.T, m.get_hcore(), m.mo_coeff))
+    eri = ao2mo.kernel(m._eri, m.mo_coeff, compact=False)
+    cis = FCISolver(mol, nproc=3)
+    e1 = cis.kernel(h1e, eri, norb, mol.nelectron)[0]
+    cis.close()
+    e2 = direct_spin1.kernel(h1e, eri, norb, mol.nelectron)[0]
+    print(e1, e2, e1-e2)
@@ -193,6 +193,33 @@ def _complete_dm3_(dm2, dm3):
                 tmp = transpose01(tmp, k, i, j)
     return dm3
 
+def make_dm3_blk(cibra, ciket, norb, nelec, p0, p1, link_index=None):
+    r'''The rows p0:p1 of the spin traced 3-pdm
+    :math:`\langle p^\dagger q r^\dagger s t^\dagger u\rangle` (see
+    make_dm123).  Only the block dm3[p0:p1] is allocated.
+    '''
+    cibra = numpy.asarray(cibra, order='C')
+    ciket = numpy.asarray(ciket, order='C')
+    if link_index is None:
+        neleca, nelecb = _unpack_nelec(nelec)
+        link_indexa = cistring.gen_linkstr_index(range(norb), neleca)
+        link_indexb = cistring.gen_linkstr_index(range(norb), nelecb)
+    else:
+        link_indexa, link_indexb = link_index
+    na,nlinka = link_indexa.shape[:2]
+    nb,nlinkb = link_indexb.shape[:2]
+    rdm3 = numpy.empty((p1-p0,)+(norb,)*5)
+    librdm.FCIrdm3_blk_drv(rdm3.ctypes.data_as(ctypes.c_void_p),
+                           cibra.ctypes.data_as(ctypes.c_void_p),
+                           ciket.ctypes.data_as(ctypes.c_void_p),
+                           ctypes.c_int(norb),
+                           ctypes.c_int(na), ctypes.c_int(nb),
+                           ctypes.c_int(nlinka), ctypes.c_int(nlinkb),
+                           link_indexa.ctypes.data_as(ctypes.c_void_p),
+                           link_indexb.ctypes.data_as(ctypes.c_void_p),
+                           ctypes.c_int(p0), ctypes.c_int(p1))
+    return rdm3
+
 def make_dm1234(fname, cibra, ciket, norb, nelec):
     r'''Spin traced 1, 2, 3 and 4-particle density matrices.
 
@@ -302,6 +329,77 @@ def reorder_dm123(rdm1, rdm2, rdm3, inplace=True):
     return rdm1, rdm2, rdm3
 
 
+def pack_dm3(dm3, p0=0):
+    '''Pack the normal-ordered 3-pdm (stored as [p,u,q,t,r,s], see
+    reorder_dm123).  The 3-pdm is symmetric wrt the permutations of the index
+    pairs (p,u), (q,t) and (r,s).  For the compound pair indices P, Q, R,
+    only the elements P >= Q >= R are stored.  dm3 can be the rows
+    dm3[p0:p0+len(dm3)], which give the segment of the packed 3-pdm for the
+    compound indices P of these rows.
+    '''
+    norb = dm3.shape[1]
+    npair = norb * norb
+    dm3 = dm3.reshape(-1,npair,npair)
+    i0 = p0 * norb
+    i1 = i0 + dm3.shape[0]
+    dm3p = numpy.empty(i1*(i1+1)*(i1+2)//6 - i0*(i0+1)*(i0+2)//6)
+    k0 = 0
+    for i in range(i0, i1):
+        k1 = k0 + (i+1)*(i+2)//2
+        dm3p[k0:k1] = dm3[i-i0,:i+1,:i+1][numpy.tril_indices(i+1)]
+        k0 = k1
+    return dm3p
+
+def unpack_dm3(dm3p, norb, p0=0, p1=None):
+    '''Unpack the rows p0:p1 of the normal-ordered 3-pdm generated by
+    pack_dm3.  Returns the dense block dm3[p0:p1] in the order [p,u,q,t,r,s].
+    '''
+    if p1 is None:
+        p1 = norb
+    npair = norb * norb
+    i = numpy.arange(p0*norb, p1*norb)[:,None,None]
+    j = numpy.arange(npair)[None,:,None]
+    k = numpy.arange(npair)[None,None,:]
+    hi = numpy.maximum(numpy.maximum(i, j), k)
+    lo = numpy.minimum(numpy.minimum(i, j), k)
+    mid = i + j + k - hi - lo
+    idx = hi*(hi+1)*(hi+2)//6 + mid*(mid+1)//2 + lo
+    return dm3p[idx].reshape(p1-p0,norb,norb,norb,norb,norb)
+
+def make_dm123_packed(civec, norb, nelec, link_index=None,
+                      max_memory=lib.param.MAX_MEMORY):
+    '''Spin traced 1, 2-pdm (as make_dm123) and the normal-ordered 3-pdm in
+    the packed form of pack_dm3.  The 3-pdm is generated and packed in blocks
+    of the first index.  The dense norb^6 3-pdm is not created.
+    '''
+    if link_index is None:
+        neleca, nelecb = _unpack_nelec(nelec)
+        link_indexa = cistring.gen_linkstr_index(range(norb), neleca)
+        link_indexb = cistring.gen_linkstr_index(range(norb), nelecb)
+        link_index = (link_indexa, link_indexb)
+    dm1, dm2 = make_rdm12_spin1('FCIrdm12kern_sf', civec, civec, norb, nelec,
+                                link_index)
+    dm2n = reorder_rdm(dm1, dm2, inplace=False)[1]
+
+    npair = norb * norb
+    dm3p = numpy.empty(npair*(npair+1)*(npair+2)//6)
+    mem_now = lib.current_memory()[0]
+    mem_avail = max(max_memory - mem_now - dm3p.nbytes/1e6, 200)
+    blksize = int(max(1, min(norb, mem_avail*1e6/8/norb**5)))
+    for p0, p1 in lib.prange(0, norb, blksize):
+        dm3 = make_dm3_blk(civec, civec, norb, nelec, p0, p1, link_index)
+# reorder_dm123 for the rows p0:p1
+        for q in range(norb):
+            dm3[:,q,q,:,:,:] -= dm2n[p0:p1]
+            dm3[:,:,:,q,q,:] -= dm2n[p0:p1]
+            dm3[:,q,:,:,q,:] -= dm2n[p0:p1].transpose(0,2,3,1)
+            for s in range(norb):
+                dm3[:,q,q,s,s,:] -= dm1[p0:p1]
+        i0, i1 = p0 * norb, p1 * norb
+        dm3p[i0*(i0+1)*(i0+2)//6:i1*(i1+1)*(i1+2)//6] = pack_dm3(dm3, p0)
+        dm3 = None
+    return dm1, dm2, dm3p
+
 # <p^+ q r^+ s t^+ u w^+ v> => <p^+ r^+ t^+ w^+ v u s q>
 # rdm2, rdm3 are the (reordered) standard 2-pdm and 3-pdm
 def reorder_dm1234(rdm1, rdm2, rdm3, rdm4, inplace=True):
@@ -24,6 +24,7 @@ from pyscf import ao2mo
 from pyscf.fci import cistring
 from pyscf.fci import direct_spin1
 from pyscf.fci import rdm
+from pyscf.fci import select_ci_pt2
 
 libfci = lib.load_library('libfci')
 
@@ -86,6 +87,9 @@ def contract_2e(eri, civec_strs, norb, nelec, link_index=None):
     return _as_SCIvector(ci1.reshape(ci_coeff.shape), ci_strs)
 
 def select_strs(myci, eri, eri_pq_max, civec_max, strs, norb, nelec):
+    if _is_multiword(strs):
+        return _select_strs_wide(myci, eri, eri_pq_max, civec_max, strs,
+                                 norb, nelec)
     strs = numpy.asarray(strs, dtype=numpy.int64)
     nstrs = len(strs)
     nvir = norb - nelec
@@ -125,10 +129,10 @@ def enlarge_space(myci, civec_strs, eri, norb, nelec):
 
     strsa_add = select_strs(myci, eri, eri_pq_max, civec_a_max, strsa, norb, nelec[0])
     strsb_add = select_strs(myci, eri, eri_pq_max, civec_b_max, strsb, norb, nelec[1])
-    strsa = numpy.append(strsa, strsa_add)
-    strsb = numpy.append(strsb, strsb_add)
-    aidx = numpy.argsort(strsa)
-    bidx = numpy.argsort(strsb)
+    strsa = numpy.concatenate((strsa, strsa_add.astype(strsa.dtype)))
+    strsb = numpy.concatenate((strsb, strsb_add.astype(strsb.dtype)))
+    aidx = cistring.argsort_strs(strsa)
+    bidx = cistring.argsort_strs(strsb)
     ci_strs = (strsa[aidx], strsb[bidx])
     aidx = numpy.where(aidx < len(ci_aidx))[0]
     bidx = numpy.where(bidx < len(ci_bidx))[0]
@@ -149,6 +153,8 @@ def enlarge_space(myci, civec_strs, eri, norb, nelec):
 def cre_des_linkstr(strs, norb, nelec, tril=False):
     '''Given intermediates, the link table to generate input strs
     '''
+    if _is_multiword(strs):
+        return _cre_des_linkstr_wide(strs, norb, nelec, tril)
     strs = numpy.asarray(strs, dtype=numpy.int64)
     nvir = norb - nelec
     nstrs = len(strs)
@@ -170,6 +176,8 @@ def des_des_linkstr(strs, norb, nelec, tril=False):
     '''
     if nelec < 2:
         return None
+    if _is_multiword(strs):
+        return _des_des_linkstr_wide(strs, norb, nelec, tril)
 
     strs = numpy.asarray(strs, dtype=numpy.int64)
     nvir = norb - nelec
@@ -211,6 +219,8 @@ def gen_des_linkstr(strs, norb, nelec):
     '''
     if nelec < 1:
         return None
+    if _is_multiword(strs):
+        return _gen_des_linkstr_wide(strs, norb, nelec)
 
     strs = numpy.asarray(strs, dtype=numpy.int64)
     nvir = norb - nelec
@@ -238,6 +248,8 @@ def gen_cre_linkstr(strs, norb, nelec):
     '''
     if nelec == norb:
         return None
+    if _is_multiword(strs):
+        return _gen_cre_linkstr_wide(strs, norb, nelec)
 
     strs = numpy.asarray(strs, dtype=numpy.int64)
     nvir = norb - nelec
@@ -260,8 +272,253 @@ def gen_cre_linkstr(strs, norb, nelec):
     return link_index
 
 
+#
+# Multi-word strings (2D arrays [nstrs,nwords]) for more than 64 orbitals.
+# The link tables have the same layouts as those generated by the C
+# functions SCIcre_des_linkstr, SCIdes_des_linkstr etc. so that the
+# contraction and density matrix kernels can be used without changes.
+#
+WIDE_BLKSIZE = 400000
+
+def _is_multiword(strs):
+    return numpy.ndim(strs) == 2
+
+def _occ_vir_wide(strs, norb, nelec):
+    occ_pattern = cistring.strs2occ(strs, norb)
+    nstrs = occ_pattern.shape[0]
+    occ = numpy.where(occ_pattern)[1].reshape(nstrs,nelec)
+    vir = numpy.where(~occ_pattern)[1].reshape(nstrs,norb-nelec)
+    return occ_pattern, occ, vir
+
+def _occ_above(occ_pattern, nelec):
+    '''Number of occupied orbitals above each orbital'''
+    return nelec - numpy.cumsum(occ_pattern, axis=1)
+
+def _des_strs_wide(strs, norb, nelec):
+    '''Unique strings which have one electron removed from strs'''
+    occ = _occ_vir_wide(strs, norb, nelec)[1]
+    inter = strs[:,None] ^ cistring.orb_masks(norb)[occ]
+    return cistring.uniq_strs(inter.reshape(-1,strs.shape[1]))
+
+def _cre_strs_wide(strs, norb, nelec):
+    '''Unique strings which have one electron added to strs'''
+    vir = _occ_vir_wide(strs, norb, nelec)[2]
+    inter = strs[:,None] | cistring.orb_masks(norb)[vir]
+    return cistring.uniq_strs(inter.reshape(-1,strs.shape[1]))
+
+def _compact_index(found, offset=0, step=1):
+    '''Rows, columns and positions in the link table of the found links'''
+    pos = (numpy.cumsum(found, axis=1) - 1) * step + offset
+    ir, ic = numpy.where(found)
+    return ir, ic, pos[ir,ic]
+
+def _tril_ai(a, i):
+    hi = numpy.maximum(a, i)
+    return hi*(hi+1)//2 + numpy.minimum(a, i)
+
+def _single_excitations_wide(strs, norb, nelec, strs_index):
+    '''Single excitations a^+ i of strs, in the order of SCIcre_des_linkstr.
+    Returns the occupied orbitals of strs and, for each excitation, the
+    orbitals a and i, the address in strs_index (-1 if not found) and sign.
+    '''
+    occ_pattern, occ, vir = _occ_vir_wide(strs, norb, nelec)
+    m, nw = strs.shape
+    masks = cistring.orb_masks(norb)
+    str0 = strs[:,None,None] ^ masks[vir][:,:,None] ^ masks[occ][:,None]
+    addr = cistring.lookup_strs(strs_index, str0.reshape(-1,nw))
+    addr = addr.reshape(m,-1)
+    a = numpy.repeat(vir, nelec, axis=1)
+    i = numpy.tile(occ, (1,norb-nelec))
+    hi = numpy.maximum(a, i)
+    lo = numpy.minimum(a, i)
+    cnt = numpy.cumsum(occ_pattern, axis=1)
+    r = numpy.arange(m)[:,None]
+    sign = 1 - 2 * ((cnt[r,hi-1] - cnt[r,lo]) % 2)
+    return occ, a, i, addr, sign
+
+def _cre_des_linkstr_wide(strs, norb, nelec, tril=False):
+    strs = numpy.asarray(strs, dtype=numpy.uint64)
+    nstrs = len(strs)
+    nvir = norb - nelec
+    link_index = numpy.zeros((nstrs,nelec+nelec*nvir,4), dtype=numpy.int32)
+    strs_index = cistring.make_strs_index(strs)
+    blksize = max(1, WIDE_BLKSIZE // max(1, nelec*nvir))
+    for p0, p1 in lib.prange(0, nstrs, blksize):
+        occ, a, i, addr, sign = _single_excitations_wide(strs[p0:p1], norb,
+                                                         nelec, strs_index)
+        tab = link_index[p0:p1]
+        if tril:
+            tab[:,:nelec,0] = occ*(occ+1)//2+occ
+        else:
+            tab[:,:nelec,0] = occ
+            tab[:,:nelec,1] = occ
+        tab[:,:nelec,2] = numpy.arange(p0, p1)[:,None]
+        tab[:,:nelec,3] = 1
+
+        ir, ic, k = _compact_index(addr >= 0, nelec)
+        a = a[ir,ic]
+        i = i[ir,ic]
+        if tril:
+            tab[ir,k,0] = _tril_ai(a, i)
+        else:
+            tab[ir,k,0] = a
+            tab[ir,k,1] = i
+        tab[ir,k,2] = addr[ir,ic]
+        tab[ir,k,3] = sign[ir,ic]
+    return link_index
+
+def _des_des_linkstr_wide(strs, norb, nelec, tril=False):
+    strs = numpy.asarray(strs, dtype=numpy.uint64)
+    nw = strs.shape[1]
+    inter = _des_strs_wide(strs, norb, nelec)
+    inter = _des_strs_wide(inter, norb, nelec-1)
+    ninter = len(inter)
+
+    nvir = norb - nelec + 2
+    link_index = numpy.zeros((ninter,nvir*nvir,4), dtype=numpy.int32)
+    masks = cistring.orb_masks(norb)
+    strs_index = cistring.make_strs_index(strs)
+    idx, idy = numpy.tril_indices(nvir, -1)
+    blksize = max(1, WIDE_BLKSIZE // len(idx))
+    for p0, p1 in lib.prange(0, ninter, blksize):
+        occ_pattern, occ, vir = _occ_vir_wide(inter[p0:p1], norb, nelec-2)
+        m = p1 - p0
+        vi = vir[:,idx]
+        vj = vir[:,idy]
+        str0 = inter[p0:p1,None] ^ masks[vi] ^ masks[vj]
+        addr = cistring.lookup_strs(strs_index, str0.reshape(-1,nw))
+        addr = addr.reshape(m,len(idx))
+        above = _occ_above(occ_pattern, nelec-2)
+        r = numpy.arange(m)[:,None]
+        sign = 1 - 2 * ((above[r,vi] + above[r,vj] + 1) % 2)
+
+        tab = link_index[p0:p1]
+        if tril:
+            ir, ic, k = _compact_index(addr >= 0)
+            tab[ir,k,0] = vi[ir,ic]*(vi[ir,ic]-1)//2+vj[ir,ic]
+            tab[ir,k,2] = addr[ir,ic]
+            tab[ir,k,3] = sign[ir,ic]
+        else:
+            ir, ic, k = _compact_index(addr >= 0, 0, 2)
+            tab[ir,k,0] = vi[ir,ic]
+            tab[ir,k,1] = vj[ir,ic]
+            tab[ir,k,2] = addr[ir,ic]
+            tab[ir,k,3] = sign[ir,ic]
+            tab[ir,k+1,0] = vj[ir,ic]
+            tab[ir,k+1,1] = vi[ir,ic]
+            tab[ir,k+1,2] = addr[ir,ic]
+            tab[ir,k+1,3] =-sign[ir,ic]
+    return link_index
+
+def _gen_des_linkstr_wide(strs, norb, nelec):
+    strs = numpy.asarray(strs, dtype=numpy.uint64)
+    nw = strs.shape[1]
+    inter = _des_strs_wide(strs, norb, nelec)
+    ninter = len(inter)
+
+    nvir = norb - nelec + 1
+    link_index = numpy.zeros((ninter,nvir,4), dtype=numpy.int32)
+    masks = cistring.orb_masks(norb)
+    strs_index = cistring.make_strs_index(strs)
+    blksize = max(1, WIDE_BLKSIZE // nvir)
+    for p0, p1 in lib.prange(0, ninter, blksize):
+        occ_pattern, occ, vir = _occ_vir_wide(inter[p0:p1], norb, nelec-1)
+        m = p1 - p0
+        str0 = inter[p0:p1,None] | masks[vir]
+        addr = cistring.lookup_strs(strs_index, str0.reshape(-1,nw))
+        addr = addr.reshape(m,nvir)
+        above = _occ_above(occ_pattern, nelec-1)
+        sign = 1 - 2 * (above[numpy.arange(m)[:,None],vir] % 2)
+
+        tab = link_index[p0:p1]
+        ir, ic, k = _compact_index(addr >= 0)
+        tab[ir,k,1] = vir[ir,ic]
+        tab[ir,k,2] = addr[ir,ic]
+        tab[ir,k,3] = sign[ir,ic]
+    return link_index
+
+def _gen_cre_linkstr_wide(strs, norb, nelec):
+    strs = numpy.asarray(strs, dtype=numpy.uint64)
+    nw = strs.shape[1]
+    inter = _cre_strs_wide(strs, norb, nelec)
+    ninter = len(inter)
+
+    link_index = numpy.zeros((ninter,nelec+1,4), dtype=numpy.int32)
+    masks = cistring.orb_masks(norb)
+    strs_index = cistring.make_strs_index(strs)
+    blksize = max(1, WIDE_BLKSIZE // (nelec+1))
+    for p0, p1 in lib.prange(0, ninter, blksize):
+        occ_pattern, occ, vir = _occ_vir_wide(inter[p0:p1], norb, nelec+1)
+        m = p1 - p0
+        str0 = inter[p0:p1,None] ^ masks[occ]
+        addr = cistring.lookup_strs(strs_index, str0.reshape(-1,nw))
+        addr = addr.reshape(m,nelec+1)
+        above = _occ_above(occ_pattern, nelec+1)
+        sign = 1 - 2 * (above[numpy.arange(m)[:,None],occ] % 2)
+
+        tab = link_index[p0:p1]
+        ir, ic, k = _compact_index(addr >= 0)
+        tab[ir,k,0] = occ[ir,ic]
+        tab[ir,k,2] = addr[ir,ic]
+        tab[ir,k,3] = sign[ir,ic]
+    return link_index
+
+def _select_strs_wide(myci, eri, eri_pq_max, civec_max, strs, norb, nelec):
+    strs = numpy.asarray(strs, dtype=numpy.uint64)
+    nstrs, nw = strs.shape
+    eri = eri.reshape([norb]*4)
+    masks = cistring.orb_masks(norb)
+    cutoff = myci.select_cutoff
+    nvir = norb - nelec
+    strs_add = [numpy.zeros((0,nw), dtype=numpy.uint64)]
+    blksize = max(1, WIDE_BLKSIZE // max(1, (nelec*nvir)**2))
+    for p0, p1 in lib.prange(0, nstrs, blksize):
+        occs, virs = _occ_vir_wide(strs[p0:p1], norb, nelec)[1:]
+        ca = civec_max[p0:p1]
+        # single excitations i->a, stored as [r,a,i]
+        single = eri_pq_max[virs[:,:,None],occs[:,None,:]] * ca[:,None,None] > cutoff
+        r, a, i = numpy.where(single)
+        va = virs[r,a]
+        oi = occs[r,i]
+        str1 = strs[p0+r] ^ masks[va] ^ masks[oi]
+        strs_add.append(str1)
+
+        # double excitations (i->a, j->b) with j < i and b > a
+        double = (oi < nelec) & (va >= nelec)
+        r, a, i, va, oi, str1 = (r[double], a[double], i[double],
+                                 va[double], oi[double], str1[double])
+        if r.size > 0:
+            eri_sub = eri[va[:,None,None],oi[:,None,None],
+                          virs[r][:,:,None],occs[r][:,None,:]]
+            mask = abs(eri_sub) * ca[r,None,None] > cutoff
+            mask &= numpy.arange(nvir)[None,:,None] > a[:,None,None]
+            mask &= numpy.arange(nelec)[None,None,:] < i[:,None,None]
+            p, b, j = numpy.where(mask)
+            str2 = (str1[p] ^ masks[virs[r[p],b]] ^ masks[occs[r[p],j]])
+            strs_add.append(str2)
+    strs_add = cistring.uniq_strs(numpy.vstack(strs_add))
+    addr = cistring.lookup_strs(cistring.make_strs_index(strs), strs_add)
+    return strs_add[addr < 0]
+
+def _make_hdiag_wide(h1e, eri, ci_strs, norb, nelec):
+    eri = ao2mo.restore(1, eri, norb)
+    jdiag = numpy.einsum('iijj->ij',eri)
+    kdiag = numpy.einsum('ijji->ij',eri)
+    occa = cistring.strs2occ(ci_strs[0], norb).astype(numpy.double)
+    occb = cistring.strs2occ(ci_strs[1], norb).astype(numpy.double)
+    h1diag = numpy.diag(h1e)
+    ea = occa.dot(h1diag) + numpy.einsum('ij,ij->i', occa.dot(jdiag-kdiag), occa) * .5
+    eb = occb.dot(h1diag) + numpy.einsum('ij,ij->i', occb.dot(jdiag-kdiag), occb) * .5
+    hdiag = numpy.dot(occa.dot(jdiag), occb.T)
+    hdiag += ea[:,None]
+    hdiag += eb
+    return hdiag.ravel()
+
+
 def make_hdiag(h1e, eri, ci_strs, norb, nelec):
     ci_coeff, nelec, ci_strs = _unpack(None, nelec, ci_strs)
+    if _is_multiword(ci_strs[0]):
+        return _make_hdiag_wide(h1e, eri, ci_strs, norb, nelec)
     na = len(ci_strs[0])
     nb = len(ci_strs[1])
     hdiag = numpy.empty(na*nb)
@@ -282,6 +539,306 @@ def make_hdiag(h1e, eri, ci_strs, norb, nelec):
                              ci_strs[1].ctypes.data_as(ctypes.c_void_p))
     return hdiag
 
+
+class _StrsBook(object):
+    '''Strings of one spin, in the order they were added to the book.
+
+    The book keeps a search index (string -> address) and the link tables
+    (cre_des_linkstr_tril and des_des_linkstr_tril layouts).  When strings
+    are added, only the links of the new strings are generated.  When
+    strings are removed, the link tables are compacted without being
+    regenerated.
+    '''
+    def __init__(self, norb, nelec, multiword=False):
+        self.norb = norb
+        self.nelec = nelec
+        self.multiword = multiword
+        nw = cistring.num_words(norb)
+        nvir = norb - nelec
+        self.strs = numpy.zeros((0,nw), dtype=numpy.uint64)
+        self._index = cistring.make_strs_index(self.strs)
+        self.cd_index = numpy.zeros((0,nelec+nelec*nvir,4), dtype=numpy.int32)
+        self._cd_count = numpy.zeros(0, dtype=int)
+        if nelec > 1:
+            self.inter = numpy.zeros((0,nw), dtype=numpy.uint64)
+            self._inter_index = cistring.make_strs_index(self.inter)
+            self.dd_index = numpy.zeros((0,(nvir+2)**2,4), dtype=numpy.int32)
+            self._dd_count = numpy.zeros(0, dtype=int)
+        else:
+            self.dd_index = None
+
+    def __len__(self):
+        return len(self.strs)
+
+    @property
+    def ci_strs(self):
+        '''Strings in the format of SCIvector._strs'''
+        if self.multiword:
+            return self.strs
+        else:
+            return self.strs.view(numpy.int64).ravel()
+
+    def _as_words(self, strs):
+        if self.multiword:
+            return numpy.asarray(strs, dtype=numpy.uint64).reshape(-1,self.strs.shape[1])
+        else:
+            return numpy.asarray(strs, dtype=numpy.int64).view(numpy.uint64).reshape(-1,1)
+
+    def lookup(self, strs):
+        return cistring.lookup_strs(self._index, self._as_words(strs))
+
+    def update(self, strs):
+        '''Keep the strings of strs in the book and add the strings which are
+        not in the book.
+
+        Returns:
+            The addresses of strs in the book, and the new addresses of the
+            strings which were in the book (-1 for the removed strings).
+        '''
+        words = self._as_words(strs)
+        addr = cistring.lookup_strs(self._index, words)
+        keep = numpy.zeros(len(self.strs), dtype=bool)
+        keep[addr[addr>=0]] = True
+        old2new = self._remove(keep)
+        self.add(words[addr<0])
+        return cistring.lookup_strs(self._index, words), old2new
+
+    def add(self, strs):
+        '''Append the strings which are not in the book'''
+        words = cistring.uniq_strs(self._as_words(strs))
+        words = words[cistring.lookup_strs(self._index, words) < 0]
+        n0 = len(self.strs)
+        if len(words) == 0:
+            return 0
+        self.strs = numpy.vstack((self.strs, words))
+        self._index = cistring.add_strs_index(self._index, words, n0)
+        self._add_cre_des(n0)
+        if self.nelec > 1:
+            self._add_des_des(n0)
+        return len(words)
+
+    def _add_cre_des(self, n0):
+        norb, nelec = self.norb, self.nelec
+        n1 = len(self.strs)
+        nlink = self.cd_index.shape[1]
+        self.cd_index = numpy.vstack((self.cd_index,
+                                      numpy.zeros((n1-n0,nlink,4), dtype=numpy.int32)))
+        self._cd_count = numpy.append(self._cd_count, numpy.zeros(n1-n0, dtype=int))
+        blksize = max(1, WIDE_BLKSIZE // max(1, nlink-nelec))
+        for p0, p1 in lib.prange(n0, n1, blksize):
+            occ, a, i, addr, sign = _single_excitations_wide(self.strs[p0:p1], norb,
+                                                             nelec, self._index)
+            tab = self.cd_index[p0:p1]
+            tab[:,:nelec,0] = occ*(occ+1)//2+occ
+            tab[:,:nelec,2] = numpy.arange(p0, p1)[:,None]
+            tab[:,:nelec,3] = 1
+            found = addr >= 0
+            ir, ic, k = _compact_index(found, nelec)
+            ai = _tril_ai(a[ir,ic], i[ir,ic])
+            addr = addr[ir,ic]
+            sign = sign[ir,ic]
+            tab[ir,k,0] = ai
+            tab[ir,k,2] = addr
+            tab[ir,k,3] = sign
+            self._cd_count[p0:p1] = nelec + found.sum(axis=1)
+# The old strings are linked to the new strings by the same excitation
+# (with the same sign) in the tril form
+            old = addr < n0
+            _append_links(self.cd_index, self._cd_count, addr[old], ai[old],
+                          ir[old]+p0, sign[old])
+
+    def _add_des_des(self, n0):
+        norb, nelec = self.norb, self.nelec
+        n1 = len(self.strs)
+        nw = self.strs.shape[1]
+        masks = cistring.orb_masks(norb)
+        idx, idy = numpy.tril_indices(nelec, -1)
+        nlink = self.dd_index.shape[1]
+        blksize = max(1, WIDE_BLKSIZE // len(idx))
+        for p0, p1 in lib.prange(n0, n1, blksize):
+            occ_pattern, occ = _occ_vir_wide(self.strs[p0:p1], norb, nelec)[:2]
+            m = p1 - p0
+            oi = occ[:,idx]
+            oj = occ[:,idy]
+            inter = self.strs[p0:p1,None] ^ masks[oi] ^ masks[oj]
+            inter = inter.reshape(-1,nw)
+            above = _occ_above(occ_pattern, nelec)
+            r = numpy.arange(m)[:,None]
+            sign = 1 - 2 * ((above[r,oi] + above[r,oj]) % 2)
+
+            rows = cistring.lookup_strs(self._inter_index, inter)
+            if numpy.any(rows < 0):
+                inter_new = cistring.uniq_strs(inter[rows<0])
+                ninter = len(self.inter)
+                self.inter = numpy.vstack((self.inter, inter_new))
+                self._inter_index = cistring.add_strs_index(self._inter_index,
+                                                            inter_new, ninter)
+                self.dd_index = numpy.vstack((self.dd_index,
+                        numpy.zeros((len(inter_new),nlink,4), dtype=numpy.int32)))
+                self._dd_count = numpy.append(self._dd_count,
+                        numpy.zeros(len(inter_new), dtype=int))
+                rows = cistring.lookup_strs(self._inter_index, inter)
+            addr = numpy.repeat(numpy.arange(p0, p1), len(idx))
+            _append_links(self.dd_index, self._dd_count, rows,
+                          (oi*(oi-1)//2+oj).ravel(), addr, sign.ravel())
+
+    def _remove(self, keep):
+        n = len(self.strs)
+        old2new = -numpy.ones(n, dtype=int)
+        old2new[keep] = numpy.arange(numpy.count_nonzero(keep))
+        if numpy.all(keep):
+            return old2new
+        self.strs = self.strs[keep]
+        self._index = cistring.make_strs_index(self.strs)
+        self.cd_index, self._cd_count = _relink(self.cd_index[keep], old2new)
+        if self.nelec > 1:
+            self.dd_index, self._dd_count = _relink(self.dd_index, old2new)
+        return old2new
+
+def _append_links(link_index, count, rows, ia, addr, sign):
+    '''Append links (ia, addr, sign) to the rows of a tril link table'''
+    if len(rows) == 0:
+        return link_index
+    order = numpy.argsort(rows, kind='mergesort')
+    rows = rows[order]
+    k = count[rows] + numpy.arange(len(rows)) - numpy.searchsorted(rows, rows)
+    link_index[rows,k,0] = ia[order]
+    link_index[rows,k,2] = addr[order]
+    link_index[rows,k,3] = sign[order]
+    count += numpy.bincount(rows, minlength=len(count))
+    return link_index
+
+def _relink(link_index, old2new):
+    '''Map the addresses of a link table to the new addresses.  The links to
+    the removed strings (new address -1) are dropped.'''
+    nrow, nlink = link_index.shape[:2]
+    addr = old2new[link_index[:,:,2]]
+    valid = (link_index[:,:,3] != 0) & (addr >= 0)
+    link_index[:,:,2] = addr
+    link_index[~valid] = 0
+    order = numpy.argsort(~valid, axis=1, kind='mergesort')
+    link_index = link_index[numpy.arange(nrow)[:,None],order]
+    return link_index, valid.sum(axis=1)
+
+
+class _SCISpace(object):
+    '''Determinant space of the selected CI which is enlarged incrementally.
+
+    The alpha and beta strings are stored in _StrsBook.  Optionally, the
+    Hamiltonian is stored as a sparse matrix for small spaces.  The
+    Hamiltonian elements are computed only for the new determinants.  It
+    requires the Hermitian contract_2e function.
+    '''
+    def __init__(self, norb, nelec, multiword=False):
+        self.booka = _StrsBook(norb, nelec[0], multiword)
+        self.bookb = _StrsBook(norb, nelec[1], multiword)
+        self.h = None
+        self._old_dets = None
+
+    @property
+    def ci_strs(self):
+        return self.booka.ci_strs, self.bookb.ci_strs
+
+    @property
+    def link_index(self):
+        return (self.booka.cd_index, self.booka.dd_index,
+                self.bookb.cd_index, self.bookb.dd_index)
+
+    def update(self, civecs):
+        '''Update the space to the strings of civecs.  Returns civecs in the
+        order of the strings of the space.
+        '''
+        strsa, strsb = civecs[0]._strs
+        na0 = len(self.booka)
+        nb0 = len(self.bookb)
+        addra, mapa = self.booka.update(strsa)
+        addrb, mapb = self.bookb.update(strsb)
+        na = len(self.booka)
+        nb = len(self.bookb)
+        # the addresses of the old determinants in the new space
+        dets = mapa[:,None] * nb + mapb
+        dets[(mapa[:,None] < 0) | (mapb < 0)] = -1
+        self._old_dets = dets.ravel()
+
+        ci_strs = self.ci_strs
+        cs = []
+        for c in civecs:
+            c1 = numpy.zeros((na,nb))
+            lib.takebak_2d(c1, c.reshape(len(strsa),len(strsb)), addra, addrb)
+            cs.append(_as_SCIvector(c1, ci_strs))
+        return cs
+
+    def update_hamiltonian(self, contract, max_size, max_memory=2000):
+        '''Update the sparse Hamiltonian for the new determinants.  contract
+        is the function to apply H on the CI vectors of the space, called as
+        contract(civec, link_index).  The sparse Hamiltonian is dropped if the
+        space is larger than max_size.
+        '''
+        from scipy import sparse
+        na = len(self.booka)
+        nb = len(self.bookb)
+        ndet = na * nb
+        if ndet > max_size:
+            self.h = self._old_dets = None
+            return None
+
+        if self.h is None or self._old_dets is None:
+            h0 = sparse.coo_matrix((ndet,ndet))
+            old = numpy.zeros(ndet, dtype=bool)
+        else:
+            h0 = self.h.tocoo()
+            dets = self._old_dets
+            mask = (dets[h0.row] >= 0) & (dets[h0.col] >= 0)
+            h0 = sparse.coo_matrix((h0.data[mask], (dets[h0.row[mask]],
+                                                    dets[h0.col[mask]])),
+                                   shape=(ndet,ndet))
+            old = numpy.zeros(ndet, dtype=bool)
+            old[dets[dets>=0]] = True
+
+        rows = [h0.row]
+        cols = [h0.col]
+        vals = [h0.data]
+        new = numpy.where(~old)[0]
+# The columns of H for the new determinants.  The unit vectors of a batch of
+# new determinants are stacked along the alpha strings and contracted in one
+# call with the link tables of the stacked alpha strings.  contract_2e holds
+# about 4 copies of the stacked vectors.
+        blksize = int(max_memory*1e6/8 / (ndet*4))
+        blksize = max(1, min(len(new), blksize))
+        for p0, p1 in lib.prange(0, len(new), blksize):
+            nvec = p1 - p0
+            e = numpy.zeros((nvec,ndet))
+            e[numpy.arange(nvec),new[p0:p1]] = 1
+            link_index = _stack_linkstr_index(self.link_index, na, nvec)
+            hc = contract(e.reshape(nvec*na,nb), link_index).reshape(nvec,ndet)
+            k, idx = numpy.nonzero(hc)
+            hj = hc[k,idx]
+            j = new[p0:p1][k]
+            rows.append(idx)
+            cols.append(j)
+            vals.append(hj)
+# H is Hermitian. The elements between the old and the new determinants are
+# obtained from the columns of the new determinants.
+            mask = old[idx]
+            rows.append(j[mask])
+            cols.append(idx[mask])
+            vals.append(hj[mask])
+        self.h = sparse.csr_matrix((numpy.hstack(vals),
+                                    (numpy.hstack(rows), numpy.hstack(cols))),
+                                   shape=(ndet,ndet))
+        self._old_dets = None
+        return self.h
+
+    def sort(self, civecs):
+        '''civecs on the strings of the space sorted in ascending order'''
+        strsa, strsb = self.ci_strs
+        aidx = cistring.argsort_strs(strsa)
+        bidx = cistring.argsort_strs(strsb)
+        ci_strs = (strsa[aidx], strsb[bidx])
+        return [_as_SCIvector(lib.take_2d(c.reshape(len(strsa),len(strsb)),
+                                          aidx, bidx), ci_strs)
+                for c in civecs]
+
 def kernel_fixed_space(myci, h1e, eri, norb, nelec, ci_strs, ci0=None,
                        tol=None, lindep=None, max_cycle=None, max_space=None,
                        nroots=None, davidson_only=None,
@@ -366,6 +923,9 @@ def kernel_float_space(myci, h1e, eri, norb, nelec, ci0=None,
     else:
         ci_strs = (numpy.asarray([int('1'*nelec[0], 2)]),
                    numpy.asarray([int('1'*nelec[1], 2)]))
+        if norb > 64:
+            ci_strs = (cistring.int2strs(ci_strs[0], norb),
+                       cistring.int2strs(ci_strs[1], norb))
         ci0 = _as_SCIvector(numpy.ones((1,1)), ci_strs)
         ci0 = myci.enlarge_space(ci0, h2e, norb, nelec)
         if ci0.size < nroots:
@@ -377,6 +937,9 @@ def kernel_float_space(myci, h1e, eri, norb, nelec, ci0=None,
             coreb = '1' * (nelec[1]-1)
             ci_strs = (numpy.asarray([int('1'+corea, 2), int('10'+corea, 2)]),
                        numpy.asarray([int('1'+coreb, 2), int('10'+coreb, 2)]))
+            if norb > 64:
+                ci_strs = (cistring.int2strs(ci_strs[0], norb),
+                           cistring.int2strs(ci_strs[1], norb))
             ci0 = _as_SCIvector(numpy.ones((2,2)), ci_strs)
             ci0 = myci.enlarge_space(ci0, h2e, norb, nelec)
         if ci0.size < nroots:
@@ -385,9 +948,20 @@ def kernel_float_space(myci, h1e, eri, norb, nelec, ci0=None,
         hdiag = myci.make_hdiag(h1e, eri, ci_strs, norb, nelec)
         ci0 = myci.get_init_guess(ci_strs, norb, nelec, nroots, hdiag)
 
-    def hop(c):
-        hc = myci.contract_2e(h2e, _as_SCIvector(c, ci_strs), norb, nelec, link_index)
+# The strings, link tables and Hamiltonian of the selected space are updated
+# incrementally in the space object
+    space = _SCISpace(norb, nelec, _is_multiword(ci0[0]._strs[0]))
+    def contract(c, link_index=None):
+        if link_index is None:
+            link_index = space.link_index
+        hc = myci.contract_2e(h2e, _as_SCIvector(c, space.ci_strs), norb, nelec,
+                              link_index)
         return hc.ravel()
+    def hop(c):
+        if space.h is None:
+            return contract(c)
+        else:
+            return space.h.dot(c)
     precond = lambda x, e, *args: x/(hdiag-e+myci.level_shift)
 
     namax = cistring.num_strings(norb, nelec[0])
@@ -396,14 +970,15 @@ def kernel_float_space(myci, h1e, eri, norb, nelec, ci0=None,
     float_tol = 3e-4
     conv = False
     for icycle in range(norb):
-        ci_strs = ci0[0]._strs
+        ci0 = space.update(ci0)
+        ci_strs = space.ci_strs
         float_tol = max(float_tol*.3, tol*1e2)
         log.debug('cycle %d  ci.shape %s  float_tol %g',
                   icycle, (len(ci_strs[0]), len(ci_strs[1])), float_tol)
 
         ci0 = [c.ravel() for c in ci0]
-        link_index = _all_linkstr_index(ci_strs, norb, nelec)
         hdiag = myci.make_hdiag(h1e, eri, ci_strs, norb, nelec)
+        space.update_hamiltonian(contract, myci.sparse_h_size, max_memory)
         #e, ci0 = lib.davidson(hop, ci0.reshape(-1), precond, tol=float_tol)
         e, ci0 = myci.eig(hop, ci0, precond, tol=float_tol, lindep=lindep,
                           max_cycle=max_cycle, max_space=max_space, nroots=nroots,
@@ -430,24 +1005,23 @@ def kernel_float_space(myci, h1e, eri, norb, nelec, ci0=None,
             conv = True
             break
 
-    ci_strs = ci0[0]._strs
+    ci0 = space.update(ci0)
+    ci_strs = space.ci_strs
     log.debug('Extra CI in selected space %s', (len(ci_strs[0]), len(ci_strs[1])))
     ci0 = [c.ravel() for c in ci0]
-    link_index = _all_linkstr_index(ci_strs, norb, nelec)
     hdiag = myci.make_hdiag(h1e, eri, ci_strs, norb, nelec)
+    space.update_hamiltonian(contract, myci.sparse_h_size, max_memory)
     e, c = myci.eig(hop, ci0, precond, tol=tol, lindep=lindep,
                     max_cycle=max_cycle, max_space=max_space, nroots=nroots,
                     max_memory=max_memory, verbose=log, **kwargs)
 
-    na = len(ci_strs[0])
-    nb = len(ci_strs[1])
     if nroots > 1:
         for i, ei in enumerate(e+ecore):
             log.info('Selected CI state %d  E = %.15g', i, ei)
-        return e+ecore, [_as_SCIvector(ci.reshape(na,nb),ci_strs) for ci in c]
+        return e+ecore, space.sort(c)
     else:
         log.info('Selected CI  E = %.15g', e+ecore)
-        return e+ecore, _as_SCIvector(c.reshape(na,nb), ci_strs)
+        return e+ecore, space.sort([c])[0]
 
 def kernel(h1e, eri, norb, nelec, ci0=None, level_shift=1e-3, tol=1e-10,
            lindep=1e-14, max_cycle=50, max_space=12, nroots=1,
@@ -460,6 +1034,39 @@ def kernel(h1e, eri, norb, nelec, ci0=None, level_shift=1e-3, tol=1e-10,
                                   ci_coeff_cutoff=ci_coeff_cutoff, ecore=ecore,
                                   **kwargs)
 
+def pt2(myci, h1e, eri, civec_strs, norb, nelec, e0=None, **kwargs):
+    '''Epstein-Nesbet PT2 correction for the selected CI wavefunction.  The
+    external space is generated from all determinants of the selected space.
+    See select_ci_pt2.kernel for the keyword arguments (pt2_cutoff,
+    stochastic, dtm_cutoff, nsample, nbatch, nproc, seed).
+
+    Kwargs:
+        e0 : float
+            Variational energy of civec_strs, not including the core energy.
+            If not given, it is computed from civec_strs.
+
+    Returns:
+        E2 and its statistical error
+    '''
+    log = logger.Logger(myci.stdout, kwargs.pop('verbose', myci.verbose))
+    nelec = direct_spin1._unpack_nelec(nelec, myci.spin)
+    ci_coeff, nelec, ci_strs = _unpack(civec_strs, nelec, myci._strs)
+    na = len(ci_strs[0])
+    nb = len(ci_strs[1])
+    ci_coeff = numpy.asarray(ci_coeff).reshape(na,nb)
+    if e0 is None:
+        h2e = direct_spin1.absorb_h1e(h1e, eri, norb, nelec, .5)
+        ci1 = myci.contract_2e(h2e, _as_SCIvector(ci_coeff, ci_strs), norb, nelec)
+        e0 = numpy.dot(ci_coeff.ravel(), ci1.ravel()) / numpy.linalg.norm(ci_coeff)**2
+
+    dets = (ci_strs[0][numpy.repeat(numpy.arange(na), nb)],
+            ci_strs[1][numpy.tile(numpy.arange(nb), na)])
+    kwargs.setdefault('max_memory', myci.max_memory)
+    e2, err = select_ci_pt2.kernel(h1e, eri, dets, ci_coeff.ravel(), norb, nelec,
+                                   e0, verbose=log, **kwargs)
+    log.note('EN-PT2 E2 = %.15g +/- %.3g  E(SCI+PT2) = %.15g', e2, err, e0+e2)
+    return e2, err
+
 # dm_pq = <|p^+ q|>
 def make_rdm1s(civec_strs, norb, nelec, link_index=None):
     '''Spin searated 1-particle density matrices, (alpha,beta)
@@ -544,8 +1151,8 @@ def trans_rdm1s(cibra_strs, ciket_strs, norb, nelec, link_index=None):
     '''
     cibra, nelec, ci_strs = _unpack(cibra_strs, nelec)
     ciket, nelec1, ci_strs1 = _unpack(ciket_strs, nelec)
-    assert(all(ci_strs[0] == ci_strs1[0]) and
-           all(ci_strs[1] == ci_strs1[1]))
+    assert(numpy.all(ci_strs[0] == ci_strs1[0]) and
+           numpy.all(ci_strs[1] == ci_strs1[1]))
     if link_index is None:
         cd_indexa = cre_des_linkstr(ci_strs[0], norb, nelec[0])
         cd_indexb = cre_des_linkstr(ci_strs[1], norb, nelec[1])
@@ -683,6 +1290,9 @@ class SelectedCI(direct_spin1.FCISolver):
         self.ci_coeff_cutoff = .5e-3
         self.select_cutoff = .5e-3
         self.conv_tol = 1e-9
+# Store the Hamiltonian as a sparse matrix if the number of determinants is
+# smaller than sparse_h_size
+        self.sparse_h_size = 0
 
 ##################################################
 # don't modify the following attributes, they are not input options
@@ -695,6 +1305,7 @@ class SelectedCI(direct_spin1.FCISolver):
         direct_spin1.FCISolver.dump_flags(self, verbose)
         logger.info(self, 'ci_coeff_cutoff %g', self.ci_coeff_cutoff)
         logger.info(self, 'select_cutoff   %g', self.select_cutoff)
+        logger.info(self, 'sparse_h_size   %d', self.sparse_h_size)
 
     def contract_2e(self, eri, civec_strs, norb, nelec, link_index=None, **kwargs):
 # The argument civec_strs is a CI vector in function FCISolver.contract_2e.
@@ -721,6 +1332,7 @@ class SelectedCI(direct_spin1.FCISolver):
     enlarge_space = enlarge_space
     kernel = kernel_float_space
     kernel_fixed_space = kernel_fixed_space
+    pt2 = pt2
 
 #    def approx_kernel(self, h1e, eri, norb, nelec, ci0=None, link_index=None,
 #                      tol=None, lindep=None, max_cycle=None,
@@ -738,6 +1350,10 @@ class SelectedCI(direct_spin1.FCISolver):
     def large_ci(self, civec_strs, norb, nelec, tol=.1):
         nelec = direct_spin1._unpack_nelec(nelec, self.spin)
         ci, _, (strsa, strsb) = _unpack(civec_strs, nelec, self._strs)
+        if _is_multiword(strsa):
+            return [(ci[i,j], bin(cistring.strs2int(strsa[i])),
+                     bin(cistring.strs2int(strsb[j])))
+                    for i,j in numpy.argwhere(abs(ci) > tol)]
         return [(ci[i,j], bin(strsa[i]), bin(strsb[j]))
                 for i,j in numpy.argwhere(abs(ci) > tol)]
 
@@ -817,6 +1433,21 @@ def _unpack(civec_strs, nelec, ci_strs=None, spin=None):
         ci_strs = (strsa, strsb)
     return civec_strs, (neleca, nelecb), ci_strs
 
+def _stack_linkstr_index(link_index, na, nvec):
+    '''Link tables of nvec copies of the na alpha strings.  The CI vectors
+    stacked as [nvec*na,nb] can be contracted in one call with these tables.
+    '''
+    cd_indexa, dd_indexa, cd_indexb, dd_indexb = link_index
+    offset = numpy.arange(nvec, dtype=numpy.int32).reshape(-1,1,1) * na
+    cd_indexa = numpy.repeat(cd_indexa[None], nvec, axis=0)
+    cd_indexa[:,:,:,2] += offset
+    cd_indexa = cd_indexa.reshape((-1,)+cd_indexa.shape[2:])
+    if dd_indexa is not None:
+        dd_indexa = numpy.repeat(dd_indexa[None], nvec, axis=0)
+        dd_indexa[:,:,:,2] += offset
+        dd_indexa = dd_indexa.reshape((-1,)+dd_indexa.shape[2:])
+    return cd_indexa, dd_indexa, cd_indexb, dd_indexb
+
 def _all_linkstr_index(ci_strs, norb, nelec):
     cd_indexa = cre_des_linkstr_tril(ci_strs[0], norb, nelec[0])
     dd_indexa = des_des_linkstr_tril(ci_strs[0], norb, nelec[0])
@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+r'''
+Epstein-Nesbet second order perturbation (EN-PT2) correction for the
+selected CI wavefunction
+
+    E2 = \sum_{a \notin P} (\sum_{i \in P} H_{ai} c_i)^2 / (E0 - H_{aa})
+
+The external determinants a are generated from the determinants i of the
+variational space P by single and double excitations.  A contribution
+H_{ai} c_i is dropped if its magnitude is smaller than pt2_cutoff.
+
+Deterministic PT2 accumulates all contributions of all determinants.
+Semistochastic PT2 (Sharma et al, JCTC 13, 1595 (2017)) computes the
+contributions larger than dtm_cutoff deterministically.  The remaining part,
+E2[pt2_cutoff] - E2[dtm_cutoff], is estimated in nbatch independent batches.
+Each batch samples nsample determinants of P with the probability
+|c_i|/\sum_j |c_j|.  The batches are distributed over a lib.spawn_pool of
+nproc processes.  The statistical error of E2 is the standard error of the
+batch estimates.
+
+The determinants are given as a list of alpha strings and a list of beta
+strings.  Strings are either int64 (single-word, up to 64 orbitals) or
+multi-word strings of cistring.int2strs.
+'''
+
+import sys
+import time
+import numpy
+from pyscf import lib
+from pyscf.lib import logger
+from pyscf import ao2mo
+from pyscf.fci import cistring
+
+def kernel(h1e, eri, dets, civec, norb, nelec, e0, pt2_cutoff=1e-6,
+           stochastic=False, dtm_cutoff=1e-4, nsample=200, nbatch=20,
+           nproc=1, seed=None, max_memory=2000, verbose=logger.NOTE):
+    '''EN-PT2 correction of a selected CI wavefunction
+
+    Args:
+        h1e : 2D array
+            1-electron Hamiltonian
+        eri : 4-index, 2-fold or 8-fold symmetric array
+            2-electron integrals
+        dets : (strsa, strsb)
+            Alpha and beta strings of the variational determinants
+        civec : 1D array
+            CI coefficients of the variational determinants
+        e0 : float
+            Variational energy, not including the nuclear repulsion or core
+            energy.
+
+    Kwargs:
+        pt2_cutoff : float
+            Contributions |H_{ai} c_i| smaller than pt2_cutoff are dropped.
+        stochastic : bool
+            Whether to use the semistochastic algorithm.
+        dtm_cutoff : float
+            In the semistochastic algorithm, contributions larger than
+            dtm_cutoff are computed deterministically.
+        nsample : int
+            Number of determinants sampled in each batch.
+        nbatch : int
+            Number of stochastic batches.
+        nproc : int
+            Number of processes.
+        seed : int
+            Seed of the random number generator.
+
+    Returns:
+        E2 and its statistical error.  The error is 0 for the deterministic
+        algorithm.
+    '''
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(sys.stdout, verbose)
+    t0 = (time.clock(), time.time())
+
+    data = _make_pt2_data(h1e, eri, dets, civec, norb, nelec, e0, max_memory)
+    log.debug('EN-PT2 for %d determinants, pt2_cutoff = %g',
+              len(data['civec']), pt2_cutoff)
+    if nproc > 1:
+        pool = lib.spawn_pool(nproc, _init_worker, (data,))
+        pmap = pool.imap
+    else:
+        _init_worker(data)
+        pmap = lambda task, args: (task(x) for x in args)
+
+    try:
+        if stochastic:
+            dtm_cutoff = max(dtm_cutoff, pt2_cutoff)
+        else:
+            dtm_cutoff = pt2_cutoff
+        e2 = _deterministic(pmap, data, dtm_cutoff, nproc)
+        log.debug('EN-PT2 deterministic part (cutoff %g) = %.15g', dtm_cutoff, e2)
+        t0 = log.timer('deterministic EN-PT2', *t0)
+        if not stochastic:
+            return e2, 0.
+
+        assert(nsample > 1)
+        seeds = numpy.random.RandomState(seed).randint(2**31-1, size=nbatch)
+        args = [(s, nsample, pt2_cutoff, dtm_cutoff) for s in seeds]
+        e2s = numpy.array(list(pmap(_stochastic_task, args)))
+        for i, e in enumerate(e2s):
+            log.debug1('batch %d  stochastic E2 = %.15g', i, e)
+        e2 += e2s.mean()
+        if nbatch > 1:
+            err = e2s.std(ddof=1) / numpy.sqrt(nbatch)
+        else:
+            err = numpy.inf
+        t0 = log.timer('stochastic EN-PT2', *t0)
+        return e2, err
+    finally:
+        if nproc > 1:
+            pool.close()
+            pool.join()
+        _init_worker(None)
+
+def _deterministic(pmap, data, cutoff, nproc):
+    nsrc = len(data['src'])
+    chunks = [(p0, p1, cutoff) for p0, p1 in
+              lib.prange(0, nsrc, max(1, (nsrc+nproc-1)//nproc))]
+    keys = numpy.zeros((0,data['nw']*2), dtype=numpy.uint64)
+    xs = numpy.zeros(0)
+    for keys1, x1 in pmap(_deterministic_task, chunks):
+        keys, xs = _reduce(numpy.vstack((keys, keys1)),
+                           numpy.hstack((xs, x1)))
+    if xs.size == 0:
+        return 0.
+    return numpy.dot(xs**2, 1./(data['e0'] - _external_hdiag(data, keys)))
+
+def _deterministic_task(args):
+    '''Contributions of the source determinants p0:p1 to the external space'''
+    p0, p1, cutoff = args
+    data = _pt2_data
+    src = data['src'][p0:p1]
+    keys = []
+    xs = []
+    for keys1, x1, s in _connections(data, src, data['civec'][src], cutoff):
+        keys1, x1 = _reduce(keys1, x1)
+        keys.append(keys1)
+        xs.append(x1)
+    if len(keys) == 0:
+        return numpy.zeros((0,data['nw']*2), dtype=numpy.uint64), numpy.zeros(0)
+    return _external(data, *_reduce(numpy.vstack(keys), numpy.hstack(xs)))
+
+def _stochastic_task(args):
+    '''Stochastic estimate of E2[pt2_cutoff] - E2[dtm_cutoff] from one sample'''
+    seed, nsample, pt2_cutoff, dtm_cutoff = args
+    data = _pt2_data
+    rand = numpy.random.RandomState(seed)
+    prob = data['prob']
+    src, w = numpy.unique(rand.choice(len(prob), nsample, p=prob),
+                          return_counts=True)
+    p = prob[src]
+    src = data['src'][src]
+# Unbiased estimator for (\sum_i x_i)^2 with the sampled x_i = H_{ai} c_i
+# (w_i repeats of determinant i)
+#   [(\sum_i w_i x_i/p_i)^2 + \sum_i (w_i(N-1)/p_i - w_i^2/p_i^2) x_i^2] / (N(N-1))
+    fac1 = w / p
+    fac2 = w * (nsample-1) / p - (w / p)**2
+    keys = []
+    xs = []
+    for keys1, x1, s in _connections(data, src, data['civec'][src], pt2_cutoff):
+        x2 = x1 ** 2
+        dtm = abs(x1) > dtm_cutoff
+        x = numpy.empty((len(x1),4))
+        x[:,0] = fac1[s] * x1
+        x[:,1] = fac2[s] * x2
+        x[:,2] = x[:,0] * dtm
+        x[:,3] = x[:,1] * dtm
+        keys1, x = _reduce(keys1, x)
+        keys.append(keys1)
+        xs.append(x)
+    if len(keys) == 0:
+        return 0.
+    keys, xs = _external(data, *_reduce(numpy.vstack(keys), numpy.vstack(xs)))
+    if len(xs) == 0:
+        return 0.
+    e2 = xs[:,0]**2 + xs[:,1] - xs[:,2]**2 - xs[:,3]
+    e2 = numpy.dot(e2, 1./(data['e0'] - _external_hdiag(data, keys)))
+    return e2 / (nsample * (nsample-1))
+
+_pt2_data = None
+def _init_worker(data):
+    global _pt2_data
+    _pt2_data = data
+
+def _as_words(strs):
+    strs = numpy.asarray(strs)
+    if strs.ndim == 1:
+        strs = numpy.asarray(strs, dtype=numpy.int64).view(numpy.uint64)
+        strs = strs.reshape(-1,1)
+    return numpy.asarray(strs, dtype=numpy.uint64, order='C')
+
+def _make_pt2_data(h1e, eri, dets, civec, norb, nelec, e0, max_memory):
+    strsa = _as_words(dets[0])
+    strsb = _as_words(dets[1])
+    nw = strsa.shape[1]
+    civec = numpy.asarray(civec).ravel()
+    civec = civec / numpy.linalg.norm(civec)
+    eri = ao2mo.restore(1, eri, norb)
+    jdiag = numpy.einsum('iijj->ij', eri)
+    kdiag = numpy.einsum('ijji->ij', eri)
+# (ai|jj) and (ai|jj)-(aj|ji) for the single excitations
+    jmat = numpy.einsum('aijj->jai', eri).reshape(norb,-1)
+    jkmat = jmat - numpy.einsum('ajji->jai', eri).reshape(norb,-1)
+# Source determinants are sorted by the alpha strings, so that the
+# determinants of a block share alpha strings
+    src = numpy.where(civec != 0)[0]
+    src = src[cistring.argsort_strs(strsa[src])]
+    prob = abs(civec[src]) / abs(civec[src]).sum()
+    return {'norb': norb, 'nelec': nelec, 'nw': nw, 'e0': e0,
+            'h1e': numpy.asarray(h1e), 'eri': eri,
+            'jdiag': jdiag, 'kdiag': kdiag, 'jmat': jmat, 'jkmat': jkmat,
+            'strsa': strsa, 'strsb': strsb, 'civec': civec,
+            'src': src, 'prob': prob,
+            'dets_index': cistring.make_strs_index(numpy.hstack((strsa, strsb))),
+            'max_memory': max_memory}
+
+def _single_excitations(strs, norb, nelec):
+    '''All i->a excitations of the strings.
+
+    Returns:
+        str1 [nstrs,nsingle,nwords], a, i and sign [nstrs,nsingle]
+    '''
+    nstrs = len(strs)
+    nvir = norb - nelec
+    occ_pattern = cistring.strs2occ(strs, norb)
+    occ = numpy.where(occ_pattern)[1].reshape(nstrs,nelec)
+    vir = numpy.where(~occ_pattern)[1].reshape(nstrs,nvir)
+    nbelow = numpy.cumsum(occ_pattern, axis=1) - occ_pattern
+    a = numpy.repeat(vir, nelec, axis=1)
+    i = numpy.tile(occ, (1,nvir))
+    rows = numpy.arange(nstrs)[:,None]
+# Number of occupied orbitals between i and a
+    nbetween = nbelow[rows,a] - nbelow[rows,i] - (a > i)
+    sign = 1 - (nbetween & 1) * 2
+    masks = cistring.orb_masks(norb)
+    str1 = strs[:,None] ^ masks[a] ^ masks[i]
+    return str1, a, i, sign
+
+def _double_excitations(strs, norb, nelec, eri):
+    '''All (i,j)->(a,b) excitations of the strings, i < j and a < b.
+
+    Returns:
+        str2 [nstrs,ndouble,nwords] and the matrix elements [nstrs,ndouble]
+    '''
+    nstrs = len(strs)
+    nvir = norb - nelec
+    occ_pattern = cistring.strs2occ(strs, norb)
+    occ = numpy.where(occ_pattern)[1].reshape(nstrs,nelec)
+    vir = numpy.where(~occ_pattern)[1].reshape(nstrs,nvir)
+    nbelow = numpy.cumsum(occ_pattern, axis=1) - occ_pattern
+    ip, jp = numpy.triu_indices(nelec, 1)
+    ap, bp = numpy.triu_indices(nvir, 1)
+    i = occ[:,ip,None]
+    j = occ[:,jp,None]
+    a = vir[:,None,ap]
+    b = vir[:,None,bp]
+    rows = numpy.arange(nstrs)[:,None,None]
+# i->a, then j->b on the intermediate string
+    nbetween = nbelow[rows,a] - nbelow[rows,i] - (a > i)
+    nbelow_j = nbelow[rows,j] - 1 + (a < j)
+    nbelow_b = nbelow[rows,b] - (i < b) + (a < b)
+    nbetween += nbelow_b - nbelow_j - (b > j)
+    sign = 1 - (nbetween & 1) * 2
+    val = sign * (eri[a,i,b,j] - eri[a,j,b,i])
+    masks = cistring.orb_masks(norb)
+    str2 = strs[:,None,None] ^ masks[a] ^ masks[i] ^ masks[b] ^ masks[j]
+    return str2.reshape(nstrs,-1,strs.shape[1]), val.reshape(nstrs,-1)
+
+def _connections(data, src, ci, cutoff):
+    '''Generate the contributions H_{ai} c_i of the source determinants src
+    to the connected determinants a, block by block.
+
+    Yields:
+        keys (alpha and beta strings) of determinants a, H_{ai} c_i, and the
+        positions of the source determinants i in src
+    '''
+    norb = data['norb']
+    neleca, nelecb = data['nelec']
+    nw = data['nw']
+    eri = data['eri']
+    eri2 = eri.reshape(norb**2,-1)
+    nsinglea = neleca * (norb-neleca)
+    nsingleb = nelecb * (norb-nelecb)
+    nconn = (nsinglea + 1) * (nsingleb + 1) + nsinglea**2 + nsingleb**2
+    blksize = int(data['max_memory']*.2e6 / (nconn*8*(nw*4+4)))
+    blksize = max(1, min(len(src), blksize))
+
+    for p0, p1 in lib.prange(0, len(src), blksize):
+        c = ci[p0:p1]
+        ndet = len(c)
+        stra, inva = _uniq_rows(data['strsa'][src[p0:p1]])
+        strb, invb = _uniq_rows(data['strsb'][src[p0:p1]])
+        occa = cistring.strs2occ(stra, norb).astype(float)
+        occb = cistring.strs2occ(strb, norb).astype(float)
+        str1a, a_a, i_a, sign_a = _single_excitations(stra, norb, neleca)
+        str1b, a_b, i_b, sign_b = _single_excitations(strb, norb, nelecb)
+        ai_a = a_a * norb + i_a
+        bj_b = a_b * norb + i_b
+        keys = []
+        xs = []
+        srcs = []
+        def collect(str_a, str_b, x):
+            shape = x.shape
+            mask = abs(x) > cutoff
+            k = numpy.empty(shape+(nw*2,), dtype=numpy.uint64)
+            k[...,:nw] = str_a
+            k[...,nw:] = str_b
+            keys.append(k[mask])
+            xs.append(x[mask])
+            srcs.append(numpy.where(mask)[0] + p0)
+
+        # alpha->alpha
+        fai = data['h1e'].ravel() + occa.dot(data['jkmat'])
+        fai = fai[numpy.arange(len(stra))[:,None],ai_a][inva]
+        fai += occb.dot(data['jmat'])[invb[:,None],ai_a[inva]]
+        collect(str1a[inva], data['strsb'][src[p0:p1],None], sign_a[inva]*fai*c[:,None])
+        # beta->beta
+        fbj = data['h1e'].ravel() + occb.dot(data['jkmat'])
+        fbj = fbj[numpy.arange(len(strb))[:,None],bj_b][invb]
+        fbj += occa.dot(data['jmat'])[inva[:,None],bj_b[invb]]
+        collect(data['strsa'][src[p0:p1],None], str1b[invb], sign_b[invb]*fbj*c[:,None])
+        # alpha,alpha->alpha,alpha
+        if neleca > 1:
+            str2a, va = _double_excitations(stra, norb, neleca, eri)
+            collect(str2a[inva], data['strsb'][src[p0:p1],None], va[inva]*c[:,None])
+        # beta,beta->beta,beta
+        if nelecb > 1:
+            str2b, vb = _double_excitations(strb, norb, nelecb, eri)
+            collect(data['strsa'][src[p0:p1],None], str2b[invb], vb[invb]*c[:,None])
+        # alpha,beta->alpha,beta
+        if nsinglea > 0 and nsingleb > 0:
+            v = eri2[ai_a[inva][:,:,None],bj_b[invb][:,None,:]]
+            v *= sign_a[inva][:,:,None] * sign_b[invb][:,None,:]
+            v *= c[:,None,None]
+            collect(str1a[inva][:,:,None], str1b[invb][:,None,:], v)
+        yield numpy.vstack(keys), numpy.hstack(xs), numpy.hstack(srcs)
+
+def _uniq_rows(strs):
+    keys, inv = numpy.unique(cistring._as_void(strs), return_inverse=True)
+    return keys.view(numpy.uint64).reshape(len(keys),-1), inv.ravel()
+
+def _reduce(keys, x):
+    '''Sum the contributions of the same determinant'''
+    if len(keys) == 0:
+        return keys, x
+    idx = numpy.lexsort(keys.T)
+    keys = keys[idx]
+    x = x[idx]
+    start = numpy.ones(len(keys), dtype=bool)
+    start[1:] = numpy.any(keys[1:] != keys[:-1], axis=1)
+    start = numpy.where(start)[0]
+    return keys[start], numpy.add.reduceat(x, start, axis=0)
+
+def _external(data, keys, x):
+    '''Remove the determinants of the variational space'''
+    mask = cistring.lookup_strs(data['dets_index'], keys) < 0
+    return keys[mask], x[mask]
+
+def _external_hdiag(data, keys):
+    '''Diagonal Hamiltonian elements H_{aa} of the determinants'''
+    norb = data['norb']
+    nw = data['nw']
+    jdiag = data['jdiag']
+    jkdiag = jdiag - data['kdiag']
+    h1diag = numpy.diag(data['h1e'])
+    hdiag = numpy.empty(len(keys))
+    for p0, p1 in lib.prange(0, len(keys), 100000):
+        occa = cistring.strs2occ(keys[p0:p1,:nw], norb).astype(float)
+        occb = cistring.strs2occ(keys[p0:p1,nw:], norb).astype(float)
+        hdiag[p0:p1] = ((occa + occb).dot(h1diag) +
+                        numpy.einsum('ij,ij->i', occa.dot(jkdiag), occa) * .5 +
+                        numpy.einsum('ij,ij->i', occb.dot(jkdiag), occb) * .5 +
+                        numpy.einsum('ij,ij->i', occa.dot(jdiag), occb))
+    return hdiag
@@ -124,6 +124,12 @@ def kernel(h1e, eri, norb, nelec, ci0=None, level_shift=1e-3, tol=1e-10,
 
 
 class SelectedCI(select_ci.SelectedCI):
+    def __init__(self, mol=None):
+        select_ci.SelectedCI.__init__(self, mol)
+# contract_2e is the Hamiltonian for the spin-symmetric CI vectors only.  It
+# cannot be used to generate the sparse Hamiltonian.
+        self.sparse_h_size = 0
+
     def contract_2e(self, eri, civec_strs, norb, nelec, link_index=None, **kwargs):
 # The argument civec_strs is a CI vector in function FCISolver.contract_2e.
 # Save and patch self._strs to make this contract_2e function compatible to
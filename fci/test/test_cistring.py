@@ -68,6 +68,33 @@ class KnowValues(unittest.TestCase):
         self.assertEqual(t1strs(7, 3), cistring.tn_strs(7, 3, 1).tolist())
         self.assertEqual(t2strs(7, 3), cistring.tn_strs(7, 3, 2).tolist())
 
+    def test_linkstr_cache(self):
+        cistring.clear_linkstr_cache()
+        link1 = cistring.gen_linkstr_index_trilidx(range(6), 3)
+        link2 = cistring.gen_linkstr_index_trilidx(range(6), 3)
+        self.assertTrue(link1 is not link2)
+        self.assertTrue(link2.flags.writeable)
+        strs = cistring.gen_strings4orblist(range(6), 3)
+        ref = cistring.gen_linkstr_index(range(6), 3, strs, True)
+        # Column 1 of the tril tables is not filled
+        self.assertTrue(numpy.all(link2[:,:,[0,2,3]] == ref[:,:,[0,2,3]]))
+        link2[:] = 0
+        link2 = cistring.gen_linkstr_index_trilidx(range(6), 3)
+        self.assertTrue(numpy.all(link2[:,:,[0,2,3]] == ref[:,:,[0,2,3]]))
+
+        mmap_size = cistring.LINKSTR_MMAP_SIZE
+        cistring.LINKSTR_MMAP_SIZE = 0
+        cistring.gen_linkstr_index(range(7), 3)
+        cistring.LINKSTR_MMAP_SIZE = mmap_size
+        link3 = cistring.gen_linkstr_index(range(7), 3)
+        self.assertTrue(isinstance(link3, numpy.memmap))
+        ref = cistring.gen_linkstr_index(range(7), 3,
+                                         cistring.gen_strings4orblist(range(7), 3))
+        self.assertTrue(numpy.all(link3 == ref))
+        link3[:] = 0
+        self.assertTrue(numpy.all(cistring.gen_linkstr_index(range(7), 3) == ref))
+        cistring.clear_linkstr_cache()
+
 def t1strs(norb, nelec):
     nocc = nelec
     hf_str = int('1'*nocc, 2)
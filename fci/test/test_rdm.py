@@ -41,6 +41,26 @@ class KnowValues(unittest.TestCase):
         dm3 = fci.rdm.make_dm123('FCI3pdm_kern_sf', ci1, ci1, norb, (5,3))[2]
         self.assertTrue(numpy.allclose(dm3ref, dm3))
 
+    def test_dm3_blk(self):
+        numpy.random.seed(2)
+        na = fci.cistring.num_strings(norb, 4)
+        nb = fci.cistring.num_strings(norb, 2)
+        ci1 = numpy.random.random((na,nb))
+        dm1, dm2, dm3 = fci.rdm.make_dm123('FCI3pdm_kern_sf', ci1, ci1, norb, (4,2))
+        dm3blk = fci.rdm.make_dm3_blk(ci1, ci1, norb, (4,2), 2, 5)
+        self.assertTrue(numpy.allclose(dm3blk, dm3[2:5]))
+
+        dm3 = fci.rdm.reorder_dm123(dm1, dm2, dm3, inplace=False)[2]
+        dm3p = fci.rdm.pack_dm3(dm3)
+        self.assertTrue(numpy.allclose(fci.rdm.unpack_dm3(dm3p, norb), dm3))
+        dm3p1 = numpy.hstack([fci.rdm.pack_dm3(dm3[p0:p0+2], p0)
+                              for p0 in range(0, norb, 2)])
+        self.assertTrue(numpy.allclose(dm3p1, dm3p))
+        dm1p, dm2p, dm3p1 = fci.rdm.make_dm123_packed(ci1, norb, (4,2))
+        self.assertTrue(numpy.allclose(dm1p, dm1))
+        self.assertTrue(numpy.allclose(dm2p, dm2))
+        self.assertTrue(numpy.allclose(dm3p1, dm3p))
+
     def test_dm4(self):
         dm4ref = make_dm4_o0(ci0, norb, nelec)
         dm4 = fci.rdm.make_dm1234('FCI4pdm_kern_sf', ci0, ci0, norb, nelec)[3]
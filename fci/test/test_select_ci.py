@@ -320,6 +320,134 @@ class KnowValues(unittest.TestCase):
         c2 = select_ci.from_fci(c2, c1._strs, norb, nelec)
         self.assertAlmostEqual(abs(numpy.dot(c1.ravel(), c2.ravel())), 1, 6)
 
+    def test_multiword_strs(self):
+        norb, nelec = 10, 4
+        strs = cistring.gen_strings4orblist(range(norb), nelec)
+        numpy.random.seed(11)
+        mask = numpy.random.random(len(strs)) > .5
+        strs = strs[mask]
+        strs_w = cistring.int2strs(strs, norb)
+        for fn in (select_ci.cre_des_linkstr, select_ci.cre_des_linkstr_tril,
+                   select_ci.des_des_linkstr, select_ci.des_des_linkstr_tril,
+                   select_ci.gen_des_linkstr, select_ci.gen_cre_linkstr):
+            self.assertTrue(numpy.all(fn(strs, norb, nelec) ==
+                                      fn(strs_w, norb, nelec)))
+
+        myci = select_ci.SCI()
+        myci.select_cutoff = 1e-3
+        nn = norb*(norb+1)//2
+        eri = (numpy.random.random(nn*(nn+1)//2)-.2)**3
+        eri[eri<.1] *= 3e-3
+        eri = ao2mo.restore(1, eri, norb)
+        eri_pq_max = abs(eri.reshape(norb**2,-1)).max(axis=1).reshape(norb,norb)
+        civec_max = numpy.random.random(len(strs))
+        strs_add0 = select_ci.select_strs(myci, eri, eri_pq_max, civec_max,
+                                          strs, norb, nelec)
+        strs_add1 = select_ci.select_strs(myci, eri, eri_pq_max, civec_max,
+                                          strs_w, norb, nelec)
+        self.assertTrue(numpy.all(cistring.int2strs(strs_add0, norb) == strs_add1))
+
+        ci_strs = (strs, strs[:-3])
+        ci_strs_w = (strs_w, strs_w[:-3])
+        h1w = numpy.random.random((norb,norb))
+        h1w = h1w + h1w.T
+        hdiag0 = select_ci.make_hdiag(h1w, eri, ci_strs, norb, (nelec,nelec))
+        hdiag1 = select_ci.make_hdiag(h1w, eri, ci_strs_w, norb, (nelec,nelec))
+        self.assertAlmostEqual(abs(hdiag0-hdiag1).max(), 0, 12)
+
+        ci0 = numpy.random.random((len(strs),len(strs)-3))
+        c0 = select_ci.contract_2e(eri, select_ci._as_SCIvector(ci0, ci_strs),
+                                   norb, (nelec,nelec))
+        c1 = select_ci.contract_2e(eri, select_ci._as_SCIvector(ci0, ci_strs_w),
+                                   norb, (nelec,nelec))
+        self.assertAlmostEqual(abs(c0-c1).max(), 0, 12)
+
+    def test_incremental_space(self):
+        norb, nelec = 8, (3,3)
+        strs = cistring.gen_strings4orblist(range(norb), nelec[0])
+        numpy.random.seed(1)
+        nn = norb*(norb+1)//2
+        h2 = ao2mo.restore(1, (numpy.random.random(nn*(nn+1)//2)-.2)**3, norb)
+        space = select_ci._SCISpace(norb, nelec)
+        for i in range(3):
+            strsa = strs[numpy.random.random(len(strs)) > .5]
+            strsb = strs[numpy.random.random(len(strs)) > .5]
+            ci0 = numpy.random.random((len(strsa),len(strsb)))
+            ci0 = select_ci._as_SCIvector(ci0, (strsa,strsb))
+            ci1 = space.update([ci0])[0]
+            ref = select_ci.contract_2e(h2, ci0, norb, nelec)
+            ci1 = select_ci.contract_2e(h2, ci1, norb, nelec, space.link_index)
+            ci1 = space.sort([ci1])[0]
+            self.assertAlmostEqual(abs(ci1-ref).max(), 0, 12)
+
+    def test_stack_linkstr_index(self):
+        norb, nelec = 8, (3,3)
+        strs = cistring.gen_strings4orblist(range(norb), nelec[0])
+        numpy.random.seed(2)
+        nn = norb*(norb+1)//2
+        h2 = ao2mo.restore(1, (numpy.random.random(nn*(nn+1)//2)-.2)**3, norb)
+        ci_strs = (strs[numpy.random.random(len(strs)) > .5],
+                   strs[numpy.random.random(len(strs)) > .5])
+        na, nb = len(ci_strs[0]), len(ci_strs[1])
+        ci0 = numpy.random.random((3,na,nb))
+        link_index = select_ci._all_linkstr_index(ci_strs, norb, nelec)
+        ref = [select_ci.contract_2e(h2, select_ci._as_SCIvector(c, ci_strs),
+                                     norb, nelec, link_index) for c in ci0]
+        link_index = select_ci._stack_linkstr_index(link_index, na, 3)
+        ci1 = select_ci.contract_2e(h2, select_ci._as_SCIvector(ci0.reshape(3*na,nb), ci_strs),
+                                    norb, nelec, link_index)
+        self.assertAlmostEqual(abs(ci1.reshape(3,na,nb)-ref).max(), 0, 12)
+
+    def test_kernel_sparse_h(self):
+        myci = select_ci.SCI()
+        myci.sparse_h_size = 1000
+        e1, c1 = myci.kernel(h1, eri, norb, nelec)
+        e2, c2 = direct_spin1.kernel(h1, eri, norb, nelec)
+        self.assertAlmostEqual(e1, e2, 9)
+        self.assertAlmostEqual(abs(numpy.dot(c1.ravel(), c2.ravel())), 1, 9)
+
+    def test_pt2(self):
+        myci = select_ci.SCI()
+        neleca = nelec // 2
+        fcivec = select_ci.to_fci(civec_strs, norb, nelec)
+        fcivec /= numpy.linalg.norm(fcivec)
+        h2e = direct_spin1.absorb_h1e(h1, eri, norb, nelec, .5)
+        hc = direct_spin1.contract_2e(h2e, fcivec, norb, nelec)
+        e0 = numpy.dot(fcivec.ravel(), hc.ravel())
+        hdiag = direct_spin1.make_hdiag(h1, eri, norb, nelec).reshape(hc.shape)
+        addra = [cistring.str2addr(norb, neleca, x) for x in ci_strs[0]]
+        addrb = [cistring.str2addr(norb, neleca, x) for x in ci_strs[1]]
+        mask = numpy.ones(hc.shape, dtype=bool)
+        mask[numpy.ix_(addra,addrb)] = False
+        e2ref = (hc[mask]**2 / (e0 - hdiag[mask])).sum()
+
+        e2, err = myci.pt2(h1, eri, civec_strs, norb, nelec, pt2_cutoff=0)
+        self.assertAlmostEqual(e2, e2ref, 9)
+        self.assertEqual(err, 0)
+
+        e2, err = myci.pt2(h1, eri, civec_strs, norb, nelec, e0=e0,
+                           pt2_cutoff=1e-3)
+        e2s, err = myci.pt2(h1, eri, civec_strs, norb, nelec, e0=e0,
+                            pt2_cutoff=1e-3, stochastic=True, dtm_cutoff=1e-2,
+                            nsample=4, nbatch=200, nproc=2, seed=1)
+        self.assertTrue(err > 0)
+        self.assertTrue(abs(e2s - e2) < err * 4)
+
+    def test_multiword_strs_lookup(self):
+        norb = 130
+        strs = [(1<<3)|(1<<70)|(1<<129), 0b111, (1<<64)|0b11, (1<<128)|0b11]
+        strs_w = cistring.int2strs(strs, norb)
+        self.assertEqual([cistring.strs2int(x) for x in strs_w], strs)
+        self.assertEqual(list(cistring.argsort_strs(strs_w)),
+                         list(numpy.argsort(strs)))
+        uniq = cistring.uniq_strs(numpy.vstack((strs_w, strs_w[::-1])))
+        self.assertEqual([cistring.strs2int(x) for x in uniq], sorted(strs))
+        strs_index = cistring.make_strs_index(strs_w)
+        query = cistring.int2strs([strs[2], 0b1011, strs[0]], norb)
+        self.assertEqual(list(cistring.lookup_strs(strs_index, query)), [2, -1, 0])
+        occ = cistring.strs2occ(strs_w[:1], norb)
+        self.assertEqual(list(numpy.where(occ[0])[0]), [3, 70, 129])
+
 
 def gen_des_linkstr(strs, norb, nelec):
     '''Given intermediates, the link table to generate input strs
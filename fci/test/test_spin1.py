@@ -3,6 +3,7 @@
 import unittest
 from functools import reduce
 import numpy
+from pyscf import lib
 from pyscf import gto
 from pyscf import scf
 from pyscf import ao2mo
@@ -67,6 +68,40 @@ class KnowValues(unittest.TestCase):
         e, c = fci.direct_spin1.kernel(h1e, g2e, norb, neleci)
         self.assertAlmostEqual(e, -8.7498253981782, 8)
 
+    def test_contract_multi(self):
+        ci1 = fci.direct_spin1.contract_2e(g2e, [ci2, ci3], norb, neleci)
+        self.assertEqual(ci1.shape, (2,)+ci2.shape)
+        ref = fci.direct_spin1.contract_2e(g2e, ci2, norb, neleci)
+        self.assertAlmostEqual(abs(ci1[0]-ref).max(), 0, 12)
+        ref = fci.direct_spin1.contract_2e(g2e, ci3, norb, neleci)
+        self.assertAlmostEqual(abs(ci1[1]-ref).max(), 0, 12)
+
+    def test_kernel_nroots(self):
+        cis = fci.direct_spin1.FCISolver()
+        cis.davidson_only = True
+        e, c = cis.kernel(h1e, g2e, norb, nelec, nroots=3)
+        self.assertAlmostEqual(e[0], -8.9347029192929, 8)
+        cis = fci.direct_spin1_symm.FCISolver()
+        cis.davidson_only = True
+        eref, cref = cis.kernel(h1e, g2e, norb, nelec, nroots=3)
+        self.assertAlmostEqual(abs(e-eref).max(), 0, 8)
+
+    def test_contract_outcore(self):
+        ref = fci.direct_spin1.contract_2e(g2e, ci2, norb, neleci)
+        c = lib.linalg_helper._scratch_vector(ci2.shape)
+        c[:] = ci2
+        ci1 = fci.direct_spin1.contract_2e_outcore(g2e, c, norb, neleci,
+                                                   max_memory=1e-3)
+        self.assertAlmostEqual(abs(ci1-ref).max(), 0, 12)
+
+    def test_kernel_outcore(self):
+        cis = fci.direct_spin1.FCISolver()
+        cis.davidson_only = True
+        e0, c0 = cis.kernel(h1e, g2e, norb, nelec, nroots=2)
+        cis.max_memory = 1e-3
+        e1, c1 = cis.kernel(h1e, g2e, norb, nelec, nroots=2)
+        self.assertAlmostEqual(abs(e1-e0).max(), 0, 9)
+
     def test_hdiag(self):
         hdiagref = fci.direct_spin0.make_hdiag(h1e, g2e, norb, mol.nelectron)
         hdiag = fci.direct_spin1.make_hdiag(h1e, g2e, norb, nelec)
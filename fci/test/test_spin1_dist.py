@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import unittest
+import numpy
+from pyscf import gto
+from pyscf import scf
+from pyscf import ao2mo
+from pyscf import mcscf
+from pyscf import fci
+from pyscf.fci import direct_spin1_dist
+
+norb = 7
+nelec = (4,3)
+numpy.random.seed(1)
+h2e = numpy.random.random((norb,norb,norb,norb))
+h2e = h2e + h2e.transpose(2,3,0,1)
+h2e = h2e + h2e.transpose(1,0,2,3)
+h2e = h2e + h2e.transpose(0,1,3,2)
+na = fci.cistring.num_strings(norb, nelec[0])
+nb = fci.cistring.num_strings(norb, nelec[1])
+ci0 = numpy.random.random((na,nb))
+
+mol = gto.M(atom='N 0 0 0; N 0 0 1.1', basis='631g', verbose=0)
+mf = scf.RHF(mol).run()
+
+class KnowValues(unittest.TestCase):
+    def test_contract(self):
+        ref = fci.direct_spin1.contract_2e(h2e, ci0, norb, nelec)
+        cis = direct_spin1_dist.FCISolver(nproc=3)
+        ci1 = cis.contract_2e(h2e, ci0, norb, nelec)
+        self.assertAlmostEqual(abs(ci1-ref).max(), 0, 9)
+        ci1 = cis.contract_2e(h2e, ci0.T, norb, nelec[::-1])
+        ref = fci.direct_spin1.contract_2e(h2e, ci0.T, norb, nelec[::-1])
+        self.assertAlmostEqual(abs(ci1-ref).max(), 0, 9)
+        cis.close()
+
+    def test_kernel(self):
+        numpy.random.seed(2)
+        h1 = numpy.random.random((norb,norb)) * .1
+        h1 = h1 + h1.T + numpy.diag(numpy.arange(norb))
+        e0, c0 = fci.direct_spin1.kernel(h1, h2e*.1, norb, nelec, nroots=3)
+        cis = direct_spin1_dist.FCISolver(nproc=3)
+        e1, c1 = cis.kernel(h1, h2e*.1, norb, nelec, nroots=3)
+        self.assertAlmostEqual(abs(numpy.asarray(e1)-e0).max(), 0, 9)
+        for x, y in zip(c0, c1):
+            self.assertAlmostEqual(abs(numpy.dot(x.ravel(), y.ravel())), 1, 9)
+        e1, c1 = cis.kernel(h1, h2e*.1, norb, nelec, ci0=c0[0])
+        self.assertAlmostEqual(e1, e0[0], 9)
+        cis.close()
+
+    def test_split_strings(self):
+        link_indexa = fci.cistring.gen_linkstr_index_trilidx(range(norb), 4)
+        segs = direct_spin1_dist.split_strings(link_indexa, 4)
+        self.assertEqual(sum(link.shape[0] for rows, link in segs), na)
+        rows, link = segs[1]
+        self.assertTrue(numpy.all(rows[link[:,:,2]] == link_indexa[9:18,:,2]))
+
+    def test_casscf(self):
+        mc = mcscf.CASSCF(mf, 6, (4,2))
+        e0 = mc.kernel()[0]
+        mc = mcscf.CASSCF(mf, 6, (4,2))
+        mc.fcisolver = direct_spin1_dist.FCISolver(mol, nproc=2)
+        e1 = mc.kernel()[0]
+        mc.fcisolver.close()
+        self.assertAlmostEqual(e0, e1, 9)
+
+
+if __name__ == "__main__":
+    print("Full Tests for distributed spin1 FCI")
+    unittest.main()
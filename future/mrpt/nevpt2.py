@@ -16,6 +16,7 @@ from pyscf import fci
 from pyscf.mcscf import mc_ao2mo
 from pyscf import ao2mo
 from pyscf.ao2mo import _ao2mo
+from pyscf.lib import prange
 
 libmc = lib.load_library('libmcscf')
 
@@ -28,26 +29,14 @@ NUMERICAL_ZERO = 1e-14
 
 def make_a16(h1e, h2e, dms, civec, norb, nelec, link_index=None):
     dm3 = dms['3']
-    #dm4 = dms['4']
-    if 'f3ca' in dms and 'f3ac' in dms:
-        f3ca = dms['f3ca']
-        f3ac = dms['f3ac']
-    else:
-        if isinstance(nelec, (int, numpy.integer)):
-            neleca = nelecb = nelec//2
-        else:
-            neleca, nelecb = nelec
-        if link_index is None:
-            link_indexa = fci.cistring.gen_linkstr_index(range(norb), neleca)
-            link_indexb = fci.cistring.gen_linkstr_index(range(norb), nelecb)
-        else:
-            link_indexa, link_indexb = link_index
-        eri = h2e.transpose(0,2,1,3)
-        f3ca = _contract4pdm('NEVPTkern_cedf_aedf', eri, civec, norb, nelec,
-                             (link_indexa,link_indexb))
-        f3ac = _contract4pdm('NEVPTkern_aedf_ecdf', eri, civec, norb, nelec,
-                             (link_indexa,link_indexb))
-
+    f3ca, f3ac = _load_f3(h2e, dms, civec, norb, nelec, link_index)
+    return _make_a16(h1e, h2e, numpy.asarray(dm3[:norb]),
+                     numpy.asarray(f3ca[:norb]), numpy.asarray(f3ac[:norb]))
+
+def _make_a16(h1e, h2e, dm3, f3ca, f3ac):
+# dm3, f3ca and f3ac can be the blocks [r0:r1] of the first index.  The
+# returned a16 is the block a16[:,:,r0:r1]
+    norb = h1e.shape[0]
     a16 = -numpy.einsum('ib,rpqiac->pqrabc', h1e, dm3)
     a16 += numpy.einsum('ia,rpqbic->pqrabc', h1e, dm3)
     a16 -= numpy.einsum('ci,rpqbai->pqrabc', h1e, dm3)
@@ -76,26 +65,14 @@ def make_a16(h1e, h2e, dms, civec, norb, nelec, link_index=None):
 def make_a22(h1e, h2e, dms, civec, norb, nelec, link_index=None):
     dm2 = dms['2']
     dm3 = dms['3']
-    #dm4 = dms['4']
-    if 'f3ca' in dms and 'f3ac' in dms:
-        f3ca = dms['f3ca']
-        f3ac = dms['f3ac']
-    else:
-        if isinstance(nelec, (int, numpy.integer)):
-            neleca = nelecb = nelec//2
-        else:
-            neleca, nelecb = nelec
-        if link_index is None:
-            link_indexa = fci.cistring.gen_linkstr_index(range(norb), neleca)
-            link_indexb = fci.cistring.gen_linkstr_index(range(norb), nelecb)
-        else:
-            link_indexa, link_indexb = link_index
-        eri = h2e.transpose(0,2,1,3)
-        f3ca = _contract4pdm('NEVPTkern_cedf_aedf', eri, civec, norb, nelec,
-                             (link_indexa,link_indexb))
-        f3ac = _contract4pdm('NEVPTkern_aedf_ecdf', eri, civec, norb, nelec,
-                             (link_indexa,link_indexb))
-
+    f3ca, f3ac = _load_f3(h2e, dms, civec, norb, nelec, link_index)
+    return _make_a22(h1e, h2e, dm2, numpy.asarray(dm3[:norb]),
+                     numpy.asarray(f3ca[:norb]), numpy.asarray(f3ac[:norb]))
+
+def _make_a22(h1e, h2e, dm2, dm3, f3ca, f3ac):
+# dm2, dm3, f3ca and f3ac can be the blocks [k0:k1] of the first index.  The
+# returned a22 is the block a22[:,:,k0:k1]
+    norb = h1e.shape[0]
     a22 = -numpy.einsum('pb,kipjac->ijkabc', h1e, dm3)
     a22 -= numpy.einsum('pa,kibjpc->ijkabc', h1e, dm3)
     a22 += numpy.einsum('cp,kibjap->ijkabc', h1e, dm3)
@@ -131,12 +108,40 @@ def make_a22(h1e, h2e, dms, civec, norb, nelec, link_index=None):
 
     return a22
 
+def _load_f3(h2e, dms, civec, norb, nelec, link_index=None):
+    '''The 4-pdm contracted with the 2e integrals.  Unless f3ca and f3ac are
+    given in dms, they are generated in blocks of the first index when sliced
+    (see _F3Blocks).
+    '''
+    if 'f3ca' in dms and 'f3ac' in dms:
+        return dms['f3ca'], dms['f3ac']
+
+    if isinstance(nelec, (int, numpy.integer)):
+        neleca = nelecb = nelec//2
+    else:
+        neleca, nelecb = nelec
+    if link_index is None:
+        link_indexa = fci.cistring.gen_linkstr_index(range(norb), neleca)
+        link_indexb = fci.cistring.gen_linkstr_index(range(norb), nelecb)
+    else:
+        link_indexa, link_indexb = link_index
+    eri = h2e.transpose(0,2,1,3)
+    f3ca = _F3Blocks('NEVPTkern_cedf_aedf', eri, civec, norb, nelec,
+                     (link_indexa,link_indexb))
+    f3ac = _F3Blocks('NEVPTkern_aedf_ecdf', eri, civec, norb, nelec,
+                     (link_indexa,link_indexb))
+    return f3ca, f3ac
+
 
 def make_a17(h1e,h2e,dm2,dm3):
     h1e = h1e - numpy.einsum('mjjn->mn',h2e)
 
-    a17 = -numpy.einsum('pi,cabi->abcp',h1e,dm2)\
-          -numpy.einsum('kpij,cabjki->abcp',h2e,dm3)
+    norb = h1e.shape[0]
+    a17 = numpy.empty((norb,)*4)
+    for c0, c1 in prange(0, norb, _dm3_blksize(norb)):
+        dm3blk = numpy.asarray(dm3[c0:c1])
+        a17[:,:,c0:c1] = -numpy.einsum('pi,cabi->abcp',h1e,dm2[c0:c1])\
+                         -numpy.einsum('kpij,cabjki->abcp',h2e,dm3blk)
     return a17
 
 def make_a19(h1e,h2e,dm1,dm2):
@@ -147,10 +152,14 @@ def make_a19(h1e,h2e,dm1,dm2):
     return a19
 
 def make_a23(h1e,h2e,dm1,dm2,dm3):
-    a23 = -numpy.einsum('ip,caib->abcp',h1e,dm2)\
-          -numpy.einsum('pijk,cajbik->abcp',h2e,dm3)\
-          +2.0*numpy.einsum('bp,ca->abcp',h1e,dm1)\
-          +2.0*numpy.einsum('pibk,caik->abcp',h2e,dm2)
+    norb = h1e.shape[0]
+    a23 = numpy.empty((norb,)*4)
+    for c0, c1 in prange(0, norb, _dm3_blksize(norb)):
+        dm3blk = numpy.asarray(dm3[c0:c1])
+        a23[:,:,c0:c1] = -numpy.einsum('ip,caib->abcp',h1e,dm2[c0:c1])\
+                         -numpy.einsum('pijk,cajbik->abcp',h2e,dm3blk)\
+                         +2.0*numpy.einsum('bp,ca->abcp',h1e,dm1[c0:c1])\
+                         +2.0*numpy.einsum('pibk,caik->abcp',h2e,dm2[c0:c1])
 
     return a23
 
@@ -164,7 +173,7 @@ def make_a25(h1e,h2e,dm1,dm2):
     return a25
 
 def make_hdm3(dm1,dm2,dm3,hdm1,hdm2):
-    delta = numpy.eye(dm3.shape[0])
+    delta = numpy.eye(dm1.shape[0])
     hdm3 = - numpy.einsum('pb,qrac->pqrabc',delta,hdm2)\
           - numpy.einsum('br,pqac->pqrabc',delta,hdm2)\
           + numpy.einsum('bq,prac->pqrabc',delta,hdm2)*2.0\
@@ -176,6 +185,23 @@ def make_hdm3(dm1,dm2,dm3,hdm1,hdm2):
           - numpy.einsum('ar,bqcp->pqrabc',delta,dm2)
     return hdm3
 
+def _make_hdm3_blk(dm1,dm2,dm3,hdm1,hdm2,r0,r1):
+    '''The block hdm3[:,:,r0:r1].  dm3 is the block dm3[r0:r1].  Using the
+    hermiticity dm3[b,q,a,p,c,r] = dm3[r,c,p,a,q,b] of the real wfn.
+    '''
+    delta = numpy.eye(dm1.shape[0])
+    deltar = delta[r0:r1]
+    hdm3 = - numpy.einsum('pb,qrac->pqrabc',delta,hdm2[:,r0:r1])\
+          - numpy.einsum('rb,pqac->pqrabc',deltar,hdm2)\
+          + numpy.einsum('bq,prac->pqrabc',delta,hdm2[:,r0:r1])*2.0\
+          + numpy.einsum('ap,bqcr->pqrabc',delta,dm2[:,:,:,r0:r1])*2.0\
+          - numpy.einsum('ap,rc,bq->pqrabc',delta,deltar,dm1)*4.0\
+          + numpy.einsum('rc,bqap->pqrabc',deltar,dm2)*2.0\
+          - numpy.einsum('rcpaqb->pqrabc',dm3)\
+          + numpy.einsum('ra,pc,bq->pqrabc',deltar,delta,dm1)*2.0\
+          - numpy.einsum('ra,bqcp->pqrabc',deltar,dm2)
+    return hdm3
+
 
 def make_hdm2(dm1,dm2):
     delta = numpy.eye(dm2.shape[0])
@@ -215,55 +241,79 @@ def make_a7(h1e,h2e,dm1,dm2,dm3):
     delta = numpy.eye(dm2.shape[0])
     # a^+_ia^+_ja_ka^l =  E^i_lE^j_k -\delta_{j,l} E^i_k
     rm2 = numpy.einsum('iljk->ijkl',dm2) - numpy.einsum('ik,jl->ijkl',dm1,delta)
+
+    norb = h1e.shape[0]
+    a7 = numpy.empty((norb,)*4)
+    for p0, p1 in prange(0, norb, _dm3_blksize(norb)):
+        dm3blk = numpy.asarray(dm3[p0:p1])
+        rm2blk = rm2[p0:p1]
     # E^{i,j,k}_{l,m,n} = E^{i,j}_{m,n}E^k_l -\delta_{k,m}E^{i,j}_{l,n}- \delta_{k,n}E^{i,j}_{m,l}
     # = E^i_nE^j_mE^k_l -\delta_{j,n}E^i_mE^k_l -\delta_{k,m}E^{i,j}_{l,n} -\delta_{k,n}E^{i,j}_{m,l}
-    rm3 = numpy.einsum('injmkl->ijklmn',dm3)\
-        - numpy.einsum('jn,imkl->ijklmn',delta,dm2)\
-        - numpy.einsum('km,ijln->ijklmn',delta,rm2)\
-        - numpy.einsum('kn,ijml->ijklmn',delta,rm2)
-
-    a7 = -numpy.einsum('bi,pqia->pqab',h1e,rm2)\
-         -numpy.einsum('ai,pqbi->pqab',h1e,rm2)\
-         -numpy.einsum('kbij,pqkija->pqab',h2e,rm3) \
-         -numpy.einsum('kaij,pqkibj->pqab',h2e,rm3) \
-         -numpy.einsum('baij,pqij->pqab',h2e,rm2)
+        rm3 = numpy.einsum('injmkl->ijklmn',dm3blk)\
+            - numpy.einsum('jn,imkl->ijklmn',delta,dm2[p0:p1])\
+            - numpy.einsum('km,ijln->ijklmn',delta,rm2blk)\
+            - numpy.einsum('kn,ijml->ijklmn',delta,rm2blk)
+
+        a7[p0:p1] = -numpy.einsum('bi,pqia->pqab',h1e,rm2blk)\
+                    -numpy.einsum('ai,pqbi->pqab',h1e,rm2blk)\
+                    -numpy.einsum('kbij,pqkija->pqab',h2e,rm3) \
+                    -numpy.einsum('kaij,pqkibj->pqab',h2e,rm3) \
+                    -numpy.einsum('baij,pqij->pqab',h2e,rm2blk)
     return rm2, a7
 
 def make_a9(h1e,h2e,hdm1,hdm2,hdm3):
     a9 =  numpy.einsum('ib,pqai->pqab',h1e,hdm2)
     a9 += numpy.einsum('ijib,pqaj->pqab',h2e,hdm2)*2.0
     a9 -= numpy.einsum('ijjb,pqai->pqab',h2e,hdm2)
-    a9 -= numpy.einsum('ijkb,pkqaij->pqab',h2e,hdm3)
     a9 += numpy.einsum('ia,pqib->pqab',h1e,hdm2)
     a9 -= numpy.einsum('ijja,pqib->pqab',h2e,hdm2)
     a9 -= numpy.einsum('ijba,pqji->pqab',h2e,hdm2)
     a9 += numpy.einsum('ijia,pqjb->pqab',h2e,hdm2)*2.0
-    a9 -= numpy.einsum('ijka,pqkjbi->pqab',h2e,hdm3)
+    if hdm3 is not None:
+        _add_a9_hdm3(a9, h2e, hdm3, 0, hdm3.shape[2])
+    return a9
+
+def _add_a9_hdm3(a9, h2e, hdm3, r0, r1):
+    '''Add the hdm3 contributions to a9.  hdm3 is the block hdm3[:,:,r0:r1]'''
+    a9[:,r0:r1] -= numpy.einsum('ijkb,pkqaij->pqab',h2e,hdm3)
+    a9 -= numpy.einsum('ijka,pqkjbi->pqab',h2e[:,:,r0:r1],hdm3)
     return a9
 
 def make_a12(h1e,h2e,dm1,dm2,dm3):
-    a12 = numpy.einsum('ia,qpib->pqab',h1e,dm2)\
-        - numpy.einsum('bi,qpai->pqab',h1e,dm2)\
-        + numpy.einsum('ijka,qpjbik->pqab',h2e,dm3)\
-        - numpy.einsum('kbij,qpajki->pqab',h2e,dm3)\
-        - numpy.einsum('bjka,qpjk->pqab',h2e,dm2)\
-        + numpy.einsum('jbij,qpai->pqab',h2e,dm2)
+    norb = h1e.shape[0]
+    a12 = numpy.empty((norb,)*4)
+    for q0, q1 in prange(0, norb, _dm3_blksize(norb)):
+        dm2blk = dm2[q0:q1]
+        dm3blk = numpy.asarray(dm3[q0:q1])
+        a12[:,q0:q1] = numpy.einsum('ia,qpib->pqab',h1e,dm2blk)\
+                     - numpy.einsum('bi,qpai->pqab',h1e,dm2blk)\
+                     + numpy.einsum('ijka,qpjbik->pqab',h2e,dm3blk)\
+                     - numpy.einsum('kbij,qpajki->pqab',h2e,dm3blk)\
+                     - numpy.einsum('bjka,qpjk->pqab',h2e,dm2blk)\
+                     + numpy.einsum('jbij,qpai->pqab',h2e,dm2blk)
     return a12
 
 def make_a13(h1e,h2e,dm1,dm2,dm3):
-    delta = numpy.eye(dm3.shape[0])
-    a13 = -numpy.einsum('ia,qbip->pqab',h1e,dm2)
-    a13 += numpy.einsum('pa,qb->pqab',h1e,dm1)*2.0
-    a13 += numpy.einsum('bi,qiap->pqab',h1e,dm2)
-    a13 -= numpy.einsum('pa,bi,qi->pqab',delta,h1e,dm1)*2.0
-    a13 -= numpy.einsum('ijka,qbjpik->pqab',h2e,dm3)
-    a13 += numpy.einsum('kbij,qjapki->pqab',h2e,dm3)
-    a13 += numpy.einsum('blma,qmlp->pqab',h2e,dm2)
-    a13 += numpy.einsum('kpma,qbkm->pqab',h2e,dm2)*2.0
-    a13 -= numpy.einsum('bpma,qm->pqab',h2e,dm1)*2.0
-    a13 -= numpy.einsum('lbkl,qkap->pqab',h2e,dm2)
-    a13 -= numpy.einsum('ap,mbkl,qlmk->pqab',delta,h2e,dm2)*2.0
-    a13 += numpy.einsum('ap,lbkl,qk->pqab',delta,h2e,dm1)*2.0
+    norb = h1e.shape[0]
+    delta = numpy.eye(norb)
+    a13 = numpy.empty((norb,)*4)
+    for q0, q1 in prange(0, norb, _dm3_blksize(norb)):
+        dm1blk = dm1[q0:q1]
+        dm2blk = dm2[q0:q1]
+        dm3blk = numpy.asarray(dm3[q0:q1])
+        tmp = -numpy.einsum('ia,qbip->pqab',h1e,dm2blk)
+        tmp += numpy.einsum('pa,qb->pqab',h1e,dm1blk)*2.0
+        tmp += numpy.einsum('bi,qiap->pqab',h1e,dm2blk)
+        tmp -= numpy.einsum('pa,bi,qi->pqab',delta,h1e,dm1blk)*2.0
+        tmp -= numpy.einsum('ijka,qbjpik->pqab',h2e,dm3blk)
+        tmp += numpy.einsum('kbij,qjapki->pqab',h2e,dm3blk)
+        tmp += numpy.einsum('blma,qmlp->pqab',h2e,dm2blk)
+        tmp += numpy.einsum('kpma,qbkm->pqab',h2e,dm2blk)*2.0
+        tmp -= numpy.einsum('bpma,qm->pqab',h2e,dm1blk)*2.0
+        tmp -= numpy.einsum('lbkl,qkap->pqab',h2e,dm2blk)
+        tmp -= numpy.einsum('ap,mbkl,qlmk->pqab',delta,h2e,dm2blk)*2.0
+        tmp += numpy.einsum('ap,lbkl,qk->pqab',delta,h2e,dm1blk)*2.0
+        a13[:,q0:q1] = tmp
     return a13
 
 
@@ -293,20 +343,34 @@ def Sr(mc,ci,dms, eris=None, verbose=None):
         h1e_v = eris['h1eff'][nocc:,ncore:nocc] - numpy.einsum('mbbn->mn',h2e_v)
 
 
+    norb = mc.ncas
+    h2e_v = numpy.asarray(h2e_v, order='C')
     if hasattr(mc.fcisolver, 'nevpt_intermediate'):
         a16 = mc.fcisolver.nevpt_intermediate('A16',mc.ncas,mc.nelecas,ci)
     else:
-        a16 = make_a16(h1e,h2e, dms, ci, mc.ncas, mc.nelecas)
+        a16 = None
+        f3ca, f3ac = _load_f3(h2e, dms, ci, norb, mc.nelecas)
+# a16 and dm3 are contracted with h2e_v in blocks of the index r
+    ener = 0
+    norm = 0
+    for r0, r1 in prange(0, norb, _dm3_blksize(norb, mc.max_memory)):
+        dm3blk = numpy.asarray(dm3[r0:r1])
+        if a16 is None:
+            a16blk = _make_a16(h1e, h2e, dm3blk, f3ca[r0:r1], f3ac[r0:r1])
+        else:
+            a16blk = a16[:,:,r0:r1]
+        h2e_vr = numpy.asarray(h2e_v[:,:,:,r0:r1], order='C')
+        ener += _vxv(h2e_vr, a16blk, h2e_v)
+        norm += _vxv(h2e_vr, dm3blk.transpose(1,2,0,4,3,5), h2e_v)
+        dm3blk = a16blk = None
     a17 = make_a17(h1e,h2e,dm2,dm3)
     a19 = make_a19(h1e,h2e,dm1,dm2)
 
-    ener = numpy.einsum('ipqr,pqrabc,iabc->i',h2e_v,a16,h2e_v)\
-        +  numpy.einsum('ipqr,pqra,ia->i',h2e_v,a17,h1e_v)*2.0\
-        +  numpy.einsum('ip,pa,ia->i',h1e_v,a19,h1e_v)
+    ener += numpy.einsum('ipqr,pqra,ia->i',h2e_v,a17,h1e_v)*2.0\
+         +  numpy.einsum('ip,pa,ia->i',h1e_v,a19,h1e_v)
 
-    norm = numpy.einsum('ipqr,rpqbac,iabc->i',h2e_v,dm3,h2e_v)\
-        +  numpy.einsum('ipqr,rpqa,ia->i',h2e_v,dm2,h1e_v)*2.0\
-        +  numpy.einsum('ip,pa,ia->i',h1e_v,dm1,h1e_v)
+    norm += numpy.einsum('ipqr,rpqa,ia->i',h2e_v,dm2,h1e_v)*2.0\
+         +  numpy.einsum('ip,pa,ia->i',h1e_v,dm1,h1e_v)
 
     return _norm_to_energy(norm, ener, mc.mo_energy[mc.ncore+mc.ncas:])
 
@@ -334,27 +398,42 @@ def Si(mc, ci, dms, eris=None, verbose=None):
         h2e_v = eris['ppaa'][ncore:nocc,:ncore].transpose(0,2,1,3)
         h1e_v = eris['h1eff'][ncore:nocc,:ncore]
 
+    norb = mc.ncas
     if hasattr(mc.fcisolver, 'nevpt_intermediate'):
         #mc.fcisolver.make_a22(mc.ncas, state)
         a22 = mc.fcisolver.nevpt_intermediate('A22',mc.ncas,mc.nelecas,ci)
     else:
-        a22 = make_a22(h1e,h2e, dms, ci, mc.ncas, mc.nelecas)
+        a22 = None
+        f3ca, f3ac = _load_f3(h2e, dms, ci, norb, mc.nelecas)
+    delta = numpy.eye(mc.ncas)
+# a22 and dm3_h are contracted with h2e_v in blocks of the index r
+    h2e_vt = numpy.asarray(h2e_v.transpose(2,1,0,3), order='C')  # qpir->ipqr
+    ener = 0
+    norm = 0
+    for r0, r1 in prange(0, norb, _dm3_blksize(norb, mc.max_memory)):
+        dm3blk = numpy.asarray(dm3[r0:r1])
+        if a22 is None:
+            a22blk = _make_a22(h1e, h2e, dm2[r0:r1], dm3blk,
+                               f3ca[r0:r1], f3ac[r0:r1])
+        else:
+            a22blk = a22[:,:,r0:r1]
+        dm3_h = numpy.einsum('abef,cd->abcdef',dm2[r0:r1],delta)*2\
+                - dm3blk.transpose(0,1,3,2,4,5)
+        h2e_vr = numpy.asarray(h2e_vt[:,:,:,r0:r1], order='C')
+        ener += _vxv(h2e_vr, a22blk, h2e_vt)
+        norm += _vxv(h2e_vr, dm3_h.transpose(1,2,0,4,3,5), h2e_vt)
+        dm3blk = a22blk = dm3_h = None
     a23 = make_a23(h1e,h2e,dm1,dm2,dm3)
     a25 = make_a25(h1e,h2e,dm1,dm2)
-    delta = numpy.eye(mc.ncas)
-    dm3_h = numpy.einsum('abef,cd->abcdef',dm2,delta)*2\
-            - dm3.transpose(0,1,3,2,4,5)
     dm2_h = numpy.einsum('ab,cd->abcd',dm1,delta)*2\
             - dm2.transpose(0,1,3,2)
     dm1_h = 2*delta- dm1.transpose(1,0)
 
-    ener = numpy.einsum('qpir,pqrabc,baic->i',h2e_v,a22,h2e_v)\
-        +  numpy.einsum('qpir,pqra,ai->i',h2e_v,a23,h1e_v)*2.0\
-        +  numpy.einsum('pi,pa,ai->i',h1e_v,a25,h1e_v)
+    ener += numpy.einsum('qpir,pqra,ai->i',h2e_v,a23,h1e_v)*2.0\
+         +  numpy.einsum('pi,pa,ai->i',h1e_v,a25,h1e_v)
 
-    norm = numpy.einsum('qpir,rpqbac,baic->i',h2e_v,dm3_h,h2e_v)\
-        +  numpy.einsum('qpir,rpqa,ai->i',h2e_v,dm2_h,h1e_v)*2.0\
-        +  numpy.einsum('pi,pa,ai->i',h1e_v,dm1_h,h1e_v)
+    norm += numpy.einsum('qpir,rpqa,ai->i',h2e_v,dm2_h,h1e_v)*2.0\
+         +  numpy.einsum('pi,pa,ai->i',h1e_v,dm1_h,h1e_v)
 
     return _norm_to_energy(norm, ener, -mc.mo_energy[:mc.ncore])
 
@@ -497,13 +576,18 @@ def Sij(mc, dms, eris, verbose=None):
         hdm2 = dms['h2']
     else:
         hdm2 = make_hdm2(dm1,dm2)
-    if 'h3' in dms:
-        hdm3 = dms['h3']
-    else:
-        hdm3 = make_hdm3(dm1,dm2,dm3,hdm1,hdm2)
 
 # a9 is very sensitive to the accuracy of HF orbital and CI wfn
-    a9 = make_a9(h1e,h2e,hdm1,hdm2,hdm3)
+    if 'h3' in dms:
+        a9 = make_a9(h1e,h2e,hdm1,hdm2,dms['h3'])
+    else:
+        norb = mc.ncas
+        a9 = make_a9(h1e,h2e,hdm1,hdm2,None)
+        for r0, r1 in prange(0, norb, _dm3_blksize(norb, mc.max_memory)):
+            hdm3 = _make_hdm3_blk(dm1,dm2,numpy.asarray(dm3[r0:r1]),
+                                  hdm1,hdm2,r0,r1)
+            _add_a9_hdm3(a9, h2e, hdm3, r0, r1)
+            hdm3 = None
     norm = 0.5*numpy.einsum('qpij,baij,pqab->ij',h2e_v,h2e_v,hdm2)
     h = 0.5*numpy.einsum('qpij,baij,pqab->ij',h2e_v,h2e_v,a9)
     diff = mc.mo_energy[:mc.ncore,None] + mc.mo_energy[None,:mc.ncore]
@@ -563,6 +647,16 @@ class NEVPT(lib.StreamObject):
             wfn were calculated in CASCI/CASSCF
         compressed_mps : bool
             compressed MPS perturber method for DMRG-SC-NEVPT2
+        rdm_storage : str
+            How to store the 3-pdm and the 4-pdm intermediates f3ca, f3ac.
+            'packed' (default) keeps the normal-ordered 3-pdm in the packed
+            form of fci.rdm.pack_dm3, f3ca and f3ac are regenerated in
+            blocks when they are needed.  'disk' saves the 3-pdm and f3ca,
+            f3ac in a temporary file.  For FCI wavefunctions, 'packed' and
+            'disk' generate the 3-pdm and f3ca, f3ac in blocks of the first
+            index without the dense norb^6 arrays.  'dense' keeps them as
+            dense arrays.  The contractions are carried out in blocks of the
+            first RDM index for all storages.
 
     Examples:
 
@@ -576,6 +670,7 @@ class NEVPT(lib.StreamObject):
         self._mc = mc
         self.root = root
         self.compressed_mps = False
+        self.rdm_storage = 'packed'
 
 ##################################################
 # don't modify the following attributes, they are not input options
@@ -658,14 +753,34 @@ class NEVPT(lib.StreamObject):
         if (not self.canonicalized):
             self.mo_coeff,_, self.mo_energy = self.canonicalize(self.mo_coeff,ci=self.load_ci(),verbose=self.verbose)
 
+        ncas = self.ncas
+        if self.rdm_storage == 'disk':
+            feri = lib.H5TmpFile()
         if hasattr(self.fcisolver, 'nevpt_intermediate'):
             logger.info(self, 'DMRG-NEVPT')
-            dm1, dm2, dm3 = self.fcisolver._make_dm123(self.load_ci(),self.ncas,self.nelecas,None)
+            dm1, dm2, dm3 = self.fcisolver._make_dm123(self.load_ci(),ncas,self.nelecas,None)
+            if self.rdm_storage == 'disk':
+                feri['dm3'] = dm3
+                dm3 = feri['dm3']
+            elif self.rdm_storage == 'packed':
+                dm3 = fci.rdm.reorder_dm123(dm1, dm2.copy(), dm3, inplace=True)[2]
+                dm3 = _PackedDM3(dm1, dm2, fci.rdm.pack_dm3(dm3))
+        elif self.rdm_storage == 'packed':
+            dm1, dm2, dm3 = fci.rdm.make_dm123_packed(self.load_ci(), ncas,
+                                                      self.nelecas,
+                                                      max_memory=self.max_memory)
+            dm3 = _PackedDM3(dm1, dm2, dm3)
+        elif self.rdm_storage == 'disk':
+            dm1, dm2 = fci.rdm.make_rdm12_spin1('FCIrdm12kern_sf', self.load_ci(),
+                                                self.load_ci(), ncas, self.nelecas)
+            dm3 = feri.create_dataset('dm3', (ncas,)*6, 'f8')
+            for p0, p1 in prange(0, ncas, _dm3_blksize(ncas, self.max_memory)):
+                dm3[p0:p1] = fci.rdm.make_dm3_blk(self.load_ci(), self.load_ci(),
+                                                  ncas, self.nelecas, p0, p1)
         else:
             dm1, dm2, dm3 = fci.rdm.make_dm123('FCI3pdm_kern_sf',
-                                               self.load_ci(), self.load_ci(), self.ncas, self.nelecas)
+                                               self.load_ci(), self.load_ci(), ncas, self.nelecas)
         dm4 = None
-
         dms = {'1': dm1, '2': dm2, '3': dm3, '4': dm4,
                #'h1': hdm1, 'h2': hdm2, 'h3': hdm3
               }
@@ -679,12 +794,26 @@ class NEVPT(lib.StreamObject):
             link_indexa = fci.cistring.gen_linkstr_index(range(self.ncas), self.nelecas[0])
             link_indexb = fci.cistring.gen_linkstr_index(range(self.ncas), self.nelecas[1])
             aaaa = eris['ppaa'][self.ncore:nocc,self.ncore:nocc].copy()
-            f3ca = _contract4pdm('NEVPTkern_cedf_aedf', aaaa, self.load_ci(), self.ncas,
-                                 self.nelecas, (link_indexa,link_indexb))
-            f3ac = _contract4pdm('NEVPTkern_aedf_ecdf', aaaa, self.load_ci(), self.ncas,
-                                 self.nelecas, (link_indexa,link_indexb))
+            f3ca = _F3Blocks('NEVPTkern_cedf_aedf', aaaa, self.load_ci(), ncas,
+                             self.nelecas, (link_indexa,link_indexb))
+            f3ac = _F3Blocks('NEVPTkern_aedf_ecdf', aaaa, self.load_ci(), ncas,
+                             self.nelecas, (link_indexa,link_indexb))
+            if self.rdm_storage == 'disk':
+                feri.create_dataset('f3ca', (ncas,)*6, 'f8')
+                feri.create_dataset('f3ac', (ncas,)*6, 'f8')
+                for p0, p1 in prange(0, ncas, _dm3_blksize(ncas, self.max_memory)):
+                    feri['f3ca'][p0:p1] = f3ca[p0:p1]
+                    feri['f3ac'][p0:p1] = f3ac[p0:p1]
+                f3ca = feri['f3ca']
+                f3ac = feri['f3ac']
+            elif self.rdm_storage != 'packed':
+                f3ca = _contract4pdm('NEVPTkern_cedf_aedf', aaaa, self.load_ci(), ncas,
+                                     self.nelecas, (link_indexa,link_indexb))
+                f3ac = _contract4pdm('NEVPTkern_aedf_ecdf', aaaa, self.load_ci(), ncas,
+                                     self.nelecas, (link_indexa,link_indexb))
             dms['f3ca'] = f3ca
             dms['f3ac'] = f3ac
+            f3ca = f3ac = None
         time1 = log.timer('eri-4pdm contraction', *time1)
 
         if self.compressed_mps:
@@ -707,6 +836,9 @@ class NEVPT(lib.StreamObject):
             norm_Si   , e_Si    = Si(self, self.load_ci(), dms, eris)
             logger.note(self, "Si    (+1)',   E = %.14f",  e_Si  )
             time1 = log.timer("space Si (+1)'", *time1)
+# f3ca and f3ac are only needed by Sr and Si
+        dms.pop('f3ca', None)
+        dms.pop('f3ac', None)
         norm_Sijrs, e_Sijrs = Sijrs(self, eris)
         logger.note(self, "Sijrs (0)  ,   E = %.14f", e_Sijrs)
         time1 = log.timer('space Sijrs (0)', *time1)
@@ -791,6 +923,55 @@ def _contract4pdm(kern, eri, civec, norb, nelec, link_index=None):
             fdm3[j,:,i,j] -= fdm2[i,:]
     return fdm3
 
+def _contract4pdm_blk(kern, eri, civec, norb, nelec, p0, p1, link_index=None):
+    '''The rows p0:p1 of _contract4pdm'''
+    if isinstance(nelec, (int, numpy.integer)):
+        neleca = nelecb = nelec//2
+    else:
+        neleca, nelecb = nelec
+    if link_index is None:
+        link_indexa = fci.cistring.gen_linkstr_index(range(norb), neleca)
+        link_indexb = fci.cistring.gen_linkstr_index(range(norb), nelecb)
+    else:
+        link_indexa, link_indexb = link_index
+    na,nlinka = link_indexa.shape[:2]
+    nb,nlinkb = link_indexb.shape[:2]
+    fdm3 = numpy.empty((p1-p0,)+(norb,)*5)
+    eri = numpy.ascontiguousarray(eri)
+    civec = numpy.asarray(civec, order='C')
+
+    libmc.NEVPTcontract_blk(getattr(libmc, kern),
+                            fdm3.ctypes.data_as(ctypes.c_void_p),
+                            eri.ctypes.data_as(ctypes.c_void_p),
+                            civec.ctypes.data_as(ctypes.c_void_p),
+                            ctypes.c_int(norb),
+                            ctypes.c_int(na), ctypes.c_int(nb),
+                            ctypes.c_int(nlinka), ctypes.c_int(nlinkb),
+                            link_indexa.ctypes.data_as(ctypes.c_void_p),
+                            link_indexb.ctypes.data_as(ctypes.c_void_p),
+                            ctypes.c_int(p0), ctypes.c_int(p1))
+    return fdm3
+
+class _F3Blocks(object):
+    '''The 4-pdm contracted with the 2e integrals (f3ca or f3ac, see
+    _contract4pdm).  The block f3[p0:p1] is generated from the CI vector when
+    it is sliced, the dense norb^6 array is not held.
+    '''
+    def __init__(self, kern, eri, civec, norb, nelec, link_index=None):
+        self.shape = (norb,) * 6
+        self.kern = kern
+        self.eri = numpy.ascontiguousarray(eri)
+        self.civec = civec
+        self.nelec = nelec
+        self.link_index = link_index
+
+    def __getitem__(self, s):
+        norb = self.shape[0]
+        p0, p1, step = s.indices(norb)
+        assert(step == 1)
+        return _contract4pdm_blk(self.kern, self.eri, self.civec, norb,
+                                 self.nelec, p0, p1, self.link_index)
+
 def _extract_orbs(mc, mo_coeff):
     ncore = mc.ncore
     ncas = mc.ncas
@@ -801,6 +982,51 @@ def _extract_orbs(mc, mo_coeff):
     return mo_core, mo_cas, mo_vir
 
 
+def _dm3_blksize(norb, max_memory=None):
+    '''Number of rows of the first index in the blocked 3-pdm contractions.
+    About 8 arrays of the block size are created in each contraction.
+    '''
+    if max_memory is None:
+        max_memory = lib.param.MAX_MEMORY
+    mem_avail = max(max_memory - lib.current_memory()[0], 200)
+    return int(max(1, min(norb, mem_avail*1e6/8/(norb**5*8))))
+
+def _vxv(v1, x, v2):
+    '''einsum('ix,xy,iy->i', v1, x, v2) with the compound indices x, y'''
+    n = v1.shape[0]
+    v1 = v1.reshape(n,-1)
+    tmp = lib.dot(v1, x.reshape(v1.shape[1],-1))
+    return numpy.einsum('iy,iy->i', tmp, v2.reshape(n,-1))
+
+class _PackedDM3(object):
+    '''The 3-pdm <E^p_q E^r_s E^t_u> stored as the packed normal-ordered 3-pdm
+    dm3p (see fci.rdm.pack_dm3 and fci.rdm.make_dm123_packed).  The storage is
+    1/6 of the dense 3-pdm.  The dense block dm3[p0:p1] is regenerated from
+    the packed 3-pdm and the normal-ordered 1-pdm and 2-pdm.  dm1 and dm2 are
+    <E^p_q> and <E^p_q E^r_s> as returned by fci.rdm.make_dm123.
+    '''
+    def __init__(self, dm1, dm2, dm3p):
+        norb = dm1.shape[0]
+        self.shape = (norb,) * 6
+        self.dm1, self.dm2 = fci.rdm.reorder_rdm(dm1, dm2, inplace=False)
+        self.dm3 = dm3p
+
+    def __getitem__(self, s):
+        norb = self.shape[0]
+        p0, p1, step = s.indices(norb)
+        assert(step == 1)
+        dm1 = self.dm1[p0:p1]
+        dm2 = self.dm2[p0:p1]
+        dm3 = fci.rdm.unpack_dm3(self.dm3, norb, p0, p1)
+# Inverse of fci.rdm.reorder_dm123
+        for q in range(norb):
+            dm3[:,q,q,:,:,:] += dm2
+            dm3[:,:,:,q,q,:] += dm2
+            dm3[:,q,:,:,q,:] += dm2.transpose(0,2,3,1)
+            for r in range(norb):
+                dm3[:,q,q,r,r,:] += dm1
+        return dm3
+
 def _norm_to_energy(norm, h, diff):
     idx = abs(norm) > NUMERICAL_ZERO
     ener_t = -(norm[idx] / (diff[idx] + h[idx]/norm[idx])).sum()
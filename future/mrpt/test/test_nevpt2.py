@@ -90,6 +90,25 @@ class KnowValues(unittest.TestCase):
         e = nevpt2.NEVPT(mc).kernel()
         self.assertAlmostEqual(e, -0.10315217594326213, 7)
 
+    def test_rdm_storage(self):
+        dm3n = fci.rdm.reorder_dm123(dm1, dm2, dm3, inplace=False)[2]
+        dm3p = nevpt2._PackedDM3(dm1, dm2, fci.rdm.pack_dm3(dm3n))
+        self.assertTrue(numpy.allclose(dm3p[0:norb], dm3))
+        self.assertTrue(numpy.allclose(dm3p[2:5], dm3[2:5]))
+        dm3p = nevpt2._PackedDM3(*fci.rdm.make_dm123_packed(mc.ci, norb, nelec))
+        self.assertTrue(numpy.allclose(dm3p[2:5], dm3[2:5]))
+
+        link_index = (fci.cistring.gen_linkstr_index(range(norb), nelec//2),) * 2
+        for kern in ('NEVPTkern_cedf_aedf', 'NEVPTkern_aedf_ecdf'):
+            f3 = nevpt2._contract4pdm(kern, h2e, mc.ci, norb, nelec, link_index)
+            f3blk = nevpt2._F3Blocks(kern, h2e, mc.ci, norb, nelec, link_index)
+            self.assertTrue(numpy.allclose(f3blk[1:4], f3[1:4]))
+            self.assertTrue(numpy.allclose(f3blk[:norb], f3))
+        for storage in ('dense', 'disk'):
+            nv = nevpt2.NEVPT(mc)
+            nv.rdm_storage = storage
+            self.assertAlmostEqual(nv.kernel(), -0.10315217594326213, 7)
+
     def test_energy1(self):
         mol = gto.M(
             verbose = 0,
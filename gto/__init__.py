@@ -8,8 +8,9 @@ from pyscf.gto import mole
 from pyscf.gto import basis
 from pyscf.gto.basis import parse, load, parse_ecp, load_ecp
 from pyscf.gto.mole import *
-from pyscf.gto.moleintor import getints, getints_by_shell
+from pyscf.gto.moleintor import getints, getints_by_shell, getints_by_shell_batch
 from pyscf.gto.eval_gto import eval_gto
+from pyscf.gto.shellpair import ShellPairList
 from pyscf.gto import ecp
 
 parse = basis.parse
@@ -4,6 +4,8 @@
 
 import os
 import sys
+import copy
+import collections
 if sys.version_info < (2,7):
     import imp
 else:
@@ -122,6 +124,28 @@ ALIAS = {
     'bfdpp'      : 'bfd_pp.dat',
 }
 
+# LRU memo of the basis (ECP) loaded from the library, indexed by
+# (basis file, element symbol).
+MAX_MEMO_SIZE = 512
+_MEMO = collections.OrderedDict()
+
+def _load_memo(fload, basisfile, symb):
+    key = (fload.__name__, basisfile, symb)
+    if key in _MEMO:
+        b = _MEMO.pop(key)
+    else:
+        b = fload(basisfile, symb)
+        while len(_MEMO) >= MAX_MEMO_SIZE:
+            _MEMO.popitem(last=False)
+    _MEMO[key] = b
+    # Mole may modify the returned basis in place
+    return copy.deepcopy(b)
+
+def clear_memo():
+    '''Remove the memoized basis sets and ECPs'''
+    _MEMO.clear()
+    parse_nwchem._SEG_INDEX.clear()
+
 def parse(string):
     '''Parse the NWChem format basis or ECP text, return an internal basis (ECP)
     format which can be assigned to :attr:`Mole.basis` or :attr:`Mole.ecp`
@@ -186,7 +210,8 @@ def load(filename_or_basisname, symb):
     basmod = ALIAS[name]
     symb = ''.join([i for i in symb if i.isalpha()])
     if 'dat' in basmod:
-        b = parse_nwchem.load(os.path.join(os.path.dirname(__file__), basmod), symb)
+        b = _load_memo(parse_nwchem.load,
+                       os.path.join(os.path.dirname(__file__), basmod), symb)
     else:
         if sys.version_info < (2,7):
             fp, pathname, description = imp.find_module(basmod, __path__)
@@ -215,5 +240,6 @@ def load_ecp(filename_or_basisname, symb):
         return parse_ecp(filename_or_basisname)
     basmod = ALIAS[name]
     symb = ''.join([i for i in symb if i.isalpha()])
-    return parse_nwchem.load_ecp(os.path.join(os.path.dirname(__file__), basmod), symb)
+    return _load_memo(parse_nwchem.load_ecp,
+                      os.path.join(os.path.dirname(__file__), basmod), symb)
 
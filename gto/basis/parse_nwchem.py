@@ -5,6 +5,8 @@
 # parse NWChem format
 #
 
+import os
+
 MAXL = 8
 SPDF = ('S', 'P', 'D', 'F', 'G', 'H', 'I', 'J')
 MAPSPDF = {'S': 0,
@@ -43,6 +45,54 @@ def load_ecp(basisfile, symb):
     return _parse_ecp(search_ecp(basisfile, symb))
 
 def search_seg(basisfile, symb):
+    index = index_seg(basisfile)
+    if symb in index:
+        p0, p1 = index[symb]
+        with open(basisfile, 'rb') as fin:
+            fin.seek(p0)
+            dat = fin.read(p1-p0).decode('utf-8')
+        return [x.strip() for x in dat.splitlines() if x.strip()]
+    else:
+        return _scan_seg(basisfile, symb)
+
+# {basisfile: (mtime, {symb: (offset_begin, offset_end)})}
+_SEG_INDEX = {}
+def index_seg(basisfile):
+    '''Byte offsets of the basis segments in the NWChem format file, indexed
+    by the element symbol.  The index is built with one pass over the file and
+    kept until the modification time of the file changes.
+    '''
+    mtime = os.path.getmtime(basisfile)
+    if basisfile in _SEG_INDEX and _SEG_INDEX[basisfile][0] == mtime:
+        return _SEG_INDEX[basisfile][1]
+
+    index = {}
+    with open(basisfile, 'rb') as fin:
+        offset = 0
+        head = True  # before the first "#BASIS SET"
+        symb = None
+        seg_start = None
+        for line in fin:
+            dat = line.lstrip(b' ')
+            if dat.startswith(b'#BASIS SET') or (not head and dat.startswith(b'END')):
+                if symb is not None and symb not in index:
+                    index[symb] = (seg_start, offset)
+                symb = None
+                seg_start = None
+                if dat.startswith(b'END'):
+                    break
+                head = False
+            elif not head and seg_start is None:
+                seg_start = offset
+                if dat.strip():
+                    symb = dat.split()[0].decode('utf-8')
+            offset += len(line)
+        if symb is not None and symb not in index:
+            index[symb] = (seg_start, offset)
+    _SEG_INDEX[basisfile] = (mtime, index)
+    return index
+
+def _scan_seg(basisfile, symb):
     with open(basisfile, 'r') as fin:
         # ignore head
         dat = fin.readline().lstrip(' ')
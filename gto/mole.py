@@ -11,7 +11,6 @@ import time
 import math
 import json
 import numpy
-import scipy.special
 import ctypes
 from pyscf import lib
 from pyscf.lib import param
@@ -44,7 +43,7 @@ def M(**kwargs):
 def _gaussian_int(n, alpha):
     r'''int_0^inf x^n exp(-alpha x^2) dx'''
     n1 = (n + 1) * .5
-    return scipy.special.gamma(n1) / (2. * alpha**n1)
+    return math.gamma(n1) / (2. * alpha**n1)
 
 def gto_norm(l, expnt):
     r'''Normalized factor for GTO radial part   :math:`g=r^l e^{-\alpha r^2}`
@@ -713,7 +712,7 @@ def unpack(moldic):
 def dumps(mol):
     '''Serialize Mole object to a JSON formatted str.
     '''
-    exclude_keys = set(('output', 'stdout', '_keys'))
+    exclude_keys = set(('output', 'stdout', '_keys', '_shell_pairs'))
     nparray_keys = set(('_atm', '_bas', '_env', '_ecpbas'))
 
     moldic = dict(mol.__dict__)
@@ -1496,6 +1495,7 @@ class Mole(lib.StreamObject):
         self._basis = None
         self._ecp = None
         self._built = False
+        self._shell_pairs = None
         self._keys = set(self.__dict__.keys())
         self.__dict__.update(kwargs)
 
@@ -1667,6 +1667,7 @@ class Mole(lib.StreamObject):
             self._atom = self.format_atom(self._atom, orig, axes, 'Bohr')
 
         self._env[PTR_LIGHT_SPEED] = param.LIGHT_SPEED
+        self._shell_pairs = None
         self._atm, self._bas, self._env = \
                 self.make_env(self._atom, self._basis, self._env, self.nucmod)
         self._atm, self._ecpbas, self._env = \
@@ -1701,6 +1702,63 @@ Note when symmetry attributes is assigned, the molecule needs to be put in the p
         return self
     kernel = build
 
+    def set_geom_(self, atoms_or_coords, unit=None):
+        '''Update the geometry of the molecule in place.
+
+        Only the coordinates in :attr:`Mole._atom` and :attr:`Mole._env` are
+        changed.  The basis, ECP and the other data generated by :func:`build`
+        are kept.  :func:`build` is called instead if the atoms are different
+        to the ones of the last build or symmetry is enabled (the point group
+        and the symmetry adapted basis depend on the geometry).  Integrals
+        held by other objects (e.g. SCF._eri) are not updated.
+
+        Args:
+            atoms_or_coords : 2D array, list or str
+                Either a (natm,3) array of the new coordinates or the new
+                :attr:`Mole.atom`
+
+        Kwargs:
+            unit : str or number
+                Unit of the coordinates.  Default is :attr:`Mole.unit`
+
+        Examples:
+
+        >>> mol = gto.M(atom='H 0 0 0; H 0 0 .74', basis='ccpvdz')
+        >>> mol.set_geom_([[0, 0, 0], [0, 0, .8]])
+        >>> mol.atom_coord(1)
+        [ 0.          0.          1.51178089]
+        '''
+        if unit is None:
+            unit = self.unit
+        try:
+            coords = numpy.asarray(atoms_or_coords, dtype=numpy.double)
+            if coords.shape != (self.natm, 3):
+                coords = None
+        except (ValueError, TypeError):
+            coords = None
+
+        if coords is None:
+            atom = atoms_or_coords
+            _atom = self.format_atom(atom, unit=unit)
+        else:
+            symbs = [a[0] for a in self._atom]
+            atom = list(zip(symbs, coords.tolist()))
+            _atom = self.format_atom(atom, unit=unit)
+
+        self.atom = atom
+        self.unit = unit
+        if (self.symmetry or not self._built or
+            [a[0] for a in _atom] != [a[0] for a in self._atom]):
+            return self.build(False, False)
+
+        self._atom = _atom
+        self._shell_pairs = None
+        # _env may be shared with shallow copies of this object
+        self._env = numpy.array(self._env, dtype=numpy.double)
+        ptr = self._atm[:,PTR_COORD]
+        self._env[ptr[:,None]+numpy.arange(3)] = [a[1] for a in _atom]
+        return self
+
     @lib.with_doc(format_atom.__doc__)
     def format_atom(self, atom, origin=0, axes=None, unit='Ang'):
         return format_atom(atom, origin, axes, unit)
@@ -2319,6 +2377,26 @@ Note when symmetry attributes is assigned, the molecule needs to be put in the p
         return moleintor.getints_by_shell(intor, shells, self._atm, bas,
                                           self._env, comp)
 
+    @lib.with_doc(moleintor.getints_by_shell_batch.__doc__)
+    def intor_by_shell_batch(self, intor, shells, comp=1, q_cond=None,
+                             cutoff=1e-14):
+        return moleintor.getints_by_shell_batch(intor, shells, self._atm,
+                                                self._bas, self._env, comp,
+                                                q_cond, cutoff)
+
+    def shell_pair_list(self, cutoff=1e-14, intor='cint2e_sph'):
+        '''The significant shell pairs and their Schwarz bounds, see
+        :class:`pyscf.gto.shellpair.ShellPairList`.  The list is cached and
+        rebuilt when the geometry or the basis is changed, including the
+        in-place changes of _atm, _bas and _env.
+        '''
+        from pyscf.gto.shellpair import ShellPairList
+        spl = self._shell_pairs
+        if (spl is None or spl.cutoff != cutoff or spl.intor != intor or
+            not spl.match(self)):
+            spl = self._shell_pairs = ShellPairList(self, cutoff, intor).build()
+        return spl
+
     @lib.with_doc(eval_gto.__doc__)
     def eval_gto(self, eval_name, coords,
                  comp=1, shls_slice=None, non0tab=None, out=None):
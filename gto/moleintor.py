@@ -8,9 +8,6 @@ import ctypes
 import pyscf.lib
 
 libcgto = pyscf.lib.load_library('libcgto')
-libcgto.CINTcgto_cart.restype = ctypes.c_int
-libcgto.CINTcgto_spheric.restype = ctypes.c_int
-libcgto.CINTcgto_spinor.restype = ctypes.c_int
 libcvhf = pyscf.lib.load_library('libcvhf')
 
 ANG_OF     = 1
@@ -226,7 +223,8 @@ def getints2c(intor_name, atm, bas, env, shls_slice=None, comp=1, hermi=0,
         return mat.transpose(2,0,1)
 
 def getints3c(intor_name, atm, bas, env, shls_slice=None, comp=1,
-              aosym='s1', ao_loc=None, cintopt=None, out=None):
+              aosym='s1', ao_loc=None, cintopt=None, out=None,
+              shell_pairs=None):
     atm = numpy.asarray(atm, dtype=numpy.int32, order='C')
     bas = numpy.asarray(bas, dtype=numpy.int32, order='C')
     env = numpy.asarray(env, dtype=numpy.double, order='C')
@@ -265,20 +263,47 @@ def getints3c(intor_name, atm, bas, env, shls_slice=None, comp=1,
     else:
         intopt = cintopt
 
-    drv = libcgto.GTOnr3c_drv
-    drv(getattr(libcgto, intor_name), getattr(libcgto, 'GTOnr3c_fill_'+aosym),
-        mat.ctypes.data_as(ctypes.c_void_p), ctypes.c_int(comp),
-        (ctypes.c_int*6)(*(shls_slice[:6])),
-        ao_loc.ctypes.data_as(ctypes.c_void_p), intopt,
-        atm.ctypes.data_as(ctypes.c_void_p), ctypes.c_int(natm),
-        bas.ctypes.data_as(ctypes.c_void_p), ctypes.c_int(nbas),
-        env.ctypes.data_as(ctypes.c_void_p))
+    nr3c_drv(getattr(libcgto, intor_name),
+             getattr(libcgto, 'GTOnr3c_fill_'+aosym), mat, comp, shls_slice,
+             ao_loc, intopt, atm, bas, env, aosym, shell_pairs)
 
     if comp == 1:
         return mat.reshape(shape[:-1], order='A')
     else:
         return numpy.rollaxis(mat, -1, 0)
 
+def nr3c_drv(intor, fill, mat, comp, shls_slice, ao_loc, cintopt,
+             atm, bas, env, aosym='s1', shell_pairs=None):
+    '''Call GTOnr3c_drv to fill the 3-center integrals in mat.  If
+    shell_pairs (:class:`pyscf.gto.shellpair.ShellPairList`) is given, only
+    the significant pairs of the first two indices are evaluated and the
+    elements of the other pairs are 0.
+    '''
+    natm = atm.shape[0]
+    nbas = bas.shape[0]
+    if shell_pairs is None:
+        libcgto.GTOnr3c_drv(intor, fill, mat.ctypes.data_as(ctypes.c_void_p),
+                            ctypes.c_int(comp),
+                            (ctypes.c_int*6)(*(shls_slice[:6])),
+                            ao_loc.ctypes.data_as(ctypes.c_void_p), cintopt,
+                            atm.ctypes.data_as(ctypes.c_void_p), ctypes.c_int(natm),
+                            bas.ctypes.data_as(ctypes.c_void_p), ctypes.c_int(nbas),
+                            env.ctypes.data_as(ctypes.c_void_p))
+    else:
+        pairs = shell_pairs.in_slice(shls_slice, aosym)
+        mat[:] = 0
+        libcgto.GTOnr3c_pairs_drv(intor, fill,
+                                  mat.ctypes.data_as(ctypes.c_void_p),
+                                  ctypes.c_int(comp),
+                                  pairs.ctypes.data_as(ctypes.c_void_p),
+                                  ctypes.c_int(len(pairs)),
+                                  (ctypes.c_int*6)(*(shls_slice[:6])),
+                                  ao_loc.ctypes.data_as(ctypes.c_void_p), cintopt,
+                                  atm.ctypes.data_as(ctypes.c_void_p), ctypes.c_int(natm),
+                                  bas.ctypes.data_as(ctypes.c_void_p), ctypes.c_int(nbas),
+                                  env.ctypes.data_as(ctypes.c_void_p))
+    return mat
+
 def getints2e(intor_name, atm, bas, env, shls_slice=None, comp=1,
               aosym='s1', ao_loc=None, cintopt=None, out=None):
     aosym = _stand_sym_code(aosym)
@@ -609,6 +634,121 @@ def getints_by_shell(intor_name, shls, atm, bas, env, comp=1):
     else:
         raise RuntimeError('Unknown intor %s' % intor_name)
 
+def getints_by_shell_batch(intor_name, shls, atm, bas, env, comp=1,
+                           q_cond=None, cutoff=1e-14, cintopt=None):
+    r'''Integrals of a list of shell pairs, triples or quartets in one call.
+    The integral blocks are stored in one contiguous buffer.
+
+    Args:
+        intor_name : str
+            Spherical or cartesian integral function, see
+            :func:`getints_by_shell`.
+        shls : 2D int array
+            (ntasks,2) for 1e and 2c2e integrals, (ntasks,3) for 3c2e
+            integrals, (ntasks,4) for 2e integrals.  Each row is the shell ids
+            of one block of integrals.
+        atm : int32 ndarray
+            libcint integral function argument
+        bas : int32 ndarray
+            libcint integral function argument
+        env : float64 ndarray
+            libcint integral function argument
+
+    Kwargs:
+        comp : int
+            Components of the integrals, e.g. cint1e_ipovlp has 3 components.
+        q_cond : (nbas,nbas) ndarray
+            Bound of the shell pairs, e.g. the Schwarz bound
+            :func:`schwarz_cond`.  If given, the blocks whose bound
+            q_cond[i,j]*q_cond[k,l] (q_cond[i,j]*q_cond[k,k] for 3c2e,
+            q_cond[i,j] for 2 shells) is smaller than cutoff are not
+            evaluated and take no space in the buffer.
+        cutoff : float
+            Screening threshold.
+
+    Returns:
+        buf, offsets.  The integrals of the t-th shell tuple are
+        buf[offsets[t]:offsets[t+1]], in the F-ordered layout of libcint
+        [di,dj,(dk,dl,)comp].  The screened blocks are empty.
+
+    Examples:
+
+    >>> mol.build(atom='H 0 0 0; H 0 0 1.1', basis='sto-3g')
+    >>> shls = [(0,1,0,1), (1,1,0,0)]
+    >>> buf, offsets = gto.getints_by_shell_batch('cint2e_sph', shls, mol._atm,
+    ...                                           mol._bas, mol._env)
+    >>> eri = [buf[p0:p1] for p0, p1 in zip(offsets[:-1], offsets[1:])]
+    '''
+    if not ('_cart' in intor_name or '_sph' in intor_name):
+        raise NotImplementedError('spinor integrals for %s' % intor_name)
+    atm = numpy.asarray(atm, dtype=numpy.int32, order='C')
+    bas = numpy.asarray(bas, dtype=numpy.int32, order='C')
+    env = numpy.asarray(env, dtype=numpy.double, order='C')
+    shls = numpy.asarray(shls, dtype=numpy.int32, order='C')
+    ntasks, nshl = shls.shape
+    natm = atm.shape[0]
+    nbas = bas.shape[0]
+
+    ao_loc = make_loc(bas, intor_name)
+    dims = ao_loc[1:] - ao_loc[:-1]
+    sizes = numpy.empty(ntasks, dtype=numpy.int64)
+    sizes[:] = comp
+    for i in range(nshl):
+        if i == 2 and '_ssc' in intor_name:  # mixed spherical-cartesian
+            ao_loc = make_loc(bas, 'cart')
+            sizes *= (ao_loc[1:] - ao_loc[:-1])[shls[:,i]]
+        else:
+            sizes *= dims[shls[:,i]]
+
+    if q_cond is not None:
+        q_cond = numpy.asarray(q_cond, dtype=numpy.double, order='C')
+        assert(q_cond.shape == (nbas,nbas))
+        keep = numpy.empty(ntasks, dtype=numpy.int8)
+        libcgto.GTOtasks_screen(keep.ctypes.data_as(ctypes.c_void_p),
+                                shls.ctypes.data_as(ctypes.c_void_p),
+                                ctypes.c_int(ntasks), ctypes.c_int(nshl),
+                                q_cond.ctypes.data_as(ctypes.c_void_p),
+                                ctypes.c_int(nbas), ctypes.c_double(cutoff))
+        sizes[keep == 0] = 0
+    offsets = numpy.zeros(ntasks+1, dtype=numpy.int64)
+    numpy.cumsum(sizes, out=offsets[1:])
+    buf = numpy.empty(int(offsets[-1]))
+
+    if cintopt is None:
+        if '2e' in intor_name:
+            cintopt = make_cintopt(atm, bas, env, intor_name)
+        else:
+            cintopt = pyscf.lib.c_null_ptr()
+    libcgto.GTOtasks_fill_drv(getattr(libcgto, intor_name),
+                              buf.ctypes.data_as(ctypes.c_void_p),
+                              offsets.ctypes.data_as(ctypes.c_void_p),
+                              shls.ctypes.data_as(ctypes.c_void_p),
+                              ctypes.c_int(ntasks), ctypes.c_int(nshl), cintopt,
+                              atm.ctypes.data_as(ctypes.c_void_p), ctypes.c_int(natm),
+                              bas.ctypes.data_as(ctypes.c_void_p), ctypes.c_int(nbas),
+                              env.ctypes.data_as(ctypes.c_void_p))
+    return buf, offsets
+
+def schwarz_cond(atm, bas, env, intor_name='cint2e_sph', pairs=None):
+    '''Schwarz bound sqrt(max|(ij|ij)|) for every pair of shells.  If pairs,
+    a (npairs,2) array of shell ids, is given, only the bounds of these pairs
+    are computed and the other elements of the returned matrix are 0.
+    '''
+    nbas = len(bas)
+    if pairs is None:
+        i, j = numpy.tril_indices(nbas)
+    else:
+        pairs = numpy.asarray(pairs, dtype=numpy.int32).reshape(-1,2)
+        i, j = pairs.T
+        if len(i) == 0:
+            return numpy.zeros((nbas,nbas))
+    shls = numpy.vstack((i, j, i, j)).T
+    buf, offsets = getints_by_shell_batch(intor_name, shls, atm, bas, env)
+    qtril = numpy.sqrt(numpy.maximum.reduceat(abs(buf), offsets[:-1]))
+    q_cond = numpy.zeros((nbas,nbas))
+    q_cond[i,j] = q_cond[j,i] = qtril
+    return q_cond
+
 
 def make_loc(bas, key):
     if 'cart' in key:
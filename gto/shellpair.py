@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+'''
+Significant shell pairs of a molecule
+
+The list is built in two steps.  First, the pairs whose Gaussian product
+prefactor R^(li+lj) exp(-a*b/(a+b)*R^2) (a, b being the most diffuse exponents
+and li, lj the angular momenta of the two shells) is smaller than the cutoff
+are dropped.  Then the Schwarz bound sqrt(max|(ij|ij)|) is computed for the
+remaining pairs and the pairs which cannot produce any integral larger than
+the cutoff are removed.  For spatially extended molecules the number of pairs
+grows linearly with the size of the system.
+'''
+
+import copy
+import numpy
+from pyscf.lib import logger
+from pyscf.gto import moleintor
+from pyscf.gto.mole import ATOM_OF, ANG_OF, NPRIM_OF, PTR_EXP
+
+
+class ShellPairList(object):
+    '''Significant shell pairs (i,j), i >= j, and their Schwarz bounds
+
+    Attributes:
+        cutoff : float
+            Pairs (i,j) with q[ij] * ket_max < cutoff are dropped.
+        intor : str
+            The 2e integral used by the Schwarz bound.
+        ket_max : float
+            The largest Schwarz bound of the other side of the integrals.
+            The default None is max(q), for the 4-center integrals.  For the
+            3-center integrals (ij|L), it is max_L sqrt((L|L)).
+
+    Saved results:
+        extents : 1D array
+            For each shell, the radius (in Bohr) beyond which its most diffuse
+            primitive function r^l exp(-a r^2) is smaller than the cutoff.
+        pairs : (npairs,2) int32 array
+            Shell ids of the significant pairs, i >= j.
+        q : 1D array
+            The Schwarz bound sqrt(max|(ij|ij)|) of each pair.
+
+    Examples:
+
+    >>> mol = gto.M(atom=[('H', (0, 0, i*5.)) for i in range(40)], basis='ccpvdz')
+    >>> spl = gto.ShellPairList(mol).build()
+    >>> spl.npairs < mol.nbas*(mol.nbas+1)//2
+    True
+    '''
+    def __init__(self, mol, cutoff=1e-14, intor='cint2e_sph', ket_max=None):
+        self.mol = mol
+        self.cutoff = cutoff
+        self.intor = intor
+        self.ket_max = ket_max
+
+        self.extents = None
+        self.pairs = None
+        self.q = None
+        self._mol_data = None
+
+    def build(self):
+        mol = self.mol
+        nbas = mol.nbas
+        thresh = -numpy.log(self.cutoff)
+        bas = mol._bas
+        env = numpy.asarray(mol._env)
+        amin = numpy.array([env[p0:p0+n].min() for p0, n in
+                            zip(bas[:,PTR_EXP], bas[:,NPRIM_OF])])
+        l = bas[:,ANG_OF]
+        self.extents = _shell_extents(amin, l, thresh)
+
+        coords = mol.atom_coords()[bas[:,ATOM_OF]]
+        pairs = []
+        for i in range(nbas):
+            rr = numpy.einsum('jx,jx->j', coords[:i+1]-coords[i],
+                              coords[:i+1]-coords[i])
+            aij = amin[i] * amin[:i+1] / (amin[i] + amin[:i+1])
+# |r-A|^li |r-B|^lj of the product is bounded by R^(li+lj) at R > 1
+            lij = (l[i] + l[:i+1]) * .5 * numpy.log(numpy.maximum(rr, 1))
+            j = numpy.where(aij * rr - lij < thresh)[0]
+            pairs.append(numpy.vstack((numpy.repeat(i, len(j)), j)).T)
+        pairs = numpy.asarray(numpy.vstack(pairs), dtype=numpy.int32)
+        npairs0 = len(pairs)
+
+        q_cond = moleintor.schwarz_cond(mol._atm, mol._bas, mol._env,
+                                        self.intor, pairs)
+        q = q_cond[pairs[:,0],pairs[:,1]]
+        if self.ket_max is None:
+            mask = q * q.max() >= self.cutoff
+        else:
+            mask = q * self.ket_max >= self.cutoff
+        self.pairs = numpy.asarray(pairs[mask], order='C')
+        self.q = q[mask]
+        self._mol_data = (numpy.array(mol._atm), numpy.array(mol._bas),
+                          numpy.array(mol._env))
+        logger.debug(mol, 'ShellPairList: %d of %d shell pairs are significant, '
+                     '%d pairs by distance', len(self.pairs), nbas*(nbas+1)//2,
+                     npairs0)
+        return self
+
+    def match(self, mol):
+        '''Whether the list was built for the same basis and geometry as mol.
+        The content of mol._atm, mol._bas and mol._env is compared.
+        '''
+        if self._mol_data is None:
+            return False
+        return all(numpy.array_equal(x, y) for x, y in
+                   zip(self._mol_data, (mol._atm, mol._bas, mol._env)))
+
+    @property
+    def npairs(self):
+        return len(self.pairs)
+
+    @property
+    def q_cond(self):
+        '''Schwarz bounds in a (nbas,nbas) matrix.  The dropped pairs are 0.'''
+        nbas = self.mol.nbas
+        q_cond = numpy.zeros((nbas,nbas))
+        i, j = self.pairs.T
+        q_cond[i,j] = q_cond[j,i] = self.q
+        return q_cond
+
+    def pairs_s1(self):
+        '''Significant pairs in both orientations (i,j) and (j,i)'''
+        i, j = self.pairs.T
+        offdiag = i != j
+        return numpy.vstack((self.pairs,
+                             numpy.vstack((j[offdiag], i[offdiag])).T))
+
+    def mask(self):
+        '''Boolean (nbas,nbas) matrix of the significant pairs'''
+        nbas = self.mol.nbas
+        mask = numpy.zeros((nbas,nbas), dtype=bool)
+        i, j = self.pairs.T
+        mask[i,j] = mask[j,i] = True
+        return mask
+
+    def subset(self, shl_mask):
+        '''A copy of the list which only keeps the pairs (i,j) with
+        shl_mask[i] or shl_mask[j].  shl_mask is a boolean array of the shells.
+        '''
+        i, j = self.pairs.T
+        mask = shl_mask[i] | shl_mask[j]
+        spl = copy.copy(self)
+        spl.pairs = numpy.asarray(self.pairs[mask], order='C')
+        spl.q = self.q[mask]
+        return spl
+
+    def in_slice(self, shls_slice, aosym='s1'):
+        '''Pairs in the shell ranges shls_slice[0:2] and shls_slice[2:4].
+        aosym='s1' returns both orientations, 's2ij' only i >= j.
+        '''
+        if aosym == 's1':
+            pairs = self.pairs_s1()
+        else:
+            pairs = self.pairs
+        i0, i1, j0, j1 = shls_slice[:4]
+        i, j = pairs.T
+        mask = (i0 <= i) & (i < i1) & (j0 <= j) & (j < j1)
+        return numpy.asarray(pairs[mask], dtype=numpy.int32, order='C')
+
+
+def _shell_extents(a, l, thresh):
+    '''The radius r at which r^l exp(-a r^2) = exp(-thresh)'''
+    r = numpy.sqrt(thresh / a)
+    for i in range(4):
+        r = numpy.sqrt((thresh + l * numpy.log(numpy.maximum(r, 1))) / a)
+    return r
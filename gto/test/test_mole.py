@@ -200,6 +200,44 @@ C    SP
                     basis={'default':'321g', 'O1': 'sto3g'})
         self.assertEqual(sorted(mol._basis.keys()), ['H', 'O1'])
 
+    def test_set_geom(self):
+        mol = gto.M(atom='Na 0 0 0; H 0 0 1.9', basis='lanl2dz',
+                    ecp={'Na': 'lanl2dz'}, verbose=0)
+        mol1 = mol.copy()
+        coords = mol.atom_coords() + .1
+        mol.set_geom_(coords, unit='Bohr')
+        ref = gto.M(atom=[['Na', coords[0]], ['H', coords[1]]], unit='Bohr',
+                    basis='lanl2dz', ecp={'Na': 'lanl2dz'}, verbose=0)
+        self.assertAlmostEqual(abs(mol._env - ref._env).max(), 0, 12)
+        self.assertTrue(numpy.all(mol._atm == ref._atm))
+        self.assertTrue(numpy.all(mol._bas == ref._bas))
+        self.assertTrue(numpy.all(mol._ecpbas == ref._ecpbas))
+        self.assertAlmostEqual(abs(mol1.atom_coords()+.1 - coords).max(), 0, 12)
+        self.assertAlmostEqual(abs(mol.intor('cint1e_nuc_sph') -
+                                   ref.intor('cint1e_nuc_sph')).max(), 0, 12)
+
+        mol.set_geom_('Na 0 0 0; H 0 0 1', unit='Ang')
+        self.assertAlmostEqual(mol.atom_coord(1)[2], 1/lib.param.BOHR, 12)
+        mol.set_geom_('Na 0 0 0; Li 0 0 1', unit='Ang')
+        self.assertEqual(mol.nelectron, 4)
+
+    def test_load_basis_memo(self):
+        import os
+        from pyscf.gto.basis import parse_nwchem
+        gto.basis.clear_memo()
+        ref = parse_nwchem._parse(parse_nwchem._scan_seg(
+            os.path.join(os.path.dirname(gto.basis.__file__), 'ano.dat'), 'Kr'))
+        b1 = gto.basis.load('ano', 'Kr')
+        self.assertEqual(b1, ref)
+        self.assertEqual(len(gto.basis._MEMO), 1)
+        b1[0][1][0] = 0
+        b2 = gto.basis.load('ANO', 'Kr')
+        self.assertEqual(b2, ref)
+        self.assertEqual(len(gto.basis._MEMO), 1)
+        e1 = gto.basis.load_ecp('lanl2dz', 'Na')
+        self.assertEqual(e1, gto.basis.load_ecp('lanl2dz', 'Na'))
+        self.assertEqual(len(gto.basis._MEMO), 2)
+
 
 if __name__ == "__main__":
     print("test mole.py")
@@ -235,6 +235,90 @@ class KnowValues(unittest.TestCase):
         eri1 = mol.intor('cint3c2e_ip1_sph', comp=3, shls_slice=(2,5,4,9,0,mol.nbas))
         self.assertAlmostEqual(finger(eri1), 642.70512922279079, 11)
 
+    def test_intor_by_shell_batch(self):
+        numpy.random.seed(1)
+        shls = numpy.random.randint(mol.nbas, size=(50,4))
+        buf, offsets = mol.intor_by_shell_batch('cint2e_sph', shls)
+        for t, s in enumerate(shls):
+            ref = mol.intor_by_shell('cint2e_sph', s)
+            eri = buf[offsets[t]:offsets[t+1]].reshape(ref.shape, order='F')
+            self.assertTrue(numpy.allclose(eri, ref))
+
+        buf, offsets = mol.intor_by_shell_batch('cint1e_ipovlp_sph', shls[:,:2], comp=3)
+        for t, s in enumerate(shls[:,:2]):
+            ref = mol.intor_by_shell('cint1e_ipovlp_sph', s, comp=3)
+            eri = buf[offsets[t]:offsets[t+1]].reshape(ref.shape[1:]+(3,), order='F')
+            self.assertTrue(numpy.allclose(eri.transpose(2,0,1), ref))
+
+        buf, offsets = mol.intor_by_shell_batch('cint3c2e_sph', shls[:,:3])
+        for t, s in enumerate(shls[:,:3]):
+            ref = mol.intor_by_shell('cint3c2e_sph', s)
+            eri = buf[offsets[t]:offsets[t+1]].reshape(ref.shape, order='F')
+            self.assertTrue(numpy.allclose(eri, ref))
+
+        q_cond = gto.moleintor.schwarz_cond(mol._atm, mol._bas, mol._env)
+        buf, offsets = mol.intor_by_shell_batch('cint2e_sph', shls, q_cond=q_cond,
+                                                cutoff=1e-4)
+        for t, s in enumerate(shls):
+            ref = mol.intor_by_shell('cint2e_sph', s)
+            if q_cond[s[0],s[1]] * q_cond[s[2],s[3]] < 1e-4:
+                self.assertEqual(offsets[t+1], offsets[t])
+                self.assertTrue(abs(ref).max() < 1e-4)
+            else:
+                eri = buf[offsets[t]:offsets[t+1]].reshape(ref.shape, order='F')
+                self.assertTrue(numpy.allclose(eri, ref))
+
+    def test_shell_pair_list(self):
+        mol1 = gto.M(atom=[['H', (0, 0, i*4.)] for i in range(12)],
+                     basis='ccpvdz', verbose=0)
+        spl = mol1.shell_pair_list(1e-10)
+        self.assertTrue(spl is mol1.shell_pair_list(1e-10))
+        self.assertTrue(spl.npairs < mol1.nbas*(mol1.nbas+1)//2)
+        self.assertTrue(numpy.all(spl.pairs[:,0] >= spl.pairs[:,1]))
+
+        q_ref = gto.moleintor.schwarz_cond(mol1._atm, mol1._bas, mol1._env)
+        mask = spl.mask()
+        self.assertTrue(numpy.allclose(spl.q_cond[mask], q_ref[mask]))
+        self.assertTrue(q_ref[~mask].max() * q_ref.max() < 1e-10)
+
+        from pyscf.df import incore
+        auxmol = incore.format_aux_basis(mol1)
+        ref = incore.aux_e2(mol1, auxmol, aosym='s2ij')
+        j3c = incore.aux_e2(mol1, auxmol, aosym='s2ij', shell_pairs=spl)
+        self.assertTrue(abs(j3c - ref).max() < 1e-8)
+        ref = incore.aux_e2(mol1, auxmol)
+        j3c = incore.aux_e2(mol1, auxmol, shell_pairs=spl)
+        self.assertTrue(abs(j3c - ref).max() < 1e-8)
+
+        shl_mask = numpy.zeros(mol1.nbas, dtype=bool)
+        shl_mask[:3] = True
+        sub = spl.subset(shl_mask)
+        self.assertTrue(0 < sub.npairs < spl.npairs)
+        self.assertTrue(numpy.all(shl_mask[sub.pairs].any(axis=1)))
+        self.assertEqual(sub.npairs, shl_mask[spl.pairs].any(axis=1).sum())
+
+        mol1.set_geom_(mol1.atom_coords()*1.1, unit='Bohr')
+        self.assertTrue(spl is not mol1.shell_pair_list(1e-10))
+        spl = mol1.shell_pair_list(1e-10)
+        ptr = mol1._atm[0,gto.PTR_COORD]
+        mol1._env[ptr+2] -= .5
+        self.assertTrue(spl is not mol1.shell_pair_list(1e-10))
+
+    def test_shell_pair_extents(self):
+        mol1 = gto.M(atom=[['O', (0, 0, i*3.)] for i in range(4)],
+                     basis='ccpvdz', verbose=0)
+        spl = mol1.shell_pair_list(1e-10)
+        l = mol1._bas[:,gto.ANG_OF]
+        a = numpy.array([mol1.bas_exp(i).min() for i in range(mol1.nbas)])
+        r = spl.extents
+        self.assertTrue(numpy.allclose(r**l * numpy.exp(-a*r**2), 1e-10))
+
+        s = abs(mol1.intor('cint1e_ovlp_sph'))
+        ao_loc = mol1.ao_loc_nr()
+        s = numpy.maximum.reduceat(numpy.maximum.reduceat(s, ao_loc[:-1]),
+                                   ao_loc[:-1], axis=1)
+        mask = spl.mask()
+        self.assertTrue(s[~mask].max() < 1e-10)
 
 
 if __name__ == "__main__":
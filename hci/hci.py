@@ -20,6 +20,8 @@ from pyscf import ao2mo
 from pyscf.lib import logger
 from pyscf.fci import cistring
 from pyscf.fci import direct_spin1
+from pyscf.fci import select_ci
+from pyscf.fci import select_ci_pt2
 
 libhci = lib.load_library('libhci')
 
@@ -174,19 +176,28 @@ def make_hdiag(h1e, eri, strs, norb, nelec):
     eri = ao2mo.restore(1, eri, norb)
     diagj = numpy.einsum('iijj->ij',eri)
     diagk = numpy.einsum('ijji->ij',eri)
+    h1diag = numpy.diag(h1e)
 
     ndet = len(strs)
-    hdiag = numpy.zeros(ndet)
-    for idet, (stra, strb) in enumerate(strs.reshape(ndet,2,-1)):
-        aocc = str2orblst(stra, norb)[0]
-        bocc = str2orblst(strb, norb)[0]
-        e1 = h1e[aocc,aocc].sum() + h1e[bocc,bocc].sum()
-        e2 = diagj[aocc][:,aocc].sum() + diagj[aocc][:,bocc].sum() \
-           + diagj[bocc][:,aocc].sum() + diagj[bocc][:,bocc].sum() \
-           - diagk[aocc][:,aocc].sum() - diagk[bocc][:,bocc].sum()
-        hdiag[idet] = e1 + e2*.5
+    stra, strb = _cistring_strs(strs)
+    hdiag = numpy.empty(ndet)
+    for p0, p1 in lib.prange(0, ndet, max(1, select_ci.WIDE_BLKSIZE//norb)):
+        occa = cistring.strs2occ(stra[p0:p1], norb).astype(numpy.double)
+        occb = cistring.strs2occ(strb[p0:p1], norb).astype(numpy.double)
+        e1 = occa.dot(h1diag) + occb.dot(h1diag)
+        e2 = (numpy.einsum('ij,ij->i', occa.dot(diagj-diagk), occa) +
+              numpy.einsum('ij,ij->i', occb.dot(diagj-diagk), occb) +
+              numpy.einsum('ij,ij->i', occa.dot(diagj), occb) * 2)
+        hdiag[p0:p1] = e1 + e2*.5
     return hdiag
 
+def _cistring_strs(strs):
+    '''The alpha and beta strings of the determinants in the multi-word
+    layout of cistring.  The words of hci strings are in the reversed order.
+    '''
+    nset = strs.shape[1] // 2
+    return strs[:,:nset][:,::-1], strs[:,nset:][:,::-1]
+
 def cre_des_sign(p, q, string):
     nset = len(string)
     pg, pb = p//64, p%64
@@ -517,6 +528,32 @@ def kernel_float_space(myci, h1e, eri, norb, nelec, ci0=None,
     else:
         return (numpy.array(e)+ecore), [as_SCIvector(ci, ci_strs) for ci in c]
 
+def pt2(myci, h1e, eri, civec, norb, nelec, e0=None, **kwargs):
+    '''Epstein-Nesbet PT2 correction for the heat-bath CI wavefunction.  See
+    pyscf.fci.select_ci_pt2.kernel for the keyword arguments (pt2_cutoff,
+    stochastic, dtm_cutoff, nsample, nbatch, nproc, seed).
+
+    Returns:
+        E2 and its statistical error
+    '''
+    log = logger.Logger(myci.stdout, kwargs.pop('verbose', myci.verbose))
+    nelec = direct_spin1._unpack_nelec(nelec, myci.spin)
+    if isinstance(civec, (tuple, list)):
+        civec = civec[0]
+    civec = as_SCIvector_if_not(civec, myci._strs)
+    strs = civec._strs
+    if e0 is None:
+        eri1 = ao2mo.restore(1, eri, norb).ravel()
+        ci1 = contract_2e_ctypes((h1e, eri1), civec, norb, nelec)
+        e0 = numpy.dot(civec, ci1) / numpy.dot(civec, civec)
+
+    dets = _cistring_strs(strs)
+    kwargs.setdefault('max_memory', myci.max_memory)
+    e2, err = select_ci_pt2.kernel(h1e, eri, dets, numpy.asarray(civec), norb,
+                                   nelec, e0, verbose=log, **kwargs)
+    log.note('EN-PT2 E2 = %.15g +/- %.3g  E(HCI+PT2) = %.15g', e2, err, e0+e2)
+    return e2, err
+
 def fix_spin(myci, shift=.2, ss=None, **kwargs):
     r'''If Selected CI solver cannot stick on spin eigenfunction, modify the solver by
     adding a shift on spin square operator
@@ -705,6 +742,7 @@ class SelectedCI(direct_spin1.FCISolver):
 
     enlarge_space = enlarge_space
     kernel = kernel_float_space
+    pt2 = pt2
 
 
 class _SCIvector(numpy.ndarray):
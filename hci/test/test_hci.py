@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+import unittest
+import numpy
+from pyscf.fci import select_ci_pt2
+from pyscf.hci import hci
+
+norb = 6
+nelec = (3,3)
+numpy.random.seed(12)
+h1 = numpy.random.random((norb,norb))
+h1 = h1 + h1.T
+nn = norb*(norb+1)//2
+eri = (numpy.random.random(nn*(nn+1)//2)-.2)**3
+stra = [0b111, 0b1011, 0b10101]
+strb = [0b111, 0b1011, 0b1101]
+strs = numpy.array([(a, b) for a in stra for b in strb], dtype=numpy.uint64)
+civec = (numpy.random.random(len(strs))-.2)**3
+
+class KnowValues(unittest.TestCase):
+    def test_pt2(self):
+        myci = hci.SelectedCI()
+        e0 = -5.
+        dets = (strs[:,0], strs[:,1])
+        for cutoff in (0, 1e-3):
+            e2ref = select_ci_pt2.kernel(h1, eri, dets, civec, norb, nelec, e0,
+                                         pt2_cutoff=cutoff, verbose=0)[0]
+            e2, err = myci.pt2(h1, eri, hci.as_SCIvector(civec, strs), norb,
+                               nelec, e0=e0, pt2_cutoff=cutoff)
+            self.assertAlmostEqual(e2, e2ref, 12)
+            self.assertEqual(err, 0)
+
+    def test_make_hdiag_multiword(self):
+        norb = 70
+        numpy.random.seed(1)
+        h1 = numpy.random.random((norb,norb))
+        h1 = h1 + h1.T
+        idx = numpy.arange(norb)
+        eri = numpy.zeros((norb,)*4)
+        eri[idx[:,None],idx[:,None],idx,idx] = numpy.random.random((norb,norb))
+        eri[idx[:,None],idx,idx,idx[:,None]] += numpy.random.random((norb,norb))
+        eri = eri + eri.transpose(1,0,3,2) + eri.transpose(2,3,0,1) + eri.transpose(3,2,1,0)
+        diagj = numpy.einsum('iijj->ij', eri)
+        diagk = numpy.einsum('ijji->ij', eri)
+        occs = [((0,1,65), (2,3,69)), ((0,64,66), (1,2,3)), ((5,6,7), (64,65,68))]
+        strs = numpy.array([numpy.hstack((hci.orblst2str(a, norb),
+                                          hci.orblst2str(b, norb)))
+                            for a, b in occs])
+        hdiag = hci.make_hdiag(h1, eri, strs, norb, (3,3))
+        for k, (a, b) in enumerate(occs):
+            a, b = list(a), list(b)
+            e2 = (diagj[a][:,a].sum() + diagj[a][:,b].sum() * 2 +
+                  diagj[b][:,b].sum() - diagk[a][:,a].sum() - diagk[b][:,b].sum())
+            ref = h1[a,a].sum() + h1[b,b].sum() + e2 * .5
+            self.assertAlmostEqual(hdiag[k], ref, 9)
+
+if __name__ == "__main__":
+    print("Full Tests for HCI")
+    unittest.main()
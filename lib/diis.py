@@ -31,6 +31,10 @@ class DIIS(object):
             DIIS subspace size. The maximum number of the vectors to be stored.
         min_space
             The minimal size of subspace before DIIS extrapolation.
+        incore_size : int
+            Vectors with at least this many elements, including the previous
+            trial vector, are stored in the HDF5 file instead of memory.
+            Default is INCORE_SIZE.
 
     Functions:
         update(x, xerr=None) :
@@ -93,6 +97,7 @@ class DIIS(object):
             self.stdout = sys.stdout
         self.space = 6
         self.min_space = 1
+        self.incore_size = INCORE_SIZE
 
 ##################################################
 # don't modify the following private variables, they are not input options
@@ -106,12 +111,12 @@ class DIIS(object):
         self._err_vec_touched = False
 
     def _store(self, key, value):
-        if value.size < INCORE_SIZE:
+        if value.size < self.incore_size:
             self._buffer[key] = value
 
         # save the error vector if filename is given, this file can be used to
         # restore the DIIS state
-        if value.size >= INCORE_SIZE or isinstance(self.filename, str):
+        if value.size >= self.incore_size or isinstance(self.filename, str):
             if key in self._diisfile:
                 self._diisfile[key][:] = value
             else:
@@ -145,7 +150,7 @@ class DIIS(object):
 # If push_err_vec is not called in advance, the error vector is generated
 # as the diff of the current vec and previous returned vec (._xprev)
 # So store the first trial vec as the previous returned vec
-            self._xprev = x
+            self._store_xprev(x)
 
         else:
             if self._head >= self.space:
@@ -154,7 +159,7 @@ class DIIS(object):
             ekey = 'e%d'%self._head
             xkey = 'x%d'%self._head
             self._store(xkey, x)
-            if x.size < INCORE_SIZE:
+            if x.size < self.incore_size:
                 self._buffer[ekey] = x - self._xprev
                 if isinstance(self.filename, str):
                     self._store(ekey, self._buffer[ekey])
@@ -165,6 +170,17 @@ class DIIS(object):
                     self._diisfile[ekey][p0:p1] = x[p0:p1] - self._xprev[p0:p1]
             self._head += 1
 
+    def _store_xprev(self, x):
+        if x.size < self.incore_size:
+            self._xprev = x
+        else:
+            self._xprev = None
+            if 'xprev' not in self._diisfile:
+                self._diisfile.create_dataset('xprev', (x.size,), x.dtype)
+            for p0,p1 in prange(0, x.size, BLOCK_SIZE):
+                self._diisfile['xprev'][p0:p1] = x[p0:p1]
+            self._xprev = self._diisfile['xprev']
+
     def get_err_vec(self, idx):
         if self._buffer:
             return self._buffer['e%d'%idx]
@@ -198,7 +214,7 @@ class DIIS(object):
         if nd < self.min_space:
             return x
 
-        dt = numpy.array(self.get_err_vec(self._head-1), copy=False)
+        dt = numpy.asarray(self.get_err_vec(self._head-1))
         for i in range(nd):
             tmp = 0
             dti = self.get_err_vec(i)
@@ -221,16 +237,16 @@ class DIIS(object):
             c = numpy.dot(v[:,idx]*(1/w[idx]), numpy.dot(v[:,idx].T.conj(), g))
         logger.debug1(self, 'diis-c %s', c)
 
-        if self._xprev is None:
-            xnew = numpy.zeros_like(x.ravel())
-        else:
-            self._xprev = None # release memory first
-            self._xprev = xnew = numpy.zeros_like(x.ravel())
+        track_xprev = self._xprev is not None
+        self._xprev = None # release memory first
+        xnew = numpy.zeros_like(x.ravel())
 
         for i, ci in enumerate(c[1:]):
             xi = self.get_vec(i)
             for p0,p1 in prange(0, x.size, BLOCK_SIZE):
                 xnew[p0:p1] += xi[p0:p1] * ci
+        if track_xprev:
+            self._store_xprev(xnew)
         return xnew.reshape(x.shape)
 
 #class CDIIS
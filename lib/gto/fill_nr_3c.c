@@ -209,3 +209,100 @@ void GTOnr3c_drv(int (*intor)(), void (*fill)(), double *eri, int comp,
         free(buf);
 }
 }
+
+/*
+ * Same to GTOnr3c_drv, but only the shell pairs listed in pairs[npairs,2]
+ * are evaluated.  The shell ids in pairs are absolute ids and must be inside
+ * shls_slice.  eri needs to be initialized (zeroed) by the caller.
+ */
+void GTOnr3c_pairs_drv(int (*intor)(), void (*fill)(), double *eri, int comp,
+                       int *pairs, int npairs,
+                       int *shls_slice, int *ao_loc, CINTOpt *cintopt,
+                       int *atm, int natm, int *bas, int nbas, double *env)
+{
+        const int ish0 = shls_slice[0];
+        const int jsh0 = shls_slice[2];
+
+#pragma omp parallel default(none) \
+        shared(intor, fill, eri, comp, pairs, npairs, shls_slice, ao_loc, \
+               cintopt, atm, natm, bas, nbas, env)
+{
+        int ij;
+        double *buf = (double *)malloc(sizeof(double)*NCTRMAX*NCTRMAX*NCTRMAX*comp);
+#pragma omp for schedule(dynamic)
+        for (ij = 0; ij < npairs; ij++) {
+                (*fill)(intor, eri, comp, pairs[ij*2]-ish0, pairs[ij*2+1]-jsh0,
+                        buf, shls_slice, ao_loc, cintopt,
+                        atm, natm, bas, nbas, env);
+        }
+        free(buf);
+}
+}
+
+/*
+ * Block-sparse 3-center integrals (ij|k) for the shell pairs listed in
+ * pairs[npairs,2] (ish >= jsh, absolute shell ids).  The AO pairs of shell
+ * pair p are stored in the columns pair_loc[p]:pair_loc[p+1] of
+ *      out[naok,ncol] in C-order, ncol = pair_loc[npairs]
+ * in the order i*dj+j (ish > jsh) or i*(i+1)/2+j (ish == jsh).  The blocks
+ * with q_pair[p] * q_aux[ksh-ksh0] < cutoff are not evaluated.  out needs to
+ * be initialized (zeroed) by the caller.
+ */
+void GTOnr3c_sparse_drv(int (*intor)(), double *out,
+                        int *pairs, int npairs, int *pair_loc,
+                        double *q_pair, double *q_aux, double cutoff,
+                        int *shls_slice, int *ao_loc, CINTOpt *cintopt,
+                        int *atm, int natm, int *bas, int nbas, double *env)
+{
+        const int ksh0 = shls_slice[4];
+        const int ksh1 = shls_slice[5];
+        const size_t ncol = pair_loc[npairs];
+
+#pragma omp parallel default(none) \
+        shared(intor, out, pairs, npairs, pair_loc, q_pair, q_aux, cutoff, \
+               ao_loc, cintopt, atm, natm, bas, nbas, env)
+{
+        int p, ish, jsh, ksh, di, dj, dk, i, j, k;
+        size_t k0;
+        int shls[3];
+        double *pout, *pbuf;
+        double *buf = (double *)malloc(sizeof(double)*NCTRMAX*NCTRMAX*NCTRMAX);
+#pragma omp for schedule(dynamic)
+        for (p = 0; p < npairs; p++) {
+                ish = pairs[p*2  ];
+                jsh = pairs[p*2+1];
+                di = ao_loc[ish+1] - ao_loc[ish];
+                dj = ao_loc[jsh+1] - ao_loc[jsh];
+                shls[0] = ish;
+                shls[1] = jsh;
+                for (ksh = ksh0; ksh < ksh1; ksh++) {
+                        if (q_pair[p] * q_aux[ksh-ksh0] < cutoff) {
+                                continue;
+                        }
+                        shls[2] = ksh;
+                        if (!(*intor)(buf, shls, atm, natm, bas, nbas, env,
+                                      cintopt)) {
+                                continue;
+                        }
+                        dk = ao_loc[ksh+1] - ao_loc[ksh];
+                        k0 = ao_loc[ksh] - ao_loc[ksh0];
+                        for (k = 0; k < dk; k++) {
+                                pout = out + (k0+k) * ncol + pair_loc[p];
+                                pbuf = buf + k * di * dj;
+                                if (ish != jsh) {
+                                        for (i = 0; i < di; i++) {
+                                        for (j = 0; j < dj; j++) {
+                                                pout[i*dj+j] = pbuf[j*di+i];
+                                        } }
+                                } else {
+                                        for (i = 0; i < di; i++) {
+                                        for (j = 0; j <= i; j++) {
+                                                pout[i*(i+1)/2+j] = pbuf[j*di+i];
+                                        } }
+                                }
+                        }
+                }
+        }
+        free(buf);
+}
+}
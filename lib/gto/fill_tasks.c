@@ -0,0 +1,70 @@
+/*
+ * Author: Qiming Sun <osirpt.sun@gmail.com>
+ *
+ * Integrals for a list of shell tuples (tasks).  The shell ids of task t are
+ * tasks[t*nshl:(t+1)*nshl], nshl = 2, 3 or 4.
+ */
+
+#include <stdlib.h>
+#include <string.h>
+#include "config.h"
+#include "cint.h"
+
+/*
+ * Schwarz screening.  keep[t] = 0 if the bound of task t is smaller than
+ * cutoff.  The bound is
+ *      q_cond[i,j]                     for (i,j)
+ *      q_cond[i,j] * q_cond[k,k]       for (i,j,k)
+ *      q_cond[i,j] * q_cond[k,l]       for (i,j,k,l)
+ */
+void GTOtasks_screen(char *keep, int *tasks, int ntasks, int nshl,
+                     double *q_cond, int nbas, double cutoff)
+{
+#pragma omp parallel default(none) \
+        shared(keep, tasks, ntasks, nshl, q_cond, nbas, cutoff)
+{
+        int t;
+        int *shls;
+        double q;
+#pragma omp for schedule(static)
+        for (t = 0; t < ntasks; t++) {
+                shls = tasks + t * nshl;
+                q = q_cond[shls[0]*nbas+shls[1]];
+                if (nshl == 3) {
+                        q *= q_cond[shls[2]*nbas+shls[2]];
+                } else if (nshl == 4) {
+                        q *= q_cond[shls[2]*nbas+shls[3]];
+                }
+                keep[t] = (q >= cutoff);
+        }
+}
+}
+
+/*
+ * The integrals of task t are written to out[offsets[t]:offsets[t+1]] in
+ * the libcint layout, i.e. the F-ordered array [di,dj,(dk,dl,)comp].  Tasks
+ * with offsets[t+1] == offsets[t] are skipped.
+ */
+void GTOtasks_fill_drv(int (*intor)(), double *out, size_t *offsets,
+                       int *tasks, int ntasks, int nshl, CINTOpt *cintopt,
+                       int *atm, int natm, int *bas, int nbas, double *env)
+{
+#pragma omp parallel default(none) \
+        shared(intor, out, offsets, tasks, ntasks, nshl, cintopt, \
+               atm, natm, bas, nbas, env)
+{
+        int t;
+        double *pout;
+#pragma omp for schedule(dynamic, 8)
+        for (t = 0; t < ntasks; t++) {
+                if (offsets[t+1] == offsets[t]) {
+                        continue;
+                }
+                pout = out + offsets[t];
+                if (!(*intor)(pout, tasks+t*nshl, atm, natm, bas, nbas, env,
+                              cintopt)) {
+                        memset(pout, 0, sizeof(double)*(offsets[t+1]-offsets[t]));
+                }
+        }
+}
+}
@@ -12,7 +12,6 @@ import tempfile
 from functools import reduce
 import numpy
 import scipy.linalg
-import h5py
 from pyscf.lib import parameters
 from pyscf.lib import logger
 from pyscf.lib import numpy_helper
@@ -330,10 +329,20 @@ def davidson1(aop, x0, precond, tol=1e-12, max_cycle=50, max_space=12,
             xt = _qr(xt, dot)
             xt = xt[:40]  # 40 trial vectors at most
 
-        axt = aop(xt)
-        for k, xi in enumerate(xt):
-            xs.append(xt[k])
-            ax.append(axt[k])
+        if _incore:
+            axt = aop(xt)
+            for k, xi in enumerate(xt):
+                xs.append(xt[k])
+                ax.append(axt[k])
+        else:
+# The trial vectors are moved to the scratch files before the contraction.
+# aop receives the memory-mapped vectors and can stream over them.
+            for xi in xt:
+                xs.append(xi)
+            xt = [xs[i] for i in range(len(xs)-len(xt), len(xs))]
+            axt = aop(xt)
+            for axi in axt:
+                ax.append(axi)
         rnow = len(xt)
         head, space = space, space+rnow
 
@@ -601,10 +610,20 @@ def davidson_nosym1(aop, x0, precond, tol=1e-12, max_cycle=50, max_space=12,
             xt = _qr(xt, dot)
             xt = xt[:40]  # 40 trial vectors at most
 
-        axt = aop(xt)
-        for k, xi in enumerate(xt):
-            xs.append(xt[k])
-            ax.append(axt[k])
+        if _incore:
+            axt = aop(xt)
+            for k, xi in enumerate(xt):
+                xs.append(xt[k])
+                ax.append(axt[k])
+        else:
+# The trial vectors are moved to the scratch files before the contraction.
+# aop receives the memory-mapped vectors and can stream over them.
+            for xi in xt:
+                xs.append(xi)
+            xt = [xs[i] for i in range(len(xs)-len(xt), len(xs))]
+            axt = aop(xt)
+            for axi in axt:
+                ax.append(axi)
         rnow = len(xt)
         head, space = space, space+rnow
 
@@ -1151,6 +1170,8 @@ def _qr(xs, dot):
     return qs
 
 def _gen_x0(v, xs):
+    if isinstance(xs, _Xlist):
+        return _gen_x0_outcore(v, xs)
     space, nroots = v.shape
     x0 = []
     for k in range(nroots):
@@ -1181,37 +1202,75 @@ def _sort_by_similarity(w, v, nroots, conv, vlast, emin=None, heff=None):
     return e, c
 
 
+def _scratch_vector(shape, dtype=numpy.double):
+    '''A zero-initialized numpy.memmap on a scratch file in TMPDIR.  The file
+    is deleted when the memmap is released.  _Xlist.append takes the memmap
+    over without a copy.
+    '''
+    tmpfile = tempfile.NamedTemporaryFile(dir=parameters.TMPDIR)
+    v = numpy.memmap(tmpfile, dtype=dtype, mode='w+', shape=shape)
+    v._scratch_file = tmpfile
+    return v
+
 class _Xlist(list):
+    '''Subspace vectors on memory-mapped scratch files.  xs[i] returns a
+    numpy.memmap view of the vector.  The OS pages the data in on access, so
+    the subspace algebra (dot products, _gen_x0) reads the vectors in place
+    instead of making a full copy for each access.  aop receives the
+    memory-mapped trial vectors and can return the sigma vectors in
+    _scratch_vector, see direct_spin1.kernel_ms1.
+    '''
     def __init__(self):
-        self.scr_h5 = misc.H5TmpFile()
-        self.index = []
+        self._files = []
+        self._vecs = []
 
     def __getitem__(self, n):
-        key = self.index[n]
-        return self.scr_h5[key].value
+        return self._vecs[n]
+
+    def __iter__(self):
+        return iter(self._vecs)
 
     def append(self, x):
-        key = str(len(self.index) + 1)
-        if key in self.index:
-            for i in range(len(self.index)+1):
-                if str(i) not in self.index:
-                    key = str(i)
-                    break
-        self.index.append(key)
-        self.scr_h5[key] = x
-        self.scr_h5.flush()
+        if getattr(x, '_scratch_file', None) is not None:
+            self._files.append(x._scratch_file)
+            self._vecs.append(x)
+            return
+        x = numpy.asarray(x)
+        tmpfile = tempfile.NamedTemporaryFile(dir=parameters.TMPDIR)
+        v = numpy.memmap(tmpfile, dtype=x.dtype, mode='w+', shape=x.shape)
+        for p0, p1 in misc.prange(0, x.size, _XLIST_BLKSIZE):
+            v.reshape(-1)[p0:p1] = x.reshape(-1)[p0:p1]
+        self._files.append(tmpfile)
+        self._vecs.append(v)
 
     def __setitem__(self, n, x):
-        key = self.index[n]
-        self.scr_h5[key][:] = x
-        self.scr_h5.flush()
+        self._vecs[n][:] = x
 
     def __len__(self):
-        return len(self.index)
+        return len(self._vecs)
 
     def pop(self, index):
-        key = self.index.pop(index)
-        del(self.scr_h5[key])
+        self._files.pop(index).close()
+        return self._vecs.pop(index)
+
+# Number of elements of a vector to process in one block in the out-of-core
+# subspace algebra, 1 MB for real vectors
+_XLIST_BLKSIZE = 131072
+
+def _gen_x0_outcore(v, xs):
+    '''Linear combination of the vectors in _Xlist, streamed over blocks of
+    the vectors so that no temporary of the full vector size is created.
+    '''
+    space, nroots = v.shape
+    x = xs[0]
+    dtype = numpy.result_type(v.dtype, x.dtype)
+    x0 = [numpy.empty(x.size, dtype=dtype) for k in range(nroots)]
+    for p0, p1 in misc.prange(0, x.size, _XLIST_BLKSIZE):
+        xblk = numpy.asarray([xs[i].reshape(-1)[p0:p1] for i in range(space)])
+        x0blk = numpy.dot(v.T, xblk)
+        for k in range(nroots):
+            x0[k][p0:p1] = x0blk[k]
+    return [xk.reshape(x.shape) for xk in x0]
 
 
 if __name__ == '__main__':
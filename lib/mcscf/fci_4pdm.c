@@ -625,3 +625,86 @@ void FCIrdm3_drv(void (*kernel)(),
         free(clinkb);
 }
 
+
+/*
+ * The rows p0 <= p < p1 of <bra|E^p_q E^r_s X_{tu}>, accumulated to
+ * rdm3[p-p0,q,r,s,t,u].  t2bra[:,i,j,k,l] = E^i_j E^k_l|bra> and
+ * tket[:,t,u] = X_{tu}|ket> are computed for the string batch.  Particle
+ * permutation symmetry is not used, the rows are complete.
+ */
+void FCI3pdm_blk_contract(double *rdm3, double *t2bra, double *tket,
+                          int bcount, int norb, int p0, int p1)
+{
+        const char TRANS_N = 'N';
+        const char TRANS_T = 'T';
+        const double D1 = 1;
+        const int nnorb = norb * norb;
+        const int n4 = nnorb * nnorb;
+        const int n3 = nnorb * norb;
+        int i, j, k, l, ji;
+        size_t n;
+        double *tbra, *pbra, *pt2;
+
+#pragma omp parallel default(none) \
+        shared(rdm3, t2bra, tket, bcount, norb, p0, p1), \
+        private(ji, i, j, k, l, n, tbra, pbra, pt2)
+{
+        tbra = malloc(sizeof(double) * nnorb * bcount);
+#pragma omp for schedule(dynamic, 4)
+        for (ji = p0*norb; ji < p1*norb; ji++) { // (<bra| E^j_i E^k_l)
+                j = ji / norb;
+                i = ji - j * norb;
+                for (n = 0; n < bcount; n++) {
+                        pbra = tbra + n * nnorb;
+                        pt2 = t2bra + n * n4 + i * norb + j;
+                        for (k = 0; k < norb; k++) {
+                                for (l = 0; l < norb; l++) {
+                                        pbra[k*norb+l] = pt2[l*n3+k*nnorb];
+                                }
+                        }
+                }
+                dgemm_(&TRANS_N, &TRANS_T, &nnorb, &nnorb, &bcount,
+                       &D1, tket, &nnorb, tbra, &nnorb,
+                       &D1, rdm3+(size_t)(ji-p0*norb)*n4, &nnorb);
+        }
+        free(tbra);
+}
+}
+
+/*
+ * The rows p0 <= p < p1 of the 3-pdm <p^+ q r^+ s t^+ u>.  Unlike
+ * FCIrdm3_drv, the rows are complete and only the (p1-p0)*norb^5 block is
+ * held in memory.
+ */
+void FCIrdm3_blk_drv(double *rdm3, double *bra, double *ket,
+                     int norb, int na, int nb, int nlinka, int nlinkb,
+                     int *link_indexa, int *link_indexb, int p0, int p1)
+{
+        const size_t nnorb = norb * norb;
+        const size_t n4 = nnorb * nnorb;
+        int ib, strk, bcount;
+        double *t1ket = malloc(sizeof(double) * nnorb * BUFBASE);
+        double *t2bra = malloc(sizeof(double) * n4 * BUFBASE);
+
+        _LinkT *clinka = malloc(sizeof(_LinkT) * nlinka * na);
+        _LinkT *clinkb = malloc(sizeof(_LinkT) * nlinkb * nb);
+        FCIcompress_link(clinka, link_indexa, norb, na, nlinka);
+        FCIcompress_link(clinkb, link_indexb, norb, nb, nlinkb);
+        memset(rdm3, 0, sizeof(double) * n4 * norb * (p1-p0));
+
+        for (strk = 0; strk < na; strk++) {
+                for (ib = 0; ib < nb; ib += BUFBASE) {
+                        bcount = MIN(BUFBASE, nb-ib);
+                        FCI_t2ci_sf(bra, t2bra, bcount, strk, ib,
+                                    norb, na, nb, nlinka, nlinkb, clinka, clinkb);
+                        FCI_t1ci_sf(ket, t1ket, bcount, strk, ib,
+                                    norb, na, nb, nlinka, nlinkb, clinka, clinkb);
+                        FCI3pdm_blk_contract(rdm3, t2bra, t1ket, bcount,
+                                             norb, p0, p1);
+                }
+        }
+        free(clinka);
+        free(clinkb);
+        free(t1ket);
+        free(t2bra);
+}
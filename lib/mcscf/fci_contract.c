@@ -434,6 +434,228 @@ void FCIcontract_2e_spin1(double *eri, double *ci0, double *ci1,
         free(clinkb);
 }
 
+/*
+ * ctr_rhf2e_kern for nvec CI vectors.  The intermediates of all vectors are
+ * stacked, t1[nnorb,nvec*bcount], so that each link is decoded once for all
+ * vectors and the eri is applied in one dgemm.  ci1buf is [nvec,na,bcount].
+ */
+static void ctr_rhf2e_kern_multi(double *eri, double *ci0, double *ci1,
+                                 double *ci1buf, double *t1buf, int nvec,
+                                 int bcount, int stra_id, int strb_id,
+                                 int norb, int na, int nb, int nlinka, int nlinkb,
+                                 _LinkTrilT *clink_indexa, _LinkTrilT *clink_indexb)
+{
+        const char TRANS_N = 'N';
+        const double D0 = 0;
+        const double D1 = 1;
+        const int nnorb = norb * (norb+1)/2;
+        const int nrow = nvec * bcount;
+        const size_t nab = (size_t)na * nb;
+        const size_t bufsize = (size_t)na * bcount;
+        const _LinkTrilT *taba = clink_indexa + stra_id * nlinka;
+        const _LinkTrilT *tabb;
+        double *t1 = t1buf;
+        double *vt1 = t1buf + (size_t)nnorb*nrow;
+        double *pt1, *pci;
+        int j, k, iv, ia, sign, str0;
+        size_t str1;
+
+        memset(t1, 0, sizeof(double)*nnorb*nrow);
+        for (j = 0; j < nlinka; j++) {
+                ia   = EXTRACT_IA  (taba[j]);
+                str1 = EXTRACT_ADDR(taba[j]);
+                sign = EXTRACT_SIGN(taba[j]);
+                if (sign == 0) {
+                        break;
+                }
+                for (iv = 0; iv < nvec; iv++) {
+                        pt1 = t1 + (size_t)ia*nrow + iv*bcount;
+                        pci = ci0 + iv*nab + str1*nb + strb_id;
+                        if (sign > 0) {
+                                for (k = 0; k < bcount; k++) {
+                                        pt1[k] += pci[k];
+                                }
+                        } else {
+                                for (k = 0; k < bcount; k++) {
+                                        pt1[k] -= pci[k];
+                                }
+                        }
+                }
+        }
+        tabb = clink_indexb + strb_id * nlinkb;
+        for (str0 = 0; str0 < bcount; str0++, tabb += nlinkb) {
+                for (j = 0; j < nlinkb; j++) {
+                        ia   = EXTRACT_IA  (tabb[j]);
+                        str1 = EXTRACT_ADDR(tabb[j]);
+                        sign = EXTRACT_SIGN(tabb[j]);
+                        if (sign == 0) {
+                                break;
+                        }
+                        pt1 = t1 + (size_t)ia*nrow + str0;
+                        pci = ci0 + stra_id*(size_t)nb + str1;
+                        if (sign > 0) {
+                                for (iv = 0; iv < nvec; iv++) {
+                                        pt1[iv*bcount] += pci[iv*nab];
+                                }
+                        } else {
+                                for (iv = 0; iv < nvec; iv++) {
+                                        pt1[iv*bcount] -= pci[iv*nab];
+                                }
+                        }
+                }
+        }
+
+        dgemm_(&TRANS_N, &TRANS_N, &nrow, &nnorb, &nnorb,
+               &D1, t1, &nrow, eri, &nnorb, &D0, vt1, &nrow);
+
+        tabb = clink_indexb + strb_id * nlinkb;
+        for (str0 = 0; str0 < bcount; str0++, tabb += nlinkb) {
+                for (j = 0; j < nlinkb; j++) {
+                        ia   = EXTRACT_IA  (tabb[j]);
+                        str1 = EXTRACT_ADDR(tabb[j]);
+                        sign = EXTRACT_SIGN(tabb[j]);
+                        if (sign == 0) {
+                                break;
+                        }
+                        pt1 = vt1 + (size_t)ia*nrow + str0;
+                        pci = ci1 + stra_id*(size_t)nb + str1;
+                        if (sign > 0) {
+                                for (iv = 0; iv < nvec; iv++) {
+                                        pci[iv*nab] += pt1[iv*bcount];
+                                }
+                        } else {
+                                for (iv = 0; iv < nvec; iv++) {
+                                        pci[iv*nab] -= pt1[iv*bcount];
+                                }
+                        }
+                }
+        }
+        for (j = 0; j < nlinka; j++) {
+                ia   = EXTRACT_IA  (taba[j]);
+                str1 = EXTRACT_ADDR(taba[j]);
+                sign = EXTRACT_SIGN(taba[j]);
+                if (sign == 0) {
+                        break;
+                }
+                for (iv = 0; iv < nvec; iv++) {
+                        pt1 = vt1 + (size_t)ia*nrow + iv*bcount;
+                        pci = ci1buf + iv*bufsize + str1*bcount;
+                        if (sign > 0) {
+                                for (k = 0; k < bcount; k++) {
+                                        pci[k] += pt1[k];
+                                }
+                        } else {
+                                for (k = 0; k < bcount; k++) {
+                                        pci[k] -= pt1[k];
+                                }
+                        }
+                }
+        }
+}
+
+/*
+ * Contract nvec CI vectors ci0[nvec,na,nb] in one call.  For each alpha
+ * string and block of beta strings, the intermediates of all vectors are
+ * gathered in one pass of the link tables and contracted with the eri in
+ * one dgemm of size (nvec*nstrb, nnorb).  The beta block is shrunk with
+ * nvec so that the buffers are about the size of FCIcontract_2e_spin1.
+ */
+void FCIcontract_2e_spin1_multi(double *eri, double *ci0, double *ci1,
+                                int norb, int na, int nb, int nlinka, int nlinkb,
+                                int *link_indexa, int *link_indexb, int nvec)
+{
+        _LinkTrilT *clinka = malloc(sizeof(_LinkTrilT) * nlinka * na);
+        _LinkTrilT *clinkb = malloc(sizeof(_LinkTrilT) * nlinkb * nb);
+        FCIcompress_link_tril(clinka, link_indexa, na, nlinka);
+        FCIcompress_link_tril(clinkb, link_indexb, nb, nlinkb);
+
+        int blksize = MAX(STRB_BLKSIZE/nvec, 8);
+        size_t nab = (size_t)na * nb;
+        memset(ci1, 0, sizeof(double)*nab*nvec);
+        double *ci1bufs[MAX_THREADS];
+#pragma omp parallel default(none) \
+        shared(eri, ci0, ci1, norb, na, nb, nlinka, nlinkb, \
+               clinka, clinkb, ci1bufs, nab, nvec, blksize)
+{
+        int strk, ib, iv;
+        size_t blen;
+        double *t1buf = malloc(sizeof(double) * blksize*nvec*norb*(norb+1));
+        double *ci1buf = malloc(sizeof(double) * na*blksize*nvec);
+        ci1bufs[omp_get_thread_num()] = ci1buf;
+        for (ib = 0; ib < nb; ib += blksize) {
+                blen = MIN(blksize, nb-ib);
+                memset(ci1buf, 0, sizeof(double) * na*blen*nvec);
+#pragma omp for schedule(static)
+                for (strk = 0; strk < na; strk++) {
+                        ctr_rhf2e_kern_multi(eri, ci0, ci1, ci1buf, t1buf, nvec,
+                                             blen, strk, ib, norb, na, nb,
+                                             nlinka, nlinkb, clinka, clinkb);
+                }
+                FCIomp_reduce_inplace(ci1bufs, blen*na*nvec);
+#pragma omp master
+                for (iv = 0; iv < nvec; iv++) {
+                        FCIaxpy2d(ci1+iv*nab+ib, ci1buf+iv*na*blen, na, nb, blen);
+                }
+// ci1 is updated by the other threads in the next block
+#pragma omp barrier
+        }
+        free(ci1buf);
+        free(t1buf);
+}
+        free(clinka);
+        free(clinkb);
+}
+
+/*
+ * The contributions of the alpha strings [0:nseg] to ci1.  ci0 and ci1 hold
+ * nrow alpha strings, which are the nseg strings of the segment followed by
+ * the alpha strings they link to.  link_indexa[:nseg] is addressed in the
+ * local rows.  The contributions of all segments sum to FCIcontract_2e_spin1.
+ */
+void FCIcontract_2e_spin1_seg(double *eri, double *ci0, double *ci1,
+                              int norb, int nrow, int nb, int nseg,
+                              int nlinka, int nlinkb,
+                              int *link_indexa, int *link_indexb)
+{
+        _LinkTrilT *clinka = malloc(sizeof(_LinkTrilT) * nlinka * nseg);
+        _LinkTrilT *clinkb = malloc(sizeof(_LinkTrilT) * nlinkb * nb);
+        FCIcompress_link_tril(clinka, link_indexa, nseg, nlinka);
+        FCIcompress_link_tril(clinkb, link_indexb, nb, nlinkb);
+
+        memset(ci1, 0, sizeof(double)*nrow*nb);
+        double *ci1bufs[MAX_THREADS];
+#pragma omp parallel default(none) \
+        shared(eri, ci0, ci1, norb, nrow, nb, nseg, nlinka, nlinkb, \
+               clinka, clinkb, ci1bufs)
+{
+        int strk, ib;
+        size_t blen;
+        double *t1buf = malloc(sizeof(double) * STRB_BLKSIZE*norb*(norb+1));
+        double *ci1buf = malloc(sizeof(double) * nrow*STRB_BLKSIZE);
+        ci1bufs[omp_get_thread_num()] = ci1buf;
+        for (ib = 0; ib < nb; ib += STRB_BLKSIZE) {
+                blen = MIN(STRB_BLKSIZE, nb-ib);
+                memset(ci1buf, 0, sizeof(double) * nrow*blen);
+#pragma omp for schedule(static)
+                for (strk = 0; strk < nseg; strk++) {
+                        ctr_rhf2e_kern(eri, ci0, ci1, ci1buf, t1buf,
+                                       blen, blen, blen, strk, ib,
+                                       norb, nrow, nb, nlinka, nlinkb,
+                                       clinka, clinkb);
+                }
+                FCIomp_reduce_inplace(ci1bufs, blen*nrow);
+#pragma omp master
+                FCIaxpy2d(ci1+ib, ci1buf, nrow, nb, blen);
+// ci1 is updated by the other threads in the next block
+#pragma omp barrier
+        }
+        free(ci1buf);
+        free(t1buf);
+}
+        free(clinka);
+        free(clinkb);
+}
+
 /*
  * eri_ab is mixed integrals (alpha,alpha|beta,beta), |beta,beta) in small strides
  */
@@ -21,6 +21,8 @@ double FCI_t2ci_sf(double *ci0, double *t1, int bcount,
                    int stra_id, int strb_id,
                    int norb, int na, int nb, int nlinka, int nlinkb,
                    _LinkT *clink_indexa, _LinkT *clink_indexb);
+void FCI3pdm_blk_contract(double *rdm3, double *t2bra, double *tket,
+                          int bcount, int norb, int p0, int p1);
 
 static void tril2pdm_particle_symm(double *rdm2, double *tbra, double *tket,
                                    int bcount, int ncre, int norb)
@@ -272,3 +274,41 @@ void NEVPTcontract(void (*kernel)(),
         free(pdm2);
 }
 
+
+/*
+ * The rows p0 <= p < p1 of <E^p_q E^r_s t_{ac}>, t_{ac} being the
+ * contraction of eri and E E|ci0> defined by kernel.  Unlike NEVPTcontract,
+ * the rows are complete and the full norb^6 array is not needed.
+ */
+void NEVPTcontract_blk(void (*kernel)(),
+                       double *rdm3, double *eri, double *ci0,
+                       int norb, int na, int nb, int nlinka, int nlinkb,
+                       int *link_indexa, int *link_indexb, int p0, int p1)
+{
+        const size_t nnorb = norb * norb;
+        const size_t n4 = nnorb * nnorb;
+        int ib, strk, bcount;
+        double *t2ket = malloc(sizeof(double) * n4 * BUFBASE);
+        double *gt2 = malloc(sizeof(double) * nnorb * BUFBASE);
+
+        _LinkT *clinka = malloc(sizeof(_LinkT) * nlinka * na);
+        _LinkT *clinkb = malloc(sizeof(_LinkT) * nlinkb * nb);
+        FCIcompress_link(clinka, link_indexa, norb, na, nlinka);
+        FCIcompress_link(clinkb, link_indexb, norb, nb, nlinkb);
+        memset(rdm3, 0, sizeof(double) * n4 * norb * (p1-p0));
+
+        for (strk = 0; strk < na; strk++) {
+                for (ib = 0; ib < nb; ib += BUFBASE) {
+                        bcount = MIN(BUFBASE, nb-ib);
+                        FCI_t2ci_sf(ci0, t2ket, bcount, strk, ib,
+                                    norb, na, nb, nlinka, nlinkb, clinka, clinkb);
+                        (*kernel)(gt2, eri, t2ket, bcount, norb, na, nb);
+                        FCI3pdm_blk_contract(rdm3, t2ket, gt2, bcount,
+                                             norb, p0, p1);
+                }
+        }
+        free(clinka);
+        free(clinkb);
+        free(t2ket);
+        free(gt2);
+}
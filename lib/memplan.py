@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+'''
+Memory and disk planner for post-HF methods
+
+The planner collects the memory estimates of the post-HF methods
+(:func:`cc.ccsd._mem_usage`, :func:`mp.mp2._mem_usage`,
+:func:`mcscf.mc_ao2mo._mem_usage`) and the disk footprint of the
+intermediate files.  For a given method object it forecasts the peak memory
+and disk, decides which path (incore, outcore, direct or DF) the method will
+take, and the block sizes used in the integral transformation and in the
+iterations.  The same :func:`choose_path` is called by the methods
+themselves, so the plan matches what the calculation does.
+
+Examples:
+
+>>> from pyscf import gto, scf, cc
+>>> from pyscf.lib import memplan
+>>> mol = gto.M(atom='O 0 0 0; H 0 -.757 .587; H 0 .757 .587', basis='cc-pvtz')
+>>> mf = scf.RHF(mol)
+>>> memplan.dryrun(cc.CCSD(mf))
+'''
+
+import sys
+import numpy
+from pyscf.lib import logger
+from pyscf.lib import misc
+
+
+def choose_path(mem_incore, mem_now, max_memory, incore_ok=True,
+                incore_anyway=False):
+    '''Decide whether the MO integrals can be held in memory.
+
+    Args:
+        mem_incore : float
+            Memory (MB) required by the in-core path.
+        mem_now : float
+            Memory (MB) already used by the process.
+        max_memory : float
+            Memory limit (MB).
+
+    Kwargs:
+        incore_ok : bool
+            Whether the in-core path is possible at all, e.g. the AO
+            integrals are available in memory.
+        incore_anyway : bool
+            Force the in-core path (see :attr:`Mole.incore_anyway`).
+
+    Returns:
+        'incore' or 'outcore'
+    '''
+    if (incore_ok and mem_incore+mem_now < max_memory) or incore_anyway:
+        return 'incore'
+    else:
+        return 'outcore'
+
+
+def _eri_incore(mf):
+    '''Whether the SCF object holds (or will hold) the AO integrals in memory'''
+    if mf._eri is not None:
+        return True
+    elif mf.mo_coeff is None and hasattr(mf, '_is_mem_enough'):
+        return mf._is_mem_enough()
+    else:
+        return False
+
+def _ccsd_dims(mycc):
+    '''nocc, nvir of CCSD.  Without SCF orbitals, they are derived from Mole'''
+    if mycc.mo_occ is not None:
+        nocc = mycc.nocc
+        return nocc, mycc.nmo - nocc
+    mol = mycc.mol
+    nocc = mol.nelectron // 2
+    nmo = mol.nao_nr()
+    frozen = mycc.frozen
+    if isinstance(frozen, (int, numpy.integer)):
+        nocc -= frozen
+        nmo -= frozen
+    elif frozen:
+        frozen = numpy.asarray(frozen)
+        nocc -= numpy.count_nonzero(frozen < nocc)
+        nmo -= len(frozen)
+    return nocc, nmo - nocc
+
+
+class Plan(object):
+    '''The forecast of memory, disk and block sizes of a calculation.
+
+    Attributes:
+        method : str
+            Name of the method.
+        path : str
+            'incore', 'outcore', 'direct' or 'df'.
+        max_memory : float
+            Memory limit (MB) the plan is made for.
+        mem_now : float
+            Memory (MB) already used when the plan was made.
+        mem_peak : float
+            Forecast peak memory (MB), including mem_now.
+        disk : float
+            Forecast peak disk usage (MB) of the temporary files.
+        dims : dict
+            Problem size, e.g. nao, nocc, nvir.
+        blksize : dict
+            The block sizes used in the different steps.
+        notes : list of str
+            Warnings and remarks.
+    '''
+    def __init__(self, method, max_memory, mem_now=0):
+        self.method = method
+        self.path = None
+        self.max_memory = max_memory
+        self.mem_now = mem_now
+        self.mem_peak = mem_now
+        self.disk = 0
+        self.dims = {}
+        self.blksize = {}
+        self.notes = []
+
+    @property
+    def fits(self):
+        '''Whether the forecast peak memory is under max_memory'''
+        return self.mem_peak <= self.max_memory
+
+    def dump(self, verbose=logger.NOTE, stdout=sys.stdout):
+        if isinstance(verbose, logger.Logger):
+            log = verbose
+        else:
+            log = logger.Logger(stdout, verbose)
+        log.note('******** memory plan for %s ********', self.method)
+        log.note('%s', '  '.join(['%s = %d' % (k, v)
+                                  for k, v in sorted(self.dims.items())]))
+        log.note('path = %s', self.path)
+        log.note('max_memory = %d MB  current memory = %d MB',
+                 self.max_memory, self.mem_now)
+        log.note('peak memory = %d MB  peak disk = %d MB',
+                 self.mem_peak, self.disk)
+        for key, val in sorted(self.blksize.items()):
+            log.note('blksize %s = %s', key, val)
+        if not self.fits:
+            log.warn('Forecast peak memory %d MB exceeds max_memory %d MB',
+                     self.mem_peak, self.max_memory)
+        for note in self.notes:
+            log.note('%s', note)
+        return self
+
+    def __repr__(self):
+        return ('<Plan %s path=%s mem_peak=%dMB disk=%dMB>' %
+                (self.method, self.path, self.mem_peak, self.disk))
+
+
+def plan_ao2mo_outcore(nao, nmoi, nmoj, nmok, nmol, max_memory,
+                       compact=True, plan=None):
+    '''Memory and disk of :func:`ao2mo.outcore.general` for the orbital
+    spaces of size nmoi, nmoj, nmok, nmol.
+    '''
+    from pyscf.ao2mo import outcore
+    if plan is None:
+        plan = Plan('ao2mo.outcore', max_memory)
+    nao_pair = nao * (nao+1) // 2
+    if compact and nmoi == nmoj:
+        nij_pair = nmoi * (nmoi+1) // 2
+    else:
+        nij_pair = nmoi * nmoj
+    if compact and nmok == nmol:
+        nkl_pair = nmok * (nmok+1) // 2
+    else:
+        nkl_pair = nmok * nmol
+    ioblk_size = max(max_memory*.1, outcore.IOBLK_SIZE)
+    e1buflen, mem_words, iobuf_words, ioblk_words = \
+            outcore.guess_e1bufsize(max_memory, ioblk_size, nij_pair, nao_pair, 1)
+    e2buflen = outcore.guess_e2bufsize(ioblk_words*8/1e6, nij_pair,
+                                       max(nao_pair, nkl_pair))[0]
+    plan.blksize['ao2mo half_e1'] = e1buflen
+    plan.blksize['ao2mo half_e2'] = e2buflen
+    # the half-transformed swap file and the final MO integrals
+    disk = (nij_pair*nao_pair + nij_pair*nkl_pair) * 8/1e6
+    mem = min(mem_words*8/1e6, (2*e1buflen*nij_pair + nao_pair*e1buflen)*8/1e6)
+    return mem, disk
+
+
+def plan_ccsd(mycc, max_memory=None, mem_now=None):
+    '''Memory plan for :class:`cc.ccsd.CCSD`'''
+    from pyscf.cc import ccsd
+    from pyscf.lib import diis
+    if max_memory is None: max_memory = mycc.max_memory
+    if mem_now is None: mem_now = misc.current_memory()[0]
+    nocc, nvir = _ccsd_dims(mycc)
+    nao = mycc.mol.nao_nr()
+    nmo = nocc + nvir
+    plan = Plan(mycc.__class__.__name__, max_memory, mem_now)
+    plan.dims = {'nao': nao, 'nocc': nocc, 'nvir': nvir}
+    mem_incore, mem_outcore, mem_basic = ccsd._mem_usage(nocc, nvir)
+
+    nvir_pair = nvir * (nvir+1) // 2
+    eri_words = (nocc**4 + nocc**3*nvir*2 + nocc**2*nvir**2*2 +
+                 nocc*nvir*nvir_pair)
+    vvvv_words = nvir_pair**2
+    if getattr(mycc._scf, 'with_df', None):
+        plan.path = 'df'
+        disk = (eri_words + vvvv_words) * 8/1e6
+        mem_peak = mem_outcore + (eri_words+vvvv_words)*8/1e6
+    else:
+        plan.path = choose_path(mem_incore, mem_now, max_memory,
+                                _eri_incore(mycc._scf), mycc.mol.incore_anyway)
+        if plan.path == 'incore':
+            disk = 0
+            mem_peak = mem_incore
+        else:
+            mem_ao2mo = max(2000, max_memory-mem_now)
+            mem1, disk = plan_ao2mo_outcore(nao, nocc, nmo, nmo, nmo,
+                                            mem_ao2mo, plan=plan)
+            disk += eri_words * 8/1e6
+            if mycc.direct:
+                plan.path = 'direct'
+                plan.notes.append('vvvv contracted AO-direct, %d process(es)' %
+                                  getattr(mycc, 'direct_nproc', 1))
+            else:
+                mem2, disk2 = plan_ao2mo_outcore(nao, nvir, nvir, nvir, nvir,
+                                                 mem_ao2mo, plan=plan)
+                disk += disk2
+            mem_peak = max(mem_outcore, mem1)
+
+    # DIIS vectors are moved to disk when they are large
+    vec_size = nocc*nvir + nocc**2*nvir**2
+    if vec_size >= diis.INCORE_SIZE:
+        disk += mycc.diis_space * vec_size * 2 * 8/1e6
+    else:
+        mem_peak += mycc.diis_space * vec_size * 2 * 8/1e6
+
+    mem_loop = max(2000, max_memory - mem_now)
+    blksize, blknvir = ccsd._blksize_inloop(nocc, nvir, mem_loop)
+    plan.blksize['update_amps occ'] = blksize
+    plan.blksize['update_amps vir'] = blknvir
+    plan.mem_peak = mem_now + mem_peak
+    plan.disk = disk
+    if mem_basic + mem_now > max_memory:
+        plan.notes.append('At least %d MB memory is needed' % (mem_basic+mem_now))
+    return plan
+
+
+def plan_mp2(mp, max_memory=None, mem_now=None):
+    '''Memory plan for :class:`mp.mp2.MP2`'''
+    from pyscf.mp import mp2
+    if max_memory is None: max_memory = mp.max_memory
+    if mem_now is None: mem_now = misc.current_memory()[0]
+    nocc = mp.nocc
+    nvir = mp.nmo - nocc
+    nao = mp.mol.nao_nr()
+    plan = Plan(mp.__class__.__name__, max_memory, mem_now)
+    plan.dims = {'nao': nao, 'nocc': nocc, 'nvir': nvir}
+    mem_incore, mem_outcore, mem_basic = mp2._mem_usage(nocc, nvir)
+    if getattr(mp._scf, 'with_df', None):
+        plan.path = 'df'
+        plan.mem_peak = mem_now + mem_incore
+    else:
+        plan.path = choose_path(mem_incore, mem_now, max_memory,
+                                _eri_incore(mp._scf), mp.mol.incore_anyway)
+        if plan.path == 'incore':
+            plan.mem_peak = mem_now + mem_incore
+        else:
+            mem_ao2mo = max(2000, max_memory*.9-mem_now)
+            mem1, plan.disk = plan_ao2mo_outcore(nao, nocc, nvir, nocc, nvir,
+                                                 mem_ao2mo, compact=False,
+                                                 plan=plan)
+            plan.mem_peak = mem_now + max(mem_outcore, mem1)
+    if mem_basic + mem_now > max_memory:
+        plan.notes.append('At least %d MB memory is needed' % (mem_basic+mem_now))
+    return plan
+
+
+def plan_casscf(mc, max_memory=None, mem_now=None):
+    '''Memory plan for the integral transformation of
+    :class:`mcscf.CASSCF` and :class:`mcscf.CASCI`
+    '''
+    from pyscf.mcscf import mc_ao2mo
+    if max_memory is None: max_memory = mc.max_memory
+    if mem_now is None: mem_now = misc.current_memory()[0]
+    ncore = mc.ncore
+    ncas = mc.ncas
+    nao = mc.mol.nao_nr()
+    if mc.mo_coeff is None:
+        nmo = nao
+    else:
+        nmo = mc.mo_coeff.shape[1]
+    plan = Plan(mc.__class__.__name__, max_memory, mem_now)
+    plan.dims = {'nao': nao, 'ncore': ncore, 'ncas': ncas, 'nmo': nmo}
+    mem_incore, mem_outcore, mem_basic = mc_ao2mo._mem_usage(ncore, ncas, nmo)
+    plan.path = choose_path(mem_incore, mem_now, max_memory*.9,
+                            _eri_incore(mc._scf), mc.mol.incore_anyway)
+    if plan.path == 'incore':
+        plan.mem_peak = mem_now + mem_incore
+    else:
+        mem_ao2mo = max(3000, max_memory*.9-mem_now)
+        mem1, disk = plan_ao2mo_outcore(nao, ncas, nmo, nmo, nmo, mem_ao2mo,
+                                        compact=False, plan=plan)
+        # ppaa and papa
+        plan.disk = disk + ncas**2*nmo**2*2 * 8/1e6
+        plan.mem_peak = mem_now + max(mem_outcore, mem1)
+    if mem_basic > max_memory*.9 - mem_now:
+        plan.notes.append('Calculation needs %d MB memory' %
+                          ((mem_basic+mem_now)/.9))
+    return plan
+
+
+def plan(obj, max_memory=None, mem_now=None):
+    '''Make the memory plan for the given method object'''
+    from pyscf.cc import ccsd
+    from pyscf.mp import mp2
+    from pyscf.mcscf import casci
+    if isinstance(obj, ccsd.CCSD):
+        return plan_ccsd(obj, max_memory, mem_now)
+    elif isinstance(obj, mp2.MP2):
+        return plan_mp2(obj, max_memory, mem_now)
+    elif isinstance(obj, casci.CASCI):
+        return plan_casscf(obj, max_memory, mem_now)
+    else:
+        raise NotImplementedError('Memory plan for %s' % obj.__class__)
+
+
+def dryrun(obj, max_memory=None, verbose=logger.NOTE):
+    '''Print the memory plan of the method object without computing anything.
+
+    The mean-field object does not need to be converged; only the orbital
+    dimensions are used.
+
+    Returns:
+        A :class:`Plan` object
+    '''
+    p = plan(obj, max_memory)
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(obj.stdout, max(verbose, logger.NOTE))
+    return p.dump(log)
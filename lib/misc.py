@@ -14,6 +14,8 @@ import functools
 import itertools
 import math
 import ctypes
+import types
+import importlib
 import numpy
 import h5py
 from pyscf.lib import param
@@ -22,7 +24,27 @@ c_double_p = ctypes.POINTER(ctypes.c_double)
 c_int_p = ctypes.POINTER(ctypes.c_int)
 c_null_ptr = ctypes.POINTER(ctypes.c_void_p)
 
-def load_library(libname):
+def load_library(libname, lazy=True):
+    '''Load the C extension libname.  If lazy is set, the shared object is
+    not opened until one of its symbols is accessed.
+    '''
+    if lazy:
+        return _LazyLibrary(libname)
+    else:
+        return _load_library(libname)
+
+class _LazyLibrary(object):
+    def __init__(self, libname):
+        self._libname = libname
+        self._lib = None
+    def __getattr__(self, key):
+        if self._lib is None:
+            self._lib = _load_library(self._libname)
+        return getattr(self._lib, key)
+    def __repr__(self):
+        return '<lazy library %s>' % self._libname
+
+def _load_library(libname):
 # numpy 1.6 has bug in ctypeslib.load_library, see numpy/distutils/misc_util.py
     if '1.6' in numpy.__version__:
         if (sys.platform.startswith('linux') or
@@ -40,6 +62,48 @@ def load_library(libname):
         _loaderpath = os.path.dirname(__file__)
         return numpy.ctypeslib.load_library(libname, _loaderpath)
 
+def lazy_import(modname):
+    '''A placeholder of the module modname.  The module is imported when its
+    attributes are accessed for the first time.
+
+    Examples:
+
+    >>> dhf = lazy_import('pyscf.scf.dhf')
+    >>> dhf.UHF(mol)  # pyscf.scf.dhf is imported here
+    '''
+    return _LazyModule(modname)
+
+class _LazyModule(types.ModuleType):
+    '''Placeholder of a module.  When the module is loaded, the placeholder is
+    replaced by the module in the namespace of the parent package.  The
+    references to the placeholder held elsewhere are forwarded to the module.
+    '''
+    def _load(self):
+        mod = self.__dict__.get('_module')
+        if mod is None:
+            name = self.__name__
+            if sys.modules.get(name) is self:
+                del(sys.modules[name])
+            mod = importlib.import_module(name)
+            self.__dict__['_module'] = mod
+            parent = sys.modules.get(name.rpartition('.')[0])
+            if parent is not None:
+                for key, val in list(vars(parent).items()):
+                    if val is self:
+                        setattr(parent, key, mod)
+        return mod
+    @property
+    def __doc__(self):
+        return self._load().__doc__
+    def __getattr__(self, key):
+        return getattr(self._load(), key)
+    def __setattr__(self, key, val):
+        setattr(self._load(), key, val)
+    def __dir__(self):
+        return dir(self._load())
+    def __repr__(self):
+        return '<lazy module %s>' % self.__name__
+
 #Fixme, the standard resouce module gives wrong number when objects are released
 #see http://fa.bianp.net/blog/2013/different-ways-to-get-memory-consumption-or-lessons-learned-from-memory_profiler/#fn:1
 #or use slow functions as memory_profiler._get_memory did
@@ -332,6 +396,37 @@ class StreamObject(object):
             check_sanity(self, self._keys, self.stdout)
         return self
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if 'stdout' in state:
+            state['stdout'] = _StreamName(state['stdout'])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if isinstance(state.get('stdout'), _StreamName):
+            self.stdout = state['stdout'].reopen()
+
+class _StreamName(object):
+    '''Placeholder of an output stream in the pickled objects.  The file is
+    reopened in append mode when the object is unpickled.'''
+    _reopened = {}
+    def __init__(self, stream):
+        if stream is sys.stdout or stream is sys.__stdout__:
+            self.name = '<stdout>'
+        elif stream is sys.stderr or stream is sys.__stderr__:
+            self.name = '<stderr>'
+        else:
+            self.name = getattr(stream, 'name', '<stdout>')
+    def reopen(self):
+        if self.name == '<stdout>':
+            return sys.stdout
+        elif self.name == '<stderr>':
+            return sys.stderr
+        elif self.name not in self._reopened:
+            self._reopened[self.name] = open(self.name, 'a')
+        return self._reopened[self.name]
+
 _warn_once_registry = {}
 def check_sanity(obj, keysref, stdout=sys.stdout):
     '''Check misinput of class attributes, check whether a class method is
@@ -445,6 +540,75 @@ def background_process(func, *args, **kwargs):
 bg = background = bg_thread = background_thread
 bp = bg_process = background_process
 
+class _omp_threads_env(object):
+    '''Set OMP_NUM_THREADS for the processes spawned in the with block'''
+    def __init__(self, omp_threads):
+        self.omp_threads = omp_threads
+    def __enter__(self):
+        self.omp_bak = os.environ.get('OMP_NUM_THREADS')
+        os.environ['OMP_NUM_THREADS'] = str(self.omp_threads)
+    def __exit__(self, type, value, traceback):
+        if self.omp_bak is None:
+            del(os.environ['OMP_NUM_THREADS'])
+        else:
+            os.environ['OMP_NUM_THREADS'] = self.omp_bak
+
+def spawn_pool(nproc, initializer=None, initargs=(), omp_threads=None):
+    '''A multiprocessing pool of nproc processes started by the "spawn" method.
+
+    The workers are new interpreters rather than forked copies of the calling
+    process, so the pool can be created after OpenMP and BLAS were
+    initialized.  The functions sent to the pool have to be module-level
+    functions.  Their arguments and return values are pickled (the output
+    streams of StreamObject are saved by their names).  Each worker runs the
+    OpenMP kernels with omp_threads threads, num_threads()/nproc by default.
+    Like any spawn pool, the main script needs the
+    if __name__ == '__main__'  guard.
+    '''
+    import multiprocessing
+    if not hasattr(multiprocessing, 'get_context'):
+        raise NotImplementedError('spawn start method requires Python 3.4')
+    if omp_threads is None:
+        omp_threads = max(1, num_threads() // nproc)
+# The workers inherit the environment at the time they are spawned
+    with _omp_threads_env(omp_threads):
+        return multiprocessing.get_context('spawn').Pool(nproc, initializer,
+                                                         initargs)
+
+def spawn_process(target, args=(), omp_threads=1):
+    '''Start a daemon process running target(*args) by the "spawn" method.
+    The OpenMP kernels of the process run with omp_threads threads.  See also
+    :func:`spawn_pool`.
+    '''
+    import multiprocessing
+    if not hasattr(multiprocessing, 'get_context'):
+        raise NotImplementedError('spawn start method requires Python 3.4')
+    p = multiprocessing.get_context('spawn').Process(target=target, args=args)
+    p.daemon = True
+    with _omp_threads_env(omp_threads):
+        p.start()
+    return p
+
+def map_with_processes(func, args, nproc=None, omp_threads=None):
+    '''Evaluate func(arg) for each item of args in a :func:`spawn_pool` of
+    nproc processes.  The results are returned in the order of args.  On
+    Python 2, which has no spawn start method, the tasks are evaluated
+    serially.
+    '''
+    import multiprocessing
+    args = list(args)
+    if nproc is None:
+        nproc = len(args)
+    nproc = min(nproc, len(args))
+    if nproc <= 1 or not hasattr(multiprocessing, 'get_context'):
+        return [func(x) for x in args]
+
+    pool = spawn_pool(nproc, omp_threads=omp_threads)
+    try:
+        return pool.map(func, args, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
 
 class H5TmpFile(h5py.File):
     def __init__(self, filename=None, *args, **kwargs):
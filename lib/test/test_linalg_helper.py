@@ -9,6 +9,7 @@ import tempfile
 from pyscf import gto
 from pyscf import scf
 from pyscf import fci
+from pyscf import lib
 
 class KnowValues(unittest.TestCase):
     def test_davidson(self):
@@ -25,6 +26,42 @@ class KnowValues(unittest.TestCase):
         e = myfci.kernel()[0]
         self.assertAlmostEqual(e, -11.579978414933732+mol.energy_nuc(), 9)
 
+    def test_davidson_outcore(self):
+        numpy.random.seed(12)
+        n = 300
+        a = numpy.random.random((n,n))
+        a = a + a.T + numpy.diag(numpy.arange(n)) * 2
+        aop = lambda xs: [a.dot(x) for x in xs]
+        precond = lambda dx, e, x0: dx/(a.diagonal()-e)
+        x0 = [numpy.eye(n)[i] for i in range(3)]
+        conv, e0, c0 = lib.davidson1(aop, x0, precond, nroots=3)
+        conv, e1, c1 = lib.davidson1(aop, x0, precond, nroots=3,
+                                     max_memory=1e-5)
+        self.assertAlmostEqual(abs(e0-e1).max(), 0, 9)
+        self.assertAlmostEqual(abs(e0-numpy.linalg.eigh(a)[0][:3]).max(), 0, 9)
+
+        # The out-of-core Davidson passes the memory-mapped trial vectors to
+        # aop, and takes the sigma vectors on scratch files over
+        def aop_mmap(xs):
+            self.assertTrue(all(isinstance(x, numpy.memmap) for x in xs))
+            axs = []
+            for x in xs:
+                ax = lib.linalg_helper._scratch_vector(x.shape)
+                ax[:] = a.dot(x)
+                axs.append(ax)
+            return axs
+        conv, e1, c1 = lib.davidson1(aop_mmap, x0, precond, nroots=3,
+                                     max_memory=1e-5)
+        self.assertAlmostEqual(abs(e0-e1).max(), 0, 9)
+
+        xs = lib.linalg_helper._Xlist()
+        for x in x0:
+            xs.append(x)
+        v = numpy.random.random((3,2))
+        ref = lib.linalg_helper._gen_x0(v, x0)
+        x1 = lib.linalg_helper._gen_x0(v, xs)
+        self.assertAlmostEqual(abs(ref[1]-x1[1]).max(), 0, 12)
+
 if __name__ == "__main__":
     print("Full Tests for linalg_helper")
     unittest.main()
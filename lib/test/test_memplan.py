@@ -0,0 +1,71 @@
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+import unittest
+import numpy
+from pyscf import gto
+from pyscf import scf
+from pyscf import cc
+from pyscf import mp
+from pyscf import mcscf
+from pyscf.lib import memplan
+
+mol = gto.Mole()
+mol.verbose = 0
+mol.atom = [
+    [8 , (0. , 0.     , 0.)],
+    [1 , (0. , -0.757 , 0.587)],
+    [1 , (0. , 0.757  , 0.587)]]
+mol.basis = 'cc-pvdz'
+mol.build()
+mf = scf.RHF(mol).run()
+
+class KnowValues(unittest.TestCase):
+    def test_choose_path(self):
+        self.assertEqual(memplan.choose_path(100, 100, 1000), 'incore')
+        self.assertEqual(memplan.choose_path(1000, 100, 1000), 'outcore')
+        self.assertEqual(memplan.choose_path(100, 100, 1000, False), 'outcore')
+        self.assertEqual(memplan.choose_path(1000, 100, 1000, False, True), 'incore')
+
+    def test_ccsd_plan(self):
+        mycc = cc.CCSD(mf)
+        plan = memplan.plan(mycc, max_memory=1e5, mem_now=0)
+        self.assertEqual(plan.path, 'incore')
+        self.assertEqual(plan.dims['nocc'], 5)
+        self.assertEqual(plan.dims['nvir'], 19)
+        self.assertEqual(plan.disk, 0)
+        self.assertTrue(plan.fits)
+
+        plan = memplan.plan(mycc, max_memory=1e-3, mem_now=0)
+        self.assertEqual(plan.path, 'outcore')
+        self.assertTrue(plan.disk > 0)
+        self.assertTrue(not plan.fits)
+        disk = plan.disk
+        mycc.direct = True
+        plan = memplan.plan(mycc, max_memory=1e-3, mem_now=0)
+        self.assertEqual(plan.path, 'direct')
+        self.assertTrue(plan.disk < disk)
+
+        mycc = cc.CCSD(mf, frozen=1)
+        plan = memplan.dryrun(mycc, verbose=0)
+        self.assertEqual(plan.dims['nocc'], 4)
+
+    def test_ccsd_plan_without_scf(self):
+        mycc = cc.CCSD(scf.RHF(mol), frozen=[0])
+        plan = memplan.plan(mycc)
+        self.assertEqual(plan.dims['nocc'], 4)
+        self.assertEqual(plan.dims['nvir'], 19)
+
+    def test_mp2_casscf_plan(self):
+        plan = memplan.plan(mp.MP2(mf), max_memory=1e-3, mem_now=0)
+        self.assertEqual(plan.path, 'outcore')
+        self.assertTrue(plan.disk > 0)
+        mc = mcscf.CASSCF(mf, 4, 4)
+        plan = memplan.plan(mc, max_memory=1e5, mem_now=0)
+        self.assertEqual(plan.path, 'incore')
+        self.assertEqual(plan.dims['ncas'], 4)
+
+if __name__ == "__main__":
+    print("Full Tests for memplan")
+    unittest.main()
@@ -0,0 +1,66 @@
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+import os
+import sys
+import math
+import pickle
+import unittest
+import numpy
+from pyscf import lib
+
+class KnowValues(unittest.TestCase):
+    def test_lazy_import(self):
+        mod = lib.lazy_import('pyscf.lib.chkfile')
+        from pyscf.lib import chkfile
+        self.assertTrue(mod.load is chkfile.load)
+        self.assertTrue('load' in dir(mod))
+
+        mod = lib.lazy_import('pyscf.symm.cg')
+        self.assertTrue(mod.real2spinor is sys.modules['pyscf.symm.cg'].real2spinor)
+
+    def test_lazy_module_replaced(self):
+        from pyscf import symm
+        mod = lib.lazy_import('pyscf.symm.basis')
+        symm._lazy_basis = mod
+        try:
+            self.assertTrue(mod.__doc__ is not None)
+            self.assertEqual(mod.__doc__, sys.modules['pyscf.symm.basis'].__doc__)
+            self.assertTrue(symm._lazy_basis is sys.modules['pyscf.symm.basis'])
+        finally:
+            del(symm._lazy_basis)
+
+    def test_lazy_library(self):
+        libnp = lib.load_library('libnp_helper')
+        self.assertTrue(libnp._lib is None)
+        libnp.NPdsymm_triu
+        self.assertTrue(libnp._lib is not None)
+
+    def test_map_with_processes(self):
+        res = lib.map_with_processes(abs, range(-3,4), 3)
+        self.assertEqual(res, [abs(x) for x in range(-3,4)])
+        res = lib.map_with_processes(os.getenv, ['OMP_NUM_THREADS']*2, 2,
+                                     omp_threads=1)
+        self.assertEqual(res, ['1', '1'])
+        self.assertRaises(ValueError, lib.map_with_processes,
+                          math.sqrt, [1, -1], 2)
+
+    def test_pickle_stream_object(self):
+        obj = lib.StreamObject()
+        obj.stdout = sys.stdout
+        obj.x = numpy.arange(3)
+        obj1 = pickle.loads(pickle.dumps(obj))
+        self.assertTrue(obj1.stdout is sys.stdout)
+        self.assertTrue(numpy.all(obj1.x == obj.x))
+
+    def test_scf_lazy_modules(self):
+        from pyscf import scf
+        from pyscf.scf import hf_symm
+        self.assertTrue(scf.rhf_symm.RHF is hf_symm.RHF)
+        self.assertTrue(scf.newton_ah.newton is not None)
+
+
+if __name__ == "__main__":
+    print("test misc")
+    unittest.main()
@@ -68,8 +68,11 @@ int CVHFnr_schwarz_cond(int *shls, CVHFOpt *opt,
         assert(j < n);
         assert(k < n);
         assert(l < n);
+// q_cond holds the inverse of the Schwarz bound 1/sqrt(max|(ij|ij)|), see
+// CVHFsetnr_direct_scf.  The pairs dropped from the shell pair list have
+// infinite q_cond and are screened out.
         double qijkl = opt->q_cond[i*n+j] * opt->q_cond[k*n+l];
-        return qijkl > opt->direct_scf_cutoff;
+        return qijkl * opt->direct_scf_cutoff < 1;
 }
 
 int CVHFnrs8_prescreen(int *shls, CVHFOpt *opt,
@@ -161,6 +164,19 @@ void CVHFsetnr_direct_scf(CVHFOpt *opt, int *atm, int natm,
         }
 }
 
+/*
+ * Take q_cond[nbas,nbas] computed elsewhere, e.g. from the shared shell pair
+ * list, instead of evaluating it in CVHFsetnr_direct_scf.
+ */
+void CVHFset_q_cond(CVHFOpt *opt, double *q_cond, int nbas)
+{
+        if (opt->q_cond) {
+                free(opt->q_cond);
+        }
+        opt->q_cond = (double *)malloc(sizeof(double) * nbas*nbas);
+        memcpy(opt->q_cond, q_cond, sizeof(double) * nbas*nbas);
+}
+
 void CVHFsetnr_direct_scf_dm(CVHFOpt *opt, double *dm, int nset,
                              int *atm, int natm, int *bas, int nbas, double *env)
 {
@@ -36,6 +36,7 @@ int CVHFr_vknoscreen(int *shls, CVHFOpt *opt,
 
 void CVHFsetnr_direct_scf(CVHFOpt *opt, int *atm, int natm,
                           int *bas, int nbas, double *env);
+void CVHFset_q_cond(CVHFOpt *opt, double *q_cond, int nbas);
 void CVHFsetnr_direct_scf_dm(CVHFOpt *opt, double *dm, int nset,
                              int *atm, int natm, int *bas, int nbas, double *env);
 
@@ -167,8 +167,9 @@ from pyscf.mcscf import mc1step_symm
 from pyscf.mcscf import casci
 from pyscf.mcscf import casci_symm
 from pyscf.mcscf import addons
-from pyscf.mcscf import casci_uhf
-from pyscf.mcscf import mc1step_uhf
+from pyscf import lib
+casci_uhf = lib.lazy_import('pyscf.mcscf.casci_uhf')
+mc1step_uhf = lib.lazy_import('pyscf.mcscf.mc1step_uhf')
 from pyscf.mcscf.addons import *
 from pyscf.mcscf import chkfile
 
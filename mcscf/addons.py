@@ -650,8 +650,17 @@ def state_specific_(casscf, state=1):
     return casscf
 state_specific = state_specific_
 
-def state_average_mix_(casscf, fcisolvers, weights=(0.5,0.5)):
+def state_average_mix_(casscf, fcisolvers, weights=(0.5,0.5), nproc=1):
     '''State-average CASSCF over multiple FCI solvers.
+
+    Kwargs:
+        nproc : int
+            The FCI problems of different solvers (e.g. for different irreps
+            or spins) are independent.  They are solved concurrently in nproc
+            processes if nproc > 1 (see :func:`lib.map_with_processes`).
+            The solvers are pickled to the worker processes, therefore they
+            cannot be modified by closures (e.g. fci.addons.fix_spin_) when
+            nproc > 1.  The results agree with the serial solves.
     '''
     fcibase_class = fcisolvers[0].__class__
 #    if fcibase_class.__name__ == 'FakeCISolver':
@@ -687,6 +696,22 @@ def state_average_mix_(casscf, fcisolvers, weights=(0.5,0.5)):
             nelec = numpy.sum(nelec)
             nelec = (nelec+solver.spin)//2, (nelec-solver.spin)//2
         return nelec
+    def solve(h1, h2, norb, nelec, ci0, **kwargs):
+        if nproc > 1 and isinstance(kwargs.get('verbose'), logger.Logger):
+            kwargs['verbose'] = kwargs['verbose'].verbose
+        tasks = [(solver, h1, h2, norb, get_nelec(solver, nelec), c0, kwargs)
+                 for solver, c0 in loop_solver(fcisolvers, ci0)]
+        es = []
+        cs = []
+        results = lib.map_with_processes(_fcisolver_kernel, tasks, nproc)
+        for solver, (e, c) in zip(fcisolvers, results):
+            if solver.nroots == 1:
+                es.append(e)
+                cs.append(c)
+            else:
+                es.extend(e)
+                cs.extend(c)
+        return es, cs
 
     class FakeCISolver(fcibase_class):
         def kernel(self, h1, h2, norb, nelec, ci0=None, verbose=0, **kwargs):
@@ -695,17 +720,8 @@ def state_average_mix_(casscf, fcisolvers, weights=(0.5,0.5)):
                 log = verbose
             else:
                 log = logger.Logger(sys.stdout, verbose)
-            es = []
-            cs = []
-            for solver, c0 in loop_solver(fcisolvers, ci0):
-                e, c = solver.kernel(h1, h2, norb, get_nelec(solver, nelec), c0,
-                                     orbsym=self.orbsym, verbose=log, **kwargs)
-                if solver.nroots == 1:
-                    es.append(e)
-                    cs.append(c)
-                else:
-                    es.extend(e)
-                    cs.extend(c)
+            es, cs = solve(h1, h2, norb, nelec, ci0,
+                           orbsym=self.orbsym, verbose=log, **kwargs)
             ss, multip = collect(solver.spin_square(c0, norb, get_nelec(solver, nelec))
                                  for solver, c0 in loop_civecs(fcisolvers, cs))
             for i, ei in enumerate(es):
@@ -713,17 +729,8 @@ def state_average_mix_(casscf, fcisolvers, weights=(0.5,0.5)):
             return numpy.einsum('i,i', numpy.array(es), weights), cs
 
         def approx_kernel(self, h1, h2, norb, nelec, ci0=None, **kwargs):
-            es = []
-            cs = []
-            for solver, c0 in loop_solver(fcisolvers, ci0):
-                e, c = solver.kernel(h1, h2, norb, get_nelec(solver, nelec), c0,
-                                     orbsym=self.orbsym, **kwargs)
-                if solver.nroots == 1:
-                    es.append(e)
-                    cs.append(c)
-                else:
-                    es.extend(e)
-                    cs.extend(c)
+            es, cs = solve(h1, h2, norb, nelec, ci0,
+                           orbsym=self.orbsym, **kwargs)
             return numpy.einsum('i,i->', es, weights), cs
         def make_rdm1(self, ci0, norb, nelec, **kwargs):
             dm1 = 0
@@ -756,6 +763,42 @@ def state_average_mix_(casscf, fcisolvers, weights=(0.5,0.5)):
     return casscf
 state_average_mix = state_average_mix_
 
+def _fcisolver_kernel(args):
+    solver, h1, h2, norb, nelec, ci0, kwargs = args
+    return solver.kernel(h1, h2, norb, nelec, ci0, **kwargs)
+
+_RUN_PARALLEL_KEYS = ('e_tot', 'e_cas', 'ci', 'mo_coeff', 'mo_energy', 'converged')
+def _run_kernel(mc):
+    mc.kernel()
+    return dict((k, getattr(mc, k)) for k in _RUN_PARALLEL_KEYS if hasattr(mc, k))
+
+def run_parallel(mcs, nproc=None):
+    '''Run the kernel of the CASCI/CASSCF objects mcs concurrently in nproc
+    processes (see :func:`lib.map_with_processes`), e.g. the points of a
+    potential energy scan or the calculations of different symmetries or
+    spins.  The calculations must be independent.  The objects are pickled
+    to the worker processes.  The results agree with the serial runs
+    [mc.kernel() for mc in mcs].
+
+    Returns:
+        The list mcs.  The results (e_tot, e_cas, ci, mo_coeff, mo_energy,
+        converged) are saved in each object.
+
+    Examples:
+
+    >>> mcs = [mcscf.CASSCF(scf.RHF(mol).run(), 6, 6) for mol in mols]
+    >>> mcscf.run_parallel(mcs, nproc=4)
+    >>> print([mc.e_tot for mc in mcs])
+    '''
+    chkfiles = [mc.chkfile for mc in mcs if getattr(mc, 'chkfile', None)]
+    if (nproc is None or nproc > 1) and len(set(chkfiles)) < len(chkfiles):
+        logger.warn(mcs[0], 'run_parallel: several objects write to the same '
+                    'chkfile concurrently.  Assign a chkfile to each object.')
+    results = lib.map_with_processes(_run_kernel, mcs, nproc)
+    for mc, res in zip(mcs, results):
+        mc.__dict__.update(res)
+    return mcs
+
 def hot_tuning_(casscf, configfile=None):
     '''Allow you to tune CASSCF parameters on the runtime
     '''
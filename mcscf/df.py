@@ -63,6 +63,7 @@ def density_fit(casscf, auxbasis=None, with_df=None):
             self.__dict__.update(casscf.__dict__)
             #self.grad_update_dep = 0
             self.with_df = with_df
+            self._eris_cache = None
             self._keys = self._keys.union(['with_df'])
 
         def dump_flags(self):
@@ -71,6 +72,10 @@ def density_fit(casscf, auxbasis=None, with_df=None):
 
         def ao2mo(self, mo_coeff):
             if self.with_df:
+                if getattr(self, 'incremental_eris', False):
+                    if self._eris_cache is None:
+                        self._eris_cache = _ERISCache()
+                    return _ERIS(self, mo_coeff, self.with_df, self._eris_cache)
                 return _ERIS(self, mo_coeff, self.with_df)
             else:
                 return casscf_class.ao2mo(self, mo_coeff)
@@ -219,17 +224,19 @@ def approx_hessian(casscf, auxbasis=None, with_df=None):
 
 
 class _ERIS(object):
-    def __init__(self, casscf, mo, with_df):
+    '''MO integrals for CASSCF from density fitting.  If cache is given, the
+    3-index integrals in MO representation are kept in the cache.  The MO
+    integrals of a rotated set of orbitals are generated from the cached
+    3-index integrals.  See _ERISCache.
+    '''
+    def __init__(self, casscf, mo, with_df, cache=None):
         import gc
         gc.collect()
         log = logger.Logger(casscf.stdout, casscf.verbose)
 
-        mol = casscf.mol
         nao, nmo = mo.shape
         ncore = casscf.ncore
         ncas = casscf.ncas
-        nocc = ncore + ncas
-        naoaux = with_df.get_naoaux()
 
         mem_incore, mem_outcore, mem_basic = _mem_usage(ncore, ncas, nmo)
         mem_now = lib.current_memory()[0]
@@ -238,83 +245,212 @@ class _ERIS(object):
             log.warn('Calculation needs %d MB memory, over CASSCF.max_memory (%d MB) limit',
                      (mem_basic+mem_now)/.9, casscf.max_memory)
 
-        t1 = t0 = (time.clock(), time.time())
         self.feri = lib.H5TmpFile()
         self.ppaa = self.feri.create_dataset('ppaa', (nmo,nmo,ncas,ncas), 'f8')
         self.papa = self.feri.create_dataset('papa', (nmo,ncas,nmo,ncas), 'f8')
-        self.j_pc = numpy.zeros((nmo,ncore))
-        k_cp = numpy.zeros((ncore,nmo))
 
-        mo = numpy.asarray(mo, order='F')
+        u = None
+        if cache is not None:
+            u = cache.rotation(with_df, mo)
+        if u is None:
+            _trans_df(self, casscf, mo, with_df, cache, max_memory, log)
+        else:
+            _rotate_df(self, casscf, u, cache, max_memory, log)
+        self.feri.flush()
+
+def _trans_df(eris, casscf, mo, with_df, cache, max_memory, log):
+    '''AO->MO transformation of the DF integrals'''
+    mol = casscf.mol
+    nao, nmo = mo.shape
+    ncore = casscf.ncore
+    ncas = casscf.ncas
+    nocc = ncore + ncas
+    naoaux = with_df.get_naoaux()
+
+    t1 = t0 = (time.clock(), time.time())
+    eris.j_pc = numpy.zeros((nmo,ncore))
+    k_cp = numpy.zeros((ncore,nmo))
+
+    mo = numpy.asarray(mo, order='F')
+    if cache is None:
         _tmpfile1 = tempfile.NamedTemporaryFile(dir=lib.param.TMPDIR)
         fxpp = h5py.File(_tmpfile1.name)
-        bufpa = numpy.empty((naoaux,nmo,ncas))
-        bufs1 = numpy.empty((with_df.blockdim,nmo,nmo))
-        fmmm = _ao2mo.libao2mo.AO2MOmmm_nr_s2_iltj
-        fdrv = _ao2mo.libao2mo.AO2MOnr_e2_drv
-        ftrans = _ao2mo.libao2mo.AO2MOtranse2_nr_s2
-        fxpp_keys = []
-        b0 = 0
-        for k, eri1 in enumerate(with_df.loop()):
-            naux = eri1.shape[0]
-            bufpp = bufs1[:naux]
-            fdrv(ftrans, fmmm,
-                 bufpp.ctypes.data_as(ctypes.c_void_p),
-                 eri1.ctypes.data_as(ctypes.c_void_p),
-                 mo.ctypes.data_as(ctypes.c_void_p),
-                 ctypes.c_int(naux), ctypes.c_int(nao),
-                 (ctypes.c_int*4)(0, nmo, 0, nmo),
-                 ctypes.c_void_p(0), ctypes.c_int(0))
-            fxpp_keys.append([str(k), b0, b0+naux])
-            fxpp[str(k)] = bufpp.transpose(1,2,0)
-            bufpa[b0:b0+naux] = bufpp[:,:,ncore:nocc]
-            bufd = numpy.einsum('kii->ki', bufpp)
-            self.j_pc += numpy.einsum('ki,kj->ij', bufd, bufd[:,:ncore])
-            k_cp += numpy.einsum('kij,kij->ij', bufpp[:,:ncore], bufpp[:,:ncore])
-            b0 += naux
-            t1 = log.timer_debug1('j_pc and k_pc', *t1)
-        self.k_pc = k_cp.T.copy()
-        bufs1 = bufpp = None
-        t1 = log.timer('density fitting ao2mo pass1', *t0)
-
-        mem_now = lib.current_memory()[0]
-        nblk = int(max(8, min(nmo, ((max_memory-mem_now)*1e6/8-bufpa.size)/(ncas**2*nmo))))
-        bufs1 = numpy.empty((nblk,ncas,nmo,ncas))
-        dgemm = lib.numpy_helper._dgemm
-        for p0, p1 in prange(0, nmo, nblk):
-            #tmp = numpy.dot(bufpa[:,p0:p1].reshape(naoaux,-1).T,
-            #                bufpa.reshape(naoaux,-1))
-            tmp = bufs1[:p1-p0]
-            dgemm('T', 'N', (p1-p0)*ncas, nmo*ncas, naoaux,
-                  bufpa.reshape(naoaux,-1), bufpa.reshape(naoaux,-1),
-                  tmp.reshape(-1,nmo*ncas), 1, 0, p0*ncas, 0, 0)
-            self.papa[p0:p1] = tmp.reshape(p1-p0,ncas,nmo,ncas)
-        bufaa = bufpa[:,ncore:nocc,:].copy().reshape(-1,ncas**2)
-        bufs1 = bufpa = None
-        t1 = log.timer('density fitting papa pass2', *t1)
-
-        mem_now = lib.current_memory()[0]
-        nblk = int(max(8, min(nmo, (max_memory-mem_now)*1e6/8/(nmo*naoaux+ncas**2*nmo))))
-        bufs1 = numpy.empty((nblk,nmo,naoaux))
-        bufs2 = numpy.empty((nblk,nmo,ncas,ncas))
-        for p0, p1 in prange(0, nmo, nblk):
-            nrow = p1 - p0
-            buf = bufs1[:nrow]
-            tmp = bufs2[:nrow].reshape(-1,ncas**2)
-            for key, col0, col1 in fxpp_keys:
-                buf[:nrow,:,col0:col1] = fxpp[key][p0:p1]
-            lib.dot(buf.reshape(-1,naoaux), bufaa, 1, tmp)
-            self.ppaa[p0:p1] = tmp.reshape(p1-p0,nmo,ncas,ncas)
-        bufs1 = bufs2 = buf = None
-        t1 = log.timer('density fitting ppaa pass2', *t1)
-
+    else:
+        fxpp = cache.reset(with_df, mo, casscf._scf.get_ovlp())
+    bufpa = numpy.empty((naoaux,nmo,ncas))
+    bufs1 = numpy.empty((with_df.blockdim,nmo,nmo))
+    fmmm = _ao2mo.libao2mo.AO2MOmmm_nr_s2_iltj
+    fdrv = _ao2mo.libao2mo.AO2MOnr_e2_drv
+    ftrans = _ao2mo.libao2mo.AO2MOtranse2_nr_s2
+    fxpp_keys = []
+    b0 = 0
+    for k, eri1 in enumerate(with_df.loop()):
+        naux = eri1.shape[0]
+        bufpp = bufs1[:naux]
+        fdrv(ftrans, fmmm,
+             bufpp.ctypes.data_as(ctypes.c_void_p),
+             eri1.ctypes.data_as(ctypes.c_void_p),
+             mo.ctypes.data_as(ctypes.c_void_p),
+             ctypes.c_int(naux), ctypes.c_int(nao),
+             (ctypes.c_int*4)(0, nmo, 0, nmo),
+             ctypes.c_void_p(0), ctypes.c_int(0))
+        fxpp_keys.append([str(k), b0, b0+naux])
+        fxpp[str(k)] = bufpp.transpose(1,2,0)
+        bufpa[b0:b0+naux] = bufpp[:,:,ncore:nocc]
+        bufd = numpy.einsum('kii->ki', bufpp)
+        eris.j_pc += numpy.einsum('ki,kj->ij', bufd, bufd[:,:ncore])
+        k_cp += numpy.einsum('kij,kij->ij', bufpp[:,:ncore], bufpp[:,:ncore])
+        b0 += naux
+        t1 = log.timer_debug1('j_pc and k_pc', *t1)
+    eris.k_pc = k_cp.T.copy()
+    bufs1 = bufpp = None
+    t1 = log.timer('density fitting ao2mo pass1', *t0)
+
+    _make_papa(eris.papa, bufpa, max_memory)
+    bufaa = bufpa[:,ncore:nocc,:].copy().reshape(-1,ncas**2)
+    bufpa = None
+    t1 = log.timer('density fitting papa pass2', *t1)
+
+    mem_now = lib.current_memory()[0]
+    nblk = int(max(8, min(nmo, (max_memory-mem_now)*1e6/8/(nmo*naoaux+ncas**2*nmo))))
+    bufs1 = numpy.empty((nblk,nmo,naoaux))
+    bufs2 = numpy.empty((nblk,nmo,ncas,ncas))
+    for p0, p1 in prange(0, nmo, nblk):
+        nrow = p1 - p0
+        buf = bufs1[:nrow]
+        tmp = bufs2[:nrow].reshape(-1,ncas**2)
+        for key, col0, col1 in fxpp_keys:
+            buf[:nrow,:,col0:col1] = fxpp[key][p0:p1]
+        lib.dot(buf.reshape(-1,naoaux), bufaa, 1, tmp)
+        eris.ppaa[p0:p1] = tmp.reshape(p1-p0,nmo,ncas,ncas)
+    bufs1 = bufs2 = buf = None
+    t1 = log.timer('density fitting ppaa pass2', *t1)
+
+    if cache is None:
         fxpp.close()
-        self.feri.flush()
-
-        dm_core = numpy.dot(mo[:,:ncore], mo[:,:ncore].T)
-        vj, vk = casscf.get_jk(mol, dm_core)
-        self.vhf_c = reduce(numpy.dot, (mo.T, vj*2-vk, mo))
-        t0 = log.timer('density fitting ao2mo', *t0)
+    else:
+        cache.keys = fxpp_keys
+
+    dm_core = numpy.dot(mo[:,:ncore], mo[:,:ncore].T)
+    vj, vk = casscf.get_jk(mol, dm_core)
+    eris.vhf_c = reduce(numpy.dot, (mo.T, vj*2-vk, mo))
+    t0 = log.timer('density fitting ao2mo', *t0)
+
+def _rotate_df(eris, casscf, u, cache, max_memory, log):
+    '''MO integrals of the orbitals mo_ref*u from the cached 3-index
+    integrals (L|pq) of the reference orbitals mo_ref.
+
+    (L|p'i') = u_{pp'} (L|pq) u_{qi'} is only needed for the occupied
+    orbitals i'.  ppaa, j_pc and vhf_c are obtained by rotating
+    (pq|t'u') = (pq|L) (L|t'u') and (pq|c'c'),  which costs
+    nmo^2*naux*(ncas^2+ncore) instead of the AO->MO transformation of the
+    DF integrals.
+    '''
+    t1 = t0 = (time.clock(), time.time())
+    nmo = u.shape[1]
+    ncore = casscf.ncore
+    ncas = casscf.ncas
+    nocc = ncore + ncas
+    naoaux = cache.keys[-1][2]
+    uocc = numpy.asarray(u[:,:nocc], order='C')
+
+# xpp holds (pq|t'u') and (pq|c'c') with p,q in the reference orbitals
+    ncol = ncas**2 + ncore
+    xpp = numpy.zeros((nmo,nmo,ncol))
+    vk = numpy.zeros((nmo,nmo))
+    k_cp = numpy.zeros((ncore,nmo))
+    bufpa = numpy.empty((naoaux,nmo,ncas))
+    for key, b0, b1 in cache.keys:
+        naux = b1 - b0
+        buf = numpy.asarray(cache.feri[key])
+# (L|p'i') stored as [p',i',L].  buf is symmetric in the first two indices
+        tmp = lib.dot(uocc.T, buf.reshape(nmo,-1)).reshape(nocc,nmo,naux)
+        tmp = numpy.asarray(tmp.transpose(1,0,2), order='C')
+        bufoo = lib.dot(u.T, tmp.reshape(nmo,-1)).reshape(nmo,nocc,naux)
+        bufpa[b0:b1] = bufoo[:,ncore:nocc].transpose(2,0,1)
+        bufc = bufoo[:,:ncore]
+        k_cp += numpy.einsum('pck,pck->cp', bufc, bufc)
+        bufc = bufc.reshape(nmo,-1)
+        vk += lib.dot(bufc, bufc.T)
+
+        w = numpy.empty((naux,ncol))
+        w[:,:ncas**2] = bufoo[ncore:nocc,ncore:nocc].reshape(ncas**2,naux).T
+        w[:,ncas**2:] = bufoo[numpy.arange(ncore),numpy.arange(ncore)].T
+        lib.dot(buf.reshape(nmo*nmo,naux), w, 1, xpp.reshape(nmo*nmo,ncol), 1)
+        t1 = log.timer_debug1('rotate DF integrals [%d:%d]'%(b0,b1), *t1)
+    buf = tmp = bufoo = bufc = w = None
+    eris.k_pc = k_cp.T.copy()
+    t1 = log.timer('rotate DF integrals pass1', *t0)
+
+    _make_papa(eris.papa, bufpa, max_memory)
+    bufpa = None
+    t1 = log.timer('rotate DF integrals papa', *t1)
+
+    mem_now = lib.current_memory()[0]
+    nblk = int(max(1, min(ncol, (max_memory-mem_now)*1e6/8/(nmo**2*2))))
+    for x0, x1 in prange(0, ncol, nblk):
+        tmp = numpy.asarray(xpp[:,:,x0:x1], order='C')
+        tmp = lib.dot(u.T, tmp.reshape(nmo,-1)).reshape(nmo,nmo,x1-x0)
+        tmp = numpy.asarray(tmp.transpose(1,0,2), order='C')
+        xpp[:,:,x0:x1] = lib.dot(u.T, tmp.reshape(nmo,-1)).reshape(nmo,nmo,x1-x0)
+    tmp = None
+    eris.ppaa[:] = xpp[:,:,:ncas**2].reshape(nmo,nmo,ncas,ncas)
+    jc = xpp[:,:,ncas**2:]
+    eris.j_pc = numpy.einsum('ppc->pc', jc).copy()
+    eris.vhf_c = jc.sum(axis=2) * 2 - vk
+    xpp = jc = None
+    t1 = log.timer('rotate DF integrals ppaa', *t1)
+    log.timer('density fitting ao2mo (rotate cached integrals)', *t0)
+
+def _make_papa(papa, bufpa, max_memory):
+    naoaux, nmo, ncas = bufpa.shape
+    mem_now = lib.current_memory()[0]
+    nblk = int(max(8, min(nmo, ((max_memory-mem_now)*1e6/8-bufpa.size)/(ncas**2*nmo))))
+    bufs1 = numpy.empty((nblk,ncas,nmo,ncas))
+    dgemm = lib.numpy_helper._dgemm
+    for p0, p1 in prange(0, nmo, nblk):
+        #tmp = numpy.dot(bufpa[:,p0:p1].reshape(naoaux,-1).T,
+        #                bufpa.reshape(naoaux,-1))
+        tmp = bufs1[:p1-p0]
+        dgemm('T', 'N', (p1-p0)*ncas, nmo*ncas, naoaux,
+              bufpa.reshape(naoaux,-1), bufpa.reshape(naoaux,-1),
+              tmp.reshape(-1,nmo*ncas), 1, 0, p0*ncas, 0, 0)
+        papa[p0:p1] = tmp.reshape(p1-p0,ncas,nmo,ncas)
+
+class _ERISCache(object):
+    '''3-index DF integrals (L|pq) in the MO representation of the reference
+    orbitals mo_ref.  In the CASSCF macro iterations, the orbitals are
+    rotations mo = mo_ref * u of the reference orbitals.  The MO integrals of
+    mo are generated by rotating the cached integrals (see _rotate_df).  The
+    cache is rebuilt when mo is not a rotation of mo_ref or with_df is
+    changed.
+    '''
+    def __init__(self):
+        self.with_df = None
+        self.mo_ref = None
+        self.ovlp = None
+        self.feri = None
+        self.keys = []
+
+    def reset(self, with_df, mo_ref, ovlp):
+        self.with_df = with_df
+        self.mo_ref = numpy.array(mo_ref)
+        self.ovlp = ovlp
+        self.feri = lib.H5TmpFile()
+        self.keys = []
+        return self.feri
+
+    def rotation(self, with_df, mo, tol=1e-7):
+        '''The rotation u = mo_ref^T S mo.  Return None if the cache can not
+        be used for mo.
+        '''
+        if (with_df is not self.with_df or len(self.keys) == 0 or
+            mo.shape != self.mo_ref.shape):
+            return None
+        u = reduce(numpy.dot, (self.mo_ref.T, self.ovlp, mo))
+        if abs(numpy.dot(u.T, u) - numpy.eye(u.shape[1])).max() > tol:
+            return None
+        return u
 
 def _mem_usage(ncore, ncas, nmo):
     nvir = nmo - ncore
@@ -633,6 +633,12 @@ class CASSCF(casci.CASCI):
         self.with_dep4 = False
         self.callback = None
         self.chk_ci = False
+# incremental_eris: the MO integrals of the macro iterations are generated by
+#   rotating the cached 3-index DF integrals of the previous orbitals instead
+#   of the AO->MO transformation.  Without density fitting, the macro
+#   iterations are first converged with the DF integrals then finished with
+#   the exact integrals.
+        self.incremental_eris = False
 
         self.fcisolver.max_cycle = 50
 
@@ -679,6 +685,7 @@ class CASSCF(casci.CASCI):
         log.info('max_memory %d MB (current use %d MB)',
                  self.max_memory, lib.current_memory()[0])
         log.info('internal_rotation = %s', self.internal_rotation)
+        log.info('incremental_eris = %s', self.incremental_eris)
         try:
             self.fcisolver.dump_flags(self.verbose)
         except AttributeError:
@@ -701,6 +708,9 @@ class CASSCF(casci.CASCI):
             self.check_sanity()
         self.dump_flags()
 
+        if self.incremental_eris and getattr(self, 'with_df', None) is None:
+            mo_coeff, ci0 = self._kernel_df_guess(mo_coeff, ci0, callback, _kern)
+
         self.converged, self.e_tot, self.e_cas, self.ci, \
                 self.mo_coeff, self.mo_energy = \
                 _kern(self, mo_coeff,
@@ -710,6 +720,23 @@ class CASSCF(casci.CASCI):
         self._finalize()
         return self.e_tot, self.e_cas, self.ci, self.mo_coeff, self.mo_energy
 
+    def _kernel_df_guess(self, mo_coeff, ci0, callback, _kern):
+        '''Converge the orbitals with the incremental DF integrals.  They are
+        the initial guess of the exact CASSCF.
+        '''
+        from pyscf.mcscf import df
+        log = logger.Logger(self.stdout, self.verbose)
+        log.info('Optimize orbitals with incremental DF integrals')
+        mc = df.density_fit(copy.copy(self))
+        mc.verbose = log.verbose
+        conv, e_tot, e_cas, ci0, mo_coeff, mo_energy = \
+                _kern(mc, mo_coeff, tol=self.conv_tol,
+                      conv_tol_grad=self.conv_tol_grad,
+                      ci0=ci0, callback=callback, verbose=log)
+        log.info('DF-CASSCF energy = %.15g  converged = %s', e_tot, conv)
+        log.info('Continue CASSCF with exact integrals')
+        return mo_coeff, ci0
+
     def mc1step(self, mo_coeff=None, ci0=None, callback=None):
         return self.kernel(mo_coeff, ci0, callback)
 
@@ -49,6 +49,9 @@ class CASSCF(mc1step.CASSCF):
             wfnsym = symm.irrep_id2name(self.mol.groupname, wfnsym)
             log.info('Active space CI wfn symmetry = %s', wfnsym)
 
+        if self.incremental_eris and getattr(self, 'with_df', None) is None:
+            mo_coeff, ci0 = self._kernel_df_guess(mo_coeff, ci0, callback, _kern)
+
         self.converged, self.e_tot, self.e_cas, self.ci, \
                 self.mo_coeff, self.mo_energy = \
                 _kern(self, mo_coeff,
@@ -9,6 +9,7 @@ import numpy
 import h5py
 from pyscf import lib
 from pyscf.lib import logger
+from pyscf.lib import memplan
 from pyscf import ao2mo
 from pyscf.ao2mo import _ao2mo
 from pyscf.ao2mo import outcore
@@ -91,7 +92,8 @@ def trans_e1_outcore(mol, mo, ncore, ncas, erifile,
     ao_loc = numpy.array(mol.ao_loc_nr(), dtype=numpy.int32)
     shranges = outcore.guess_shell_ranges(mol, True, aobuflen, None, ao_loc)
     ao2mopt = _ao2mo.AO2MOpt(mol, 'cint2e_sph',
-                             'CVHFnr_schwarz_cond', 'CVHFsetnr_direct_scf')
+                             'CVHFnr_schwarz_cond', 'CVHFsetnr_direct_scf',
+                             mol.shell_pair_list())
     nstep = len(shranges)
     paapp = 0
     maxbuflen = max([x[2] for x in shranges])
@@ -260,9 +262,9 @@ class _ERIS(object):
         mem_now = lib.current_memory()[0]
 
         eri = casscf._scf._eri
-        if (method == 'incore' and eri is not None and
-            (mem_incore+mem_now < casscf.max_memory*.9) or
-            mol.incore_anyway):
+        if memplan.choose_path(mem_incore, mem_now, casscf.max_memory*.9,
+                               method == 'incore' and eri is not None,
+                               mol.incore_anyway) == 'incore':
             if eri is None:
                 from pyscf.scf import _vhf
                 eri = _vhf.int2e_sph(mol._atm, mol._bas, mol._env)
@@ -154,6 +154,34 @@ class KnowValues(unittest.TestCase):
         e = mc.kernel()[0]
         self.assertAlmostEqual(e, -108.70065770892457, 7)
 
+    def test_state_average_mix_parallel(self):
+        solver1 = fci.direct_spin1_symm.FCI(mol)
+        solver1.wfnsym = 'A1g'
+        solver1.nroots = 2
+        solver2 = fci.direct_spin1_symm.FCI(mol)
+        solver2.wfnsym = 'A2g'
+        solver2.spin = 2
+        mc = mcscf.CASSCF(mfr, 4, 4)
+        mcscf.state_average_mix_(mc, [solver1, solver2], (.25,.25,.5))
+        e0 = mc.kernel()[0]
+        mc = mcscf.CASSCF(mfr, 4, 4)
+        mcscf.state_average_mix_(mc, [solver1, solver2], (.25,.25,.5), nproc=2)
+        e1 = mc.kernel()[0]
+        self.assertAlmostEqual(e0, e1, 9)
+
+    def test_run_parallel(self):
+        mfs = []
+        for b in (1.4, 1.6):
+            mol1 = gto.M(atom=[['N',(0,0,-b/2)], ['N',(0,0,b/2)]],
+                         basis='ccpvdz', verbose=0)
+            mfs.append(scf.RHF(mol1).run())
+        e0 = [mcscf.CASSCF(mf, 4, 4).kernel()[0] for mf in mfs]
+        mcs = [mcscf.CASSCF(mf, 4, 4) for mf in mfs]
+        mcscf.run_parallel(mcs, nproc=2)
+        for e, mc in zip(e0, mcs):
+            self.assertAlmostEqual(e, mc.e_tot, 9)
+            self.assertTrue(mc.converged)
+
     def test_project_init_guess(self):
         b = 1.5
         mol1 = gto.M(
@@ -134,6 +134,32 @@ class KnowValues(unittest.TestCase):
         self.assertTrue(numpy.allclose(eri0[:,:,ncore:nocc,ncore:nocc], eris.ppaa))
         self.assertTrue(numpy.allclose(eri0[:,ncore:nocc,:,ncore:nocc], eris.papa))
 
+    def test_incremental_eris(self):
+        mf = scf.density_fit(m)
+        mf.max_memory = 100
+        mf.kernel()
+        mc = mcscf.DFCASSCF(mf, 4, 4)
+        mc.incremental_eris = True
+        nmo = mc.mo_coeff.shape[1]
+        numpy.random.seed(1)
+        x = numpy.random.random((nmo,nmo)) * .1
+        u = scipy.linalg.expm(x - x.T)
+        mo1 = numpy.dot(mc.mo_coeff, u)
+        eris0 = mc.ao2mo(mc.mo_coeff)
+        eris1 = mc.ao2mo(mo1)
+        mc.incremental_eris = False
+        eris_ref = mc.ao2mo(mo1)
+        self.assertTrue(numpy.allclose(eris1.ppaa, eris_ref.ppaa))
+        self.assertTrue(numpy.allclose(eris1.papa, eris_ref.papa))
+        self.assertTrue(numpy.allclose(eris1.j_pc, eris_ref.j_pc))
+        self.assertTrue(numpy.allclose(eris1.k_pc, eris_ref.k_pc))
+        self.assertTrue(numpy.allclose(eris1.vhf_c, eris_ref.vhf_c))
+
+        mc = mcscf.CASSCF(m, 4, 4)
+        mc.incremental_eris = True
+        emc = mc.mc1step()[0]
+        self.assertAlmostEqual(emc, -108.913786407955, 7)
+
     def test_assign_cderi(self):
         nao = molsym.nao_nr()
         w, u = scipy.linalg.eigh(mol.intor('cint2e_sph', aosym='s4'))
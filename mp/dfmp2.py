@@ -10,7 +10,6 @@ import time
 import numpy
 from pyscf import lib
 from pyscf.lib import logger
-from pyscf.ao2mo import _ao2mo
 #from pyscf.mp.mp2 import make_rdm1, make_rdm2, make_rdm1_ao
 
 
@@ -75,9 +74,7 @@ class MP2(lib.StreamObject):
         mo = numpy.asarray(mo_coeff, order='F')
         nmo = mo.shape[1]
         ijslice = (0, nocc, nocc, nmo)
-        Lov = None
-        for eri1 in self._scf.with_df.loop():
-            Lov = _ao2mo.nr_e2(eri1, mo, ijslice, aosym='s2', out=Lov)
+        for Lov in self._scf.with_df.loop_mo(mo, ijslice):
             yield Lov
 
 #    def make_rdm1(self, t2=None):
@@ -9,6 +9,7 @@ import warnings
 import numpy
 from pyscf import lib
 from pyscf.lib import logger
+from pyscf.lib import memplan
 from pyscf import ao2mo
 
 
@@ -175,9 +176,9 @@ class MP2(lib.StreamObject):
                      '(ia|jb) is computed based on the DF 3-tensor integrals.\n'
                      'You can switch to dfmp2.MP2 for the DF-MP2 implementation')
             eri = self._scf.with_df.ao2mo((co,cv,co,cv))
-        elif (self._scf._eri is not None and
-            mem_incore+mem_now < self.max_memory or
-            self.mol.incore_anyway):
+        elif memplan.choose_path(mem_incore, mem_now, self.max_memory,
+                                 self._scf._eri is not None,
+                                 self.mol.incore_anyway) == 'incore':
             if self._scf._eri is None:
                 eri = self.intor('cint2e_sph', aosym='s8')
             else:
@@ -86,23 +86,24 @@ Saved results
 
 '''
 
+from pyscf import lib
 from pyscf.scf import hf
 from pyscf.scf import hf as rhf
 from pyscf.scf import rohf
-from pyscf.scf import hf_symm
-from pyscf.scf import hf_symm as rhf_symm
 from pyscf.scf import uhf
-from pyscf.scf import uhf_symm
-from pyscf.scf import dhf
 from pyscf.scf import chkfile
 from pyscf.scf import addons
 from pyscf.scf import diis
 from pyscf.scf.uhf import spin_square
 from pyscf.scf.hf import get_init_guess
 from pyscf.scf.addons import *
-from pyscf.scf import x2c
-from pyscf.scf.x2c import sfx2c1e, sfx2c
-from pyscf.scf import newton_ah
+# Symmetry adapted, relativistic and second order SCF modules are imported
+# when they are used
+hf_symm = rhf_symm = lib.lazy_import('pyscf.scf.hf_symm')
+uhf_symm = lib.lazy_import('pyscf.scf.uhf_symm')
+dhf = lib.lazy_import('pyscf.scf.dhf')
+x2c = lib.lazy_import('pyscf.scf.x2c')
+newton_ah = lib.lazy_import('pyscf.scf.newton_ah')
 
 
 
@@ -157,7 +158,14 @@ def X2C(mol, *args):
 def density_fit(mf, auxbasis='weigend+etb', with_df=None):
     return mf.density_fit(auxbasis, with_df)
 
-newton = newton_ah.newton
+def sfx2c1e(mf):
+    '''Spin-free X2C.  See :func:`pyscf.scf.x2c.sfx2c1e`'''
+    return x2c.sfx2c1e(mf)
+sfx2c = sfx2c1e
+
+def newton(mf):
+    '''Second order SCF solver.  See :func:`pyscf.scf.newton_ah.newton`'''
+    return newton_ah.newton(mf)
 
 def fast_newton(mf, mo_coeff=None, mo_occ=None, dm0=None,
                 auxbasis=None, projectbasis=None, **newton_kwargs):
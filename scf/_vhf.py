@@ -14,15 +14,17 @@ def _fpointer(name):
 
 class VHFOpt(object):
     def __init__(self, mol, intor,
-                 prescreen='CVHFnoscreen', qcondname=None, dmcondname=None):
+                 prescreen='CVHFnoscreen', qcondname=None, dmcondname=None,
+                 shell_pairs=None):
         self._this = ctypes.POINTER(_CVHFOpt)()
         #print self._this.contents, expect ValueError: NULL pointer access
         self._intor = _fpointer(intor)
         self._cintopt = pyscf.lib.c_null_ptr()
         self._dmcondname = dmcondname
-        self.init_cvhf_direct(mol, intor, prescreen, qcondname)
+        self.init_cvhf_direct(mol, intor, prescreen, qcondname, shell_pairs)
 
-    def init_cvhf_direct(self, mol, intor, prescreen, qcondname):
+    def init_cvhf_direct(self, mol, intor, prescreen, qcondname,
+                         shell_pairs=None):
         c_atm = numpy.asarray(mol._atm, dtype=numpy.int32, order='C')
         c_bas = numpy.asarray(mol._bas, dtype=numpy.int32, order='C')
         c_env = numpy.asarray(mol._env, dtype=numpy.double, order='C')
@@ -41,11 +43,14 @@ class VHFOpt(object):
         self._this.contents.fprescreen = _fpointer(prescreen)
 
         if prescreen != 'CVHFnoscreen':
-            fsetqcond = getattr(libcvhf, qcondname)
-            fsetqcond(self._this,
-                      c_atm.ctypes.data_as(ctypes.c_void_p), natm,
-                      c_bas.ctypes.data_as(ctypes.c_void_p), nbas,
-                      c_env.ctypes.data_as(ctypes.c_void_p))
+            if shell_pairs is not None and qcondname == 'CVHFsetnr_direct_scf':
+                set_q_cond(libcvhf, self._this, shell_pairs)
+            else:
+                fsetqcond = getattr(libcvhf, qcondname)
+                fsetqcond(self._this,
+                          c_atm.ctypes.data_as(ctypes.c_void_p), natm,
+                          c_bas.ctypes.data_as(ctypes.c_void_p), nbas,
+                          c_env.ctypes.data_as(ctypes.c_void_p))
 
     @property
     def direct_scf_tol(self):
@@ -73,6 +78,18 @@ class VHFOpt(object):
                    c_bas.ctypes.data_as(ctypes.c_void_p), nbas,
                    c_env.ctypes.data_as(ctypes.c_void_p))
 
+def set_q_cond(lib, cvhfopt, shell_pairs):
+    '''Initialize the q_cond of the C optimizer with the Schwarz bounds of
+    the shell pair list.  Same to CVHFsetnr_direct_scf, the inverse of the
+    bound is stored.  Dropped pairs have infinite q_cond.  They are screened
+    out by CVHFnrs8_prescreen and CVHFnr_schwarz_cond, which compare the
+    bounds in the inverse convention.
+    '''
+    with numpy.errstate(divide='ignore'):
+        q_cond = numpy.asarray(1./shell_pairs.q_cond, order='C')
+    lib.CVHFset_q_cond(cvhfopt, q_cond.ctypes.data_as(ctypes.c_void_p),
+                       ctypes.c_int(q_cond.shape[0]))
+
 class _CVHFOpt(ctypes.Structure):
     _fields_ = [('nbas', ctypes.c_int),
                 ('_padding', ctypes.c_int),
@@ -13,7 +13,7 @@ from pyscf import lib
 from pyscf.gto import mole
 from pyscf.gto import moleintor
 from pyscf.lib import logger
-from pyscf import symm
+symm = lib.lazy_import('pyscf.symm')
 from pyscf.scf import hf
 
 
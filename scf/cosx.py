@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+r'''
+Seminumerical exchange (chain-of-spheres, COSX)
+
+The exchange matrix is evaluated with one electron coordinate on a DFT
+integration grid and the other one analytically
+
+    K_{mn} = \sum_g w_g \chi_m(g) \sum_s A_{ns}(g) F_{gs}
+    F_{gs} = \sum_l \chi_l(g) D_{ls}
+    A_{ns}(g) = \int \chi_n(r) \chi_s(r) / |r-g| dr
+
+The potential integrals A(g) are computed in batches of grid points, as the
+3-center integrals (ns|g) between the AO pairs and a set of point-like
+Gaussians placed on the grids.  The AO pairs are screened by the shell pair
+list of the molecule.  For each block of grids, only the shell pairs which
+contain a shell s of significant F_{gs} on the block are evaluated.  The grids
+on which \chi(g) or F(g) vanish are skipped.
+The cost scales as N_grids * N_pairs, which is much cheaper than the
+analytical exchange for large molecules.
+
+Ref:
+    F. Neese, F. Wennmohs, A. Hansen, U. Becker, Chem. Phys. 356, 98 (2009)
+'''
+
+import time
+import numpy
+from pyscf import lib
+from pyscf import gto
+from pyscf.lib import logger
+from pyscf.scf import hf
+from pyscf.scf import _vhf
+from pyscf.dft import numint
+from pyscf.dft import gen_grid
+from pyscf.df import incore
+
+# The exponent of the point-like Gaussians on the grids
+POINT_EXPONENT = 1e16
+
+def fakemol_for_grids(mol, coords, expnt=POINT_EXPONENT):
+    r'''A Mole object which has one normalized s-type Gaussian of large exponent
+    on each grid point.  The 3-center integrals (ij|g) between mol and the
+    fakemol are the potential integrals \int ij(r) / |r-g| dr.
+    '''
+    coords = numpy.asarray(coords, order='C')
+    ngrids = len(coords)
+    fakeatm = numpy.zeros((ngrids,gto.ATM_SLOTS), dtype=numpy.int32)
+    fakebas = numpy.zeros((ngrids,gto.BAS_SLOTS), dtype=numpy.int32)
+    fakeenv = [coords.ravel(), [expnt, 0]]
+    ptr = ngrids * 3
+    fakeatm[:,gto.PTR_COORD] = numpy.arange(0, ptr, 3)
+    fakebas[:,gto.ATOM_OF] = numpy.arange(ngrids)
+    fakebas[:,gto.NPRIM_OF] = 1
+    fakebas[:,gto.NCTR_OF] = 1
+    fakebas[:,gto.PTR_EXP] = ptr
+    fakebas[:,gto.PTR_COEFF] = ptr + 1
+# 1/(2 sqrt(pi)) is the normalization factor of the s-type real spherical
+# harmonic.  The point charge has unit integral \int g(r) dr = 1
+    fakeenv[1][1] = 1 / (2*numpy.sqrt(numpy.pi) *
+                         gto.mole._gaussian_int(2, expnt))
+    fakemol = gto.Mole()
+    fakemol._atm = fakeatm
+    fakemol._bas = fakebas
+    fakemol._env = numpy.hstack(fakeenv)
+    fakemol._built = True
+    return fakemol
+
+def get_k(mol, dm, hermi=1, grids=None, max_memory=2000, cutoff=1e-11,
+          verbose=None):
+    r'''Seminumerical exchange matrix
+
+    Args:
+        mol : an instance of :class:`Mole`
+        dm : 2D array or a list of 2D arrays
+            Density matrices
+
+    Kwargs:
+        hermi : int
+            Whether K matrix is hermitian
+
+            | 0 : no hermitian or symmetric
+            | 1 : hermitian
+        grids : an instance of :class:`gen_grid.Grids`
+            Grids for the numerical integration.  By default, level 1 grids
+            are generated.
+        cutoff : float
+            The grids on which |w \chi| * |F| < cutoff are skipped.
+
+    Returns:
+        K matrix of the same shape as dm
+    '''
+    if verbose is None:
+        verbose = mol.verbose
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(mol.stdout, verbose)
+    t0 = (time.clock(), time.time())
+    if grids is None:
+        grids = gen_grid.Grids(mol)
+        grids.level = 1
+    if grids.coords is None:
+        grids.build(mol)
+
+    dm = numpy.asarray(dm)
+    nao = dm.shape[-1]
+    dms = dm.reshape(-1,nao,nao)
+    nset = len(dms)
+    nao_pair = nao * (nao+1) // 2
+    ngrids = grids.weights.size
+
+    shell_pairs = mol.shell_pair_list()
+    ao_loc = mol.ao_loc_nr()
+    ni = numint._NumInt()
+    non0tab = numint.make_mask(mol, grids.coords)
+    # A(g) in the packed and unpacked form, the columns A(g)[:,:,sidx], the AO
+    # values, w*AO, F(g) for each DM and K(g)
+    blksize = max_memory*.9e6/8 / (nao_pair+nao**2*2+nao*(nset+3))
+    blksize = min(ngrids, max(numint.BLKSIZE,
+                              int(blksize)//numint.BLKSIZE*numint.BLKSIZE))
+    log.debug1('COSX: ngrids %d, blksize %d', ngrids, blksize)
+
+    vk = numpy.zeros((nset,nao,nao))
+    nskip = 0
+    npairs = 0
+    for ao, mask, weight, coords \
+            in ni.block_loop(mol, grids, nao, 0, max_memory, non0tab, blksize):
+        wao = ao * weight.reshape(-1,1)
+        fg = [lib.dot(ao, dmi) for dmi in dms]
+        fmax = numpy.max([abs(f).max(axis=1) for f in fg], axis=0)
+        idx = numpy.where(abs(wao).max(axis=1) * fmax > cutoff)[0]
+        nskip += len(weight) - len(idx)
+        if len(idx) == 0:
+            continue
+
+        fg = [f[idx] for f in fg]
+        wao = wao[idx]
+# K_mn gets the contributions of A_ns(g) only through the shells s on which
+# F_gs is significant in this block.  The other pairs are not evaluated.
+        fshl = numpy.max([numpy.maximum.reduceat(abs(f).max(axis=0), ao_loc[:-1])
+                          for f in fg], axis=0)
+        pairs = shell_pairs.subset(fshl > cutoff)
+        npairs += pairs.npairs
+
+        fakemol = fakemol_for_grids(mol, coords[idx])
+        aij = incore.aux_e2(mol, fakemol, 'cint3c2e_sph', aosym='s2ij',
+                            shell_pairs=pairs)
+        aij = lib.unpack_tril(aij.T)
+        for i in range(nset):
+            fgi = fg[i]
+            sidx = numpy.where(abs(fgi).max(axis=0) > cutoff)[0]
+            kg = numpy.einsum('gns,gs->gn', aij[:,:,sidx], fgi[:,sidx])
+            vk[i] += lib.dot(wao.T, kg)
+        aij = fakemol = None
+    log.debug1('COSX: %d of %d grids are skipped', nskip, ngrids)
+    log.debug1('COSX: %d shell pairs are evaluated in the grid blocks, '
+               '%d pairs in the shell pair list', npairs, shell_pairs.npairs)
+
+    if hermi == 1:
+        vk = (vk + vk.transpose(0,2,1)) * .5
+    log.timer('COSX vk', *t0)
+    return vk.reshape(dm.shape)
+
+def get_j(mol, dm, hermi=1, vhfopt=None):
+    '''Analytical J matrix of the direct SCF, without the exchange part
+    '''
+    dm = numpy.asarray(dm)
+    nao = dm.shape[-1]
+    dms = [numpy.asarray(x, order='C') for x in dm.reshape(-1,nao,nao)]
+    vj = _vhf.direct_mapdm('cint2e_sph', 's8', 'ji->s2kl', dms, 1,
+                           mol._atm, mol._bas, mol._env, vhfopt)
+    vj = vj.reshape(-1,nao,nao)
+    for i in range(len(vj)):
+        lib.hermi_triu(vj[i], 1)
+    return vj.reshape(dm.shape)
+
+
+def cosx(mf, grids=None):
+    '''For the given SCF object, replace the analytical exchange matrix with the
+    seminumerical (COSX) exchange.  J matrix is computed analytically, or with
+    the density fitting integrals if mf is a density fitting object (RIJCOSX).
+
+    Args:
+        mf : an SCF object
+
+    Kwargs:
+        grids : an instance of :class:`gen_grid.Grids`
+            Grids for the exchange matrix.  By default, level 1 grids are
+            used.
+
+    Examples:
+
+    >>> mol = gto.M(atom='O 0 0 0; H 0 .757 .587; H 0 -.757 .587', basis='ccpvdz')
+    >>> mf = cosx.cosx(scf.RHF(mol))
+    >>> mf.kernel()
+
+    >>> mf = cosx.cosx(scf.density_fit(dft.RKS(mol)))
+    >>> mf.xc = 'b3lyp'
+    >>> mf.kernel()
+    '''
+    mf_class = mf.__class__
+    if mf_class.__doc__ is None:
+        doc = ''
+    else:
+        doc = mf_class.__doc__
+
+    if grids is None:
+        grids = gen_grid.Grids(mf.mol)
+        grids.level = 1
+        grids.stdout = mf.stdout
+        grids.verbose = mf.verbose
+
+    class COSXHF(mf_class):
+        __doc__ = doc + \
+        r'''
+        Attributes for COSX exchange:
+            cosx_grids : an instance of :class:`gen_grid.Grids`
+                Grids for the seminumerical exchange.
+            cosx_cutoff : float
+                The grids on which |w \chi| * |F| < cosx_cutoff are skipped.
+        '''
+        def __init__(self):
+            self.__dict__.update(mf.__dict__)
+            self.cosx_grids = grids
+            self.cosx_cutoff = 1e-11
+            self._keys = self._keys.union(['cosx_grids', 'cosx_cutoff'])
+
+        def get_jk(self, mol=None, dm=None, hermi=1):
+            return (self.get_j(mol, dm, hermi), self.get_k(mol, dm, hermi))
+
+        def get_j(self, mol=None, dm=None, hermi=1):
+            if mol is None: mol = self.mol
+            if dm is None: dm = self.make_rdm1()
+            if getattr(self, 'with_df', None):
+                return mf_class.get_j(self, mol, dm, hermi)
+            elif self._eri is not None:
+                return hf.dot_eri_dm(self._eri, dm, hermi)[0]
+            else:
+                cpu0 = (time.clock(), time.time())
+                if self.direct_scf and self.opt is None:
+                    self.opt = self.init_direct_scf(mol)
+                vj = get_j(mol, dm, hermi, self.opt)
+                logger.timer(self, 'vj', *cpu0)
+                return vj
+
+        def get_k(self, mol=None, dm=None, hermi=1):
+            if mol is None: mol = self.mol
+            if dm is None: dm = self.make_rdm1()
+            return get_k(mol, dm, hermi, self.cosx_grids, self.max_memory,
+                         self.cosx_cutoff, logger.Logger(self.stdout, self.verbose))
+
+    return COSXHF()
+
+
+if __name__ == '__main__':
+    from pyscf import scf
+    mol = gto.M(atom='O 0 0 0; H 0 .757 .587; H 0 -.757 .587',
+                basis='ccpvdz', verbose=0)
+    mf = scf.RHF(mol)
+    mf.kernel()
+    dm = mf.make_rdm1()
+    vk = mf.get_k(mol, dm)
+    print(abs(get_k(mol, dm) - vk).max())
+    mf = cosx(scf.RHF(mol))
+    print(mf.kernel() - -76.0267656731)
@@ -1002,6 +1002,15 @@ class SCF(lib.StreamObject):
         self._eri = None
         self._keys = set(self.__dict__.keys())
 
+    def __getstate__(self):
+# The C optimizer of direct SCF is not picklable.  get_jk rebuilds it.
+# The temporary chkfile is owned by the original object, the copy keeps the
+# file name only.
+        state = lib.StreamObject.__getstate__(self)
+        state['opt'] = None
+        state['_chkfile'] = None
+        return state
+
     def build(self, mol=None):
         if mol is None: mol = self.mol
         if self.verbose >= logger.WARN:
@@ -1185,9 +1194,10 @@ class SCF(lib.StreamObject):
 
     def init_direct_scf(self, mol=None):
         if mol is None: mol = self.mol
+        shell_pairs = mol.shell_pair_list(min(1e-14, self.direct_scf_tol*.1))
         opt = _vhf.VHFOpt(mol, 'cint2e_sph', 'CVHFnrs8_prescreen',
                           'CVHFsetnr_direct_scf',
-                          'CVHFsetnr_direct_scf_dm')
+                          'CVHFsetnr_direct_scf_dm', shell_pairs)
         opt.direct_scf_tol = self.direct_scf_tol
         return opt
 
@@ -0,0 +1,105 @@
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+import numpy
+import unittest
+from pyscf import gto
+from pyscf import scf
+from pyscf import dft
+from pyscf.scf import cosx
+
+mol = gto.Mole()
+mol.build(
+    verbose = 5,
+    output = '/dev/null',
+    atom = '''
+O     0    0        0
+H     0    -0.757   0.587
+H     0    0.757    0.587''',
+    basis = 'cc-pvdz',
+)
+
+mf = scf.RHF(mol)
+mf.scf()
+nao = mol.nao_nr()
+
+
+class KnowValues(unittest.TestCase):
+    def test_get_k(self):
+        dm = mf.make_rdm1()
+        vj0, vk0 = scf.hf.get_jk(mol, dm)
+        grids = dft.gen_grid.Grids(mol)
+        grids.level = 5
+        grids.build()
+        vk1 = cosx.get_k(mol, dm, grids=grids)
+        self.assertTrue(abs(vk1-vk0).max() < 1e-4)
+        self.assertTrue(abs(vk1-vk1.T).max() < 1e-12)
+
+        numpy.random.seed(1)
+        dms = numpy.random.random((2,nao,nao)) * .1
+        dms = dms + dms.transpose(0,2,1)
+        vk0 = scf.hf.get_jk(mol, dms)[1]
+        vk1 = cosx.get_k(mol, dms, grids=grids)
+        self.assertEqual(vk1.shape, (2,nao,nao))
+        self.assertTrue(abs(vk1-vk0).max() < 1e-4)
+
+        vj1 = cosx.get_j(mol, dms)
+        self.assertTrue(numpy.allclose(vj1, scf.hf.get_jk(mol, dms)[0]))
+
+    def test_get_k_pair_screening(self):
+        # The density is localized on the first water.  The shell pairs
+        # between the AOs of the second water are not evaluated.
+        mol1 = gto.M(atom='''
+O     0    0        0
+H     0    -0.757   0.587
+H     0    0.757    0.587
+O     0    0        15
+H     0    -0.757   15.587
+H     0    0.757    15.587''', basis='6-31g', verbose=0)
+        nao1 = mol1.nao_nr()
+        nbas0 = mol1.nbas // 2
+        nao0 = mol1.ao_loc_nr()[nbas0]
+        numpy.random.seed(2)
+        dm0 = numpy.random.random((nao0,nao0)) * .1
+        dm = numpy.zeros((nao1,nao1))
+        dm[:nao0,:nao0] = dm0 + dm0.T
+        vk0 = scf.hf.get_jk(mol1, dm)[1]
+        grids = dft.gen_grid.Grids(mol1)
+        grids.level = 5
+        grids.build()
+        vk1 = cosx.get_k(mol1, dm, grids=grids)
+        self.assertTrue(abs(vk1-vk0).max() < 1e-4)
+
+        shl_mask = numpy.zeros(mol1.nbas, dtype=bool)
+        shl_mask[:nbas0] = True
+        spl = mol1.shell_pair_list()
+        self.assertTrue(spl.subset(shl_mask).npairs < spl.npairs)
+
+    def test_rhf(self):
+        mf1 = cosx.cosx(scf.RHF(mol))
+        e1 = mf1.kernel()
+        self.assertAlmostEqual(e1, mf.e_tot, 3)
+
+    def test_uks(self):
+        mf0 = dft.UKS(mol)
+        mf0.xc = 'b3lyp'
+        e0 = mf0.kernel()
+        mf1 = cosx.cosx(dft.UKS(mol))
+        mf1.xc = 'b3lyp'
+        e1 = mf1.kernel()
+        self.assertAlmostEqual(e1, e0, 3)
+
+    def test_rijcosx(self):
+        mf0 = scf.density_fit(dft.RKS(mol))
+        mf0.xc = 'b3lyp'
+        e0 = mf0.kernel()
+        mf1 = cosx.cosx(scf.density_fit(dft.RKS(mol)))
+        mf1.xc = 'b3lyp'
+        e1 = mf1.kernel()
+        self.assertAlmostEqual(e1, e0, 3)
+
+
+if __name__ == "__main__":
+    print("Full Tests for COSX")
+    unittest.main()